@@ -127,6 +127,7 @@ class CustomUser(AbstractUser):
     country = models.CharField(max_length=50, blank=True)
     bio = models.TextField(max_length=500, blank=True)
     is_premium = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.username} ({self.rank})"
\ No newline at end of file
@@ -9,6 +9,9 @@ from django.urls import reverse_lazy
 from django import forms
 from .forms import CustomUserCreationForm, UserProfileForm
 from .models import CustomUser
+from stats import percentiles, rollups, similarity
+from stats.comparison import career_totals
+from teams import rosters
 
 User = get_user_model()
 
@@ -109,14 +112,31 @@ class PlayerDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         player = self.object
-        context['recent_matches'] = player.match_stats.select_related('match')[:5]
+        context['recent_matches'] = player.match_stats.select_related('match__team1', 'match__team2')[:5]
         context['weapon_stats'] = player.weapon_stats.all()[:5]
 
         # ADD GAMING PREFERENCES
         context['gaming_preferences'] = self.get_gaming_preferences(player)
+        context['percentile_rows'] = self.get_percentile_rows(player)
+        context['form_rows'] = rollups.player_form(player.id)
+        context['similar_players'] = similarity.similar_players(player.id, limit=5)
+        context['stints'] = rosters.career_stints(player)
 
         return context
 
+    def get_percentile_rows(self, player):
+        """Career metrics with their percentile among all players, the player's pro/community group and rank"""
+        totals = career_totals([player.id])[player.id]
+        ranked = percentiles.player_percentiles(player, totals)
+        if not ranked:
+            return []
+        scopes = percentiles.scopes_for(player.is_professional, player.rank)
+        return [{
+            'label': label,
+            'value': totals[metric],
+            'percentiles': [ranked[scope].get(metric) for scope in scopes],
+        } for metric, label in percentiles.METRIC_LABELS.items()]
+
     def get_gaming_preferences(self, user):
         """Get REAL gaming preferences from user data and session"""
         import random
@@ -0,0 +1,208 @@
+"""Several GET requests against /api/ in one round trip.
+
+    POST /api/batch/
+    {"requests": [
+        {"id": "team", "url": "/api/teams/5/"},
+        {"id": "recent", "url": "/api/matches/?team=5&page_size=10"},
+        {"id": "h2h", "url": "/api/matches/?team=5&opponent=9",
+         "headers": {"If-None-Match": "\"...\""}}
+    ]}
+
+Sub-requests are independent reads, so they run concurrently on a
+thread pool of API_BATCH_WORKERS, each through the normal view with the
+caller's user. Every query a view runs through rows() is memoized for
+the batch, keyed by its SQL and parameters: when two sub-requests load
+the same team, page or member list, the database sees it once.
+
+Only the If-None-Match and If-Modified-Since headers are forwarded, and
+a sub-request that raises comes back as a 500 entry of its own.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from urllib.parse import urlsplit
+
+_current = ContextVar('api_batch_cache', default=None)
+logger = logging.getLogger('api.batch')
+
+# The only caller headers passed on to sub-requests; the rest (Accept included) are fixed by the batch
+FORWARDED_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+
+class BatchCache:
+    """Query results shared by the sub-requests of one batch; each key is loaded once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+        self.loading = {}
+        self.hits = 0
+
+    def get(self, key, load):
+        with self.lock:
+            if key in self.results:
+                self.hits += 1
+                return self.results[key]
+            key_lock = self.loading.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another thread may have finished loading while we waited
+            with self.lock:
+                if key in self.results:
+                    self.hits += 1
+                    return self.results[key]
+            value = load()
+            with self.lock:
+                self.results[key] = value
+            return value
+
+
+def _key(queryset, kind):
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None  # e.g. pk__in=[] - Django answers it without a query
+    return kind, queryset.db, sql, tuple(params)
+
+
+def rows(queryset):
+    """list(queryset), shared with the rest of the batch when inside one"""
+    cache = _current.get()
+    key = cache and _key(queryset, 'rows')
+    if not key:
+        return list(queryset)
+    return cache.get(key, lambda: list(queryset))
+
+
+class CachedPage:
+    """What Django's Paginator needs from a queryset - count() and slicing - through the batch cache"""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.ordered = queryset.ordered
+
+    def count(self):
+        cache = _current.get()
+        key = cache and _key(self.queryset, 'count')
+        if not key:
+            return self.queryset.count()
+        return cache.get(key, self.queryset.count)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return rows(self.queryset[index])
+        return rows(self.queryset[index:index + 1])[0]
+
+
+class BatchError(Exception):
+    pass
+
+
+def parse(data):
+    """Validated [(id, path, query string, headers)] from the decoded batch request body"""
+    if not isinstance(data, dict):
+        raise BatchError('Body must be a JSON object with a "requests" list')
+    specs = data.get('requests')
+    if not isinstance(specs, list) or not specs:
+        raise BatchError('"requests" must be a non-empty list')
+    limit = getattr(settings, 'API_BATCH_MAX_REQUESTS', 20)
+    if len(specs) > limit:
+        raise BatchError(f'At most {limit} sub-requests per batch')
+
+    parsed = []
+    for index, spec in enumerate(specs):
+        if not isinstance(spec, dict) or not isinstance(spec.get('url'), str):
+            raise BatchError(f'Sub-request {index} needs a "url"')
+        if spec.get('method', 'GET').upper() != 'GET':
+            raise BatchError(f'Sub-request {index}: only GET is supported')
+        url = urlsplit(spec['url'])
+        if not url.path.startswith('/api/') or url.path.rstrip('/') == '/api/batch':
+            raise BatchError(f'Sub-request {index}: url must be an /api/ resource')
+        headers = spec.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise BatchError(f'Sub-request {index}: "headers" must be an object')
+        parsed.append((spec.get('id', index), url.path, url.query, headers))
+    return parsed
+
+
+def _sub_request(parent, path, query_string, headers):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {
+        key: value for key, value in parent.META.items()
+        if key in ('SERVER_NAME', 'SERVER_PORT', 'REMOTE_ADDR', 'HTTP_HOST', 'HTTP_ACCEPT_LANGUAGE', 'wsgi.url_scheme')
+    }
+    request.META.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'HTTP_ACCEPT': 'application/json',
+    })
+    forwarded = {name.lower() for name in FORWARDED_HEADERS}
+    for name, value in headers.items():
+        if name.lower() in forwarded:
+            request.META['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    request.GET = QueryDict(query_string)
+    request.COOKIES = parent.COOKIES
+    # Middleware doesn't run for sub-requests - they act as the batch's caller
+    request.user = parent.user
+    request.session = getattr(parent, 'session', None)
+    request._dont_enforce_csrf_checks = True  # GET only
+    return request
+
+
+def _run_one(parent, spec):
+    identifier, path, query_string, headers = spec
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return {'id': identifier, 'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+
+    try:
+        response = match.func(_sub_request(parent, path, query_string, headers), *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception:
+        # One failing sub-request must not take the others' responses down with it
+        logger.exception('Batch sub-request %s failed', path)
+        return {'id': identifier, 'status': 500, 'headers': {}, 'body': {'detail': 'Server error.'}}
+    try:
+        body = json.loads(response.content) if response.content else None
+    except ValueError:
+        body = response.content.decode(errors='replace')
+    kept = {name: response[name] for name in ('ETag', 'Last-Modified') if response.has_header(name)}
+    return {'id': identifier, 'status': response.status_code, 'headers': kept, 'body': body}
+
+
+def _run_in_thread(parent, spec):
+    try:
+        return _run_one(parent, spec)
+    finally:
+        connection.close()  # Pool threads each opened their own connection
+
+
+def run(parent, specs):
+    """Responses for the parsed sub-requests, in request order, plus the number of cache hits"""
+    cache = BatchCache()
+    token = _current.set(cache)
+    try:
+        workers = min(getattr(settings, 'API_BATCH_WORKERS', 4), len(specs))
+        if workers <= 1:
+            results = [_run_one(parent, spec) for spec in specs]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(copy_context().run, _run_in_thread, parent, spec) for spec in specs]
+                results = [future.result() for future in futures]
+    finally:
+        _current.reset(token)
+    return results, cache.hits
@@ -0,0 +1,283 @@
+"""values()-based serialization for the API list endpoints.
+
+A FastSerializer is compiled once from one of the ModelSerializers in
+api/serializers.py and produces the same JSON, but from a single
+values() query with the nested relations joined in, instead of model
+instances and per-field serializer machinery for every row:
+
+    fast = FastSerializer(MatchSerializer)
+    rows = fast.values(Match.objects.filter(is_finished=True))
+    data = fast.build_many(rows)
+
+?fields= and ?expand= prune the plan itself: a field that isn't asked
+for adds no column, join or subquery, and a relation that isn't
+expanded is rendered as its primary key straight from the foreign key
+column. Top-level to-many fields (a team's members) are loaded with one
+extra query per page, like prefetch_related.
+
+Type conversion still goes through the DRF field's to_representation
+(decimals, datetimes), so formatting can't drift from the serializer.
+Sources that aren't columns - counts, flags, model properties - are
+listed in COMPUTED with the columns they need.
+"""
+from functools import lru_cache
+from types import SimpleNamespace
+from django.contrib.auth import get_user_model
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework import serializers as drf
+from rest_framework.exceptions import ValidationError
+from matches.models import Match, PlayerMatchStats
+from stats.models import WeaponStats
+from teams.models import Team, TeamMembership
+from tournaments.models import Tournament, TournamentParticipation
+from . import batch
+
+User = get_user_model()
+
+# Returned by a computed getter when DRF would leave the key out
+# (a read-only source that goes through a null relation)
+SKIP = object()
+
+# Fields whose to_representation doesn't change what values() returns
+PASSTHROUGH_FIELDS = (drf.CharField, drf.IntegerField, drf.BooleanField, drf.ChoiceField)
+
+
+@lru_cache(maxsize=None)
+def country_flag(model, country):
+    return model.get_country_flag(SimpleNamespace(country=country))
+
+
+def related_count(model, field):
+    """Annotation factory: number of `model` rows pointing at the outer row through `field`"""
+    def annotation(outer):
+        counts = (model.objects.filter(**{field: OuterRef(outer)}).order_by()
+                  .values(field).annotate(n=Count('pk')).values('n'))
+        return Coalesce(Subquery(counts), 0)
+    return annotation
+
+
+def flag(model):
+    return lambda prefix: ([prefix + 'country'], {}, lambda country: country_flag(model, country))
+
+
+def count(name, model, field):
+    annotation = related_count(model, field)
+    return lambda prefix: ([], {prefix.replace('__', '_') + name: annotation(prefix + 'pk')}, None)
+
+
+def prop(model, name, *columns):
+    """A model property evaluated on just the columns it reads"""
+    getter = getattr(model, name).fget
+
+    def compute(*values):
+        return getter(SimpleNamespace(**dict(zip(columns, values))))
+    return lambda prefix: ([prefix + column for column in columns], {}, compute)
+
+
+def match_winner_name(prefix):
+    def compute(is_finished, team1_score, team2_score, team1_name, team2_name):
+        winner = Match.winner.fget(SimpleNamespace(
+            is_finished=is_finished, team1_score=team1_score, team2_score=team2_score,
+            team1=team1_name, team2=team2_name,
+        ))
+        return SKIP if winner is None else winner
+    columns = ['is_finished', 'team1_score', 'team2_score', 'team1__name', 'team2__name']
+    return [prefix + column for column in columns], {}, compute
+
+
+# (model, serializer source) -> prefix -> (value paths, annotations, compute(*values))
+COMPUTED = {
+    (User, 'get_country_flag'): flag(User),
+    (Team, 'get_country_flag'): flag(Team),
+    (Team, 'memberships.count'): count('member_count', TeamMembership, 'team'),
+    (Tournament, 'participants.count'): count('participant_count', TournamentParticipation, 'tournament'),
+    (Match, 'winner.name'): match_winner_name,
+    (PlayerMatchStats, 'kd_ratio'): prop(PlayerMatchStats, 'kd_ratio', 'kills', 'deaths'),
+    (WeaponStats, 'headshot_percentage'): prop(WeaponStats, 'headshot_percentage', 'total_kills', 'headshot_kills'),
+    (WeaponStats, 'accuracy_percentage'): prop(WeaponStats, 'accuracy_percentage', 'total_kills', 'total_shots'),
+}
+
+
+class FastSerializer:
+    """Flat values() plan plus a row builder for one ModelSerializer class.
+
+    `fields` and `expand` are sets of dotted field names (see
+    parse_selection). With fields=None every field is rendered; with
+    expand=None every nested relation is embedded, otherwise relations
+    that aren't listed (or selected into by `fields`) render as their
+    primary key and are never joined.
+    """
+
+    def __init__(self, serializer_class, fields=None, expand=None):
+        self.serializer_class = serializer_class
+        self.fields = fields
+        self.expand = expand
+        self.paths = []
+        self.annotations = {}
+        self.children = []  # (name, related model, foreign key name, child FastSerializer or None)
+        self.builder = self.compile(serializer_class, '', '')
+        if self.children:
+            self._path('pk')
+
+    def _path(self, path):
+        if path not in self.paths and path not in self.annotations:
+            self.paths.append(path)
+        return path
+
+    def wanted(self, dotted):
+        if self.fields is None:
+            return True
+        return any(name == dotted or name.startswith(dotted + '.') or dotted.startswith(name + '.')
+                   for name in self.fields)
+
+    def expanded(self, dotted):
+        if self.expand is None or dotted in self.expand:
+            return True
+        # Selecting or expanding something inside a relation embeds the relation
+        inside = dotted + '.'
+        return any(name.startswith(inside) for name in self.expand | (self.fields or frozenset()))
+
+    def subselection(self, dotted):
+        """fields / expand re-rooted below `dotted`, for a to-many child plan"""
+        inside = dotted + '.'
+        fields = None
+        if self.fields is not None and dotted not in self.fields:
+            fields = frozenset(name[len(inside):] for name in self.fields if name.startswith(inside))
+        expand = None
+        if self.expand is not None:
+            expand = frozenset(name[len(inside):] for name in self.expand if name.startswith(inside))
+        return fields, expand
+
+    def compile(self, serializer_class, prefix, path):
+        model = serializer_class.Meta.model
+        builders = []
+        for name, field in serializer_class().fields.items():
+            dotted = path + name
+            if not self.wanted(dotted):
+                continue
+            if isinstance(field, drf.ListSerializer):
+                if prefix:
+                    raise ValueError(f'{serializer_class.__name__}.{name}: to-many fields are only supported at the top level')
+                relation = model._meta.get_field(field.source)
+                child = None
+                if self.expanded(dotted):
+                    child = FastSerializer(type(field.child), *self.subselection(dotted))
+                    child._path(relation.field.name)
+                self.children.append((name, relation.related_model, relation.field.name, child))
+                builders.append((name, (), None, name))
+            elif isinstance(field, drf.BaseSerializer):
+                key = self._path(prefix + field.source)
+                if self.expanded(dotted):
+                    # Nested object: None when the foreign key is null, like the serializer
+                    nested = self.compile(type(field), prefix + field.source + '__', dotted + '.')
+                    builders.append((name, (key,), None, nested))
+                else:
+                    builders.append((name, (key,), None, None))
+            elif (model, field.source) in COMPUTED:
+                paths, annotations, compute = COMPUTED[(model, field.source)](prefix)
+                self.annotations.update(annotations)
+                keys = tuple(self._path(path) for path in paths) + tuple(annotations)
+                builders.append((name, keys, compute, self._converter(field)))
+            else:
+                # Plain or dotted column. Every hop of a dotted source is fetched too:
+                # DRF omits the key when one of them is null.
+                hops = field.source.split('.')
+                guards = tuple(self._path(prefix + '__'.join(hops[:i])) for i in range(1, len(hops)))
+                key = self._path(prefix + '__'.join(hops))
+                builders.append((name, guards + (key,), None, self._converter(field)))
+        return builders
+
+    @staticmethod
+    def _converter(field):
+        if isinstance(field, PASSTHROUGH_FIELDS):
+            return None
+        return field.to_representation
+
+    def values(self, queryset):
+        """The one query for a page: every column the JSON needs, relations joined"""
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations)
+        return queryset.values(*self.paths, *self.annotations)
+
+    def load_children(self, rows):
+        """One query per to-many field for all the parent rows: {name: {parent pk: [items]}}"""
+        pks = [row['pk'] for row in rows]
+        loaded = {}
+        for name, model, foreign_key, child in self.children:
+            grouped = {pk: [] for pk in pks}
+            queryset = model.objects.filter(**{foreign_key + '__in': pks})
+            if child is None:
+                for parent, pk in queryset.values_list(foreign_key, 'pk'):
+                    grouped[parent].append(pk)
+            else:
+                for row in batch.rows(child.values(queryset)):
+                    grouped[row[foreign_key]].append(child.build(row))
+            loaded[name] = grouped
+        return loaded
+
+    def build(self, row, builders=None, children=None):
+        data = {}
+        for name, keys, compute, convert in builders or self.builder:
+            if not keys:
+                # To-many field, loaded separately by load_children
+                data[name] = children[name][row['pk']]
+                continue
+            if isinstance(convert, list):
+                # Nested serializer: keys is (foreign key,), convert is its builders
+                data[name] = None if row[keys[0]] is None else self.build(row, convert)
+                continue
+            if compute is None:
+                *guards, key = keys
+                if any(row[guard] is None for guard in guards):
+                    continue
+                value = row[key]
+            else:
+                value = compute(*[row[key] for key in keys])
+                if value is SKIP:
+                    continue
+            data[name] = value if value is None or convert is None else convert(value)
+        return data
+
+    def build_many(self, rows):
+        builder = self.builder
+        children = None
+        if self.children:
+            rows = list(rows)
+            children = self.load_children(rows)
+        return [self.build(row, builder, children) for row in rows]
+
+
+def field_names(serializer_class, path=''):
+    """Every dotted field name a serializer can render, relations included"""
+    names = set()
+    for name, field in serializer_class().fields.items():
+        names.add(path + name)
+        nested = field.child if isinstance(field, drf.ListSerializer) else field
+        if isinstance(nested, drf.BaseSerializer):
+            names |= field_names(type(nested), path + name + '.')
+    return names
+
+
+def parse_selection(serializer_class, fields=None, expand=None):
+    """Validated (fields, expand) frozensets from ?fields= / ?expand= strings; None when not given"""
+    known = field_names(serializer_class)
+    selection = []
+    errors = {}
+    for param, value in (('fields', fields), ('expand', expand)):
+        if value is None:
+            selection.append(None)
+            continue
+        names = frozenset(name.strip() for name in value.split(',') if name.strip())
+        unknown = sorted(names - known)
+        if unknown:
+            errors[param] = [f"Unknown field: '{name}'" for name in unknown]
+        selection.append(names)
+    if errors:
+        raise ValidationError(errors)
+    return tuple(selection)
+
+
+@lru_cache(maxsize=256)
+def fast_serializer(serializer_class, fields=None, expand=None):
+    return FastSerializer(serializer_class, fields, expand)
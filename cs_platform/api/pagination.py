@@ -0,0 +1,7 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+class ApiPagination(PageNumberPagination):
+    """PAGE_SIZE by default; clients can ask for up to 500 rows with ?page_size="""
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -39,7 +39,7 @@ class TeamMembershipSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TeamMembership
-        fields = ['player', 'role', 'joined_date', 'is_active']
+        fields = ['player', 'role', 'joined_date', 'left_date', 'is_active']
 
 
 class TeamDetailSerializer(serializers.ModelSerializer):
@@ -8,6 +8,8 @@ urlpatterns = [
     # Players
     path('players/', views.PlayerListView.as_view(), name='api_player_list'),
     path('players/<int:pk>/', views.PlayerDetailView.as_view(), name='api_player_detail'),
+    path('players/compare/', views.PlayerComparisonView.as_view(), name='api_player_comparison'),
+    path('players/<int:pk>/similar/', views.SimilarPlayersView.as_view(), name='api_similar_players'),
 
     # Teams
     path('teams/', views.TeamListView.as_view(), name='api_team_list'),
@@ -20,7 +22,14 @@ urlpatterns = [
     # Tournaments
     path('tournaments/', views.TournamentListView.as_view(), name='api_tournament_list'),
     path('tournaments/<int:pk>/', views.TournamentDetailView.as_view(), name='api_tournament_detail'),
+    path('tournaments/<int:pk>/forecast/', views.TournamentForecastView.as_view(), name='api_tournament_forecast'),
 
     # Stats
     path('weapon-stats/', views.WeaponStatsListView.as_view(), name='api_weapon_stats'),
+
+    # Several requests in one round trip
+    path('batch/', views.BatchView.as_view(), name='api_batch'),
+
+    # Delta sync
+    path('changes/', views.ChangeFeedView.as_view(), name='api_changes'),
 ]
\ No newline at end of file
@@ -0,0 +1,318 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils.decorators import method_decorator
+from rest_framework import generics
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
+from changes import feed
+from changes.conditional import conditional
+from teams.models import Team, TeamMembership
+from matches.models import Match, PlayerMatchStats
+from tournaments import forecast
+from tournaments.models import Tournament, TournamentParticipation
+from stats import percentiles, similarity
+from stats.comparison import ComparisonError, compare_players, parse_player_ids
+from stats.models import MapStats, PercentileTable, PlayerFeatures, WeaponStats
+from . import batch
+from .fast import fast_serializer, parse_selection
+from .serializers import (
+    UserSerializer, TeamSerializer, TeamDetailSerializer, MatchSerializer,
+    TournamentSerializer, WeaponStatsSerializer
+)
+
+User = get_user_model()
+
+TRUE_VALUES = ('true', '1', 'yes')
+
+
+@api_view(['GET'])
+def api_overview(request, format=None):
+    """Index of the API endpoints"""
+    return Response({
+        'API Overview': 'CS Platform REST API',
+        'Players': reverse('api_player_list', request=request, format=format),
+        'Teams': reverse('api_team_list', request=request, format=format),
+        'Matches': reverse('api_match_list', request=request, format=format),
+        'Tournaments': reverse('api_tournament_list', request=request, format=format),
+        'Weapon Stats': reverse('api_weapon_stats', request=request, format=format),
+        'Player Comparison': reverse('api_player_comparison', request=request, format=format),
+    })
+
+
+class FastSerializerMixin:
+    """Render from one values() query (see api/fast.py) instead of model instances.
+
+    ?fields=id,team1.name narrows the response and ?expand=team1 embeds
+    only the listed relations (the rest render as ids); both shrink the
+    query as well as the payload. The JSON otherwise matches
+    `serializer_class`.
+    """
+
+    def get_fast_serializer(self):
+        serializer_class = self.get_serializer_class()
+        params = self.request.query_params
+        return fast_serializer(serializer_class, *parse_selection(
+            serializer_class, params.get('fields'), params.get('expand')
+        ))
+
+
+class FastListMixin(FastSerializerMixin):
+    def list(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer()
+        rows = fast.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(batch.CachedPage(rows))
+        if page is not None:
+            return self.get_paginated_response(fast.build_many(page))
+        return Response(fast.build_many(rows))
+
+
+class FastRetrieveMixin(FastSerializerMixin):
+    def retrieve(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer()
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        queryset = self.filter_queryset(self.get_queryset()).filter(**lookup)
+        rows = batch.rows(fast.values(queryset))
+        if not rows:
+            raise NotFound()
+        return Response(fast.build_many(rows)[0])
+
+
+class ConditionalMixin:
+    """ETag / Last-Modified from table versions; a repeat poll gets a 304 before any query runs.
+
+    `version_models` are the tables the response reads. Detail views set
+    `version_row` to the model looked up by the URL's pk.
+    """
+    version_models = ()
+    version_row = None
+
+    def get(self, request, *args, **kwargs):
+        row = (self.version_row, self.lookup_url_kwarg or self.lookup_field) if self.version_row else None
+        return conditional(self.version_models, row)(super().get)(request, *args, **kwargs)
+
+
+def flag(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return value.lower() in TRUE_VALUES
+
+
+def id_param(request, name):
+    """An integer id query parameter, None when absent; anything else is a 400"""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: f'{name} must be an integer id'})
+
+
+class PlayerListView(ConditionalMixin, FastListMixin, generics.ListAPIView):
+    serializer_class = UserSerializer
+    version_models = (User,)
+
+    def get_queryset(self):
+        queryset = User.objects.order_by('username')
+        is_professional = flag(self.request, 'is_professional')
+        if is_professional is not None:
+            queryset = queryset.filter(is_professional=is_professional)
+        if self.request.query_params.get('rank'):
+            queryset = queryset.filter(rank=self.request.query_params['rank'])
+        if self.request.query_params.get('country'):
+            queryset = queryset.filter(country__iexact=self.request.query_params['country'])
+        return queryset
+
+
+class PlayerDetailView(ConditionalMixin, FastRetrieveMixin, generics.RetrieveAPIView):
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+    version_row = User
+
+
+class TeamListView(ConditionalMixin, FastListMixin, generics.ListAPIView):
+    serializer_class = TeamSerializer
+    version_models = (Team, TeamMembership, User)
+
+    def get_queryset(self):
+        queryset = Team.objects.filter(is_temporary=False)
+        is_professional = flag(self.request, 'is_professional')
+        if is_professional is not None:
+            queryset = queryset.filter(is_professional=is_professional)
+        if self.request.query_params.get('country'):
+            queryset = queryset.filter(country__iexact=self.request.query_params['country'])
+        return queryset
+
+
+class TeamDetailView(ConditionalMixin, FastRetrieveMixin, generics.RetrieveAPIView):
+    queryset = Team.objects.all()
+    serializer_class = TeamDetailSerializer
+    version_models = (TeamMembership, User)
+    version_row = Team
+
+
+class MatchListView(ConditionalMixin, FastListMixin, generics.ListAPIView):
+    serializer_class = MatchSerializer
+    version_models = (Match, Team, TeamMembership, User)
+
+    def get_queryset(self):
+        queryset = Match.objects.all()
+        is_finished = flag(self.request, 'is_finished')
+        if is_finished is not None:
+            queryset = queryset.filter(is_finished=is_finished)
+        if self.request.query_params.get('map'):
+            queryset = queryset.filter(map_name=self.request.query_params['map'])
+        team = id_param(self.request, 'team')
+        if team is not None:
+            queryset = queryset.filter(Q(team1_id=team) | Q(team2_id=team))
+            opponent = id_param(self.request, 'opponent')
+            if opponent is not None:
+                # Head to head
+                queryset = queryset.filter(Q(team1_id=opponent) | Q(team2_id=opponent))
+        return queryset
+
+
+class MatchDetailView(ConditionalMixin, FastRetrieveMixin, generics.RetrieveAPIView):
+    queryset = Match.objects.all()
+    serializer_class = MatchSerializer
+    version_models = (Team, TeamMembership, User)
+    version_row = Match
+
+
+class TournamentListView(ConditionalMixin, FastListMixin, generics.ListAPIView):
+    serializer_class = TournamentSerializer
+    version_models = (Tournament, TournamentParticipation, User)
+
+    def get_queryset(self):
+        queryset = Tournament.objects.all()
+        if self.request.query_params.get('status'):
+            queryset = queryset.filter(status=self.request.query_params['status'])
+        team = id_param(self.request, 'team')
+        if team is not None:
+            queryset = queryset.filter(participants__team_id=team)
+        return queryset
+
+
+class TournamentDetailView(ConditionalMixin, FastRetrieveMixin, generics.RetrieveAPIView):
+    queryset = Tournament.objects.all()
+    serializer_class = TournamentSerializer
+    version_models = (TournamentParticipation, User)
+    version_row = Tournament
+
+
+class TournamentForecastView(APIView):
+    """Monte Carlo reach and placement probabilities per team (see tournaments/forecast.py).
+
+    A stale or missing forecast is recomputed in the background; until
+    then the last one is returned with "is_stale": true.
+    """
+
+    def get(self, request, pk, format=None):
+        tournament = Tournament.objects.filter(pk=pk).first()
+        if tournament is None:
+            raise NotFound()
+        cached, is_stale = forecast.cached(tournament)
+        return Response({
+            'tournament': pk,
+            'is_stale': is_stale,
+            'computed_at': cached and cached.computed_at,
+            **(cached.results if cached else {'runs': 0, 'milestones': [], 'teams': []}),
+        })
+
+
+class WeaponStatsListView(ConditionalMixin, FastListMixin, generics.ListAPIView):
+    serializer_class = WeaponStatsSerializer
+    version_models = (WeaponStats, User)
+
+    def get_queryset(self):
+        queryset = WeaponStats.objects.all()
+        if self.request.query_params.get('weapon'):
+            queryset = queryset.filter(weapon=self.request.query_params['weapon'])
+        player = id_param(self.request, 'player')
+        if player is not None:
+            queryset = queryset.filter(player_id=player)
+        return queryset
+
+
+class PlayerComparisonView(APIView):
+    """Compare 2 to MAX_PLAYERS players: ?players=1,2,3 (see stats/comparison.py)"""
+
+    @method_decorator(conditional([User, PlayerMatchStats, Match, Team, WeaponStats, MapStats, PercentileTable]))
+    def get(self, request, format=None):
+        try:
+            player_ids = parse_player_ids(request.query_params.getlist('players'))
+        except ComparisonError as exc:
+            raise ValidationError({'players': str(exc)})
+        comparison = percentiles.add_to_comparison(compare_players(player_ids))
+        missing = set(player_ids) - {entry['player'].id for entry in comparison['players']}
+        if missing:
+            raise NotFound(f"Unknown players: {', '.join(map(str, sorted(missing)))}")
+        return Response({
+            'players': [
+                {**entry, 'player': UserSerializer(entry['player']).data}
+                for entry in comparison['players']
+            ],
+            'leaders': comparison['leaders'],
+        })
+
+
+class SimilarPlayersView(APIView):
+    """Players who play most like the given one (see stats/similarity.py); ?limit= up to 50"""
+    max_limit = 50
+
+    @method_decorator(conditional([User, PlayerFeatures], row=(User, 'pk')))
+    def get(self, request, pk, format=None):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            raise ValidationError({'limit': 'limit must be an integer'})
+        if limit < 1:
+            raise ValidationError({'limit': 'limit must be >= 1'})
+        if not User.objects.filter(pk=pk).exists():
+            raise NotFound()
+        results = similarity.similar_players(pk, limit)
+        return Response({
+            'player': pk,
+            'results': [{**result, 'player': UserSerializer(result['player']).data} for result in results],
+        })
+
+
+class ChangeFeedView(APIView):
+    """Delta sync: compacted upserts and deletes after ?since=<cursor>, paged (see changes/feed.py).
+
+    Without `since` only the current cursor is returned - fetch it before
+    the initial full download. ?limit= (max 1000) and ?resources=teams,players
+    are optional.
+    """
+    max_limit = 1000
+
+    def get(self, request, format=None):
+        params = request.query_params
+        if 'since' not in params:
+            return Response({'cursor': feed.current_cursor(), 'changes': [], 'has_more': False})
+        try:
+            since = int(params['since'])
+            limit = min(int(params.get('limit', 500)), self.max_limit)
+        except ValueError:
+            raise ValidationError({'since': 'since and limit must be integers'})
+        if since < 0 or limit < 1:
+            raise ValidationError({'since': 'since must be >= 0 and limit >= 1'})
+        names = [name for name in params.get('resources', '').split(',') if name] or None
+        changes, cursor, has_more = feed.changes_since(since, limit, names)
+        return Response({'cursor': cursor, 'changes': changes, 'has_more': has_more})
+
+
+class BatchView(APIView):
+    """Run up to API_BATCH_MAX_REQUESTS GET sub-requests against /api/ in one round trip (see api/batch.py)"""
+
+    def post(self, request, format=None):
+        try:
+            specs = batch.parse(request.data)
+        except batch.BatchError as exc:
+            raise ValidationError({'requests': str(exc)})
+        responses, _ = batch.run(request, specs)
+        return Response({'responses': responses})
@@ -0,0 +1,213 @@
+"""The hot code paths we track. Each case returns the callable to time."""
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.template import Context, Template
+from rest_framework.renderers import JSONRenderer
+from api import serializers
+from api.fast import fast_serializer
+from api.renderers import FastJSONRenderer
+from matches.models import Match
+from matches import history, odds, series
+from matches.views import generate_match_prediction
+from stats.models import WeaponStats
+from stats.templatetags import stats_filters
+from stats import percentiles, similarity
+from stats.comparison import METRICS, career_totals, compare_players
+from stats.views import calculate_team_stats
+from tournaments import forecast, montecarlo
+from tournaments.models import Stage
+from .harness import case
+
+User = get_user_model()
+
+
+@case('match_prediction')
+def match_prediction(data):
+    team1, team2 = data.teams[:2]
+    return lambda: generate_match_prediction(team1, team2, 'mirage')
+
+
+@case('team_map_strengths')
+def team_map_strengths(data):
+    teams = data.teams[:2]
+    return lambda: odds.team_strengths(teams)
+
+
+@case('series_predictions_page')
+def series_predictions_page(data):
+    # A match list page: 20 matches, each as a BO1 on its map and a BO3 with veto
+    matches = [Match(id=match.id, team1=match.team1, team2=match.team2, map_name=match.map_name)
+               for match in data.matches]
+    return lambda: series.predict_matches(matches)
+
+
+@case('team_stats')
+def team_stats(data):
+    team, matches = data.teams[0], data.team_matches
+    return lambda: calculate_team_stats(team, matches)
+
+
+@case('team_series_history')
+def team_series_history(data):
+    team = data.teams[0]
+    return lambda: history.team_history(team)
+
+
+@case('player_comparison_grouped')
+def player_comparison_grouped(data):
+    player_ids = [player.id for player in data.players[:2]]
+    return lambda: compare_players(player_ids)
+
+
+@case('player_comparison_roster')
+def player_comparison_roster(data):
+    player_ids = [player.id for player in data.players[:20]]
+    return lambda: compare_players(player_ids)
+
+
+@case('percentile_lookup')
+def percentile_lookup(data):
+    player = data.players[0]
+    totals = career_totals([player.id])[player.id]
+    return lambda: percentiles.player_percentiles(player, totals)
+
+
+@case('percentile_full_sort')
+def percentile_full_sort(data):
+    # What a lookup costs without the tables: every player's totals, sorted per metric
+    player = data.players[0]
+    player_ids = list(User.objects.values_list('id', flat=True))
+
+    def rank():
+        totals = [stats for stats in career_totals(player_ids).values() if stats['match_count']]
+        own = career_totals([player.id])[player.id]
+        return {metric: sum(stats[metric] < own[metric] for stats in totals) / len(totals) for metric in METRICS}
+    return rank
+
+
+@case('similar_players')
+def similar_players(data):
+    similarity.save_vectors()
+    player_id = data.players[0].id
+    similarity.similar_players(player_id)  # Loads the index
+    return lambda: similarity.similar_players(player_id)
+
+
+@case('similarity_search_1m')
+def similarity_search_1m(data):
+    # Synthetic: a million random vectors, partitioned like a real index of that size
+    rng = np.random.default_rng(0)
+    index = similarity.SimilarityIndex()
+    index.load(np.arange(1_000_000), rng.normal(size=(1_000_000, len(similarity.FEATURES))).astype(np.float32))
+    return lambda: index.search(12345, 10)
+
+
+@case('tournament_forecast')
+def tournament_forecast(data):
+    # 100k play-outs of Swiss qualifiers into double elimination playoffs, neither generated yet
+    tournament = data.tournaments[0]
+    plan, _ = forecast.build_plan(tournament, stages=[
+        Stage(tournament=tournament, name='Swiss', format='swiss', order=1, advance_count=8),
+        Stage(tournament=tournament, name='Playoffs', format='double_elimination', order=2),
+    ])
+    return lambda: montecarlo.play_out(plan, 100000)
+
+
+def serializer_case(serializer_class, rows):
+    return lambda: serializer_class(rows, many=True).data
+
+
+@case('serializer_users')
+def serializer_users(data):
+    return serializer_case(serializers.UserSerializer, data.players[:20])
+
+
+@case('serializer_teams')
+def serializer_teams(data):
+    return serializer_case(serializers.TeamSerializer, data.teams[:20])
+
+
+@case('serializer_matches')
+def serializer_matches(data):
+    return serializer_case(serializers.MatchSerializer, data.matches)
+
+
+@case('serializer_tournaments')
+def serializer_tournaments(data):
+    return serializer_case(serializers.TournamentSerializer, data.tournaments)
+
+
+@case('serializer_weapon_stats')
+def serializer_weapon_stats(data):
+    return serializer_case(serializers.WeaponStatsSerializer, data.weapon_stats)
+
+
+# A full 500-row API page, query included: the ModelSerializer path with the
+# joins it needs against the values() path the list endpoints use
+API_PAGE_SIZE = 500
+
+
+def api_page_case(serializer_class, queryset, fast):
+    if fast:
+        plan = fast_serializer(serializer_class)
+        renderer = FastJSONRenderer()
+        return lambda: renderer.render(plan.build_many(plan.values(queryset)[:API_PAGE_SIZE]))
+    renderer = JSONRenderer()
+    return lambda: renderer.render(serializer_class(queryset[:API_PAGE_SIZE], many=True).data)
+
+
+@case('api_page_matches')
+def api_page_matches(data):
+    return api_page_case(serializers.MatchSerializer, Match.objects.select_related('team1__captain', 'team2__captain'),
+                         fast=False)
+
+
+@case('api_page_matches_fast')
+def api_page_matches_fast(data):
+    return api_page_case(serializers.MatchSerializer, Match.objects.all(), fast=True)
+
+
+@case('api_page_players')
+def api_page_players(data):
+    return api_page_case(serializers.UserSerializer, User.objects.order_by('username'), fast=False)
+
+
+@case('api_page_players_fast')
+def api_page_players_fast(data):
+    return api_page_case(serializers.UserSerializer, User.objects.order_by('username'), fast=True)
+
+
+@case('api_page_weapon_stats')
+def api_page_weapon_stats(data):
+    return api_page_case(serializers.WeaponStatsSerializer, WeaponStats.objects.select_related('player'), fast=False)
+
+
+@case('api_page_weapon_stats_fast')
+def api_page_weapon_stats_fast(data):
+    return api_page_case(serializers.WeaponStatsSerializer, WeaponStats.objects.all(), fast=True)
+
+
+@case('stats_filters')
+def stats_filters_calls(data):
+    values = [(i, (i % 97) + 1) for i in range(1000)]
+    lookup_table = {i: i * 2 for i in range(100)}
+
+    def run():
+        for value, total in values:
+            stats_filters.percentage(value, total)
+            stats_filters.div(value, total)
+            stats_filters.mul(value, '1.5')
+            stats_filters.lookup(lookup_table, value % 120)
+    return run
+
+
+@case('stats_filters_template')
+def stats_filters_template(data):
+    # The filters as the leaderboard uses them - through the template engine
+    template = Template(
+        '{% load stats_filters %}{% for row in rows %}'
+        '{{ row.kills|div:row.deaths|floatformat:2 }} {{ row.headshots|percentage:row.kills }}% '
+        '{{ row.kills|mul:2 }}{% endfor %}'
+    )
+    rows = [{'kills': 20 + i % 15, 'deaths': 10 + i % 9, 'headshots': 8 + i % 7} for i in range(100)]
+    return lambda: template.render(Context({'rows': rows}))
@@ -0,0 +1,40 @@
+"""Benchmark datasets, built with `generate_league` at a few fixed scales"""
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Q
+from matches.models import Match
+from stats.models import WeaponStats
+from teams.models import Team
+from tournaments.models import Tournament
+
+User = get_user_model()
+
+SCALES = {
+    'small': {'players': 50, 'teams': 10, 'tournaments': 2, 'matches': 200},
+    'medium': {'players': 500, 'teams': 100, 'tournaments': 10, 'matches': 5000},
+    'large': {'players': 2000, 'teams': 400, 'tournaments': 40, 'matches': 50000},
+}
+
+
+def build(scale, seed=42):
+    """Fill the (empty, throwaway) database with the league for `scale`"""
+    call_command('generate_league', seed=seed, stdout=StringIO(), **SCALES[scale])
+    return Dataset()
+
+
+class Dataset:
+    """The rows cases measure against, loaded once per scale"""
+
+    def __init__(self):
+        self.teams = list(Team.objects.order_by('id'))
+        self.players = list(User.objects.filter(match_stats__isnull=False).distinct().order_by('id')[:50])
+        self.matches = list(Match.objects.select_related('team1', 'team2').order_by('-match_date')[:20])
+        self.tournaments = list(Tournament.objects.order_by('id')[:20])
+        self.weapon_stats = list(WeaponStats.objects.select_related('player').order_by('id')[:20])
+
+        team = self.teams[0]
+        self.team_matches = list(
+            Match.objects.filter(Q(team1=team) | Q(team2=team), is_finished=True)
+            .select_related('team1', 'team2').order_by('-match_date')[:50]
+        )
@@ -0,0 +1,154 @@
+"""Timing and allocation measurement for registered benchmark cases.
+
+A case is a function that receives the loaded Dataset and returns the
+zero-argument callable to measure:
+
+    @case('match_prediction')
+    def match_prediction(data):
+        team1, team2 = data.teams[:2]
+        return lambda: generate_match_prediction(team1, team2, 'mirage')
+
+Timing follows timeit: the loop count is calibrated so one repeat takes
+at least MIN_REPEAT_SECONDS, gc is paused while timing, and the best and
+median per-call times over the repeats are kept. Allocations are measured
+in a separate single call under tracemalloc, so tracing overhead never
+leaks into the timings.
+"""
+import gc
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from django.conf import settings
+
+MIN_REPEAT_SECONDS = 0.05
+
+# Case name -> setup function, filled by @case in benchmarks/cases.py
+registry = {}
+
+
+def case(name):
+    def decorator(setup):
+        registry[name] = setup
+        return setup
+    return decorator
+
+
+def calibrate(fn):
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= MIN_REPEAT_SECONDS or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def measure_time(fn, repeat):
+    number = calibrate(fn)
+    per_call = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            per_call.append((time.perf_counter() - started) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        'loops': number,
+        'best_us': round(min(per_call) * 1e6, 3),
+        'median_us': round(statistics.median(per_call) * 1e6, 3),
+        'stdev_us': round(statistics.stdev(per_call) * 1e6, 3) if len(per_call) > 1 else 0.0,
+    }
+
+
+def measure_allocations(fn):
+    """Peak traced memory and net new blocks for one call"""
+    fn()  # Warm caches so one-off imports and lazy setup aren't counted
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = after.compare_to(before, 'filename')
+    return {
+        'peak_kb': round(peak / 1024, 2),
+        'net_blocks': sum(stat.count_diff for stat in diff),
+    }
+
+
+def run_case(name, data, repeat):
+    fn = registry[name](data)
+    result = measure_time(fn, repeat)
+    result.update(measure_allocations(fn))
+    return result
+
+
+def history_path():
+    return Path(getattr(settings, 'BENCHMARK_HISTORY', settings.BASE_DIR / 'benchmarks' / 'history.json'))
+
+
+def load_history(path=None):
+    path = path or history_path()
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def append_history(results, label='', path=None):
+    path = path or history_path()
+    history = load_history(path)
+    history.append({
+        'label': label,
+        'commit': _git_commit(),
+        'created': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+        'results': results,
+    })
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=2, sort_keys=True)
+    return history[-1]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def compare(base, current, threshold):
+    """Rows for every (scale, case) in both runs; `regressed` when the median or peak memory grew past threshold"""
+    rows = []
+    for scale, cases in current['results'].items():
+        for name, now in cases.items():
+            before = base['results'].get(scale, {}).get(name)
+            if before is None:
+                continue
+            time_change = (now['median_us'] - before['median_us']) / before['median_us'] if before['median_us'] else 0.0
+            memory_change = (now['peak_kb'] - before['peak_kb']) / before['peak_kb'] if before['peak_kb'] else 0.0
+            rows.append({
+                'scale': scale,
+                'case': name,
+                'before_us': before['median_us'],
+                'after_us': now['median_us'],
+                'time_change': round(time_change, 4),
+                'memory_change': round(memory_change, 4),
+                'regressed': time_change > threshold or memory_change > threshold,
+            })
+    return rows
@@ -0,0 +1,50 @@
+import fnmatch
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from benchmarks import fixtures, harness
+
+
+class Command(BaseCommand):
+    help = 'Time the hot code paths against generated datasets and append the results to the history file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('cases', nargs='*', help='Case names or glob patterns (default: all)')
+        parser.add_argument('--scale', nargs='+', choices=list(fixtures.SCALES), default=['small', 'medium'])
+        parser.add_argument('--repeat', type=int, default=7, help='Timed repeats per case')
+        parser.add_argument('--label', default='', help='Stored with the run, e.g. a branch name')
+        parser.add_argument('--no-save', action='store_true', help="Don't append to the history file")
+
+    def handle(self, *args, **options):
+        from benchmarks import cases  # noqa: F401 - registers the cases
+
+        selected = [
+            name for name in harness.registry
+            if not options['cases'] or any(fnmatch.fnmatch(name, pattern) for pattern in options['cases'])
+        ]
+        if not selected:
+            raise CommandError(f"No cases match {' '.join(options['cases'])}. Known: {', '.join(harness.registry)}")
+
+        # Datasets live in a throwaway test database, never the real one
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        results = {}
+        try:
+            for scale in options['scale']:
+                self.stdout.write(f'Building {scale} dataset...')
+                data = fixtures.build(scale)
+                results[scale] = {}
+                for name in selected:
+                    result = harness.run_case(name, data, options['repeat'])
+                    results[scale][name] = result
+                    self.stdout.write(
+                        f"  {name:<26} median {result['median_us']:>12.1f} us  best {result['best_us']:>12.1f} us  "
+                        f"peak {result['peak_kb']:>9.1f} KiB  blocks {result['net_blocks']:>6}"
+                    )
+                call_command('flush', interactive=False, verbosity=0)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if not options['no_save']:
+            harness.append_history(results, label=options['label'])
+            self.stdout.write(f'Appended to {harness.history_path()}')
+        self.stdout.write(self.style.SUCCESS('Benchmarks complete'))
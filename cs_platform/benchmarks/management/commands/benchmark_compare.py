@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks import harness
+
+
+class Command(BaseCommand):
+    help = 'Compare two benchmark runs from the history file and flag regressions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base', type=int, default=-2, help='History index of the baseline run (default: previous)')
+        parser.add_argument('--current', type=int, default=-1, help='History index of the run to check (default: latest)')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Flag median time or peak memory growth above this fraction')
+
+    def handle(self, *args, **options):
+        history = harness.load_history()
+        try:
+            base, current = history[options['base']], history[options['current']]
+        except IndexError:
+            raise CommandError(f'Need at least two runs in {harness.history_path()} (found {len(history)})')
+
+        self.stdout.write(f"Base:    {base['created']} {base['commit']} {base['label']}")
+        self.stdout.write(f"Current: {current['created']} {current['commit']} {current['label']}")
+
+        rows = harness.compare(base, current, options['threshold'])
+        for row in rows:
+            line = (f"{row['scale']:<7} {row['case']:<26} {row['before_us']:>12.1f} -> {row['after_us']:>12.1f} us "
+                    f"({row['time_change']:+.1%})  memory {row['memory_change']:+.1%}")
+            self.stdout.write(self.style.ERROR(line + '  REGRESSION') if row['regressed'] else line)
+
+        regressed = [f"{row['scale']}/{row['case']}" for row in rows if row['regressed']]
+        if regressed:
+            raise CommandError(f"{len(regressed)} cases regressed more than {options['threshold']:.0%}: {', '.join(regressed)}")
+        self.stdout.write(self.style.SUCCESS('No regressions'))
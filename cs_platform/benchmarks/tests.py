@@ -0,0 +1,29 @@
+import tempfile
+from pathlib import Path
+from django.test import SimpleTestCase
+from benchmarks import harness
+
+
+class HarnessTest(SimpleTestCase):
+    def test_measure_time_and_allocations(self):
+        """Test that a case gets timings and an allocation count"""
+        result = harness.measure_time(lambda: sum(range(100)), repeat=3)
+        self.assertGreater(result['loops'], 1)
+        self.assertLessEqual(result['best_us'], result['median_us'])
+
+        kept = []
+        allocations = harness.measure_allocations(lambda: kept.append([object() for _ in range(100)]))
+        self.assertGreaterEqual(allocations['net_blocks'], 100)
+        self.assertGreater(allocations['peak_kb'], 0)
+
+    def test_history_round_trip_and_compare(self):
+        """Test that a slower second run is flagged against the first"""
+        path = Path(tempfile.mkdtemp()) / 'history.json'
+        base = harness.append_history({'small': {'team_stats': {'median_us': 100, 'peak_kb': 10}}}, path=path)
+        current = harness.append_history({'small': {'team_stats': {'median_us': 125, 'peak_kb': 10}}}, path=path)
+        self.assertEqual(len(harness.load_history(path)), 2)
+
+        rows = harness.compare(base, current, threshold=0.10)
+        self.assertEqual(rows[0]['time_change'], 0.25)
+        self.assertTrue(rows[0]['regressed'])
+        self.assertFalse(harness.compare(base, current, threshold=0.30)[0]['regressed'])
@@ -0,0 +1,75 @@
+"""ETag / Last-Modified for read endpoints, answered before the view runs.
+
+    @conditional([Match, PlayerMatchStats], row=(get_user_model(), 'player_id'))
+    async def async_player_stats(request, player_id): ...
+
+The ETag hashes the request's representation (path, query string,
+Accept) with the versions of every table the response reads. `row`
+adds the updated_at of the one object a detail response is about.
+A matching If-None-Match / If-Modified-Since gets a 304 from the stamp
+alone - one small query, no view query or serialization.
+"""
+import hashlib
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.http import http_date, quote_etag
+from django.utils.cache import get_conditional_response
+from .tracking import versions
+
+
+def stamp(request, models, row=None, kwargs=None):
+    """(etag, last_modified) for the request, or (None, None) when the `row` object doesn't exist"""
+    parts = [request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+    modified = []
+    for table, (version, updated_at) in sorted(versions(*models).items()):
+        parts.append(f'{table}:{version}')
+        if updated_at:
+            modified.append(updated_at)
+    if row is not None:
+        model, kwarg = row
+        updated_at = model.objects.filter(pk=kwargs[kwarg]).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None, None
+        parts.append(updated_at.isoformat())
+        modified.append(updated_at)
+    etag = quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+    return etag, max(modified) if modified else None
+
+
+def _check(request, models, row, kwargs):
+    if request.method not in ('GET', 'HEAD'):
+        return None, None, None
+    etag, last_modified = stamp(request, models, row, kwargs)
+    if etag is None:
+        return None, None, None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp), etag, timestamp
+
+
+def _finish(response, etag, timestamp):
+    if etag and response.status_code == 200:
+        response.headers.setdefault('ETag', etag)
+        if timestamp:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+    return response
+
+
+def conditional(models, row=None):
+    """Like django.views.decorators.http.condition, with the stamp from table versions; sync or async views"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                not_modified, etag, timestamp = await sync_to_async(_check)(request, models, row, kwargs)
+                if not_modified is not None:
+                    return not_modified
+                return _finish(await view(request, *args, **kwargs), etag, timestamp)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                not_modified, etag, timestamp = _check(request, models, row, kwargs)
+                if not_modified is not None:
+                    return not_modified
+                return _finish(view(request, *args, **kwargs), etag, timestamp)
+        return inner
+    return decorator
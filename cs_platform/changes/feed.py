@@ -0,0 +1,117 @@
+"""Delta sync log for clients that mirror teams, players, matches and tournaments.
+
+Saves and deletes append a Change row in the same transaction as the
+write. A client pages through everything after its cursor, compacted to
+the latest action per object:
+
+    1. GET /api/changes/            -> {"cursor": N}  (remember N)
+    2. download the full lists once
+    3. GET /api/changes/?since=N    -> upserts (with data) and deletes,
+                                       then repeat with the returned cursor
+
+Upsert data is the list endpoint's JSON with relations left as ids.
+compact() drops every entry superseded by a later one for the same
+object, so the log stays about as large as the tables it covers and a
+client that is far behind still gets one entry per object.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+from .models import Change
+
+
+def resources():
+    """resource name -> (model, serializer class)"""
+    from api.serializers import MatchSerializer, TeamSerializer, TournamentSerializer, UserSerializer
+    from matches.models import Match
+    from teams.models import Team
+    from tournaments.models import Tournament
+    return {
+        'players': (get_user_model(), UserSerializer),
+        'teams': (Team, TeamSerializer),
+        'matches': (Match, MatchSerializer),
+        'tournaments': (Tournament, TournamentSerializer),
+    }
+
+
+def logged_objects():
+    """model -> function(instance, deleted) returning (resource, object id, action)"""
+    from teams.models import TeamMembership
+    from tournaments.models import TournamentParticipation
+    handlers = {model: _own_row(name) for name, (model, _) in resources().items()}
+    # Member and participant counts are part of the team and tournament JSON
+    handlers[TeamMembership] = lambda instance, deleted: ('teams', instance.team_id, 'upsert')
+    handlers[TournamentParticipation] = lambda instance, deleted: ('tournaments', instance.tournament_id, 'upsert')
+    return handlers
+
+
+def _own_row(resource):
+    return lambda instance, deleted: (resource, instance.pk, 'delete' if deleted else 'upsert')
+
+
+def record(resource, object_id, action):
+    Change.objects.create(resource=resource, object_id=object_id, action=action)
+
+
+def reset(*names):
+    """Tell clients to refetch whole resources, after writes that logged nothing per row"""
+    Change.objects.bulk_create([Change(resource=name, object_id=0, action='reset') for name in names or resources()])
+
+
+def current_cursor():
+    return Change.objects.aggregate(last=Max('seq'))['last'] or 0
+
+
+def changes_since(since, limit=500, names=None):
+    """(entries, cursor, has_more) - at most `limit` objects whose latest change is after `since`"""
+    from api.fast import fast_serializer
+    available = resources()
+    names = [name for name in (names or available) if name in available]
+    # Changes younger than CHANGES_SETTLE_SECONDS aren't served yet: with concurrent
+    # writers a lower seq can commit after a higher one, and a client whose cursor
+    # had already moved past it would never see it
+    horizon = timezone.now() - timedelta(seconds=getattr(settings, 'CHANGES_SETTLE_SECONDS', 2))
+
+    latest = list(
+        Change.objects.filter(seq__gt=since, created_at__lte=horizon, resource__in=names)
+        .values('resource', 'object_id').annotate(last=Max('seq')).order_by('last')[:limit + 1]
+    )
+    has_more = len(latest) > limit
+    latest = latest[:limit]
+    if not latest:
+        return [], since, False
+
+    entries = list(Change.objects.filter(seq__in=[row['last'] for row in latest]).order_by('seq'))
+
+    # Current rows for the upserts: one values() query per resource
+    upserted = {}
+    for entry in entries:
+        if entry.action == 'upsert':
+            upserted.setdefault(entry.resource, []).append(entry.object_id)
+    data = {}
+    for name, ids in upserted.items():
+        model, serializer_class = available[name]
+        fast = fast_serializer(serializer_class, None, frozenset())
+        rows = fast.build_many(fast.values(model.objects.filter(pk__in=ids).order_by()))
+        data[name] = {row['id']: row for row in rows}
+
+    results = []
+    for entry in entries:
+        item = {'seq': entry.seq, 'resource': entry.resource, 'id': entry.object_id, 'action': entry.action}
+        if entry.action == 'upsert':
+            row = data[entry.resource].get(entry.object_id)
+            if row is None:
+                item['action'] = 'delete'  # Gone without a logged delete
+            else:
+                item['data'] = row
+        results.append(item)
+    return results, entries[-1].seq, has_more
+
+
+def compact():
+    """Delete every entry superseded by a later one for the same object. Returns the number deleted."""
+    newer = Change.objects.filter(resource=OuterRef('resource'), object_id=OuterRef('object_id'), seq__gt=OuterRef('seq'))
+    deleted, _ = Change.objects.filter(Exists(newer)).delete()
+    return deleted
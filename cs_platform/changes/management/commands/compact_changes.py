@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from changes import feed
+
+
+class Command(BaseCommand):
+    help = 'Drop delta sync log entries superseded by a later change to the same object (run from cron)'
+
+    def handle(self, *args, **options):
+        deleted = feed.compact()
+        self.stdout.write(self.style.SUCCESS(f'Compacted the change log ({deleted} superseded entries removed)'))
@@ -0,0 +1,35 @@
+from django.db import models
+
+
+class TableVersion(models.Model):
+    """Change counter per tracked table, bumped by model signals (see changes/tracking.py)"""
+    table = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+
+class Change(models.Model):
+    """One entry of the delta sync log (see changes/feed.py); seq only ever grows"""
+    ACTION_CHOICES = [
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+        ('reset', 'Reset'),  # Bulk write without per-row entries - clients refetch the resource
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    resource = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+        indexes = [
+            models.Index(fields=['resource', 'object_id', 'seq']),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.action} {self.resource}/{self.object_id}"
@@ -0,0 +1,186 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from matches.models import Match
+from teams.models import Team, TeamMembership
+from .feed import changes_since, compact
+from .models import TableVersion
+from . import tracking
+
+User = get_user_model()
+
+
+class TrackingTest(TestCase):
+    def test_saves_and_deletes_bump_table_versions(self):
+        """Test that tracked models bump their table's counter on save and delete"""
+        team = Team.objects.create(name='Alpha', tag='ALP')
+        version = tracking.versions(Team)['teams_team'][0]
+        team.description = 'Changed'
+        team.save()
+        self.assertEqual(tracking.versions(Team)['teams_team'][0], version + 1)
+        team.delete()
+        self.assertEqual(tracking.versions(Team)['teams_team'][0], version + 2)
+
+    def test_login_does_not_bump_players(self):
+        """Test that the last_login save on every login leaves the players version alone"""
+        User.objects.create_user(username='regular', password='testpass123')
+        before = tracking.versions(User)[User._meta.db_table][0]
+        self.assertTrue(self.client.login(username='regular', password='testpass123'))
+        self.assertEqual(tracking.versions(User)[User._meta.db_table][0], before)
+
+    def test_suspended_bumps_once_afterwards(self):
+        """Test that bulk work inside suspended() bumps every tracked table once"""
+        before = tracking.versions(Match)['matches_match'][0]
+        with tracking.suspended():
+            Team.objects.bulk_create([Team(name=f'Team {i}', tag=f'T{i}') for i in range(3)])
+            Team.objects.create(name='Single', tag='ONE')
+        self.assertEqual(tracking.versions(Match)['matches_match'][0], before + 1)
+        self.assertTrue(TableVersion.objects.filter(table='teams_team').exists())
+
+
+@override_settings(QUERY_LOG_ENABLED=False)  # Its periodic flush would land in the counted queries
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='poller', password='testpass123')
+        self.team1 = Team.objects.create(name='Alpha', tag='ALP')
+        self.team2 = Team.objects.create(name='Bravo', tag='BRV')
+        self.match = Match.objects.create(team1=self.team1, team2=self.team2, map_name='mirage')
+
+    def test_unchanged_list_is_304_without_running_the_view(self):
+        """Test that a repeat poll with the ETag gets a 304 from the version query alone"""
+        url = '/api/matches/?format=json'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A change to any table the list reads invalidates it
+        self.team2.name = 'Bravo Renamed'
+        self.team2.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_representations_get_different_etags(self):
+        """Test that query strings and pages are versioned separately"""
+        first = self.client.get('/api/matches/?format=json')
+        filtered = self.client.get('/api/matches/?format=json&fields=id')
+        self.assertNotEqual(first['ETag'], filtered['ETag'])
+
+    def test_detail_uses_row_updated_at(self):
+        """Test that a detail ETag follows its own row and Last-Modified is answered"""
+        url = f'/api/players/{self.user.pk}/?format=json'
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+
+        other = User.objects.create_user(username='other', password='testpass123')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        self.user.country = 'Denmark'
+        self.user.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/players/{other.pk + 1}/?format=json').status_code, 404)
+
+    def test_async_stats_endpoint(self):
+        """Test that the async team performance JSON answers conditional requests"""
+        TeamMembership.objects.create(team=self.team1, player=self.user)
+        url = f'/stats/async/team/{self.team1.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        Match.objects.create(team1=self.team1, team2=self.team2, map_name='dust2')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+@override_settings(CHANGES_SETTLE_SECONDS=0)
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        self.team1 = Team.objects.create(name='Alpha', tag='ALP')
+        self.team2 = Team.objects.create(name='Bravo', tag='BRV')
+
+    def get(self, **params):
+        response = self.client.get('/api/changes/', dict(params, format='json'))
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_changes_since_cursor_are_compacted(self):
+        """Test that several changes to one object come back as its latest state once"""
+        cursor = self.get()['cursor']
+        for name in ('Alpha 2', 'Alpha 3'):
+            self.team1.name = name
+            self.team1.save()
+        player = User.objects.create_user(username='newplayer', password='testpass123')
+        TeamMembership.objects.create(team=self.team1, player=player)
+
+        data = self.get(since=cursor)
+        entries = {(entry['resource'], entry['id']): entry for entry in data['changes']}
+        self.assertEqual(len(data['changes']), 2)
+        self.assertEqual(entries[('teams', self.team1.pk)]['data']['name'], 'Alpha 3')
+        self.assertEqual(entries[('teams', self.team1.pk)]['data']['member_count'], 1)
+        self.assertEqual(entries[('players', player.pk)]['action'], 'upsert')
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.get(since=data['cursor'])['changes'], [])
+
+    def test_logins_are_not_logged(self):
+        """Test that logging in doesn't send the player to mirroring clients again"""
+        User.objects.create_user(username='regular', password='testpass123')
+        cursor = self.get()['cursor']
+        self.assertTrue(self.client.login(username='regular', password='testpass123'))
+        self.assertEqual(self.get(since=cursor)['changes'], [])
+
+    def test_deletes_and_relations_as_ids(self):
+        """Test that deletes are reported and upserts carry related objects as ids"""
+        cursor = self.get()['cursor']
+        match = Match.objects.create(team1=self.team1, team2=self.team2, map_name='mirage')
+        data = self.get(since=cursor, resources='matches')
+        self.assertEqual(data['changes'][0]['data']['team1'], self.team1.pk)
+
+        team2_id = self.team2.pk
+        self.team2.delete()  # Cascades to the match
+        data = self.get(since=data['cursor'], resources='matches,teams')
+        actions = {(entry['resource'], entry['id']): entry['action'] for entry in data['changes']}
+        self.assertEqual(actions, {('matches', match.pk): 'delete', ('teams', team2_id): 'delete'})
+
+    def test_paging(self):
+        """Test that pages follow the cursor without repeating or skipping objects"""
+        cursor = self.get()['cursor']
+        teams = [Team.objects.create(name=f'Team {i}', tag=f'T{i}') for i in range(5)]
+        seen = []
+        while True:
+            data = self.get(since=cursor, limit=2)
+            seen.extend(entry['id'] for entry in data['changes'])
+            cursor = data['cursor']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, [team.pk for team in teams])
+
+    def test_compact_keeps_latest_entry_per_object(self):
+        """Test that compaction leaves one entry per object and the feed unchanged"""
+        for name in ('A', 'B', 'C'):
+            self.team1.name = name
+            self.team1.save()
+        before = changes_since(0)[0]
+        self.assertGreater(compact(), 0)
+        self.assertEqual(changes_since(0)[0], before)
+
+    def test_bulk_writes_log_a_reset(self):
+        """Test that suspended bulk work tells clients to refetch"""
+        cursor = self.get()['cursor']
+        with tracking.suspended():
+            Team.objects.bulk_create([Team(name='Bulk', tag='BLK')])
+        actions = {(entry['resource'], entry['action']) for entry in self.get(since=cursor)['changes']}
+        self.assertIn(('teams', 'reset'), actions)
+
+    def test_settle_window_holds_back_recent_entries(self):
+        """Test that entries younger than CHANGES_SETTLE_SECONDS aren't served yet"""
+        cursor = self.get()['cursor']
+        Team.objects.create(name='Fresh', tag='FRS')
+        with self.settings(CHANGES_SETTLE_SECONDS=60):
+            data = self.get(since=cursor)
+        self.assertEqual((data['changes'], data['cursor']), ([], cursor))
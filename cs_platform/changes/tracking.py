@@ -0,0 +1,116 @@
+"""Per-table change counters.
+
+Every save or delete of a tracked model bumps its table's TableVersion
+row in the same transaction, so a version read after commit reflects
+every change to that table. Response version stamps (changes/conditional.py)
+are built from these counters - one small query instead of the
+response's own query.
+
+The same handler appends the delta sync log entry (changes/feed.py).
+Writes that skip signals - QuerySet.update(), bulk_create() and raw
+SQL - must call bump() themselves. Saves limited to fields no response
+shows (unversioned_fields(), e.g. the last_login written on every
+login) don't bump the version or add a sync log entry.
+
+Every writer to a table updates that table's one TableVersion row, so
+concurrent writers to the same table queue on it until commit. That is
+accepted: writes here are short transactions that SQLite serializes
+anyway, and the counter must move in the writer's own transaction -
+bumped after commit, a poll in between could get a 304 for data that
+has already changed.
+"""
+from contextlib import contextmanager
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from .models import TableVersion
+from . import feed
+
+
+def tracked_models():
+    from matches.models import Match, PlayerMatchStats
+    from stats.models import MapStats, WeaponStats
+    from teams.models import Team, TeamMembership
+    from tournaments.models import Tournament, TournamentParticipation
+    return [
+        get_user_model(), Team, TeamMembership, Match, PlayerMatchStats,
+        Tournament, TournamentParticipation, WeaponStats, MapStats,
+    ]
+
+
+def bump(*models):
+    for model in models:
+        table = model._meta.db_table
+        updated = TableVersion.objects.filter(table=table).update(
+            version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            _, created = TableVersion.objects.get_or_create(table=table, defaults={'version': 1})
+            if not created:  # Lost the race to create it
+                TableVersion.objects.filter(table=table).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def versions(*models):
+    """{table: (version, updated_at)} for `models`, in one query"""
+    tables = [model._meta.db_table for model in models]
+    found = {
+        row.table: (row.version, row.updated_at)
+        for row in TableVersion.objects.filter(table__in=tables)
+    }
+    return {table: found.get(table, (0, None)) for table in tables}
+
+
+def unversioned_fields():
+    """model -> fields whose saves alone change nothing a response or the sync log shows"""
+    return {get_user_model(): {'last_login'}}
+
+
+def _versioned_save(sender, update_fields):
+    return not update_fields or not set(update_fields) <= unversioned_fields().get(sender, set())
+
+
+def _changed(sender, instance, signal, **kwargs):
+    if kwargs.get('raw'):
+        return  # loaddata
+    if signal is not post_delete and not _versioned_save(sender, kwargs.get('update_fields')):
+        return
+    bump(sender)
+    log = _feed_handlers.get(sender)
+    if log is not None:
+        feed.record(*log(instance, signal is post_delete))
+
+
+# model -> sync log entry builder, filled by connect()
+_feed_handlers = {}
+
+
+def connect():
+    _feed_handlers.update(feed.logged_objects())
+    for model in tracked_models():
+        post_save.connect(_changed, sender=model, dispatch_uid=f'changes.save.{model._meta.label}')
+        post_delete.connect(_changed, sender=model, dispatch_uid=f'changes.delete.{model._meta.label}')
+
+
+def disconnect():
+    for model in tracked_models():
+        post_save.disconnect(sender=model, dispatch_uid=f'changes.save.{model._meta.label}')
+        post_delete.disconnect(sender=model, dispatch_uid=f'changes.delete.{model._meta.label}')
+
+
+@contextmanager
+def suspended():
+    """Bulk writes without per-row signals, then one bump per tracked table
+    and a reset entry per synced resource.
+
+    A post_delete listener stops Django from fast-deleting a queryset, so
+    clearing a million rows would otherwise fetch and signal every one.
+    Only for management commands - it disconnects the handlers process-wide.
+    """
+    disconnect()
+    try:
+        yield
+    finally:
+        connect()
+        bump(*tracked_models())
+        feed.reset()
@@ -0,0 +1,12 @@
+"""Celery app for TASKS_BACKEND = 'celery'.
+
+Only needed when Celery is the task backend:
+    celery -A cs_platform.celery worker
+"""
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cs_platform.settings')
+
+app = Celery('cs_platform')
+app.config_from_object('django.conf:settings', namespace='CELERY')
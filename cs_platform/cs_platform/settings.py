@@ -5,7 +5,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-@i)lz-3o1dqh9!1bak3av)h@32y0npgu+4y4^rx49d)dnex+og'
 
-DEBUG = True
+# Set DJANGO_DEBUG=False for the production serving profile (hashed, precompressed static files)
+DEBUG = os.environ.get('DJANGO_DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '*']
 
@@ -15,6 +16,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
 
     'rest_framework',
@@ -25,15 +27,26 @@ INSTALLED_APPS = [
     'teams',
     'tournaments',
     'stats',
+    'tasks',
+    'loadtest',
+    'benchmarks',
+    'profiling',
+    'changes',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Below WhiteNoise, so static files keep their precompressed variants
+    'django.middleware.gzip.GZipMiddleware',
+    'profiling.querylog.QueryLogMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'profiling.middleware.ProfilingMiddleware',  # Only active for signed staff requests
+    'profiling.nplusone.NPlusOneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -45,15 +58,61 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # orjson-backed JSON; the browsable API only in development
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
-    ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+        'api.renderers.FastJSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.ApiPagination',
     'PAGE_SIZE': 20
 }
 
 
+# Background tasks - 'database' (run with `manage.py run_tasks`) or 'celery'
+TASKS_BACKEND = os.environ.get('TASKS_BACKEND', 'database')
+TASKS_VISIBILITY_TIMEOUT = 300  # Seconds a claimed task stays hidden from other workers
+TASKS_RETRY_DELAY = 10  # Base seconds for exponential retry backoff
+TASKS_WORKERS = None  # Defaults to the CPU count
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+
+# On-demand request profiling (`manage.py profiling_token <username>`)
+PROFILING_SAMPLE_INTERVAL = 0.001  # Seconds between stack samples
+PROFILING_TOKEN_MAX_AGE = 24 * 3600
+
+# Slow query log (`manage.py slow_queries`, or Profiling > Query stats in the admin)
+QUERY_LOG_ENABLED = os.environ.get('QUERY_LOG_ENABLED', str(DEBUG)) == 'True'  # Off in production unless asked for
+QUERY_LOG_EXPLAIN_THRESHOLD_MS = 100  # Capture EXPLAIN once per fingerprint above this
+QUERY_LOG_FLUSH_SECONDS = 10  # Per-process totals are written at most this often
+
+# N+1 query detection - logs to 'profiling.nplusone'; set NPLUSONE_RAISE to fail requests in tests
+NPLUSONE_ENABLED = DEBUG
+NPLUSONE_RAISE = os.environ.get('NPLUSONE_RAISE', 'False') == 'True'
+NPLUSONE_THRESHOLD = 3  # Identical queries from one call site before it counts
+
+# Matchmaking
+# The queue is in-process memory: serve the matchmaking views from one process (see matches/matchmaking.py)
+MATCHMAKING_WIDEN_SECONDS = 30  # Each wait of this length widens the search by one rank
+MATCHMAKING_SWEEP = True  # Background thread retrying lobbies while players wait
+
+# API batch endpoint (/api/batch/)
+API_BATCH_MAX_REQUESTS = 20
+API_BATCH_WORKERS = 4  # Threads running one batch's sub-requests; 1 runs them in order
+
+# Delta sync log (/api/changes/)
+CHANGES_SETTLE_SECONDS = 2  # Entries are served once this old, so late commits of lower seqs aren't skipped
+
+# Player percentile tables (stats/percentiles.py)
+PERCENTILES_MIN_MATCHES = 1  # Players with fewer matches aren't ranked
+
+# Similar-player search (stats/similarity.py)
+SIMILARITY_BRUTE_FORCE_LIMIT = 50000  # Above this many players the index is partitioned with k-means
+SIMILARITY_PROBES = 8  # Partitions scanned per search
+SIMILARITY_REBUILD_FRACTION = 0.1  # Re-fit scaling and partitions once this share of vectors has changed
+
+# Tournament forecasts (tournaments/forecast.py)
+TOURNAMENT_SIMULATION_RUNS = 100000  # Monte Carlo play-outs per forecast
+TOURNAMENT_SIMULATION_WORKERS = 0  # Processes sharing the play-outs (0 = inline in the task worker)
+
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:8000",
@@ -102,6 +161,19 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic writes content-hashed copies plus .gz/.br variants (Brotli needs the
+# Brotli package); WhiteNoise serves the hashed names with immutable cache headers
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+WHITENOISE_MAX_AGE = 0 if DEBUG else 3600  # Unhashed files; hashed ones are cached for a year
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
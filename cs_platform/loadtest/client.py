@@ -0,0 +1,152 @@
+"""Minimal keep-alive HTTP/1.1 client on asyncio streams.
+
+Enough HTTP for driving our own server: Content-Length and chunked
+bodies, a shared cookie jar and form POSTs with the CSRF token. Using
+the standard library keeps the harness free of extra dependencies.
+"""
+import asyncio
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class Connection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.writer = None
+
+    async def request(self, method, path, headers, body=b''):
+        if self.writer is None:
+            await self.open()
+
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        if body or method == 'POST':
+            lines.append(f'Content-Length: {len(body)}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('Connection closed by server')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        cookies = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'set-cookie':
+                cookies.append(value.strip())
+            response_headers[name] = value.strip()
+        response_headers['set-cookie'] = cookies
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            body = await self.reader.readexactly(int(response_headers['content-length']))
+        elif method == 'HEAD' or status in (204, 304):
+            body = b''
+        else:
+            body = await self.reader.read()
+            response_headers['connection'] = 'close'
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return Response(status, response_headers, body)
+
+    async def _read_chunked(self):
+        parts = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(parts)
+            parts.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+
+class Client:
+    """Pool of keep-alive connections sharing one cookie jar"""
+
+    def __init__(self, base_url, connections=10):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.cookies = {}
+        self.pool = asyncio.Queue()
+        for _ in range(connections):
+            self.pool.put_nowait(Connection(self.host, self.port))
+
+    async def close(self):
+        while not self.pool.empty():
+            await self.pool.get_nowait().close()
+
+    async def request(self, method, path, data=None, headers=None):
+        request_headers = {'Accept-Encoding': 'gzip', 'User-Agent': 'cs-platform-loadtest'}
+        if self.cookies:
+            request_headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        body = b''
+        if data is not None:
+            body = urlencode(data).encode()
+            request_headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            if 'csrftoken' in self.cookies:
+                request_headers['X-CSRFToken'] = self.cookies['csrftoken']
+                request_headers['Referer'] = f'http://{self.host}:{self.port}{path}'
+        request_headers.update(headers or {})
+
+        connection = await self.pool.get()
+        try:
+            try:
+                response = await connection.request(method, path, request_headers, body)
+            except (ConnectionError, asyncio.IncompleteReadError, HTTPError):
+                # Stale keep-alive connection - retry reads once on a fresh one
+                await connection.close()
+                if method != 'GET':
+                    raise
+                response = await connection.request(method, path, request_headers, body)
+        except BaseException:
+            await connection.close()
+            raise
+        finally:
+            self.pool.put_nowait(connection)
+
+        for header in response.headers['set-cookie']:
+            cookie = SimpleCookie(header)
+            self.cookies.update({key: morsel.value for key, morsel in cookie.items()})
+        return response
+
+    async def login(self, login_path, username, password):
+        await self.request('GET', login_path)
+        response = await self.request('POST', login_path, {'username': username, 'password': password})
+        if response.status != 302 or 'sessionid' not in self.cookies:
+            raise HTTPError(f'Login as {username} failed (HTTP {response.status})')
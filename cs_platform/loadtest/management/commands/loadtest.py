@@ -0,0 +1,126 @@
+import asyncio
+import random
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.urls import reverse
+from matches.models import Match
+from teams.models import Team
+from loadtest import client as http, profile, runner
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Drive a running server with a weighted traffic mix and report latency per URL name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+        parser.add_argument('--users', type=int, default=20, help='Closed loop: concurrent virtual users')
+        parser.add_argument('--rate', type=float, default=50, help='Open loop: requests per second')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to generate load')
+        parser.add_argument('--think-time', type=float, default=0, help='Closed loop: mean pause between requests')
+        parser.add_argument('--connections', type=int, help='Keep-alive connections (defaults to --users, or 50 open loop)')
+        parser.add_argument('--profile', help='JSON file overriding scenario weights')
+        parser.add_argument('--username', help='Log in first - needed for result submission (a team captain)')
+        parser.add_argument('--password')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--save', help='Write the results as a baseline JSON file')
+        parser.add_argument('--baseline', help='Compare against a saved baseline')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Flag throughput drops / p95 increases above this fraction')
+
+    def handle(self, *args, **options):
+        try:
+            weights = profile.load_weights(options['profile'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.options, self.weights = options, weights
+
+        scenarios = profile.build_scenarios(weights, self.load_targets(options['username']))
+        if not scenarios:
+            raise CommandError('No scenario has data to hit - generate some with `manage.py generate_league`')
+        skipped = sorted(set(name for name, weight in weights.items() if weight > 0) - {s.name for s in scenarios})
+        if skipped:
+            self.stdout.write(f"Skipping scenarios without targets: {', '.join(skipped)}")
+
+        mode = options['mode']
+        load = f"{options['users']} users" if mode == 'closed' else f"{options['rate']}/s"
+        self.stdout.write(f"Load testing {options['base_url']} ({mode} loop, {load}, {options['duration']}s)")
+
+        started = time.perf_counter()
+        recorder = asyncio.run(self.run(scenarios, options))
+        summary = runner.summarize(recorder, time.perf_counter() - started)
+        self.print_summary(summary)
+
+        if options['save']:
+            runner.save(options['save'], summary, {
+                'base_url': options['base_url'], 'mode': mode, 'users': options['users'],
+                'rate': options['rate'], 'duration': options['duration'], 'weights': weights,
+            })
+            self.stdout.write(f"Baseline written to {options['save']}")
+
+        if options['baseline']:
+            self.compare(options['baseline'], summary, options['threshold'])
+
+    def load_targets(self, username):
+        # The newest rows rather than ORDER BY RANDOM(), which scans the whole table
+        match_ids = Match.objects.order_by('-id').values_list('id', flat=True)[:1000]
+        team_ids = Team.objects.filter(is_active=True).order_by('-id').values_list('id', flat=True)[:500]
+        player_ids = User.objects.filter(match_stats__isnull=False).distinct().order_by('-id').values_list(
+            'id', flat=True)[:500]
+
+        result_match_ids = []
+        if username:
+            result_match_ids = Match.objects.filter(
+                Q(team1__captain__username=username) | Q(team2__captain__username=username),
+                is_finished=False,
+            ).values_list('id', flat=True)
+        return profile.Targets(match_ids, team_ids, player_ids, result_match_ids)
+
+    async def run(self, scenarios, options):
+        connections = options['connections'] or (options['users'] if options['mode'] == 'closed' else 50)
+        client = http.Client(options['base_url'], connections=connections)
+        rng = random.Random(options['seed'])
+        try:
+            if options['username']:
+                await client.login(reverse('login'), options['username'], options['password'] or '')
+            if options['mode'] == 'closed':
+                return await runner.run_closed(client, scenarios, rng, options['users'],
+                                               options['duration'], options['think_time'])
+            return await runner.run_open(client, scenarios, rng, options['rate'], options['duration'])
+        except (OSError, http.HTTPError) as e:
+            raise CommandError(f"Can't load test {options['base_url']}: {e}")
+        finally:
+            await client.close()
+
+    def print_summary(self, summary):
+        self.stdout.write(f"{'URL name':<20} {'reqs':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for name, row in summary.items():
+            line = (f"{name:<20} {row['requests']:>7} {row['throughput']:>8.1f} {row['p50_ms']:>9.1f} "
+                    f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['error_rate']:>7.1%}")
+            self.stdout.write(self.style.ERROR(line) if row['error_rate'] else line)
+
+    def compare(self, path, summary, threshold):
+        try:
+            saved = runner.load(path)
+            baseline = saved['results']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Can't read baseline {path}: {e}")
+
+        self.stdout.write(f'\nAgainst {path}:')
+        meta = saved.get('meta', {})
+        if meta.get('mode') != self.options['mode'] or meta.get('weights') != self.weights:
+            self.stdout.write(self.style.WARNING('Baseline used a different mode or traffic mix - numbers may not be comparable'))
+        rows = runner.compare(baseline, summary, threshold)
+        for row in rows:
+            line = (f"{row['name']:<20} throughput {row['throughput_change']:+.1%}  p95 {row['p95_change']:+.1%}  "
+                    f"errors {row['error_rate_change']:+.2%}")
+            self.stdout.write(self.style.ERROR(line + '  REGRESSION') if row['regressed'] else line)
+
+        regressed = [row['name'] for row in rows if row['regressed']]
+        if regressed:
+            raise CommandError(f"{len(regressed)} URL names regressed more than {threshold:.0%}: {', '.join(regressed)}")
+        self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,105 @@
+"""Weighted traffic mix for the load test.
+
+Each scenario is named after the URL it hits and builds one request from
+the ids sampled out of the database before the run. Weights can be
+overridden per run with a JSON file of {"scenario name": weight}.
+"""
+import json
+from django.urls import NoReverseMatch, reverse
+
+# Roughly what the access logs look like: browsing dominates, writes are rare
+DEFAULT_WEIGHTS = {
+    'match_list': 25,
+    'match_detail': 20,
+    'leaderboard': 15,
+    'player_comparison': 8,
+    'team_detail': 10,
+    'api_match_list': 7,
+    'api_player_list': 6,
+    'api_team_list': 5,
+    'match_result': 4,
+}
+
+
+class Scenario:
+    def __init__(self, name, weight, build, method='GET'):
+        self.name = name
+        self.weight = weight
+        self.build = build
+        self.method = method
+
+
+class Targets:
+    """Object ids the scenarios pick from, loaded once before the run"""
+
+    def __init__(self, match_ids, team_ids, player_ids, result_match_ids=()):
+        self.match_ids = list(match_ids)
+        self.team_ids = list(team_ids)
+        self.player_ids = list(player_ids)
+        self.result_match_ids = list(result_match_ids)
+
+
+def load_weights(path=None):
+    weights = dict(DEFAULT_WEIGHTS)
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown scenarios in {path}: {', '.join(sorted(unknown))}")
+        weights.update(overrides)
+    return weights
+
+
+def build_scenarios(weights, targets):
+    """Scenarios with a positive weight whose targets exist"""
+    match_list = reverse('match_list')
+    leaderboard = reverse('leaderboard')
+    comparison = reverse('player_comparison')
+
+    def match_detail(rng):
+        return reverse('match_detail', kwargs={'pk': rng.choice(targets.match_ids)}), None
+
+    def team_detail(rng):
+        return reverse('team_detail', kwargs={'pk': rng.choice(targets.team_ids)}), None
+
+    def player_comparison(rng):
+        player1, player2 = rng.sample(targets.player_ids, 2)
+        return f'{comparison}?player1={player1}&player2={player2}', None
+
+    def api_list(url_name):
+        try:
+            path = reverse(url_name)
+        except NoReverseMatch:
+            return None
+        return lambda rng: (f'{path}?page={rng.randint(1, 5)}&format=json', None)
+
+    def match_result(rng):
+        # Each unfinished match can only be finished once
+        if not targets.result_match_ids:
+            return None
+        match_id = targets.result_match_ids.pop()
+        score = rng.randint(0, 11)
+        data = {'team1_score': 13, 'team2_score': score, 'duration_minutes': 40, 'is_finished': 'on'}
+        return reverse('match_result', kwargs={'pk': match_id}), data
+
+    available = {
+        'match_list': (lambda rng: (f'{match_list}?page={rng.randint(1, 5)}', None), True),
+        'match_detail': (match_detail, targets.match_ids),
+        'leaderboard': (lambda rng: (leaderboard, None), True),
+        'player_comparison': (player_comparison, len(targets.player_ids) >= 2),
+        'team_detail': (team_detail, targets.team_ids),
+        'api_match_list': (api_list('api_match_list'), None),
+        'api_player_list': (api_list('api_player_list'), None),
+        'api_team_list': (api_list('api_team_list'), None),
+        'match_result': (match_result, targets.result_match_ids),
+    }
+
+    scenarios = []
+    for name, weight in weights.items():
+        build, has_targets = available[name]
+        if has_targets is None:
+            has_targets = build is not None  # URL not mounted in this configuration
+        if weight > 0 and has_targets:
+            scenarios.append(Scenario(name, weight, build, method='POST' if name == 'match_result' else 'GET'))
+    return scenarios
@@ -0,0 +1,151 @@
+"""Closed- and open-loop drivers and the per-scenario report.
+
+Closed loop: a fixed number of virtual users, each sending its next
+request when the previous one returns - measures the throughput ceiling.
+
+Open loop: requests arrive on a Poisson schedule at a fixed rate whether
+or not earlier ones have finished. Latency is measured from the scheduled
+arrival, not from when a connection became free, so a stalled server
+shows up in the percentiles instead of silently slowing the load down.
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict
+from .client import HTTPError
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, latency, status):
+        self.latencies[name].append(latency)
+        self.statuses[name][status] += 1
+        if status == 'error' or status >= 400:
+            self.errors[name] += 1
+
+
+async def send(client, recorder, scenario, rng, scheduled=None):
+    built = scenario.build(rng)
+    if built is None:
+        return
+    path, data = built
+    started = scheduled if scheduled is not None else time.perf_counter()
+    try:
+        response = await client.request(scenario.method, path, data)
+        status = response.status
+    except (OSError, asyncio.IncompleteReadError, ValueError, HTTPError):
+        status = 'error'
+    recorder.record(scenario.name, time.perf_counter() - started, status)
+
+
+def pick(rng, scenarios):
+    return rng.choices(scenarios, weights=[scenario.weight for scenario in scenarios])[0]
+
+
+async def run_closed(client, scenarios, rng, users, duration, think_time=0.0):
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user():
+        while time.perf_counter() < deadline:
+            await send(client, recorder, pick(rng, scenarios), rng)
+            if think_time:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+
+    await asyncio.gather(*(virtual_user() for _ in range(users)))
+    return recorder
+
+
+async def run_open(client, scenarios, rng, rate, duration):
+    recorder = Recorder()
+    start = time.perf_counter()
+    in_flight = set()
+    next_arrival = start
+
+    while next_arrival < start + duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = asyncio.ensure_future(send(client, recorder, pick(rng, scenarios), rng, scheduled=next_arrival))
+        in_flight.add(request)
+        request.add_done_callback(in_flight.discard)
+        next_arrival += rng.expovariate(rate)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return recorder
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    """Throughput, latency percentiles (ms) and error rate per scenario plus a total row"""
+    def row(latencies, errors, statuses=None):
+        latencies = sorted(latencies)
+        count = len(latencies)
+        summary = {
+            'requests': count,
+            'throughput': round(count / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'error_rate': round(errors / count, 4) if count else 0.0,
+        }
+        if statuses is not None:
+            summary['statuses'] = {str(status): n for status, n in sorted(statuses.items(), key=str)}
+        return summary
+
+    results = {
+        name: row(latencies, recorder.errors[name], recorder.statuses[name])
+        for name, latencies in sorted(recorder.latencies.items())
+    }
+    results['total'] = row(
+        [latency for latencies in recorder.latencies.values() for latency in latencies],
+        sum(recorder.errors.values()),
+    )
+    return results
+
+
+def compare(baseline, current, threshold):
+    """Per-scenario change against a baseline; `regressed` marks anything worse than `threshold` (a fraction)"""
+    rows = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        throughput_change = _change(before['throughput'], now['throughput'])
+        p95_change = _change(before['p95_ms'], now['p95_ms'])
+        error_change = now['error_rate'] - before['error_rate']
+        rows.append({
+            'name': name,
+            'throughput_change': throughput_change,
+            'p95_change': p95_change,
+            'error_rate_change': round(error_change, 4),
+            'regressed': throughput_change < -threshold or p95_change > threshold or error_change > 0.01,
+        })
+    return rows
+
+
+def _change(before, now):
+    if not before:
+        return 0.0
+    return round((now - before) / before, 4)
+
+
+def save(path, summary, meta):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': summary}, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
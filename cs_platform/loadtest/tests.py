@@ -0,0 +1,69 @@
+import asyncio
+import random
+from types import SimpleNamespace
+from django.test import SimpleTestCase
+from loadtest import profile, runner
+from loadtest.client import HTTPError
+
+
+class RunnerReportTest(SimpleTestCase):
+    def test_summary_percentiles_and_error_rate(self):
+        """Test the per-URL-name summary row"""
+        recorder = runner.Recorder()
+        for ms in range(1, 101):
+            recorder.record('match_list', ms / 1000, 200)
+        recorder.record('match_detail', 0.5, 500)
+        recorder.record('match_detail', 0.1, 'error')
+
+        summary = runner.summarize(recorder, elapsed=10)
+        self.assertEqual(summary['match_list']['p50_ms'], 50)
+        self.assertEqual(summary['match_list']['p99_ms'], 99)
+        self.assertEqual(summary['match_list']['throughput'], 10)
+        self.assertEqual(summary['match_detail']['error_rate'], 1.0)
+        self.assertEqual(summary['total']['requests'], 102)
+
+    def test_dropped_connection_is_recorded_as_an_error(self):
+        """Test that a connection closed by the server counts as an error instead of ending the run"""
+        class DroppingClient:
+            async def request(self, method, path, data=None):
+                raise HTTPError('Connection closed by server')
+
+        scenario = SimpleNamespace(name='match_result', method='POST', build=lambda rng: ('/matches/1/result/', {}))
+        recorder = runner.Recorder()
+        asyncio.run(runner.send(DroppingClient(), recorder, scenario, random.Random(0)))
+        self.assertEqual(recorder.errors['match_result'], 1)
+        self.assertEqual(dict(recorder.statuses['match_result']), {'error': 1})
+
+    def test_compare_flags_regressions_above_threshold(self):
+        """Test that only changes beyond the threshold are flagged"""
+        baseline = {'leaderboard': {'throughput': 100, 'p95_ms': 50, 'error_rate': 0.0},
+                    'team_detail': {'throughput': 100, 'p95_ms': 50, 'error_rate': 0.0}}
+        current = {'leaderboard': {'throughput': 95, 'p95_ms': 54, 'error_rate': 0.0},
+                   'team_detail': {'throughput': 80, 'p95_ms': 50, 'error_rate': 0.0}}
+        rows = {row['name']: row for row in runner.compare(baseline, current, threshold=0.10)}
+        self.assertFalse(rows['leaderboard']['regressed'])
+        self.assertTrue(rows['team_detail']['regressed'])
+
+
+class TrafficProfileTest(SimpleTestCase):
+    def test_scenarios_without_targets_are_dropped(self):
+        """Test that result submission is skipped when there is nothing to submit"""
+        targets = profile.Targets(match_ids=[1, 2], team_ids=[3], player_ids=[4, 5])
+        scenarios = profile.build_scenarios(profile.DEFAULT_WEIGHTS, targets)
+        names = {scenario.name for scenario in scenarios}
+        self.assertIn('match_detail', names)
+        self.assertNotIn('match_result', names)
+
+        comparison = next(s for s in scenarios if s.name == 'player_comparison')
+        path, data = comparison.build(random.Random(1))
+        self.assertIn('player1=', path)
+        self.assertIsNone(data)
+
+    def test_weight_overrides_reject_unknown_scenarios(self):
+        """Test that a typo in a profile file is reported"""
+        import json
+        import tempfile
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'match_lsit': 10}, f)
+        with self.assertRaises(ValueError):
+            profile.load_weights(f.name)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Match, PlayerMatchStats
+from .models import Match, PlayerMatchStats, Series
 
 @admin.register(Match)
 class MatchAdmin(admin.ModelAdmin):
@@ -12,4 +12,10 @@ class MatchAdmin(admin.ModelAdmin):
 class PlayerMatchStatsAdmin(admin.ModelAdmin):
     list_display = ['player', 'match', 'kills', 'deaths', 'assists', 'kd_ratio']
     list_filter = ['match__map_name', 'team']
-    search_fields = ['player__username', 'match__team1__name', 'match__team2__name']
\ No newline at end of file
+    search_fields = ['player__username', 'match__team1__name', 'match__team2__name']
+@admin.register(Series)
+class SeriesAdmin(admin.ModelAdmin):
+    list_display = ['team1', 'team2', 'format', 'team1_maps', 'team2_maps', 'winner', 'series_date', 'is_finished']
+    list_filter = ['format', 'is_finished', 'series_date']
+    search_fields = ['team1__name', 'team2__name']
+    ordering = ['-series_date']
@@ -116,6 +116,14 @@ class MatchResultForm(forms.ModelForm):
             'is_finished': 'Mark as Finished',
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # A bracket slot needs a winner; a drawn tournament map would decide nothing
+        if (self.instance.match_type == 'tournament' and cleaned_data.get('is_finished')
+                and cleaned_data.get('team1_score') == cleaned_data.get('team2_score')):
+            raise forms.ValidationError("A tournament match can't end in a draw - enter the deciding score.")
+        return cleaned_data
+
 
 class PlayerStatsForm(forms.ModelForm):
     class Meta:
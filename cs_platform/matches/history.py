@@ -0,0 +1,153 @@
+"""Series bookkeeping and team match history.
+
+A Series groups a best-of-N's maps (Match rows). Its score is rebuilt
+from the finished maps whenever one of them is saved finished (see
+signals.py), in the same transaction as the map, and a decided series
+drops the maps it no longer needs. A finished match that isn't part of
+a series gets a BO1 of its own.
+
+Each series also keeps one SeriesSide row per team, so a team's history
+is a single `(team, -series_date)` index scan rather than an OR over
+both team columns, and the maps of a whole page of series come from one
+prefetch query.
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from changes import tracking
+from .models import Match, Series, SeriesSide
+
+
+def _map_winner(team1_id, team2_id, team1_score, team2_score):
+    if team1_score == team2_score:
+        return None
+    return team1_id if team1_score > team2_score else team2_id
+
+
+def start_series(team1, team2, format='bo1', maps=(), series_date=None, **match_fields):
+    """A new series with one unplayed Match per map code in `maps`, in play order"""
+    series_date = series_date or timezone.now()
+    with transaction.atomic():
+        series = Series.objects.create(team1=team1, team2=team2, format=format, series_date=series_date)
+        SeriesSide.objects.bulk_create([
+            SeriesSide(series=series, team=team1, opponent=team2, series_date=series_date),
+            SeriesSide(series=series, team=team2, opponent=team1, series_date=series_date),
+        ])
+        for map_name in maps:
+            Match.objects.create(team1=team1, team2=team2, map_name=map_name, series=series,
+                                 match_date=series_date, **match_fields)
+    return series
+
+
+def record_map(match):
+    """Bring the series of a finished map - a new BO1 if it has none - up to date"""
+    with transaction.atomic():
+        if match.series_id is None:
+            match.series = start_series(match.team1, match.team2, series_date=match.match_date)
+            Match.objects.filter(pk=match.pk).update(series=match.series)
+
+        series = Series.objects.select_for_update().get(pk=match.series_id)
+        won = Counter(
+            _map_winner(*row) for row in series.maps.filter(is_finished=True).values_list(
+                'team1_id', 'team2_id', 'team1_score', 'team2_score'
+            )
+        )
+        needed = series.best_of // 2 + 1
+        series.team1_maps = won[series.team1_id]
+        series.team2_maps = won[series.team2_id]
+        if series.team1_maps >= needed:
+            series.winner_id = series.team1_id
+        elif series.team2_maps >= needed:
+            series.winner_id = series.team2_id
+        else:
+            series.winner_id = None
+        series.is_finished = series.winner_id is not None
+        series.save()
+
+        if series.is_finished:
+            series.maps.filter(is_finished=False).delete()  # Maps the series no longer needs
+        for team_id, maps_won, maps_lost in ((series.team1_id, series.team1_maps, series.team2_maps),
+                                             (series.team2_id, series.team2_maps, series.team1_maps)):
+            SeriesSide.objects.filter(series=series, team_id=team_id).update(
+                maps_won=maps_won, maps_lost=maps_lost, won=series.winner_id == team_id,
+                is_finished=series.is_finished, series_date=series.series_date,
+            )
+    return series
+
+
+def backfill(batch_size=2000):
+    """Give every finished match outside a series a BO1 of its own; returns how many were created.
+
+    record_map does this one map at a time from post_save; this is the
+    bulk version, with both SeriesSide rows written alongside.
+    """
+    created = 0
+    while True:
+        maps = list(Match.objects.filter(series__isnull=True, is_finished=True).order_by('id').only(
+            'id', 'team1_id', 'team2_id', 'team1_score', 'team2_score', 'match_date'
+        )[:batch_size])
+        if not maps:
+            break
+        with transaction.atomic():
+            series = []
+            for match in maps:
+                winner_id = _map_winner(match.team1_id, match.team2_id, match.team1_score, match.team2_score)
+                series.append(Series(
+                    team1_id=match.team1_id, team2_id=match.team2_id, format='bo1',
+                    team1_maps=int(winner_id == match.team1_id), team2_maps=int(winner_id == match.team2_id),
+                    winner_id=winner_id, series_date=match.match_date, is_finished=winner_id is not None,
+                ))
+            Series.objects.bulk_create(series)
+            for match, one in zip(maps, series):
+                match.series = one
+            Match.objects.bulk_update(maps, ['series'])
+            SeriesSide.objects.bulk_create([
+                SeriesSide(series=one, team_id=team_id, opponent_id=opponent_id, series_date=one.series_date,
+                           maps_won=maps_won, maps_lost=maps_lost, won=one.winner_id == team_id,
+                           is_finished=one.is_finished)
+                for one in series
+                for team_id, opponent_id, maps_won, maps_lost in (
+                    (one.team1_id, one.team2_id, one.team1_maps, one.team2_maps),
+                    (one.team2_id, one.team1_id, one.team2_maps, one.team1_maps),
+                )
+            ])
+        created += len(maps)
+    if created:
+        tracking.bump(Match)
+    return created
+
+
+def team_history(team, limit=5):
+    """The team's latest finished series, newest first, with their map results - two queries"""
+    sides = SeriesSide.objects.filter(team=team, is_finished=True).order_by('-series_date').select_related(
+        'series', 'opponent'
+    ).prefetch_related(
+        Prefetch('series__maps', queryset=Match.objects.filter(is_finished=True).order_by('match_date', 'id'))
+    )[:limit]
+
+    history = []
+    for side in sides:
+        map_results = []
+        for match in side.series.maps.all():
+            own_first = match.team1_id == team.id
+            team_score, opponent_score = ((match.team1_score, match.team2_score) if own_first
+                                          else (match.team2_score, match.team1_score))
+            map_results.append({
+                'map': match.get_map_name_display(),
+                'team_score': team_score,
+                'opponent_score': opponent_score,
+                'winner': 'team' if team_score > opponent_score else 'opponent',
+            })
+        history.append({
+            'series_id': side.series_id,
+            'opponent': side.opponent.name,
+            'opponent_tag': f'[{side.opponent.tag}]',
+            'date': side.series_date,
+            'series_score': f'{side.maps_won}-{side.maps_lost}',
+            'series_winner': 'team' if side.won else 'opponent',
+            'series_type': side.series.get_format_display(),
+            'map_results': map_results,
+            'total_maps': len(map_results),
+        })
+    return history
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from matches import scoreboard
+
+
+class Command(BaseCommand):
+    help = 'Store scoreboards for finished matches that have none (matches finished through the app get one on save)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        built = scoreboard.backfill(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Built {built} scoreboards'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from matches import history
+
+
+class Command(BaseCommand):
+    help = 'Put every finished match that is not part of a series into a BO1 of its own (new maps are grouped as they finish)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        created = history.backfill(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Created {created} series'))
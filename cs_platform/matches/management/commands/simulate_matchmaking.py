@@ -0,0 +1,64 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from matches.matchmaking import MatchmakingQueue, RANKS, form_matches, player_rating
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the matchmaking queue with synthetic players (nothing is written to the database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=100000, help='Players joining over the run')
+        parser.add_argument('--rate', type=float, default=2000, help='Simulated joins per second')
+        parser.add_argument('--widen', type=float, default=30, help='Seconds per rank the search window widens')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        clock = SimulatedClock()
+        queue = MatchmakingQueue(clock=clock, widen_every=options['widen'])
+        # Most of the population sits in the middle ranks
+        rank_weights = [15, 25, 25, 18, 10, 7]
+
+        waits = []
+        differences = []
+        spreads = []
+        join_time = 0.0
+        start = time.perf_counter()
+
+        for player_id in range(options['players']):
+            clock.now += rng.expovariate(options['rate'])
+            rank = rng.choices(RANKS, weights=rank_weights)[0]
+
+            started = time.perf_counter()
+            queue.join(player_id, rank, player_rating(rank, rng.randint(0, 3000)))
+            join_time += time.perf_counter() - started
+
+            for lobby, difference in form_matches(queue, persist=False):
+                waits.extend(clock.now - entry.joined_at for entry in lobby)
+                differences.append(difference)
+                spreads.append(max(e.rank_index for e in lobby) - min(e.rank_index for e in lobby))
+
+        elapsed = time.perf_counter() - start
+        players = options['players']
+
+        self.stdout.write(f'Players:          {players}')
+        self.stdout.write(f'Lobbies formed:   {len(differences)} ({len(queue)} players still queued)')
+        self.stdout.write(f'Wall time:        {elapsed:.2f}s ({players / elapsed:,.0f} joins/s including lobby search)')
+        self.stdout.write(f'Join only:        {players / join_time:,.0f} joins/s')
+        if waits:
+            waits.sort()
+            self.stdout.write(f'Wait (simulated): avg {statistics.mean(waits):.1f}s, '
+                              f'p95 {waits[int(len(waits) * 0.95)]:.1f}s, max {waits[-1]:.1f}s')
+            self.stdout.write(f'Rating gap:       avg {statistics.mean(differences):.1f}, max {max(differences)}')
+            self.stdout.write(f'Rank spread:      avg {statistics.mean(spreads):.2f} ranks')
+        self.stdout.write(self.style.SUCCESS('Simulation complete'))
@@ -0,0 +1,259 @@
+"""Community matchmaking queue.
+
+Waiting players live in memory, one FIFO bucket per rank, so joining and
+leaving are O(1). A lobby is searched for from the oldest player in each
+bucket outwards: everyone starts out only matching their own rank and the
+window widens by one rank every MATCHMAKING_WIDEN_SECONDS they wait.
+Ten players found this way are split into the 5v5 with the smallest
+rating difference and written as a Match between two temporary teams.
+Their memberships are closed when the match finishes or is deleted.
+
+Lobbies are formed when a player joins, and by a sweeper thread that
+retries every MATCHMAKING_WIDEN_SECONDS while anyone is waiting, as
+windows widen. Polling the status never writes.
+
+The queue lives in the memory of one process. Players who join through
+different worker processes are never matched with each other, so serve
+the matchmaking views from a single process.
+"""
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.db import connection, transaction
+from django.contrib.auth import get_user_model
+from changes import tracking
+from teams.models import Team, TeamMembership
+from .models import Match
+
+User = get_user_model()
+logger = logging.getLogger('matches.matchmaking')
+
+TEAM_SIZE = 5
+LOBBY_SIZE = TEAM_SIZE * 2
+RANKS = [code for code, _ in User.RANK_CHOICES]
+RANK_INDEX = {code: index for index, code in enumerate(RANKS)}
+
+
+def widen_seconds():
+    return getattr(settings, 'MATCHMAKING_WIDEN_SECONDS', 30)
+
+
+def player_rating(rank, hours_played=0):
+    """Skill estimate used for team balancing: rank first, experience as a tiebreak"""
+    return 1000 + RANK_INDEX.get(rank, 0) * 200 + min(hours_played, 2000) // 10
+
+
+def balance_teams(players):
+    """Split ten (player_id, rating) pairs into the 5v5 with the smallest rating gap.
+
+    The first player is pinned to team A, so only C(9, 4) = 126 splits
+    have to be tried.
+    """
+    total = sum(rating for _, rating in players)
+    best = None
+    for rest in itertools.combinations(range(1, len(players)), TEAM_SIZE - 1):
+        team_a = (0,) + rest
+        rating_a = sum(players[i][1] for i in team_a)
+        difference = abs(total - 2 * rating_a)
+        if best is None or difference < best[0]:
+            best = (difference, team_a)
+            if difference == 0:
+                break
+
+    team_a = set(best[1])
+    return (
+        [players[i] for i in sorted(team_a)],
+        [players[i] for i in range(len(players)) if i not in team_a],
+        best[0],
+    )
+
+
+class QueueEntry:
+    __slots__ = ('player_id', 'rank_index', 'rating', 'joined_at')
+
+    def __init__(self, player_id, rank_index, rating, joined_at):
+        self.player_id = player_id
+        self.rank_index = rank_index
+        self.rating = rating
+        self.joined_at = joined_at
+
+
+class MatchmakingQueue:
+    """Thread-safe in-memory queue. `clock` is injectable so the simulator can fast-forward time."""
+
+    def __init__(self, clock=time.monotonic, widen_every=None):
+        self.clock = clock
+        self.widen_every = widen_every or widen_seconds()
+        self.buckets = [OrderedDict() for _ in RANKS]
+        self.entries = {}
+        self.assignments = {}  # player id -> match id once their lobby is created
+        self.lock = threading.Lock()
+        self.sweeper = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def join(self, player_id, rank, rating):
+        with self.lock:
+            if player_id in self.entries:
+                return False
+            self.assignments.pop(player_id, None)
+            entry = QueueEntry(player_id, RANK_INDEX.get(rank, 0), rating, self.clock())
+            self.entries[player_id] = entry
+            self.buckets[entry.rank_index][player_id] = entry
+            return True
+
+    def leave(self, player_id):
+        with self.lock:
+            entry = self.entries.pop(player_id, None)
+            if entry is None:
+                return False
+            del self.buckets[entry.rank_index][player_id]
+            return True
+
+    def status(self, player_id):
+        with self.lock:
+            if player_id in self.assignments:
+                return {'status': 'matched', 'match_id': self.assignments[player_id]}
+            entry = self.entries.get(player_id)
+            if entry is None:
+                return {'status': 'idle'}
+            waited = self.clock() - entry.joined_at
+            return {
+                'status': 'queued',
+                'waited_seconds': round(waited, 1),
+                'search_ranks': [RANKS[i] for i in self._window(entry, waited)],
+                'players_in_queue': len(self.entries),
+            }
+
+    def _window(self, entry, waited):
+        width = int(waited // self.widen_every)
+        low = max(0, entry.rank_index - width)
+        high = min(len(RANKS) - 1, entry.rank_index + width)
+        # Nearest ranks first so a lobby is as tight as the wait allows
+        return sorted(range(low, high + 1), key=lambda i: (abs(i - entry.rank_index), i))
+
+    def pop_lobby(self):
+        """Remove and return ten entries for the longest-waiting player who has a full lobby, or None"""
+        with self.lock:
+            if len(self.entries) < LOBBY_SIZE:
+                return None
+            now = self.clock()
+            heads = sorted(
+                (next(iter(bucket.values())) for bucket in self.buckets if bucket),
+                key=lambda entry: entry.joined_at,
+            )
+            for anchor in heads:
+                lobby = []
+                for rank_index in self._window(anchor, now - anchor.joined_at):
+                    for entry in self.buckets[rank_index].values():
+                        lobby.append(entry)
+                        if len(lobby) == LOBBY_SIZE:
+                            break
+                    if len(lobby) == LOBBY_SIZE:
+                        break
+                if len(lobby) == LOBBY_SIZE:
+                    for entry in lobby:
+                        del self.entries[entry.player_id]
+                        del self.buckets[entry.rank_index][entry.player_id]
+                    return lobby
+            return None
+
+    def assign(self, player_ids, match_id):
+        with self.lock:
+            for player_id in player_ids:
+                self.assignments[player_id] = match_id
+
+    def keep_sweeping(self):
+        """Start the sweeper thread unless it's running (MATCHMAKING_SWEEP = False turns it off)"""
+        if not getattr(settings, 'MATCHMAKING_SWEEP', True):
+            return
+        with self.lock:
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(target=self._sweep, name='matchmaking-sweeper', daemon=True)
+                self.sweeper.start()
+
+    def _sweep(self):
+        while True:
+            time.sleep(self.widen_every)
+            try:
+                form_matches(self)
+            except Exception:
+                logger.exception('Matchmaking sweep failed')
+            finally:
+                connection.close()  # This thread's own connection
+            with self.lock:
+                if not self.entries:
+                    self.sweeper = None  # The next join starts a new one
+                    return
+
+
+def create_lobby_match(team_a, team_b, map_name=None):
+    """Write a balanced lobby as a Match between two temporary teams, all or nothing"""
+    lobby_id = uuid.uuid4().hex[:6].upper()
+    map_name = map_name or Match.MAP_CHOICES[int(lobby_id, 16) % len(Match.MAP_CHOICES)][0]
+
+    with transaction.atomic():
+        teams = []
+        for side, players in (('A', team_a), ('B', team_b)):
+            team = Team.objects.create(
+                name=f'Lobby {lobby_id} {side}',
+                tag=f'Q{lobby_id}{side}',
+                captain_id=players[0][0],
+                is_active=False,
+                is_temporary=True,
+            )
+            TeamMembership.objects.bulk_create([
+                TeamMembership(team=team, player_id=player_id) for player_id, _ in players
+            ])
+            tracking.bump(TeamMembership)
+            teams.append(team)
+
+        return Match.objects.create(
+            team1=teams[0],
+            team2=teams[1],
+            map_name=map_name,
+            match_type='competitive',
+        )
+
+
+def close_lobby(match, when=None):
+    """End the lobby sides' memberships once their match is over, so they don't count as real teams"""
+    open_memberships = TeamMembership.objects.filter(
+        team_id__in=[match.team1_id, match.team2_id], team__is_temporary=True, left_date__isnull=True,
+    )
+    for membership in open_memberships:
+        membership.leave(when)
+
+
+def form_matches(queue, persist=True):
+    """Turn every lobby the queue can currently fill into a match. Returns the created matches."""
+    created = []
+    while True:
+        lobby = queue.pop_lobby()
+        if lobby is None:
+            return created
+        team_a, team_b, difference = balance_teams([(entry.player_id, entry.rating) for entry in lobby])
+        if not persist:
+            created.append((lobby, difference))
+            continue
+        try:
+            match = create_lobby_match(team_a, team_b)
+        except Exception:
+            # Put everyone back at the front of the line with their original wait time
+            with queue.lock:
+                for entry in sorted(lobby, key=lambda entry: entry.joined_at, reverse=True):
+                    queue.entries[entry.player_id] = entry
+                    queue.buckets[entry.rank_index][entry.player_id] = entry
+                    queue.buckets[entry.rank_index].move_to_end(entry.player_id, last=False)
+            raise
+        queue.assign([entry.player_id for entry in lobby], match.id)
+        created.append(match)
+
+
+# Process-wide queue used by the views
+matchmaking_queue = MatchmakingQueue()
@@ -33,6 +33,8 @@ class Match(models.Model):
     match_date = models.DateTimeField(default=timezone.now)
     duration_minutes = models.IntegerField(validators=[MinValueValidator(1)], null=True, blank=True)
     is_finished = models.BooleanField(default=False)
+    series = models.ForeignKey('Series', on_delete=models.SET_NULL, null=True, blank=True, related_name='maps')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-match_date']
@@ -48,6 +50,55 @@ class Match(models.Model):
         return self.team1 if self.team1_score > self.team2_score else self.team2
 
 
+class Series(models.Model):
+    """A best-of-N between two teams; its maps are the Match rows pointing at it (see history.py)"""
+    FORMAT_CHOICES = [
+        ('bo1', 'BO1'),
+        ('bo3', 'BO3'),
+        ('bo5', 'BO5'),
+    ]
+
+    team1 = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='series_as_team1')
+    team2 = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='series_as_team2')
+    format = models.CharField(max_length=3, choices=FORMAT_CHOICES, default='bo1')
+    team1_maps = models.PositiveSmallIntegerField(default=0)
+    team2_maps = models.PositiveSmallIntegerField(default=0)
+    winner = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    series_date = models.DateTimeField(default=timezone.now)
+    is_finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-series_date']
+        verbose_name_plural = 'series'
+
+    def __str__(self):
+        return f"{self.team1.name} vs {self.team2.name} ({self.get_format_display()})"
+
+    @property
+    def best_of(self):
+        return int(self.format[2:])
+
+
+class SeriesSide(models.Model):
+    """One team's view of a series - what a team's history is read from, newest first off one index"""
+    series = models.ForeignKey(Series, on_delete=models.CASCADE, related_name='sides')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='series_sides')
+    opponent = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='+')
+    series_date = models.DateTimeField()
+    maps_won = models.PositiveSmallIntegerField(default=0)
+    maps_lost = models.PositiveSmallIntegerField(default=0)
+    won = models.BooleanField(default=False)
+    is_finished = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['series', 'team']
+        indexes = [models.Index(fields=['team', '-series_date'])]
+
+    def __str__(self):
+        return f"{self.team.name} vs {self.opponent.name} {self.maps_won}-{self.maps_lost}"
+
+
 class PlayerMatchStats(models.Model):
     match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='player_stats')
     player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='match_stats')
@@ -67,4 +118,14 @@ class PlayerMatchStats(models.Model):
 
     @property
     def kd_ratio(self):
-        return round(self.kills / max(self.deaths, 1), 2)
\ No newline at end of file
+        return round(self.kills / max(self.deaths, 1), 2)
+
+
+class MatchScoreboard(models.Model):
+    """A finished match's scoreboard, built once at finalization (see scoreboard.py)"""
+    match = models.OneToOneField(Match, on_delete=models.CASCADE, primary_key=True, related_name='scoreboard')
+    data = models.JSONField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Scoreboard for match {self.match_id}"
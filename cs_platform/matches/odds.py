@@ -0,0 +1,86 @@
+"""Team-vs-team map win probabilities.
+
+A team's strength on a map is its seeding rating (see
+tournaments.brackets.team_rating) on an Elo scale, plus the log-odds of
+its own record on that map and, at half weight, of its current roster's
+MapStats on it. Records are shrunk towards 50% by two phantom wins and
+two phantom losses, so a 1-0 team isn't treated as unbeatable:
+
+    form(wins, games) = logit((wins + 2) / (games + 4))
+    strength[team, map] = rating * ln(10) / 400 + form(team record) + 0.5 * form(roster record)
+    P(a beats b on map) = sigmoid(strength[a, map] - strength[b, map])
+
+Records for any number of teams come from three grouped queries: one
+per side of finished matches, and one over the active members' MapStats.
+"""
+import math
+import numpy as np
+from django.db.models import Count, F, Q, Sum
+from stats.models import MapStats
+from tournaments.brackets import MAP_POOL, team_rating
+from .models import Match
+
+MAP_INDEX = {code: index for index, code in enumerate(MAP_POOL)}
+
+ELO_SCALE = math.log(10) / 400
+PRIOR_GAMES = 2  # Phantom wins and losses added to every map record
+ROSTER_WEIGHT = 0.5  # Players' map records count for less than the team's own
+
+
+def map_records(team_ids):
+    """(wins, games) arrays of shape [teams, maps], in `team_ids` and MAP_POOL order"""
+    position = {team_id: index for index, team_id in enumerate(team_ids)}
+    wins = np.zeros((len(team_ids), len(MAP_POOL)))
+    games = np.zeros((len(team_ids), len(MAP_POOL)))
+    for side, other in (('team1', 'team2'), ('team2', 'team1')):
+        rows = Match.objects.filter(
+            is_finished=True, **{f'{side}_id__in': team_ids}
+        ).values(f'{side}_id', 'map_name').annotate(
+            games=Count('id'),
+            wins=Count('id', filter=Q(**{f'{side}_score__gt': F(f'{other}_score')})),
+        ).order_by()
+        for row in rows:
+            if row['map_name'] in MAP_INDEX:
+                key = position[row[f'{side}_id']], MAP_INDEX[row['map_name']]
+                wins[key] += row['wins']
+                games[key] += row['games']
+    return wins, games
+
+
+def roster_records(team_ids):
+    """(wins, games) arrays of shape [teams, maps] summed over each team's active members' MapStats"""
+    position = {team_id: index for index, team_id in enumerate(team_ids)}
+    wins = np.zeros((len(team_ids), len(MAP_POOL)))
+    games = np.zeros((len(team_ids), len(MAP_POOL)))
+    rows = MapStats.objects.filter(
+        player__team_memberships__team_id__in=team_ids, player__team_memberships__is_active=True,
+        player__team_memberships__team__is_temporary=False,
+    ).values('player__team_memberships__team_id', 'map_name').annotate(
+        wins=Sum('matches_won'), games=Sum('matches_played'),
+    ).order_by()
+    for row in rows:
+        if row['map_name'] in MAP_INDEX:
+            key = position[row['player__team_memberships__team_id']], MAP_INDEX[row['map_name']]
+            wins[key] = row['wins'] or 0
+            games[key] = row['games'] or 0
+    return wins, games
+
+
+def form(wins, games):
+    """Log-odds of a shrunk win rate"""
+    rate = (wins + PRIOR_GAMES) / (games + 2 * PRIOR_GAMES)
+    return np.log(rate / (1 - rate))
+
+
+def team_strengths(teams):
+    """Strength per team and map, shape [teams, maps]"""
+    teams = list(teams)
+    team_ids = [team.id for team in teams]
+    ratings = np.array([team_rating(team) for team in teams], dtype=np.float64) * ELO_SCALE
+    return ratings[:, None] + form(*map_records(team_ids)) + ROSTER_WEIGHT * form(*roster_records(team_ids))
+
+
+def map_win_matrix(teams):
+    """P[map, a, b] = probability that teams[a] beats teams[b] on MAP_POOL[map]"""
+    strengths = team_strengths(teams).T  # [maps, teams]
+    return 1 / (1 + np.exp(strengths[:, None, :] - strengths[:, :, None]))
@@ -0,0 +1,122 @@
+"""Scoreboard documents for the match page.
+
+A finished match never changes, so its scoreboard - both teams, their
+player lines sorted by kills and the derived K/D, ADR and headshot
+numbers - is built once when the match is finalized and stored as one
+JSON document (MatchScoreboard). The finished match page is then the
+match row joined to that document; no player_stats queries and no
+per-row template arithmetic.
+
+Upcoming and live matches get the same document built on the fly, so
+the template only knows one shape. Player lines saved after the match
+finished queue a rebuild (tasks.rebuild_scoreboard).
+"""
+from django.db import transaction
+from .models import Match, MatchScoreboard, PlayerMatchStats
+
+
+def _team(team, score, won):
+    return {
+        'id': team.id,
+        'name': team.name,
+        'tag': team.tag,
+        'logo': team.logo.url if team.logo else None,
+        'score': score,
+        'won': won,
+        'players': [],
+    }
+
+
+def _line(stat, rounds):
+    player = stat.player
+    return {
+        'player_id': player.id,
+        'username': player.username,
+        'rank': player.rank,
+        'rank_display': player.get_rank_display(),
+        'kills': stat.kills,
+        'deaths': stat.deaths,
+        'assists': stat.assists,
+        'headshots': stat.headshots,
+        'damage_dealt': stat.damage_dealt,
+        'kd_ratio': stat.kd_ratio,
+        'kd_diff': stat.kills - stat.deaths,
+        'adr': round(stat.damage_dealt / rounds, 1) if rounds else 0,
+        'hs_percentage': round(stat.headshots / max(stat.kills, 1) * 100, 1),
+    }
+
+
+def build(match, stats):
+    """The scoreboard document for `match` from its PlayerMatchStats rows (with players loaded)"""
+    winner = match.winner
+    teams = {
+        match.team1_id: _team(match.team1, match.team1_score, winner is not None and winner.id == match.team1_id),
+        match.team2_id: _team(match.team2, match.team2_score, winner is not None and winner.id == match.team2_id),
+    }
+    rounds = match.team1_score + match.team2_score
+    for stat in sorted(stats, key=lambda stat: (-stat.kills, stat.deaths, stat.player.username)):
+        if stat.team_id in teams:
+            teams[stat.team_id]['players'].append(_line(stat, rounds))
+
+    for team in teams.values():
+        players = team['players']
+        kills, deaths = sum(line['kills'] for line in players), sum(line['deaths'] for line in players)
+        team['totals'] = {
+            'kills': kills,
+            'deaths': deaths,
+            'assists': sum(line['assists'] for line in players),
+            'kd_ratio': round(kills / max(deaths, 1), 2),
+        }
+    return {
+        'team1': teams[match.team1_id],
+        'team2': teams[match.team2_id],
+        'winner': winner.name if winner else None,
+        'has_players': bool(stats),
+    }
+
+
+def _stats(match_ids):
+    return PlayerMatchStats.objects.filter(match_id__in=match_ids).select_related('player')
+
+
+def live(match):
+    """The document built from the current rows, for matches without a stored one"""
+    return build(match, list(_stats([match.id])))
+
+
+def save(match):
+    """Build and store the scoreboard of a finished match"""
+    scoreboard, _ = MatchScoreboard.objects.update_or_create(match=match, defaults={'data': live(match)})
+    return scoreboard
+
+
+def for_match(match):
+    """The stored document of a finished match (load it with select_related('scoreboard')), else a live one"""
+    stored = getattr(match, 'scoreboard', None)
+    if match.is_finished and stored is not None:
+        return stored.data
+    return live(match)
+
+
+def backfill(batch_size=500):
+    """Store scoreboards for finished matches that have none; returns how many were built.
+
+    Player lines for a page of matches come from one query, so a freshly
+    generated league's documents are built in batches rather than by save().
+    """
+    built = 0
+    while True:
+        matches = list(Match.objects.filter(is_finished=True, scoreboard__isnull=True).select_related(
+            'team1', 'team2'
+        ).order_by('id')[:batch_size])
+        if not matches:
+            break
+        by_match = {match.id: [] for match in matches}
+        for stat in _stats(by_match):
+            by_match[stat.match_id].append(stat)
+        with transaction.atomic():
+            MatchScoreboard.objects.bulk_create([
+                MatchScoreboard(match=match, data=build(match, by_match[match.id])) for match in matches
+            ])
+        built += len(matches)
+    return built
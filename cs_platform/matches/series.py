@@ -0,0 +1,174 @@
+"""Best-of-N series odds with a map veto, computed exactly.
+
+The veto follows the usual seven-map format, team1 going first:
+
+    BO1: ban, ban, ban, ban, ban, ban, decider
+    BO3: ban, ban, pick, pick, ban, ban, decider
+    BO5: ban, ban, pick, pick, pick, pick, decider
+
+Each team bans the remaining map it is weakest on against this opponent
+and picks the one it is strongest on (map win probabilities from
+matches.odds). Maps are played in pick order with the decider last, and
+the series is a walk over them: the probability of every (team1 maps,
+team2 maps) state is pushed forward one map at a time until a side has
+won enough, which gives the exact final map score distribution - no
+sampling.
+
+Everything is vectorized over matchups, so a page of upcoming matches
+is one batch: one map win matrix for the teams involved, then a handful
+of array operations whatever the number of matches.
+"""
+from math import comb
+import numpy as np
+from .odds import MAP_INDEX, MAP_POOL, map_win_matrix
+
+VETO = {
+    1: 'bbbbbb',
+    3: 'bbppbb',
+    5: 'bbpppp',
+}
+
+ROUNDS_TO_WIN = 13  # MR12
+
+
+def veto(probabilities, best_of):
+    """Map indexes in play order, shape [matchups, best_of], from team1's map win probabilities [matchups, maps]"""
+    if best_of not in VETO:
+        raise ValueError(f'Unsupported series format: BO{best_of}')
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    rows = np.arange(len(probabilities))
+    available = np.ones(probabilities.shape, dtype=bool)
+    picks = []
+    for step, action in enumerate(VETO[best_of]):
+        team1_turn = step % 2 == 0
+        # Team1 picks its best map and bans its worst; team2 the other way round
+        prefers_high = (action == 'p') == team1_turn
+        score = np.where(available, probabilities if prefers_high else -probabilities, -np.inf)
+        choice = score.argmax(axis=1)
+        available[rows, choice] = False
+        if action == 'p':
+            picks.append(choice)
+    decider = available.argmax(axis=1)
+    return np.stack(picks + [decider], axis=1)
+
+
+def series_scores(map_probabilities):
+    """{(team1 maps, team2 maps): probability per matchup} over final series scores.
+
+    `map_probabilities` is [matchups, best_of]: team1's chance on each map, in play order.
+    """
+    map_probabilities = np.asarray(map_probabilities, dtype=np.float64)
+    best_of = map_probabilities.shape[1]
+    needed = best_of // 2 + 1
+
+    states = {(0, 0): np.ones(len(map_probabilities))}
+    finished = {}
+    for _ in range(best_of):
+        following = {}
+        for (team1_maps, team2_maps), chance in states.items():
+            won = map_probabilities[:, team1_maps + team2_maps]
+            for score, step in (((team1_maps + 1, team2_maps), won), ((team1_maps, team2_maps + 1), 1 - won)):
+                target = finished if needed in score else following
+                target[score] = target.get(score, 0) + chance * step
+        states = following
+    return dict(sorted(finished.items(), key=lambda item: (-item[0][0], item[0][1])))
+
+
+def _round_win_chance(round_probability):
+    """Chance of winning a map (first to ROUNDS_TO_WIN, win by two in overtime) at a fixed per-round chance"""
+    lose = 1 - round_probability
+    regulation = sum(
+        comb(ROUNDS_TO_WIN - 1 + lost, lost) * round_probability ** ROUNDS_TO_WIN * lose ** lost
+        for lost in range(ROUNDS_TO_WIN - 1)
+    )
+    tied = comb(2 * (ROUNDS_TO_WIN - 1), ROUNDS_TO_WIN - 1) * (round_probability * lose) ** (ROUNDS_TO_WIN - 1)
+    overtime = round_probability ** 2 / (round_probability ** 2 + lose ** 2)
+    return regulation + tied * overtime
+
+
+def round_scores(map_probability):
+    """Most likely round score for team1's map win probability, e.g. '13-9'.
+
+    The per-round chance that gives `map_probability` is found by
+    bisection; the final score is then the mode of the negative binomial
+    over the loser's rounds, with overtime as one more outcome (shown as
+    16-14 to the favourite).
+    """
+    map_probability = np.atleast_1d(np.asarray(map_probability, dtype=np.float64))
+    low, high = np.zeros_like(map_probability), np.ones_like(map_probability)
+    for _ in range(40):
+        middle = (low + high) / 2
+        too_weak = _round_win_chance(middle) < map_probability
+        low, high = np.where(too_weak, middle, low), np.where(too_weak, high, middle)
+    rounds = (low + high) / 2
+
+    outcomes = [
+        comb(ROUNDS_TO_WIN - 1 + lost, lost) * chance ** ROUNDS_TO_WIN * (1 - chance) ** lost
+        for chance in (rounds, 1 - rounds) for lost in range(ROUNDS_TO_WIN - 1)
+    ]
+    outcomes.append(comb(2 * (ROUNDS_TO_WIN - 1), ROUNDS_TO_WIN - 1) * (rounds * (1 - rounds)) ** (ROUNDS_TO_WIN - 1))
+    labels = [f'{ROUNDS_TO_WIN}-{lost}' for lost in range(ROUNDS_TO_WIN - 1)]
+    labels += [f'{lost}-{ROUNDS_TO_WIN}' for lost in range(ROUNDS_TO_WIN - 1)]
+    best = np.stack(outcomes).argmax(axis=0)
+    overtime = [f'{ROUNDS_TO_WIN + 3}-{ROUNDS_TO_WIN + 1}', f'{ROUNDS_TO_WIN + 1}-{ROUNDS_TO_WIN + 3}']
+    return [
+        overtime[int(map_probability[index] < 0.5)] if choice == len(labels) else labels[choice]
+        for index, choice in enumerate(best)
+    ]
+
+
+def predict(pairs, best_of=3, maps=None, matrix=None, teams=None):
+    """Series predictions for (team1, team2) pairs, all in one batch.
+
+    `maps` fixes the maps (codes, one list per pair) instead of running
+    the veto. `matrix`/`teams` reuse a map_win_matrix already computed.
+    """
+    if not pairs:
+        return []
+    if matrix is None:
+        teams = list({team.id: team for pair in pairs for team in pair}.values())
+        matrix = map_win_matrix(teams)
+    position = {team.id: index for index, team in enumerate(teams)}
+    first = np.array([position[team1.id] for team1, _ in pairs])
+    second = np.array([position[team2.id] for _, team2 in pairs])
+    by_map = matrix[:, first, second].T  # [pairs, maps]
+
+    if maps is None:
+        order = veto(by_map, best_of)
+    else:
+        order = np.array([[MAP_INDEX[code] for code in pair_maps] for pair_maps in maps])
+    played = np.take_along_axis(by_map, order, axis=1)
+    scores = series_scores(played)
+    team1_wins = sum(chance for (team1_maps, team2_maps), chance in scores.items() if team1_maps > team2_maps)
+
+    predictions = []
+    for index in range(len(pairs)):
+        distribution = [(f'{team1_maps}-{team2_maps}', round(float(chance[index]) * 100, 1))
+                        for (team1_maps, team2_maps), chance in scores.items()]
+        predictions.append({
+            'best_of': order.shape[1],
+            'maps': [MAP_POOL[map_index] for map_index in order[index]],
+            'map_probabilities': [round(float(chance) * 100, 1) for chance in played[index]],
+            'team1_win_probability': round(float(team1_wins[index]) * 100, 1),
+            'team2_win_probability': round(100 - float(team1_wins[index]) * 100, 1),
+            'scores': distribution,
+            'predicted_score': max(distribution, key=lambda item: item[1])[0],
+        })
+    return predictions
+
+
+def predict_matches(matches, best_of=3):
+    """{match id: {'map': the scheduled map as a BO1, 'series': a BO`best_of` with veto}} for upcoming matches"""
+    matches = [match for match in matches if not match.is_finished]
+    if not matches:
+        return {}
+    pairs = [(match.team1, match.team2) for match in matches]
+    teams = list({team.id: team for pair in pairs for team in pair}.values())
+    matrix = map_win_matrix(teams)
+
+    single_maps = predict(pairs, maps=[[match.map_name] for match in matches], matrix=matrix, teams=teams)
+    series = predict(pairs, best_of, matrix=matrix, teams=teams)
+    return {
+        match.id: {'map': single, 'series': whole}
+        for match, single, whole in zip(matches, single_maps, series)
+    }
@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Match, PlayerMatchStats
+from . import history, matchmaking, scoreboard
+
+
+# Recomputation runs in the task worker - saves only queue it, after commit
+@receiver(post_save, sender=Match)
+def queue_match_recompute(sender, instance, **kwargs):
+    if not instance.is_finished:
+        return
+
+    from stats.tasks import recompute_match_stats
+    transaction.on_commit(
+        lambda: recompute_match_stats.enqueue(instance.pk, unique_key=f'match-stats:{instance.pk}')
+    )
+
+
+# The series score moves with its maps, in the map's own transaction
+@receiver(post_save, sender=Match)
+def update_series(sender, instance, **kwargs):
+    if instance.is_finished:
+        history.record_map(instance)
+
+
+# A finished match's page is served from the scoreboard document written here
+@receiver(post_save, sender=Match)
+def save_scoreboard(sender, instance, **kwargs):
+    if instance.is_finished:
+        scoreboard.save(instance)
+
+
+# Lobby teams only exist for their one match
+@receiver(post_save, sender=Match)
+def close_finished_lobby(sender, instance, **kwargs):
+    if instance.is_finished:
+        matchmaking.close_lobby(instance)
+
+
+@receiver(post_delete, sender=Match)
+def close_abandoned_lobby(sender, instance, **kwargs):
+    matchmaking.close_lobby(instance)
+
+
+@receiver(post_save, sender=PlayerMatchStats)
+def queue_player_recompute(sender, instance, **kwargs):
+    from stats.tasks import recompute_player_stats, refresh_rollups
+    from .tasks import rebuild_scoreboard
+    player_id, match_id = instance.player_id, instance.match_id
+    transaction.on_commit(
+        lambda: recompute_player_stats.enqueue(player_id, unique_key=f'player-stats:{player_id}')
+    )
+    # These tasks skip matches that aren't finished yet - they have no stored scoreboard or buckets
+    transaction.on_commit(
+        lambda: rebuild_scoreboard.enqueue(match_id, unique_key=f'scoreboard:{match_id}')
+    )
+    transaction.on_commit(
+        lambda: refresh_rollups.enqueue(match_id, unique_key=f'rollups:{match_id}')
+    )
@@ -0,0 +1,11 @@
+from tasks.queue import task
+from .models import Match
+from . import scoreboard
+
+
+@task
+def rebuild_scoreboard(match_id):
+    """Re-store a finished match's scoreboard after its player lines changed"""
+    match = Match.objects.select_related('team1', 'team2').filter(pk=match_id, is_finished=True).first()
+    if match is not None:
+        scoreboard.save(match)
@@ -1,3 +1,322 @@
 from django.test import TestCase
 
 # Create your tests here.
+
+
+import itertools
+from datetime import timedelta
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from teams.models import Team, TeamMembership
+from .models import Match, MatchScoreboard, PlayerMatchStats, Series, SeriesSide
+from .matchmaking import MatchmakingQueue, balance_teams
+from . import matchmaking
+from tasks import queue
+from . import history, scoreboard, series
+
+User = get_user_model()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class MatchmakingQueueTest(TestCase):
+    def test_balance_teams_minimizes_rating_difference(self):
+        """Test that the best of the 126 splits is picked"""
+        players = [(i, rating) for i, rating in enumerate([1000, 1000, 1200, 1200, 1400, 1400, 1600, 1600, 1800, 1800])]
+        team_a, team_b, difference = balance_teams(players)
+        self.assertEqual(len(team_a), 5)
+        self.assertEqual(len(team_b), 5)
+        self.assertEqual(difference, 0)
+        self.assertEqual(sum(r for _, r in team_a), sum(r for _, r in team_b))
+
+    def test_search_window_widens_with_wait_time(self):
+        """Test that mixed ranks only match once they've waited long enough"""
+        clock = FakeClock()
+        queue = MatchmakingQueue(clock=clock, widen_every=30)
+        for i in range(5):
+            queue.join(i, 'silver', 1000)
+        for i in range(5, 10):
+            queue.join(i, 'gold_nova', 1200)
+
+        self.assertIsNone(queue.pop_lobby())
+        clock.now = 31
+        lobby = queue.pop_lobby()
+        self.assertEqual(len(lobby), 10)
+        self.assertEqual(len(queue), 0)
+
+    def test_oldest_player_blocked_does_not_stall_other_ranks(self):
+        """Test that a lonely Silver doesn't stop ten Global Elites from playing"""
+        queue = MatchmakingQueue(clock=FakeClock(), widen_every=30)
+        queue.join(100, 'silver', 1000)
+        for i in range(10):
+            queue.join(i, 'global_elite', 2000)
+        lobby = queue.pop_lobby()
+        self.assertNotIn(100, [entry.player_id for entry in lobby])
+        self.assertEqual(len(queue), 1)
+
+
+class MatchmakingSweeperTest(TestCase):
+    def test_sweeper_retries_until_the_queue_is_empty(self):
+        """Test that the sweeper thread keeps forming lobbies while anyone waits, then stops"""
+        from unittest import mock
+        queue = MatchmakingQueue(widen_every=0.01)
+        queue.join(1, 'gold_nova', 1000)
+        sweeps = []
+
+        def form_matches(swept):
+            sweeps.append(len(swept))
+            if len(sweeps) == 2:
+                swept.leave(1)
+
+        with mock.patch.object(matchmaking, 'form_matches', form_matches):
+            queue.keep_sweeping()
+            sweeper = queue.sweeper
+            sweeper.join(timeout=5)
+        self.assertEqual(sweeps, [1, 1])
+        self.assertIsNone(queue.sweeper)
+
+
+@override_settings(MATCHMAKING_SWEEP=False)
+class MatchmakingViewTest(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(f'queuer{i}', f'queuer{i}@test.com', 'pass123', rank='gold_nova')
+            for i in range(10)
+        ]
+        matchmaking.matchmaking_queue = MatchmakingQueue()
+
+    def test_tenth_join_creates_match_with_temporary_teams(self):
+        """Test that a full lobby becomes one Match between two hidden teams"""
+        for user in self.users:
+            self.client.force_login(user)
+            response = self.client.post(reverse('matchmaking_join'))
+        self.assertEqual(response.json()['status'], 'matched')
+
+        match = Match.objects.get()
+        self.assertEqual(match.match_type, 'competitive')
+        self.assertTrue(match.team1.is_temporary)
+        self.assertFalse(match.team1.is_active)
+        self.assertEqual(match.team1.memberships.count() + match.team2.memberships.count(), 10)
+        self.assertFalse(Team.objects.filter(is_active=True).exists())
+
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse('matchmaking_status'))
+        self.assertEqual(response.json(), {'status': 'matched', 'match_id': match.id})
+
+    def test_status_polls_never_form_lobbies(self):
+        """Test that a lobby the widened windows allow is formed by the next join, not by status polls"""
+        clock = FakeClock()
+        queue = matchmaking.matchmaking_queue = MatchmakingQueue(clock=clock, widen_every=30)
+        ranks = ['silver_1', 'gold_nova', 'master_guardian']
+        for user, rank in zip(self.users[:9], itertools.cycle(ranks)):
+            queue.join(user.id, rank, 1000)
+        clock.now = 120
+
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(reverse('matchmaking_status')).json()['status'], 'queued')
+        self.assertFalse(Match.objects.exists())
+
+        self.client.force_login(self.users[9])
+        self.assertEqual(self.client.post(reverse('matchmaking_join')).json()['status'], 'matched')
+        self.assertEqual(Match.objects.count(), 1)
+
+    def test_finished_lobby_closes_its_memberships(self):
+        """Test that lobby memberships end with the match and never count as a real team"""
+        from tournaments.forms import TournamentRegistrationForm
+        for user in self.users:
+            self.client.force_login(user)
+            self.client.post(reverse('matchmaking_join'))
+        match = Match.objects.get()
+        self.assertEqual(list(TournamentRegistrationForm(self.users[0]).fields['team'].queryset), [])
+
+        match.team1_score, match.team2_score, match.is_finished = 13, 9, True
+        match.save()
+        lobby_teams = [match.team1_id, match.team2_id]
+        self.assertFalse(TeamMembership.objects.filter(team_id__in=lobby_teams, left_date__isnull=True).exists())
+        self.assertFalse(TeamMembership.objects.filter(team_id__in=lobby_teams, is_active=True).exists())
+
+
+@override_settings(QUERY_LOG_ENABLED=False)
+class SeriesTest(TestCase):
+    def setUp(self):
+        self.teams = [
+            Team.objects.create(name=f'Series {i}', tag=f'S{i}', is_professional=True, world_ranking=i * 10 + 1)
+            for i in range(4)
+        ]
+
+    def test_veto_picks_strong_maps_and_bans_weak_ones(self):
+        """Test that each side picks its best map and the decider is the last one left"""
+        chances = np.array([[0.9, 0.8, 0.6, 0.5, 0.4, 0.2, 0.1]])
+        # Bans: team1 drops 0.1, team2 drops 0.9; picks: team1 0.8, team2 0.2; bans 0.4 and 0.6
+        self.assertEqual(series.veto(chances, 3).tolist(), [[1, 5, 3]])
+        self.assertEqual(series.veto(chances, 1).shape, (1, 1))
+        self.assertEqual(sorted(series.veto(chances, 5)[0]), [1, 2, 3, 4, 5])
+        with self.assertRaises(ValueError):
+            series.veto(chances, 7)
+
+    def test_series_scores_match_brute_force(self):
+        """Test the exact BO5 score distribution against every sequence of map results"""
+        chances = np.array([[0.7, 0.4, 0.55, 0.3, 0.6]])
+        expected = {}
+        # Unplayed maps are summed out, so every full sequence of five results can be weighted as a whole
+        for results in itertools.product([True, False], repeat=5):
+            chance = np.prod([map_chance if won else 1 - map_chance for won, map_chance in zip(results, chances[0])])
+            team1 = team2 = 0
+            for won in results:
+                if 3 in (team1, team2):
+                    break
+                team1, team2 = team1 + won, team2 + (not won)
+            expected[(team1, team2)] = expected.get((team1, team2), 0) + chance
+
+        scores = series.series_scores(chances)
+        self.assertEqual(set(scores), set(expected))
+        for score, chance in expected.items():
+            self.assertAlmostEqual(float(scores[score][0]), chance)
+        self.assertAlmostEqual(sum(float(chance[0]) for chance in scores.values()), 1)
+
+    def test_round_scores(self):
+        """Test that favourites are predicted to win, by more the bigger the favourite"""
+        close, clear, underdog = series.round_scores([0.55, 0.95, 0.1])
+        self.assertEqual(close, '16-14')
+        self.assertTrue(clear.startswith('13-') and int(clear.split('-')[1]) < 10)
+        self.assertTrue(underdog.endswith('-13'))
+
+    def test_upcoming_matches_are_predicted_in_one_batch(self):
+        """Test that a page of matches costs the same three queries as one"""
+        matches = [Match.objects.create(team1=self.teams[i], team2=self.teams[(i + 1) % 4], map_name='mirage')
+                   for i in range(4)]
+        finished = Match.objects.create(team1=self.teams[0], team2=self.teams[1], map_name='dust2',
+                                        team1_score=13, team2_score=5, is_finished=True)
+        with self.assertNumQueries(3):
+            predictions = series.predict_matches(matches + [finished])
+
+        self.assertNotIn(finished.id, predictions)
+        first = predictions[matches[0].id]
+        self.assertEqual(first['map']['maps'], ['mirage'])
+        self.assertEqual(first['map']['scores'][0][0], '1-0')
+        self.assertEqual(len(first['series']['maps']), 3)
+        self.assertGreater(first['series']['team1_win_probability'], 50)  # Better world ranking
+        self.assertAlmostEqual(sum(chance for _, chance in first['series']['scores']), 100, delta=0.2)
+
+        response = self.client.get(reverse('match_list'))
+        self.assertContains(response, 'BO3 ')
+
+
+class SeriesHistoryTest(TestCase):
+    def setUp(self):
+        self.team1 = Team.objects.create(name='History One', tag='HO1')
+        self.team2 = Team.objects.create(name='History Two', tag='HO2')
+
+    def finish(self, match, team1_score, team2_score):
+        match.team1_score, match.team2_score, match.is_finished = team1_score, team2_score, True
+        match.save()
+
+    def test_series_is_maintained_as_maps_finish(self):
+        """Test that the score follows the finished maps and a decided BO3 drops its unplayed map"""
+        one = history.start_series(self.team1, self.team2, 'bo3', ['mirage', 'inferno', 'dust2'])
+        first, second, third = one.maps.order_by('id')
+        self.finish(first, 13, 7)
+        one.refresh_from_db()
+        self.assertEqual((one.team1_maps, one.team2_maps, one.is_finished), (1, 0, False))
+
+        self.finish(second, 16, 14)
+        one.refresh_from_db()
+        self.assertEqual((one.team1_maps, one.team2_maps, one.winner), (2, 0, self.team1))
+        self.assertTrue(one.is_finished)
+        self.assertFalse(Match.objects.filter(pk=third.pk).exists())
+        side = SeriesSide.objects.get(series=one, team=self.team2)
+        self.assertEqual((side.maps_won, side.maps_lost, side.won, side.is_finished), (0, 2, False, True))
+
+    def test_single_matches_become_bo1_series(self):
+        """Test that a finished match outside a series gets one, on save or by the backfill"""
+        saved = Match.objects.create(team1=self.team1, team2=self.team2, map_name='train',
+                                     team1_score=9, team2_score=13, is_finished=True)
+        saved.refresh_from_db()
+        self.assertEqual(saved.series.format, 'bo1')
+        self.assertEqual(saved.series.winner, self.team2)
+
+        Match.objects.bulk_create([Match(team1=self.team2, team2=self.team1, map_name='cache',
+                                         team1_score=13, team2_score=3, is_finished=True)])
+        self.assertEqual(history.backfill(), 1)
+        self.assertEqual(history.backfill(), 0)
+        self.assertEqual(Series.objects.filter(winner=self.team2, is_finished=True).count(), 2)
+
+    def test_team_history_is_two_queries(self):
+        """Test that the team page history reads series and their maps in two queries, newest first"""
+        for index in range(3):
+            one = history.start_series(self.team1, self.team2, 'bo3', ['mirage', 'inferno', 'dust2'],
+                                       series_date=timezone.now() - timedelta(days=index))
+            for match in one.maps.order_by('id')[:2]:
+                self.finish(match, 13, 10 + index)
+
+        with self.assertNumQueries(2):
+            rows = history.team_history(self.team2)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([row['series_score'] for row in rows], ['0-2'] * 3)
+        self.assertEqual(rows[0]['map_results'][0], {
+            'map': 'Mirage', 'team_score': 10, 'opponent_score': 13, 'winner': 'opponent',
+        })
+        self.assertEqual(rows[0]['opponent_tag'], '[HO1]')
+        self.assertGreater(rows[0]['date'], rows[1]['date'])
+
+        response = self.client.get(reverse('team_detail', args=[self.team1.pk]))
+        self.assertContains(response, '2-0')
+
+
+class ScoreboardTest(TestCase):
+    def setUp(self):
+        self.team1 = Team.objects.create(name='Board One', tag='BO1')
+        self.team2 = Team.objects.create(name='Board Two', tag='BO2')
+        self.match = Match.objects.create(team1=self.team1, team2=self.team2, map_name='mirage')
+        for index, (team, kills, deaths) in enumerate([(self.team1, 12, 15), (self.team1, 25, 10),
+                                                       (self.team2, 18, 20), (self.team2, 9, 14)]):
+            player = User.objects.create_user(f'board{index}', f'board{index}@test.com', 'pass123')
+            PlayerMatchStats.objects.create(match=self.match, player=player, team=team, kills=kills,
+                                            deaths=deaths, headshots=kills // 2, damage_dealt=kills * 110)
+
+    def finish(self):
+        self.match.team1_score, self.match.team2_score, self.match.is_finished = 13, 11, True
+        self.match.save()
+
+    def test_finalizing_stores_the_scoreboard(self):
+        """Test that finishing a match stores sorted player lines with their derived stats"""
+        self.finish()
+        data = MatchScoreboard.objects.get(match=self.match).data
+        self.assertEqual(data['winner'], 'Board One')
+        self.assertEqual([line['username'] for line in data['team1']['players']], ['board1', 'board0'])
+        best = data['team1']['players'][0]
+        self.assertEqual((best['kd_ratio'], best['kd_diff'], best['adr'], best['hs_percentage']),
+                         (2.5, 15, round(25 * 110 / 24, 1), 48.0))
+        self.assertEqual(data['team2']['totals']['kills'], 27)
+
+        late = User.objects.create_user('late', 'late@test.com', 'pass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayerMatchStats.objects.create(match=self.match, player=late, team=self.team2, kills=30, deaths=5)
+        queue.run_pending()
+        data = MatchScoreboard.objects.get(match=self.match).data
+        self.assertEqual(data['team2']['players'][0]['username'], 'late')
+
+    @override_settings(QUERY_LOG_ENABLED=False)
+    def test_finished_page_renders_from_the_document(self):
+        """Test that a finished match page is one query and never reads player_stats"""
+        self.finish()
+        PlayerMatchStats.objects.filter(match=self.match).delete()  # Only the document is left
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('match_detail', args=[self.match.pk]))
+        self.assertContains(response, 'board1')
+        self.assertContains(response, 'ADR: ')
+
+        upcoming = Match.objects.create(team1=self.team1, team2=self.team2, map_name='inferno')
+        self.assertFalse(scoreboard.for_match(upcoming)['has_players'])
+        MatchScoreboard.objects.all().delete()
+        self.assertEqual(scoreboard.backfill(), 1)
@@ -9,6 +9,9 @@ urlpatterns = [
     path('<int:match_id>/delete/', views.delete_match, name='delete_match'),
     path('<int:match_id>/ajax-delete/', views.ajax_delete_match, name='ajax_delete_match'),
 path('api/stats/', views.match_stats_summary, name='match_stats_api'),
+    path('queue/join/', views.matchmaking_join, name='matchmaking_join'),
+    path('queue/leave/', views.matchmaking_leave, name='matchmaking_leave'),
+    path('queue/status/', views.matchmaking_status, name='matchmaking_status'),
 
 ]
 
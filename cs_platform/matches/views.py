@@ -8,42 +8,27 @@ from django.db.models import Q, Avg, Count, Sum
 import random
 import hashlib
 from .models import Match, PlayerMatchStats
+from .odds import MAP_INDEX, map_win_matrix
+from . import matchmaking, scoreboard, series
 from .forms import MatchCreateForm, MatchResultForm, PlayerStatsForm
 from teams.models import Team, TeamMembership
 from django.http import JsonResponse
 
 def generate_match_prediction(team1, team2, map_name):
-    """Generate realistic match prediction with betting odds"""
+    """Match prediction with betting odds, from the map win probabilities in matches/odds.py"""
 
-    # Create consistent seed for same matchup
+    # Create consistent seed for same matchup (the confidence jitter below)
     matchup_seed = int(hashlib.md5(f"{team1.id}_{team2.id}_{map_name}".encode()).hexdigest()[:8], 16)
     random.seed(matchup_seed)
 
-    # Base probability calculation
-    team1_strength = calculate_team_strength(team1, map_name)
-    team2_strength = calculate_team_strength(team2, map_name)
-
-    # Calculate win probabilities
-    total_strength = team1_strength + team2_strength
-    team1_win_prob = team1_strength / total_strength
-    team2_win_prob = team2_strength / total_strength
-
-    # Add some randomness for excitement (±10%)
-    randomness = random.uniform(-0.1, 0.1)
-    team1_win_prob += randomness
-    team2_win_prob -= randomness
-
-    # Ensure probabilities are within reasonable bounds
-    team1_win_prob = max(0.15, min(0.85, team1_win_prob))
+    matrix = map_win_matrix([team1, team2])
+    team1_win_prob = float(matrix[MAP_INDEX[map_name], 0, 1])
     team2_win_prob = 1.0 - team1_win_prob
 
     # Calculate betting odds (European format)
     team1_odds = round(1.0 / team1_win_prob, 2)
     team2_odds = round(1.0 / team2_win_prob, 2)
 
-    # Generate score prediction
-    predicted_score = generate_score_prediction(team1_win_prob)
-
     # Generate confidence level
     confidence = calculate_prediction_confidence(team1, team2)
 
@@ -53,77 +38,14 @@ def generate_match_prediction(team1, team2, map_name):
         'team1_odds': team1_odds,
         'team2_odds': team2_odds,
         'predicted_winner': team1 if team1_win_prob > 0.5 else team2,
-        'predicted_score': predicted_score,
+        'predicted_score': series.round_scores(team1_win_prob)[0],
+        # The same teams as a BO3 with a map veto, reusing the matrix above
+        'series': series.predict([(team1, team2)], best_of=3, matrix=matrix, teams=[team1, team2])[0],
         'confidence': confidence,
         'analysis': generate_match_analysis(team1, team2, map_name, team1_win_prob)
     }
 
 
-def calculate_team_strength(team, map_name):
-    """Calculate team strength based on various factors"""
-    base_strength = 50  # Base strength for all teams
-
-    # Professional team bonus
-    if team.is_professional:
-        base_strength += 25
-
-        # World ranking bonus (lower ranking = higher strength)
-        if team.world_ranking:
-            ranking_bonus = max(0, 50 - team.world_ranking)
-            base_strength += ranking_bonus
-
-        # Prize money factor (more successful = stronger)
-        if team.prize_money:
-            prize_bonus = min(20, team.prize_money / 10000)  # Max 20 points
-            base_strength += prize_bonus
-
-    # Map-specific bonuses (some teams are better on certain maps)
-    map_bonuses = {
-        'dust2': [1, 3, 7, 2, 5],  # Different teams get different bonuses
-        'mirage': [5, 1, 2, 8, 3],
-        'inferno': [3, 7, 1, 4, 6],
-        'cache': [2, 5, 9, 1, 4],
-        'overpass': [8, 2, 4, 6, 1],
-        'train': [4, 6, 3, 9, 2],
-        'cobblestone': [6, 4, 8, 3, 7]
-    }
-
-    if map_name in map_bonuses:
-        # Use team ID to get consistent map bonus
-        bonus_index = team.id % len(map_bonuses[map_name])
-        map_bonus = map_bonuses[map_name][bonus_index]
-        base_strength += map_bonus
-
-    # Team activity bonus (teams with more members are more active)
-    member_count = team.memberships.filter(is_active=True).count()
-    activity_bonus = min(10, member_count * 2)  # Max 10 points
-    base_strength += activity_bonus
-
-    # Add some team-specific randomness for variety
-    team_seed = team.id * 12345
-    random.seed(team_seed)
-    team_variation = random.uniform(-5, 5)
-    base_strength += team_variation
-
-    return max(20, base_strength)  # Minimum strength of 20
-
-
-def generate_score_prediction(team1_win_prob):
-    """Generate realistic score prediction"""
-    if team1_win_prob > 0.7:
-        # Strong favorite
-        return random.choice(['16-8', '16-10', '16-9', '16-7'])
-    elif team1_win_prob > 0.6:
-        # Moderate favorite
-        return random.choice(['16-12', '16-13', '16-11', '16-14'])
-    elif team1_win_prob > 0.4:
-        # Close match
-        return random.choice(['16-14', '19-17', '16-13', '22-20'])
-    else:
-        # Underdog predicted to win
-        return random.choice(['8-16', '10-16', '12-16', '11-16'])
-
-
 def calculate_prediction_confidence(team1, team2):
     """Calculate confidence level of the prediction"""
 
@@ -235,6 +157,11 @@ class MatchListView(ListView):
         context['finished_matches'] = Match.objects.filter(is_finished=True).count()
         context['ongoing_matches'] = Match.objects.filter(is_finished=False).count()
 
+        # Odds for every upcoming match on the page, in one batch
+        predictions = series.predict_matches(context['matches'])
+        for match in context['matches']:
+            match.prediction = predictions.get(match.id)
+
         return context
 
 
@@ -244,13 +171,15 @@ class MatchDetailView(DetailView):
     template_name = 'matches/match_detail.html'
     context_object_name = 'match'
 
+    def get_queryset(self):
+        return Match.objects.select_related('team1', 'team2', 'scoreboard')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         match = self.object
 
-        context['player_stats'] = match.player_stats.all().select_related('player', 'team')
-        context['team1_stats'] = match.player_stats.filter(team=match.team1)
-        context['team2_stats'] = match.player_stats.filter(team=match.team2)
+        # Finished matches render from their stored document; others build it from the live rows
+        context['scoreboard'] = scoreboard.for_match(match)
 
         # Generate match prediction if match hasn't started
         if not match.is_finished and match.team1_score == 0 and match.team2_score == 0:
@@ -383,4 +312,32 @@ def match_stats_summary(request):
         ).order_by('-count')[:5]
     }
 
-    return JsonResponse(stats)
\ No newline at end of file
+    return JsonResponse(stats)
+
+@login_required
+def matchmaking_join(request):
+    """Join the community queue and try to fill a lobby straight away"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+
+    user = request.user
+    queue = matchmaking.matchmaking_queue
+    queue.join(user.id, user.rank, matchmaking.player_rating(user.rank, user.hours_played))
+    matchmaking.form_matches(queue)
+    if len(queue):
+        queue.keep_sweeping()  # Retries as the waiting players' windows widen
+    return JsonResponse(queue.status(user.id))
+
+
+@login_required
+def matchmaking_leave(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+
+    return JsonResponse({'success': matchmaking.matchmaking_queue.leave(request.user.id)})
+
+
+@login_required
+def matchmaking_status(request):
+    """Polled by queued players - read only; lobbies are formed on join and by the sweeper"""
+    return JsonResponse(matchmaking.matchmaking_queue.status(request.user.id))
@@ -0,0 +1,111 @@
+from django.contrib import admin
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+from .models import RequestProfile, QueryFingerprint, QueryStat
+from .sampler import build_tree, flame_rows
+
+FLAME_ROW_HEIGHT = 18
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['path', 'url_name', 'status_code', 'duration_ms', 'sql_count', 'sql_time_ms', 'user', 'created_at']
+    list_filter = ['url_name', 'status_code']
+    search_fields = ['path', 'url_name']
+    ordering = ['-created_at']
+    exclude = ['stacks', 'sql_timeline']
+    readonly_fields = [
+        'user', 'method', 'path', 'url_name', 'status_code', 'duration_ms', 'sql_count', 'sql_time_ms',
+        'samples', 'created_at', 'flame_graph', 'call_tree', 'sql_queries',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Flame graph')
+    def flame_graph(self, obj):
+        boxes = flame_rows(build_tree(obj.stacks))
+        if not boxes:
+            return 'No samples - the request finished faster than the sampling interval'
+        depth = max(box[0] for box in boxes) + 1
+        hue = lambda name: sum(map(ord, name)) % 60  # Stable warm colour per function
+        return format_html(
+            '<div style="position:relative;width:100%;min-width:900px;height:{}px;font:11px monospace">{}</div>',
+            depth * FLAME_ROW_HEIGHT,
+            format_html_join('', (
+                '<div title="{} - {} samples ({}%)" style="position:absolute;top:{}px;left:{}%;width:{}%;'
+                'height:{}px;background:hsl({},80%,60%);border:1px solid #fff;box-sizing:border-box;'
+                'overflow:hidden;white-space:nowrap;color:#000">{}</div>'
+            ), (
+                (name, value, round(width * 100, 1), row * FLAME_ROW_HEIGHT, round(left * 100, 3),
+                 round(width * 100, 3), FLAME_ROW_HEIGHT - 1, hue(name), name)
+                for row, left, width, name, value in boxes
+            )),
+        )
+
+    @admin.display(description='Call tree')
+    def call_tree(self, obj):
+        tree = build_tree(obj.stacks)
+        total = tree['value'] or 1
+
+        def render(node):
+            children = [child for child in sorted(node['children'].values(), key=lambda c: -c['value'])
+                        if child['value'] / total >= 0.01]
+            label = format_html('{}% {} <small>({} samples)</small>',
+                                round(node['value'] * 100 / total, 1), node['name'], node['value'])
+            if not children:
+                return format_html('<li>{}</li>', label)
+            # Hot paths start expanded
+            open_attr = mark_safe(' open') if node['value'] / total >= 0.2 else ''
+            return format_html('<li><details{}><summary>{}</summary><ul>{}</ul></details></li>',
+                               open_attr, label, mark_safe(''.join(render(child) for child in children)))
+
+        return format_html('<ul style="font:12px monospace;margin-left:0">{}</ul>', render(tree))
+
+    @admin.display(description='SQL timeline')
+    def sql_queries(self, obj):
+        return format_html(
+            '<table><tr><th>Start ms</th><th>Duration ms</th><th>SQL</th></tr>{}</table>',
+            format_html_join('', '<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>', (
+                (query['start_ms'], query['duration_ms'], query['sql']) for query in obj.sql_timeline
+            )),
+        )
+
+
+@admin.register(QueryStat)
+class QueryStatAdmin(admin.ModelAdmin):
+    """Top-N slow query report - sort by total, max or count"""
+    list_display = ['short_sql', 'url_name', 'count', 'total_ms', 'avg_ms', 'max_ms', 'has_plan', 'last_seen']
+    list_filter = ['url_name']
+    search_fields = ['query__sql', 'url_name']
+    ordering = ['-total_ms']
+    list_select_related = ['query']
+    readonly_fields = ['query', 'url_name', 'count', 'total_ms', 'max_ms', 'last_seen', 'sql', 'plan']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='SQL')
+    def short_sql(self, obj):
+        return obj.query.sql[:120]
+
+    @admin.display(description='Plan', boolean=True)
+    def has_plan(self, obj):
+        return bool(obj.query.explain)
+
+    @admin.display(description='Normalized SQL')
+    def sql(self, obj):
+        return format_html('<code>{}</code>', obj.query.sql)
+
+    @admin.display(description='EXPLAIN')
+    def plan(self, obj):
+        if not obj.query.explain:
+            return 'Never ran slower than QUERY_LOG_EXPLAIN_THRESHOLD_MS'
+        return format_html('<pre>{}</pre><small>captured from a {} ms run</small>',
+                           obj.query.explain, obj.query.explain_duration_ms)
+
+
+@admin.register(QueryFingerprint)
+class QueryFingerprintAdmin(admin.ModelAdmin):
+    list_display = ['fingerprint', 'sql', 'explain_duration_ms', 'first_seen']
+    search_fields = ['fingerprint', 'sql']
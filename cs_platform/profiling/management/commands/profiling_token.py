@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from profiling.middleware import make_token, TOKEN_PARAM
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Print a signed token that lets a staff user profile requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+        if not user.is_staff:
+            raise CommandError(f'{user.username} is not staff - only staff requests are profiled')
+
+        token = make_token(user)
+        self.stdout.write(f'Add ?{TOKEN_PARAM}={token} to a URL, or send the header X-Profile-Token: {token}')
+        self.stdout.write('Profiles are listed in the admin under Profiling > Request profiles')
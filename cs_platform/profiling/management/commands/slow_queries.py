@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from profiling import querylog
+
+
+class Command(BaseCommand):
+    help = 'Show the most expensive SQL fingerprints per URL name from the slow query log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--order', choices=['total_ms', 'max_ms', 'count'], default='total_ms')
+        parser.add_argument('--url-name', help='Only queries issued under this URL name')
+        parser.add_argument('--explain', action='store_true', help='Print captured query plans')
+
+    def handle(self, *args, **options):
+        # Include whatever this process has collected but not written yet
+        querylog.flush(force=True)
+        stats = querylog.top(options['top'], options['order'], options['url_name'])
+        if not stats:
+            self.stdout.write('No queries logged yet - is QUERY_LOG_ENABLED on?')
+            return
+
+        self.stdout.write(f"{'URL name':<28} {'count':>8} {'total ms':>11} {'avg ms':>9} {'max ms':>9}  SQL")
+        for stat in stats:
+            self.stdout.write(
+                f"{stat.url_name or '-':<28} {stat.count:>8} {stat.total_ms:>11.1f} {stat.avg_ms:>9.2f} "
+                f"{stat.max_ms:>9.1f}  {stat.query.sql[:100]}"
+            )
+            if options['explain'] and stat.query.explain:
+                for line in stat.query.explain.splitlines():
+                    self.stdout.write(f'{"":>30}| {line}')
@@ -0,0 +1,99 @@
+import time
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from .models import RequestProfile
+from .sampler import Sampler
+
+TOKEN_PARAM = '_profile'
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+TOKEN_SALT = 'profiling.request'
+
+
+def make_token(user):
+    """Signed token that lets `user` (staff only) profile requests until it expires"""
+    return signing.dumps({'user': user.pk}, salt=TOKEN_SALT)
+
+
+def token_user_id(token):
+    max_age = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 24 * 3600)
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=max_age)['user']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+class SQLTimeline:
+    """execute_wrapper that records when each query started and how long it took"""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        query_started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            finished = time.perf_counter()
+            self.queries.append({
+                'start_ms': round((query_started - self.started) * 1000, 3),
+                'duration_ms': round((finished - query_started) * 1000, 3),
+                'sql': sql,
+            })
+
+
+class ProfilingMiddleware:
+    """Profile a single request when it carries a valid token from a staff user.
+
+    Requests without the `_profile` parameter or X-Profile-Token header
+    pass straight through - one dict lookup each.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.GET.get(TOKEN_PARAM) or request.META.get(TOKEN_HEADER)
+        if not token:
+            return self.get_response(request)
+
+        user = getattr(request, 'user', None)
+        if not (user and user.is_staff and token_user_id(token) == user.pk):
+            return self.get_response(request)
+
+        return self.profile(request)
+
+    def profile(self, request):
+        started = time.perf_counter()
+        timeline = SQLTimeline(started)
+        sampler = Sampler()
+        wrappers = [connection.execute_wrapper(timeline) for connection in connections.all()]
+
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        RequestProfile.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.get_full_path()[:500],
+            url_name=(match.view_name if match else '')[:200],
+            status_code=response.status_code,
+            duration_ms=round(duration * 1000, 3),
+            sql_count=len(timeline.queries),
+            sql_time_ms=round(sum(query['duration_ms'] for query in timeline.queries), 3),
+            samples=sum(sampler.stacks.values()),
+            stacks=dict(sampler.stacks),
+            sql_timeline=timeline.queries,
+        )
+        response['X-Profile-Duration-Ms'] = f'{duration * 1000:.1f}'
+        return response
@@ -0,0 +1,59 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class RequestProfile(models.Model):
+    """One profiled request, triggered by a signed token (see profiling/middleware.py)"""
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='request_profiles')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    url_name = models.CharField(max_length=200, blank=True)
+    status_code = models.IntegerField()
+    duration_ms = models.FloatField()
+    sql_count = models.IntegerField(default=0)
+    sql_time_ms = models.FloatField(default=0)
+    samples = models.IntegerField(default=0)
+    stacks = models.JSONField(default=dict)  # Folded stacks: "outer;inner;leaf" -> sample count
+    sql_timeline = models.JSONField(default=list)  # [{"start_ms", "duration_ms", "sql"}] in execution order
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class QueryFingerprint(models.Model):
+    """A normalized SQL statement; the plan is captured the first time it runs slowly"""
+    fingerprint = models.CharField(max_length=16, unique=True)
+    sql = models.TextField()
+    explain = models.TextField(blank=True)
+    explain_duration_ms = models.FloatField(null=True, blank=True)  # Duration of the run that was explained
+    first_seen = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sql[:100]
+
+
+class QueryStat(models.Model):
+    """Totals for one fingerprint under one URL name"""
+    query = models.ForeignKey(QueryFingerprint, on_delete=models.CASCADE, related_name='stats')
+    url_name = models.CharField(max_length=200, blank=True)
+    count = models.IntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['query', 'url_name']
+        ordering = ['-total_ms']
+
+    def __str__(self):
+        return f"{self.url_name or '-'}: {self.query}"
+
+    @property
+    def avg_ms(self):
+        return round(self.total_ms / self.count, 3) if self.count else 0
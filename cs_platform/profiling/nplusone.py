@@ -0,0 +1,177 @@
+"""N+1 query detection for development and tests.
+
+Every query in a request is keyed by (fingerprint, call site). The call
+site is the template line being rendered when the query ran, or else the
+innermost line of project code. When the same key repeats
+NPLUSONE_THRESHOLD times it's reported once, with the select_related /
+prefetch_related paths that would have loaded the rows up front -
+worked out from the table and column in the repeated query and the
+tables the request had already read.
+
+    with detect_n_plus_one() as detector:
+        response = self.client.get(url)
+    self.assertEqual(detector.issues, [])
+"""
+import logging
+import os
+import re
+import sys
+from contextlib import contextmanager
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from .sql import fingerprint
+
+logger = logging.getLogger('profiling.nplusone')
+
+# Our own execute_wrappers sit between the caller and the database
+INSTRUMENTATION_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('nplusone.py', 'querylog.py', 'middleware.py')
+}
+
+_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?', re.IGNORECASE)
+_LOOKUP = re.compile(r'\bWHERE\s+"?(\w+)"?\."?(\w+)"?\s*=\s*\?', re.IGNORECASE)
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class Issue:
+    def __init__(self, location, sql, count, suggestions):
+        self.location = location
+        self.sql = sql
+        self.count = count
+        self.suggestions = suggestions
+
+    def __str__(self):
+        hint = '; '.join(self.suggestions) or 'load the related rows in the outer query'
+        return f'N+1 at {self.location}: "{self.sql[:150]}" repeated - try {hint}'
+
+
+def call_site():
+    """Template line being rendered, else the innermost project frame, as a string"""
+    base_dir = str(settings.BASE_DIR)
+    python_site = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = getattr(origin, 'template_name', None) or origin.name
+                return f'template {name}, line {token.lineno}'
+        if (python_site is None and code.co_filename.startswith(base_dir)
+                and code.co_filename not in INSTRUMENTATION_FILES and 'site-packages' not in code.co_filename):
+            python_site = f'{code.co_filename[len(base_dir) + 1:]}:{frame.f_lineno} in {code.co_name}'
+        frame = frame.f_back
+    return python_site or 'unknown'
+
+
+def _models_by_table():
+    return {model._meta.db_table: model for model in apps.get_models()}
+
+
+def suggest(sql, seen_tables):
+    """select_related / prefetch_related paths that would have avoided a repeated single-row lookup"""
+    lookup = _LOOKUP.search(sql)
+    if not lookup:
+        return []
+    models = _models_by_table()
+    target = models.get(lookup.group(1))
+    if target is None:
+        return []
+    seen = [models[table] for table in seen_tables if table in models and models[table] is not target]
+
+    suggestions = []
+    column = lookup.group(2)
+    if column == target._meta.pk.column:
+        # Forward foreign key followed per row: load it with a JOIN
+        for model in seen:
+            for path in _paths_to(model, target):
+                suggestions.append(f"{model.__name__}: select_related('{path}')")
+    else:
+        # Rows fetched by a foreign key column: a reverse relation read per parent
+        field = next((f for f in target._meta.concrete_fields if f.column == column and f.is_relation), None)
+        if field is not None:
+            accessor = field.remote_field.get_accessor_name()
+            suggestions.append(f"{field.related_model.__name__}: prefetch_related('{accessor}')")
+    return suggestions[:5]
+
+
+def _paths_to(model, target, depth=2):
+    paths = []
+    for field in model._meta.concrete_fields:
+        if not (field.many_to_one or field.one_to_one):
+            continue
+        if field.related_model is target:
+            paths.append(field.name)
+        elif depth > 1:
+            paths.extend(f'{field.name}__{path}' for path in _paths_to(field.related_model, target, depth - 1))
+    return paths
+
+
+class Detector:
+    """execute_wrapper counting (fingerprint, call site) repeats"""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or getattr(settings, 'NPLUSONE_THRESHOLD', 3)
+        self.counts = {}
+        self.seen_tables = []
+        self.issues = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            key, normalized = fingerprint(sql)
+            site = call_site()
+            count = self.counts.get((key, site), 0) + 1
+            self.counts[(key, site)] = count
+            if count == self.threshold:
+                issue = Issue(site, normalized, count, suggest(normalized, self.seen_tables))
+                self.issues.append(issue)
+                logger.warning(str(issue))
+            for table in _TABLES.findall(sql):
+                if table not in self.seen_tables:
+                    self.seen_tables.append(table)
+        return execute(sql, params, many, context)
+
+    def check(self):
+        if self.issues:
+            raise NPlusOneError('\n'.join(str(issue) for issue in self.issues))
+
+
+@contextmanager
+def detect_n_plus_one(raise_error=False, threshold=None):
+    detector = Detector(threshold)
+    wrappers = [connection.execute_wrapper(detector) for connection in connections.all()]
+    for wrapper in wrappers:
+        wrapper.__enter__()
+    try:
+        yield detector
+    finally:
+        for wrapper in reversed(wrappers):
+            wrapper.__exit__(None, None, None)
+    if raise_error:
+        detector.check()
+
+
+class NPlusOneMiddleware:
+    """Log (or with NPLUSONE_RAISE, raise) N+1 patterns per request. Off unless NPLUSONE_ENABLED."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'NPLUSONE_ENABLED', False)
+        self.raise_error = getattr(settings, 'NPLUSONE_RAISE', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with detect_n_plus_one(raise_error=self.raise_error) as detector:
+            response = self.get_response(request)
+        if detector.issues:
+            response['X-NPlusOne-Count'] = str(len(detector.issues))
+        return response
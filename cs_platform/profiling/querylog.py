@@ -0,0 +1,206 @@
+"""Slow query log.
+
+QueryLogMiddleware wraps every database call in a request, groups the
+queries by fingerprint and adds them to per-process totals keyed by
+(fingerprint, URL name). Totals are written out at most every
+QUERY_LOG_FLUSH_SECONDS, so a request normally costs no extra writes.
+A flush that fails puts its totals back for the next one and is only
+logged - the request it runs in never sees the error.
+
+The first time a SELECT's fingerprint takes longer than
+QUERY_LOG_EXPLAIN_THRESHOLD_MS its plan is captured with EXPLAIN
+(EXPLAIN QUERY PLAN on SQLite) using the real parameters, in a savepoint
+so an EXPLAIN that fails never breaks the request's transaction. Queries
+that raised are counted but not explained.
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from .models import QueryFingerprint, QueryStat
+from .sql import fingerprint
+
+_lock = threading.Lock()
+_pending = {}  # (fingerprint, url_name) -> [count, total_ms, max_ms]
+_sql = {}  # fingerprint -> normalized sql, for fingerprints not yet written
+_plans = {}  # fingerprint -> (plan text, duration ms) waiting to be written
+_explained = set()  # Fingerprints whose plan is already stored
+_state = {'last_flush': time.monotonic()}
+_local = threading.local()
+logger = logging.getLogger('profiling.querylog')
+
+
+def explain_threshold_ms():
+    return getattr(settings, 'QUERY_LOG_EXPLAIN_THRESHOLD_MS', 100)
+
+
+class RequestQueries:
+    """execute_wrapper collecting one request's queries by fingerprint"""
+
+    def __init__(self):
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            key, normalized = fingerprint(sql)
+            totals = self.queries.get(key)
+            if totals is None:
+                totals = self.queries[key] = [0, 0.0, 0.0, normalized]
+            totals[0] += 1
+            totals[1] += duration_ms
+            totals[2] = max(totals[2], duration_ms)
+
+        # Only queries that succeeded are explained
+        if duration_ms >= explain_threshold_ms() and not many and key not in _explained:
+            capture_plan(key, sql, params, duration_ms, context['connection'])
+        return result
+
+
+def capture_plan(key, sql, params, duration_ms, connection):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return
+    with _lock:
+        if key in _explained:
+            return
+        _explained.add(key)
+
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    _local.explaining = True
+    try:
+        # A savepoint inside the request's transaction, so a failed EXPLAIN can't abort it
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            plan = '\n'.join(' | '.join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:
+        plan = f'EXPLAIN failed: {e}'
+    finally:
+        _local.explaining = False
+
+    with _lock:
+        _plans[key] = (plan, round(duration_ms, 3))
+
+
+def record(queries, url_name):
+    with _lock:
+        for key, (count, total_ms, max_ms, normalized) in queries.items():
+            totals = _pending.get((key, url_name))
+            if totals is None:
+                _pending[(key, url_name)] = [count, total_ms, max_ms]
+                _sql[key] = normalized
+            else:
+                totals[0] += count
+                totals[1] += total_ms
+                totals[2] = max(totals[2], max_ms)
+
+
+def flush(force=False):
+    """Write the pending totals. Returns the number of (fingerprint, URL name) rows touched."""
+    interval = getattr(settings, 'QUERY_LOG_FLUSH_SECONDS', 10)
+    with _lock:
+        if not _pending or (not force and time.monotonic() - _state['last_flush'] < interval):
+            return 0
+        pending, sql, plans = dict(_pending), dict(_sql), dict(_plans)
+        _pending.clear()
+        _sql.clear()
+        _plans.clear()
+        _state['last_flush'] = time.monotonic()
+
+    try:
+        _write(pending, sql, plans)
+    except Exception:
+        _restore(pending, sql, plans)
+        raise
+    return len(pending)
+
+
+def _restore(pending, sql, plans):
+    """Merge totals from a failed flush back into the pending ones"""
+    with _lock:
+        for key, (count, total_ms, max_ms) in pending.items():
+            totals = _pending.setdefault(key, [0, 0.0, 0.0])
+            totals[0] += count
+            totals[1] += total_ms
+            totals[2] = max(totals[2], max_ms)
+        for key, normalized in sql.items():
+            _sql.setdefault(key, normalized)
+        for key, plan in plans.items():
+            _plans.setdefault(key, plan)
+
+
+def _add(query_id, url_name, count, total_ms, max_ms):
+    return QueryStat.objects.filter(query_id=query_id, url_name=url_name).update(
+        count=F('count') + count,
+        total_ms=F('total_ms') + total_ms,
+        max_ms=Greatest(F('max_ms'), max_ms),
+    )
+
+
+def _write(pending, sql, plans):
+    keys = {key for key, _ in pending}
+    with transaction.atomic():
+        existing = dict(QueryFingerprint.objects.filter(fingerprint__in=keys).values_list('fingerprint', 'id'))
+        QueryFingerprint.objects.bulk_create([
+            QueryFingerprint(fingerprint=key, sql=sql.get(key, ''))
+            for key in keys - set(existing)
+        ], ignore_conflicts=True)
+        ids = dict(QueryFingerprint.objects.filter(fingerprint__in=keys).values_list('fingerprint', 'id'))
+
+        for key, (plan, duration_ms) in plans.items():
+            QueryFingerprint.objects.filter(fingerprint=key, explain='').update(
+                explain=plan, explain_duration_ms=duration_ms)
+
+        for (key, url_name), (count, total_ms, max_ms) in pending.items():
+            if _add(ids[key], url_name, count, total_ms, max_ms):
+                continue
+            try:
+                with transaction.atomic():
+                    QueryStat.objects.create(query_id=ids[key], url_name=url_name,
+                                             count=count, total_ms=total_ms, max_ms=max_ms)
+            except IntegrityError:
+                # Another process created the row since our update - add to it instead
+                _add(ids[key], url_name, count, total_ms, max_ms)
+
+
+def top(limit=20, order='total_ms', url_name=None):
+    stats = QueryStat.objects.select_related('query')
+    if url_name is not None:
+        stats = stats.filter(url_name=url_name)
+    return list(stats.order_by(f'-{order}')[:limit])
+
+
+class QueryLogMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_LOG_ENABLED', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        queries = RequestQueries()
+        wrappers = [connection.execute_wrapper(queries) for connection in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+
+        match = getattr(request, 'resolver_match', None)
+        record(queries.queries, match.view_name if match else '')
+        try:
+            flush()
+        except Exception:
+            logger.exception('Query log flush failed; its totals are kept for the next one')
+        return response
@@ -0,0 +1,100 @@
+"""Sampling profiler for a single request.
+
+A background thread snapshots the request thread's stack every
+PROFILING_SAMPLE_INTERVAL seconds and counts identical stacks, which is
+all a flame graph or call tree needs. Unlike a tracing profiler the
+request runs at close to normal speed, so timings stay realistic.
+
+The sampler shortens the interpreter's switch interval while it runs.
+That setting is process-wide, so overlapping samplers share it: the
+first to start saves the original, each one gets at least the switching
+it asked for, and the last to stop restores it.
+"""
+import sys
+import threading
+from collections import Counter
+from django.conf import settings
+
+_switch_lock = threading.Lock()
+_switch = {'original': None, 'active': Counter()}  # Switch intervals wanted by running samplers
+
+
+def frame_label(code):
+    filename = code.co_filename
+    base_dir = str(settings.BASE_DIR)
+    if filename.startswith(base_dir):
+        filename = filename[len(base_dir) + 1:]
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages')[-1].lstrip('/\\')
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler:
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.001)
+        self.target_thread = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        # The sampler needs the GIL as often as it wants to sample
+        with _switch_lock:
+            if not _switch['active']:
+                _switch['original'] = sys.getswitchinterval()
+            _switch['active'][self.interval / 2] += 1
+            sys.setswitchinterval(min([_switch['original'], *_switch['active']]))
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        with _switch_lock:
+            wanted = self.interval / 2
+            _switch['active'][wanted] -= 1
+            if not _switch['active'][wanted]:
+                del _switch['active'][wanted]
+            sys.setswitchinterval(min([_switch['original'], *_switch['active']]))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+def build_tree(stacks):
+    """Folded stacks -> nested {'name', 'value', 'children'} with inclusive sample counts"""
+    root = {'name': 'all', 'value': 0, 'children': {}}
+    for stack, count in stacks.items():
+        root['value'] += count
+        node = root
+        for name in stack.split(';'):
+            child = node['children'].get(name)
+            if child is None:
+                child = node['children'][name] = {'name': name, 'value': 0, 'children': {}}
+            child['value'] += count
+            node = child
+    return root
+
+
+def flame_rows(tree, min_fraction=0.005):
+    """(depth, left, width, name, value) boxes for an icicle-style flame graph, widths as fractions"""
+    total = tree['value'] or 1
+    boxes = []
+
+    def visit(node, depth, left):
+        width = node['value'] / total
+        if width < min_fraction:
+            return
+        boxes.append((depth, left, width, node['name'], node['value']))
+        for child in sorted(node['children'].values(), key=lambda child: -child['value']):
+            visit(child, depth + 1, left)
+            left += child['value'] / total
+
+    visit(tree, 0, 0.0)
+    return boxes
@@ -0,0 +1,184 @@
+import sys
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from matches.models import Match, PlayerMatchStats
+from profiling import querylog
+from profiling.middleware import make_token
+from profiling.models import QueryStat, RequestProfile
+from profiling.nplusone import NPlusOneError, detect_n_plus_one
+from profiling.sampler import Sampler, build_tree, flame_rows
+from profiling.sql import fingerprint
+from teams.models import Team
+
+User = get_user_model()
+
+
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@test.com', 'pass123')
+        self.player = User.objects.create_user('player', 'player@test.com', 'pass123')
+
+    def test_signed_staff_request_is_profiled(self):
+        """Test that a valid token from a staff user stores a profile with its SQL timeline"""
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('leaderboard'), {'_profile': make_token(self.admin)})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Profile-Duration-Ms', response)
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.url_name, 'leaderboard')
+        self.assertGreater(profile.sql_count, 0)
+        self.assertEqual(len(profile.sql_timeline), profile.sql_count)
+
+        response = self.client.get(reverse('admin:profiling_requestprofile_change', args=[profile.pk]))
+        self.assertContains(response, 'Flame graph')
+        self.assertContains(response, 'SQL timeline')
+
+    def test_requests_without_valid_staff_token_are_not_profiled(self):
+        """Test that missing, forged and non-staff tokens are ignored"""
+        self.client.force_login(self.admin)
+        self.client.get(reverse('leaderboard'))
+        self.client.get(reverse('leaderboard'), {'_profile': 'forged'})
+        self.client.get(reverse('leaderboard'), HTTP_X_PROFILE_TOKEN=make_token(self.player))
+
+        self.client.force_login(self.player)
+        self.client.get(reverse('leaderboard'), {'_profile': make_token(self.player)})
+        self.assertFalse(RequestProfile.objects.exists())
+
+
+class FlameGraphTest(TestCase):
+    def test_tree_and_boxes_from_folded_stacks(self):
+        """Test inclusive counts and box widths"""
+        tree = build_tree({'view;query': 3, 'view;render': 1})
+        self.assertEqual(tree['value'], 4)
+        self.assertEqual(tree['children']['view']['children']['query']['value'], 3)
+
+        boxes = {name: (depth, left, width) for depth, left, width, name, _ in flame_rows(tree)}
+        self.assertEqual(boxes['view'], (1, 0.0, 1.0))
+        self.assertEqual(boxes['query'], (2, 0.0, 0.75))
+        self.assertEqual(boxes['render'], (2, 0.75, 0.25))
+
+
+class SamplerTest(TestCase):
+    def test_overlapping_samplers_restore_the_switch_interval(self):
+        """Test that samplers stopping out of order leave the process's switch interval as it was"""
+        original = sys.getswitchinterval()
+        first, second = Sampler(interval=0.002), Sampler(interval=0.001)
+        first.start()
+        second.start()
+        self.assertEqual(sys.getswitchinterval(), 0.0005)
+        first.stop()
+        self.assertEqual(sys.getswitchinterval(), 0.0005)
+        second.stop()
+        self.assertEqual(sys.getswitchinterval(), original)
+
+
+class FingerprintTest(TestCase):
+    def test_literals_and_in_lists_collapse(self):
+        """Test that queries differing only in values share a fingerprint"""
+        first = fingerprint('SELECT * FROM "t" WHERE "t"."id" IN (%s, %s) AND "name" = \'a\' LIMIT 21')
+        second = fingerprint('SELECT * FROM "t" WHERE "t"."id" IN (%s, %s, %s, %s) AND "name" = \'bb\' LIMIT 5')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first[0], fingerprint('SELECT * FROM "t2" WHERE "t2"."id" = %s')[0])
+
+
+@override_settings(QUERY_LOG_ENABLED=True, QUERY_LOG_EXPLAIN_THRESHOLD_MS=0, QUERY_LOG_FLUSH_SECONDS=0)
+class QueryLogTest(TestCase):
+    def setUp(self):
+        querylog._explained.clear()
+        querylog.flush(force=True)
+        QueryStat.objects.all().delete()
+
+    def test_queries_are_totalled_per_url_name_with_plans(self):
+        """Test that the leaderboard's queries are logged under its URL name with an EXPLAIN"""
+        self.client.get(reverse('leaderboard'))
+        self.client.get(reverse('leaderboard'))
+
+        stats = QueryStat.objects.filter(url_name='leaderboard').select_related('query')
+        self.assertTrue(stats.exists())
+        self.assertTrue(all(stat.count % 2 == 0 for stat in stats))
+        selects = [stat for stat in stats if stat.query.sql.startswith('SELECT')]
+        self.assertTrue(all(stat.query.explain for stat in selects))
+
+    def test_failed_flush_keeps_totals_and_the_response(self):
+        """Test that a flush error is logged, the page still renders and the totals go out next time"""
+        from unittest import mock
+        from django.db import OperationalError
+        with self.assertLogs('profiling.querylog', 'ERROR'), \
+                mock.patch.object(querylog, '_write', side_effect=OperationalError('database is locked')):
+            self.assertEqual(self.client.get(reverse('leaderboard')).status_code, 200)
+        self.assertFalse(QueryStat.objects.exists())
+
+        self.client.get(reverse('leaderboard'))
+        stats = QueryStat.objects.filter(url_name='leaderboard')
+        self.assertTrue(stats.exists())
+        self.assertTrue(all(stat.count % 2 == 0 for stat in stats))
+
+    def test_only_successful_queries_are_explained_in_a_savepoint(self):
+        """Test that a failed query isn't explained and a failed EXPLAIN leaves the transaction usable"""
+        from django.db import DatabaseError, connection, transaction
+        queries = querylog.RequestQueries()
+        context = {'connection': connection}
+
+        def failing(sql, params, many, context):
+            raise DatabaseError('no such table')
+
+        with self.assertRaises(DatabaseError):
+            queries(failing, 'SELECT 1 FROM missing_table', (), False, context)
+        self.assertEqual(querylog._explained, set())
+
+        with transaction.atomic():
+            # The query "succeeds" but its EXPLAIN can't, as the table doesn't exist
+            queries(lambda *args: None, 'SELECT 2 FROM missing_table', (), False, context)
+            self.assertEqual(User.objects.count(), 0)
+        plans = [plan for plan, _ in querylog._plans.values()]
+        self.assertTrue(any(plan.startswith('EXPLAIN failed') for plan in plans))
+        self.assertEqual(sum(count for count, *_ in queries.queries.values()), 2)
+
+    def test_slow_queries_command(self):
+        """Test the top-N report"""
+        from io import StringIO
+        from django.core.management import call_command
+        self.client.get(reverse('leaderboard'))
+        out = StringIO()
+        call_command('slow_queries', top=5, explain=True, stdout=out)
+        self.assertIn('leaderboard', out.getvalue())
+
+
+class NPlusOneDetectorTest(TestCase):
+    def setUp(self):
+        self.player = User.objects.create_user('fragger', 'fragger@test.com', 'pass123')
+        teams = [Team.objects.create(name=f'Team {i}', tag=f'T{i}') for i in range(8)]
+        for i in range(4):
+            match = Match.objects.create(team1=teams[2 * i], team2=teams[2 * i + 1], map_name='mirage')
+            PlayerMatchStats.objects.create(match=match, player=self.player, team=teams[2 * i], kills=20)
+
+    def test_template_loop_reports_line_and_select_related_path(self):
+        """Test that a lazy relation in a template loop is reported with the path to load"""
+        template = engines['django'].from_string(
+            '{% for stat in stats %}\n{{ stat.match.team1.name }}{% endfor %}'
+        )
+        with detect_n_plus_one() as detector:
+            template.render({'stats': PlayerMatchStats.objects.select_related('match')})
+
+        self.assertEqual(len(detector.issues), 1)
+        issue = detector.issues[0]
+        self.assertIn('line 2', issue.location)
+        self.assertIn("PlayerMatchStats: select_related('match__team1')", issue.suggestions)
+
+    def test_python_loop_reports_prefetch_and_can_raise(self):
+        """Test that a reverse relation read per row suggests prefetch_related and raises on request"""
+        with self.assertRaises(NPlusOneError) as raised:
+            with detect_n_plus_one(raise_error=True):
+                for match in Match.objects.all():
+                    list(match.player_stats.all())
+        self.assertIn('profiling/tests.py', str(raised.exception))
+        self.assertIn("Match: prefetch_related('player_stats')", str(raised.exception))
+
+    def test_player_detail_has_no_n_plus_one(self):
+        """Test that recent matches load their teams up front"""
+        with detect_n_plus_one(raise_error=True):
+            response = self.client.get(reverse('player_detail', kwargs={'pk': self.player.pk}))
+        self.assertEqual(response.status_code, 200)
@@ -4,7 +4,8 @@ from django.shortcuts import render
 from django.contrib.auth import get_user_model
 from django.db.models import Count, Avg, Sum
 from asgiref.sync import sync_to_async
-from teams.models import Team
+from changes.conditional import conditional
+from teams.models import Team, TeamMembership
 from matches.models import Match, PlayerMatchStats
 from stats.models import WeaponStats, MapStats
 from django.db import models
@@ -13,6 +14,7 @@ from django.db import models
 User = get_user_model()
 
 
+@conditional([User, Team, TeamMembership, Match, PlayerMatchStats, WeaponStats, MapStats])
 async def async_leaderboard_data(request):
     """Async view for leaderboard data - simulates heavy computation"""
 
@@ -69,6 +71,7 @@ async def async_leaderboard_data(request):
     })
 
 
+@conditional([PlayerMatchStats, Match, WeaponStats], row=(User, 'player_id'))
 async def async_player_stats(request, player_id):
     """Async view for individual player statistics"""
 
@@ -131,6 +134,7 @@ async def async_player_stats(request, player_id):
         }, status=404)
 
 
+@conditional([Match, TeamMembership, User], row=(Team, 'team_id'))
 async def async_team_performance(request, team_id):
     """Async view for team performance analytics"""
 
@@ -0,0 +1,58 @@
+"""Day and month buckets with running totals, from per-day totals.
+
+Everything here is integer arrays: days counted from 1970-01-01 and
+subjects as codes that rollups.backfill maps back to player ids, team
+ids or map names. rollup_all splits the rows between subjects, so each
+worker's running totals are complete for the subjects it gets.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+KEY_STRIDE = 1 << 24  # More days than any bucket start, so (subject, start) packs into one int64
+
+
+def month_starts(days):
+    """The first day of each day's month"""
+    return np.asarray(days, dtype='datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+
+def _buckets(codes, starts, totals):
+    """(codes, starts, own totals, running totals) per distinct (subject, start), ordered by both"""
+    keys, inverse = np.unique(codes * KEY_STRIDE + starts, return_inverse=True)
+    own = np.zeros((len(keys), totals.shape[1]), dtype=np.int64)
+    np.add.at(own, inverse.ravel(), totals)
+
+    bucket_codes = keys // KEY_STRIDE
+    running = np.cumsum(own, axis=0)
+    # Restart the sum at each subject's first bucket
+    first = np.flatnonzero(np.r_[True, bucket_codes[1:] != bucket_codes[:-1]])
+    offsets = running[first] - own[first]
+    running -= np.repeat(offsets, np.diff(np.r_[first, len(keys)]), axis=0)
+    return bucket_codes, keys % KEY_STRIDE, own, running
+
+
+def rollup(chunk):
+    """{'day': buckets, 'month': buckets} for (codes, days, totals [rows, metrics]) of per-day rows"""
+    codes, days, totals = (np.asarray(part, dtype=np.int64) for part in chunk)
+    return {
+        'day': _buckets(codes, days, totals),
+        'month': _buckets(codes, month_starts(days), totals),
+    }
+
+
+def rollup_all(codes, days, totals, workers=0, chunks=None):
+    """`rollup` over shares of the subjects, in a process pool when workers > 1; results in subject order"""
+    codes = np.asarray(codes, dtype=np.int64)
+    order = np.argsort(codes, kind='stable')
+    codes, days, totals = codes[order], np.asarray(days)[order], np.asarray(totals)[order]
+    # Cut only between subjects, so no subject's running totals span two shares
+    share_count = chunks or max(workers, 1)
+    cuts = np.searchsorted(codes, np.linspace(codes[0], codes[-1] + 1, share_count + 1)[1:-1]) if len(codes) else []
+    shares = [part for part in zip(np.split(codes, cuts), np.split(days, cuts), np.split(totals, cuts)) if len(part[0])]
+
+    if workers > 1 and len(shares) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shares)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            return list(pool.map(rollup, shares))
+    return [rollup(share) for share in shares]
@@ -0,0 +1,176 @@
+"""N-way player comparison.
+
+Everything for up to MAX_PLAYERS players comes from a fixed handful of
+queries, whatever the number of players: the users, one grouped
+aggregate over PlayerMatchStats for the career totals, one for the
+per-team history, and one read each of their MapStats and WeaponStats
+rows. Derived metrics (K/D, ADR, KPR, HS%, APM) are computed in Python
+from the totals.
+"""
+from collections import defaultdict
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Max, Min, Q, Sum
+from matches.models import PlayerMatchStats
+from .models import MapStats, WeaponStats
+
+User = get_user_model()
+
+MAX_PLAYERS = 20
+
+# Derived metrics the comparison ranks players on (higher is better)
+METRICS = ['kd_ratio', 'adr', 'kpr', 'hs_percentage', 'assists_per_match']
+
+WON_MAP = (
+    Q(team=F('match__team1'), match__team1_score__gt=F('match__team2_score')) |
+    Q(team=F('match__team2'), match__team2_score__gt=F('match__team1_score'))
+)
+
+WEAPON_NAMES = dict(WeaponStats.WEAPON_CHOICES)
+MAP_NAMES = dict(MapStats.MAP_CHOICES)
+
+
+class ComparisonError(ValueError):
+    pass
+
+
+def parse_player_ids(values, minimum=2):
+    """Ordered, de-duplicated player ids from ?players=1,2,3 (repeatable) values"""
+    ids = []
+    for value in values:
+        for part in str(value).split(','):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                player_id = int(part)
+            except ValueError:
+                raise ComparisonError(f"'{part}' is not a player id")
+            if player_id not in ids:
+                ids.append(player_id)
+    if len(ids) > MAX_PLAYERS:
+        raise ComparisonError(f'At most {MAX_PLAYERS} players can be compared')
+    if len(ids) < minimum:
+        raise ComparisonError(f'Select at least {minimum} players to compare')
+    return ids
+
+
+def derived_stats(totals):
+    matches = max(totals['match_count'], 1)
+    return {
+        'kd_ratio': round(totals['total_kills'] / max(totals['total_deaths'], 1), 2),
+        'adr': round(totals['total_damage'] / matches, 1),
+        'kpr': round(totals['total_kills'] / matches, 1),
+        'hs_percentage': round((totals['total_headshots'] / max(totals['total_kills'], 1)) * 100, 1),
+        'assists_per_match': round(totals['total_assists'] / matches, 1),
+    }
+
+
+def career_totals(player_ids):
+    """{player id: totals and derived metrics} from one grouped query"""
+    rows = PlayerMatchStats.objects.filter(player_id__in=player_ids).values('player_id').annotate(
+        total_kills=Sum('kills'),
+        total_deaths=Sum('deaths'),
+        total_assists=Sum('assists'),
+        total_headshots=Sum('headshots'),
+        total_damage=Sum('damage_dealt'),
+        match_count=Count('match'),
+    ).order_by()
+    empty = dict.fromkeys(
+        ['total_kills', 'total_deaths', 'total_assists', 'total_headshots', 'total_damage', 'match_count'], 0
+    )
+    totals = {player_id: dict(empty) for player_id in player_ids}
+    for row in rows:
+        totals[row.pop('player_id')] = {key: value or 0 for key, value in row.items()}
+    return {player_id: {**stats, **derived_stats(stats)} for player_id, stats in totals.items()}
+
+
+def weapon_preferences(player_ids):
+    """{player id: weapons by kills, with their share of the player's weapon kills}"""
+    grouped = defaultdict(list)
+    for weapon in WeaponStats.objects.filter(player_id__in=player_ids).order_by('player_id', '-total_kills'):
+        grouped[weapon.player_id].append(weapon)
+
+    preferences = {}
+    for player_id in player_ids:
+        weapons = grouped[player_id]
+        total = sum(weapon.total_kills for weapon in weapons)
+        preferences[player_id] = [{
+            'weapon': WEAPON_NAMES.get(weapon.weapon, weapon.weapon),
+            'code': weapon.weapon,
+            'kills': weapon.total_kills,
+            'percentage': round(weapon.total_kills / total * 100, 1) if total else 0,
+            'headshot_percentage': weapon.headshot_percentage,
+            'accuracy_percentage': weapon.accuracy_percentage,
+        } for weapon in weapons]
+    return preferences
+
+
+def map_performance(player_ids):
+    """{player id: maps by matches played} from the players' MapStats"""
+    grouped = defaultdict(list)
+    for map_stats in MapStats.objects.filter(player_id__in=player_ids).order_by('player_id', '-matches_played'):
+        grouped[map_stats.player_id].append({
+            'map': MAP_NAMES.get(map_stats.map_name, map_stats.map_name),
+            'code': map_stats.map_name,
+            'matches': map_stats.matches_played,
+            'wins': map_stats.matches_won,
+            'win_rate': map_stats.win_rate,
+            'avg_kills': round(map_stats.total_kills / max(map_stats.matches_played, 1), 1),
+            'kd': map_stats.kd_ratio,
+        })
+    return {player_id: grouped[player_id] for player_id in player_ids}
+
+
+def team_history(player_ids):
+    """{player id: teams played for, most recent first} from one grouped query"""
+    rows = PlayerMatchStats.objects.filter(player_id__in=player_ids).values(
+        'player_id', 'team_id', 'team__name'
+    ).annotate(
+        matches=Count('id'),
+        wins=Count('id', filter=WON_MAP & Q(match__is_finished=True)),
+        first=Min('match__match_date'),
+        last=Max('match__match_date'),
+    ).order_by('player_id', '-last')
+
+    history = {player_id: [] for player_id in player_ids}
+    for row in rows:
+        first, last = row['first'].year, row['last'].year
+        history[row['player_id']].append({
+            'team': row['team__name'],
+            'team_id': row['team_id'],
+            'period': str(first) if first == last else f'{first}-{last}',
+            'matches': row['matches'],
+            'wins': row['wins'],
+        })
+    return history
+
+
+def leaders(basic_stats):
+    """{metric: id of the best player on it}, among players with at least one match"""
+    played = {player_id: stats for player_id, stats in basic_stats.items() if stats['match_count']}
+    if len(played) < 2:
+        return {}
+    return {metric: max(played, key=lambda player_id: played[player_id][metric]) for metric in METRICS}
+
+
+def compare_players(player_ids):
+    """Comparison data for `player_ids`; one entry per existing player, in the order given"""
+    found = User.objects.in_bulk(player_ids)
+    player_ids = [player_id for player_id in player_ids if player_id in found]
+    if not player_ids:
+        return {'players': [], 'leaders': {}}
+
+    basic_stats = career_totals(player_ids)
+    weapons = weapon_preferences(player_ids)
+    maps = map_performance(player_ids)
+    teams = team_history(player_ids)
+    return {
+        'players': [{
+            'player': found[player_id],
+            'stats': basic_stats[player_id],
+            'weapons': weapons[player_id],
+            'maps': maps[player_id],
+            'teams': teams[player_id],
+        } for player_id in player_ids],
+        'leaders': leaders(basic_stats),
+    }
@@ -0,0 +1,125 @@
+"""Row generation for `manage.py generate_league`.
+
+Plain Python with no Django imports, so spawned worker processes can
+generate chunks without setting up Django. Every chunk is seeded from
+(seed, chunk index), which keeps the output identical whatever the
+worker count.
+"""
+import random
+
+MAPS = ['dust2', 'mirage', 'inferno', 'cache', 'overpass', 'train', 'cobblestone']
+WEAPONS = ['ak47', 'm4a4', 'm4a1s', 'awp', 'deagle', 'glock', 'usp']
+RANKS = ['silver', 'gold_nova', 'master_guardian', 'legendary_eagle', 'supreme', 'global_elite']
+ROLES = ['igl', 'awper', 'entry_fragger', 'rifler', 'support']
+COUNTRIES = ['Bulgaria', 'Denmark', 'France', 'Germany', 'Ukraine', 'Sweden', 'Brazil', 'USA', 'Poland', 'Finland']
+
+# Kill share per weapon by role - AWPers live on the AWP, everyone else on rifles
+ROLE_WEAPON_WEIGHTS = {
+    'awper': [10, 3, 3, 65, 9, 5, 5],
+    'default': [38, 20, 17, 4, 9, 6, 6],
+}
+WEAPON_HEADSHOT_RATE = [0.45, 0.45, 0.5, 0.08, 0.55, 0.6, 0.6]
+WEAPON_ACCURACY = [0.18, 0.2, 0.22, 0.45, 0.25, 0.15, 0.2]
+
+_rosters = None
+
+
+def chunk_rng(seed, chunk_index):
+    return random.Random(seed * 1000003 + chunk_index)
+
+
+def init_worker(rosters):
+    """Pool initializer - rosters are sent once per worker instead of once per chunk"""
+    global _rosters
+    _rosters = rosters
+
+
+def generate_matches(args):
+    """Generate one chunk of finished matches.
+
+    `args` is (seed, chunk_index, first_match_id, count, start_timestamp, span_seconds).
+    Rosters are [(team_id, strength, [(player_id, role, skill), ...])].
+    Returns (match_rows, stat_rows, map_totals, weapon_totals) where the
+    totals are keyed by (player_id, map) and (player_id, weapon).
+    """
+    seed, chunk_index, first_match_id, count, start_timestamp, span_seconds = args
+    rosters = _rosters
+    rng = chunk_rng(seed, chunk_index)
+
+    match_rows = []
+    stat_rows = []
+    map_totals = {}
+    weapon_totals = {}
+
+    for match_id in range(first_match_id, first_match_id + count):
+        team1, team2 = rng.sample(rosters, 2)
+        map_name = rng.choice(MAPS)
+
+        # Stronger team wins more often, never always
+        team1_wins = rng.random() < team1[1] / (team1[1] + team2[1])
+        loser_score = rng.choices(range(13), weights=[1, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 9, 0])[0]
+        team1_score, team2_score = (13, loser_score) if team1_wins else (loser_score, 13)
+        rounds = team1_score + team2_score
+        match_date = start_timestamp + rng.random() * span_seconds
+        match_type = rng.choices(['competitive', 'tournament', 'casual'], weights=[6, 3, 1])[0]
+        match_rows.append((match_id, team1[0], team2[0], map_name, match_type,
+                           team1_score, team2_score, match_date, 25 + rounds + rng.randint(0, 10)))
+
+        for team, won in ((team1, team1_wins), (team2, not team1_wins)):
+            for player_id, role, skill in team[2]:
+                kills = max(0, int(rng.gauss(rounds * 0.7 * skill, 4)))
+                deaths = max(1, int(rng.gauss(rounds * 0.7 / skill, 3)))
+                assists = max(0, int(rng.gauss(rounds * 0.18, 2)))
+                damage = max(0, int(kills * rng.uniform(90, 120) + assists * 40))
+
+                weapon_kills = _split_kills(rng, kills, role)
+                headshots = 0
+                for weapon_index, weapon_count in enumerate(weapon_kills):
+                    if not weapon_count:
+                        continue
+                    weapon_headshots = min(weapon_count, int(weapon_count * WEAPON_HEADSHOT_RATE[weapon_index]
+                                                             * rng.uniform(0.7, 1.3) + 0.5))
+                    shots = int(weapon_count / WEAPON_ACCURACY[weapon_index] * rng.uniform(0.8, 1.2))
+                    headshots += weapon_headshots
+                    totals = weapon_totals.setdefault((player_id, WEAPONS[weapon_index]), [0, 0, 0])
+                    totals[0] += weapon_count
+                    totals[1] += shots
+                    totals[2] += weapon_headshots
+
+                stat_rows.append((match_id, player_id, team[0], kills, deaths, assists, headshots, damage))
+
+                totals = map_totals.setdefault((player_id, map_name), [0, 0, 0, 0])
+                totals[0] += 1
+                totals[1] += won
+                totals[2] += kills
+                totals[3] += deaths
+
+    return match_rows, stat_rows, map_totals, weapon_totals
+
+
+def _split_kills(rng, kills, role):
+    """Spread kills over weapons around the role's usual mix (O(weapons), not O(kills))"""
+    weights = ROLE_WEAPON_WEIGHTS.get(role, ROLE_WEAPON_WEIGHTS['default'])
+    total_weight = sum(weights)
+    counts = [int(kills * weight / total_weight * rng.uniform(0.6, 1.4)) for weight in weights]
+    # Whatever rounding left over (or overshot) goes to the main weapon
+    main_weapon = weights.index(max(weights))
+    counts[main_weapon] = max(0, counts[main_weapon] + kills - sum(counts))
+    overshoot = sum(counts) - kills
+    for weapon_index in range(len(counts)):
+        if overshoot <= 0:
+            break
+        taken = min(overshoot, counts[weapon_index])
+        counts[weapon_index] -= taken
+        overshoot -= taken
+    return counts
+
+
+def merge_totals(into, totals):
+    for key, values in totals.items():
+        current = into.get(key)
+        if current is None:
+            into[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                current[i] += value
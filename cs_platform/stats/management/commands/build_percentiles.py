@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from stats import percentiles
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the player percentile tables from scratch (run from cron; finished matches refresh them incrementally)'
+
+    def handle(self, *args, **options):
+        ranked = percentiles.build_tables()
+        self.stdout.write(self.style.SUCCESS(f'Built percentile tables for {ranked} players'))
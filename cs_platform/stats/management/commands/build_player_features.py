@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from stats import similarity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every player feature vector for similar-player search (finished matches refresh their players)'
+
+    def handle(self, *args, **options):
+        written = similarity.save_vectors()
+        self.stdout.write(self.style.SUCCESS(f'Built feature vectors for {written} players'))
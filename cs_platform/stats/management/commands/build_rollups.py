@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from stats import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the day and month stats buckets from scratch (finished matches refresh theirs incrementally)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=0, help='Processes building buckets (0 = inline)')
+
+    def handle(self, *args, **options):
+        written = rollups.backfill(options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} stats buckets'))
@@ -0,0 +1,251 @@
+import multiprocessing
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from changes import tracking
+from matches import history, scoreboard
+from matches.models import Match, PlayerMatchStats, Series
+from stats import league, percentiles, rollups, similarity
+from stats.models import WeaponStats, MapStats
+from teams.models import Team, TeamMembership
+from tournaments.models import Tournament, TournamentParticipation
+
+User = get_user_model()
+
+# Column order of the tuples built by stats.league.generate_matches
+MATCH_FIELDS = ['id', 'team1', 'team2', 'map_name', 'match_type', 'team1_score', 'team2_score',
+                'match_date', 'duration_minutes', 'is_finished', 'updated_at']
+STAT_FIELDS = ['match', 'player', 'team', 'kills', 'deaths', 'assists', 'headshots', 'damage_dealt']
+
+LEAGUE_SPAN = timedelta(days=730)  # Matches are spread over this long before now
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a reproducible synthetic league for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=1000)
+        parser.add_argument('--teams', type=int, default=100, help='Teams of five - needs players >= 5 * teams')
+        parser.add_argument('--tournaments', type=int, default=10)
+        parser.add_argument('--matches', type=int, default=10000, help='Each match adds 10 PlayerMatchStats rows')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Matches generated and inserted per chunk')
+        parser.add_argument('--workers', type=int, default=0, help='Processes generating match chunks (0 = inline)')
+        parser.add_argument('--prefix', default='lg', help='Prefix for generated usernames, team names and tags')
+        parser.add_argument('--clear', action='store_true', help='Delete a previously generated league with this prefix first')
+
+    def handle(self, *args, **options):
+        if options['players'] < options['teams'] * 5:
+            raise CommandError('--players must be at least 5 * --teams')
+        if options['teams'] < 2:
+            raise CommandError('--teams must be at least 2')
+
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        started = time.perf_counter()
+
+        # Bulk and raw writes bypass the change tracking signals - bump every table once at the end
+        with tracking.suspended():
+            if options['clear']:
+                self.clear()
+
+            players = self.create_players(options['players'])
+            rosters = self.create_teams(players, options['teams'])
+            self.create_tournaments(options['tournaments'], players[0], rosters)
+            self.create_matches(rosters, options)
+
+        self.stdout.write(self.style.SUCCESS(f'League generated in {time.perf_counter() - started:.1f}s'))
+
+    def clear(self):
+        # Largest tables first with plain filtered deletes - cascading a million stat rows
+        # through the collector from Team/User would take far longer
+        PlayerMatchStats.objects.filter(player__username__startswith=f'{self.prefix}_').delete()
+        Match.objects.filter(team1__name__startswith=f'{self.prefix} ').delete()
+        Series.objects.filter(team1__name__startswith=f'{self.prefix} ').delete()
+        MapStats.objects.filter(player__username__startswith=f'{self.prefix}_').delete()
+        WeaponStats.objects.filter(player__username__startswith=f'{self.prefix}_').delete()
+        Tournament.objects.filter(name__startswith=f'{self.prefix} ').delete()
+        Team.objects.filter(name__startswith=f'{self.prefix} ').delete()
+        deleted, _ = User.objects.filter(username__startswith=f'{self.prefix}_').delete()
+        self.stdout.write(f'Cleared previous league ({deleted} rows)')
+
+    def bulk_create(self, model, objects, batch_size=5000):
+        for start in range(0, len(objects), batch_size):
+            model.objects.bulk_create(objects[start:start + batch_size], batch_size=batch_size)
+
+    def create_players(self, count):
+        self.stdout.write(f'Creating {count} players...')
+        # One hash for everyone - hashing per user would dominate the run
+        password = make_password('password')
+        users = []
+        for i in range(count):
+            rank = self.rng.choices(league.RANKS, weights=[15, 25, 25, 18, 10, 7])[0]
+            users.append(User(
+                username=f'{self.prefix}_player{i}',
+                email=f'{self.prefix}_player{i}@example.com',
+                password=password,
+                rank=rank,
+                hours_played=self.rng.randint(50, 6000),
+                country=self.rng.choice(league.COUNTRIES),
+                favorite_weapon=self.rng.choice(league.WEAPONS),
+                hltv_rating=Decimal(str(round(self.rng.uniform(5.0, 7.2), 1))),  # Same scale as load_pro_teams
+            ))
+        with transaction.atomic():
+            self.bulk_create(User, users)
+        return list(User.objects.filter(username__startswith=f'{self.prefix}_player').order_by('id'))
+
+    def create_teams(self, players, count):
+        self.stdout.write(f'Creating {count} teams...')
+        teams = [
+            Team(
+                name=f'{self.prefix} Team {i}',
+                tag=f'{self.prefix.upper()[:4]}{i}',
+                country=self.rng.choice(league.COUNTRIES),
+                is_professional=i < 30,
+                world_ranking=i + 1 if i < 30 else None,
+                captain=players[i * 5],
+            )
+            for i in range(count)
+        ]
+        with transaction.atomic():
+            self.bulk_create(Team, teams)
+            teams = list(Team.objects.filter(name__startswith=f'{self.prefix} Team ').order_by('id'))
+
+            # Rosters stay together for the whole league, so every stint covers every match
+            joined_date = timezone.now() - LEAGUE_SPAN
+            memberships = []
+            rosters = []
+            for i, team in enumerate(teams):
+                roster = []
+                for slot, player in enumerate(players[i * 5:i * 5 + 5]):
+                    role = league.ROLES[slot]
+                    memberships.append(TeamMembership(team=team, player=player, role=role, joined_date=joined_date))
+                    roster.append((player.id, role, float(player.hltv_rating) / 6))  # ~1.0 for an average player
+                strength = sum(skill for _, _, skill in roster)
+                rosters.append((team.id, strength, roster))
+            self.bulk_create(TeamMembership, memberships)
+            User.objects.filter(id__in=[p.id for p in players[:min(count, 30) * 5]]).update(is_professional=True)
+        return rosters
+
+    def create_tournaments(self, count, organizer, rosters):
+        self.stdout.write(f'Creating {count} tournaments...')
+        now = timezone.now()
+        tournaments = []
+        for i in range(count):
+            start = now - timedelta(days=self.rng.randint(-60, 700))
+            tournaments.append(Tournament(
+                name=f'{self.prefix} Cup {i}',
+                prize_pool=self.rng.choice([10000, 50000, 250000, 1000000]),
+                max_teams=16,
+                start_date=start,
+                end_date=start + timedelta(days=7),
+                registration_deadline=start - timedelta(days=7),
+                status='completed' if start + timedelta(days=7) < now else 'upcoming',
+                organizer=organizer,
+            ))
+        with transaction.atomic():
+            self.bulk_create(Tournament, tournaments)
+            participations = []
+            for tournament in Tournament.objects.filter(name__startswith=f'{self.prefix} Cup '):
+                entrants = self.rng.sample(rosters, min(16, len(rosters)))
+                for placement, (team_id, _, _) in enumerate(entrants, start=1):
+                    participations.append(TournamentParticipation(
+                        tournament=tournament, team_id=team_id,
+                        placement=placement if tournament.status == 'completed' else None,
+                    ))
+            self.bulk_create(TournamentParticipation, participations)
+
+    def create_matches(self, rosters, options):
+        total, chunk_size, seed = options['matches'], options['chunk_size'], options['seed']
+        # Ids are assigned up front so chunks can be generated independently of the database
+        first_id = (Match.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        start_timestamp = (timezone.now() - LEAGUE_SPAN).timestamp()
+        chunks = [
+            (seed, index, first_id + offset, min(chunk_size, total - offset),
+             start_timestamp, LEAGUE_SPAN.total_seconds())
+            for index, offset in enumerate(range(0, total, chunk_size))
+        ]
+
+        self.stdout.write(f'Creating {total} matches ({total * 10} player stat rows) in {len(chunks)} chunks...')
+        map_totals = {}
+        weapon_totals = {}
+
+        if options['workers']:
+            with multiprocessing.get_context('spawn').Pool(
+                options['workers'], initializer=league.init_worker, initargs=(rosters,)
+            ) as pool:
+                # imap keeps chunk order, so inserts are the same as an inline run
+                for index, result in enumerate(pool.imap(league.generate_matches, chunks)):
+                    self.insert_chunk(result, map_totals, weapon_totals, index, len(chunks))
+        else:
+            league.init_worker(rosters)
+            for index, chunk in enumerate(chunks):
+                self.insert_chunk(league.generate_matches(chunk), map_totals, weapon_totals, index, len(chunks))
+        self.reset_sequences(Match)
+
+        self.stdout.write('Writing map and weapon totals...')
+        with transaction.atomic():
+            self.bulk_create(MapStats, [
+                MapStats(player_id=player_id, map_name=map_name, matches_played=played,
+                         matches_won=won, total_kills=kills, total_deaths=deaths)
+                for (player_id, map_name), (played, won, kills, deaths) in map_totals.items()
+            ])
+            self.bulk_create(WeaponStats, [
+                WeaponStats(player_id=player_id, weapon=weapon, total_kills=kills,
+                            total_shots=shots, headshot_kills=headshots)
+                for (player_id, weapon), (kills, shots, headshots) in weapon_totals.items()
+            ])
+
+        self.stdout.write('Grouping maps into series...')
+        history.backfill()
+        self.stdout.write('Writing match scoreboards...')
+        scoreboard.backfill()
+        self.stdout.write('Building day and month stats buckets...')
+        rollups.backfill(options['workers'])
+
+        self.stdout.write('Building percentile tables and player feature vectors...')
+        percentiles.build_tables()
+        similarity.save_vectors()
+
+    def insert_rows(self, model, field_names, rows):
+        """executemany straight into the model's table - model instances cost more than the insert itself"""
+        columns = [model._meta.get_field(name).column for name in field_names]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def reset_sequences(self, *models):
+        """Move id sequences past explicitly inserted ids (PostgreSQL; a no-op on SQLite)"""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+    def insert_chunk(self, result, map_totals, weapon_totals, index, chunk_count):
+        match_rows, stat_rows, chunk_map_totals, chunk_weapon_totals = result
+        tz = timezone.get_current_timezone()
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        now = adapt_datetime(timezone.now())
+
+        # Raw inserts skip post_save, so no stats recompute tasks are queued for generated data
+        with transaction.atomic():
+            self.insert_rows(Match, MATCH_FIELDS, [
+                row[:7] + (adapt_datetime(datetime.fromtimestamp(row[7], tz)), row[8], True, now)
+                for row in match_rows
+            ])
+            self.insert_rows(PlayerMatchStats, STAT_FIELDS, stat_rows)
+
+        league.merge_totals(map_totals, chunk_map_totals)
+        league.merge_totals(weapon_totals, chunk_weapon_totals)
+        self.stdout.write(f'  chunk {index + 1}/{chunk_count}')
@@ -77,4 +77,75 @@ class MapStats(models.Model):
     def kd_ratio(self):
         if self.total_deaths == 0:
             return self.total_kills
-        return round(self.total_kills / self.total_deaths, 2)
\ No newline at end of file
+        return round(self.total_kills / self.total_deaths, 2)
+
+class PercentileTable(models.Model):
+    """Sorted values of one metric over the players in one scope (see stats/percentiles.py)"""
+    scope = models.CharField(max_length=40)  # 'all', 'pro', 'community' or 'rank:<rank>'
+    metric = models.CharField(max_length=30)
+    values = models.BinaryField()  # float32, ascending
+    player_ids = models.BinaryField()  # int32, same order as values
+    size = models.IntegerField(default=0)
+    version = models.IntegerField(default=0)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['scope', 'metric']
+
+    def __str__(self):
+        return f"{self.metric} in {self.scope} ({self.size} players)"
+
+
+class PlayerFeatures(models.Model):
+    """A player's raw play-style vector for similar-player search (see stats/similarity.py)"""
+    player = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='features')
+    vector = models.BinaryField()  # float32, similarity.FEATURES order
+    updated_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Features of {self.player_id}"
+
+
+class StatsBucket(models.Model):
+    """One day's or one month's totals for a player, team or map, with running totals (see stats/rollups.py)"""
+    SCOPE_CHOICES = [
+        ('player', 'Player'),
+        ('team', 'Team'),
+        ('map', 'Map'),
+    ]
+
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('month', 'Month'),
+    ]
+
+    scope = models.CharField(max_length=6, choices=SCOPE_CHOICES)
+    subject = models.CharField(max_length=20)  # Player id, team id or map code
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    start = models.DateField()  # The day, or the first of the month
+    matches = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)  # Always 0 for maps
+    kills = models.IntegerField(default=0)
+    deaths = models.IntegerField(default=0)
+    assists = models.IntegerField(default=0)
+    headshots = models.IntegerField(default=0)
+    damage = models.BigIntegerField(default=0)
+    # The same totals summed over every bucket of this subject up to and including this one
+    running_matches = models.IntegerField(default=0)
+    running_wins = models.IntegerField(default=0)
+    running_kills = models.IntegerField(default=0)
+    running_deaths = models.IntegerField(default=0)
+    running_assists = models.IntegerField(default=0)
+    running_headshots = models.IntegerField(default=0)
+    running_damage = models.BigIntegerField(default=0)
+    is_latest = models.BooleanField(default=False)  # The subject's last bucket of this period, so its all-time totals
+
+    class Meta:
+        unique_together = ['scope', 'period', 'subject', 'start']
+        indexes = [
+            models.Index(fields=['scope', 'period', 'start']),
+            models.Index(fields=['scope', 'period'], condition=models.Q(is_latest=True), name='statsbucket_latest'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.subject} {self.period} of {self.start}"
@@ -0,0 +1,221 @@
+"""Percentile tables: "this player's ADR is in the 99.2th percentile".
+
+For every metric and scope (all players, pro / community, each rank)
+a PercentileTable row holds the sorted metric values as a float32
+array, next to the player id of each value. A lookup is two binary
+searches in the cached array - no sorting or aggregating per request:
+
+    scopes = scopes_for(player.is_professional, player.rank)
+    percentiles(load_tables(scopes), stats, scopes)
+
+`build_tables` rebuilds everything from one grouped query (run it from
+cron with `manage.py build_percentiles`). When a match finishes,
+`refresh_players` moves only the players who played it: their old
+entries are dropped and their new values inserted at their sorted
+positions.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from changes import tracking
+from matches.models import PlayerMatchStats
+from .comparison import METRICS
+from .models import PercentileTable
+
+TOTALS = ['total_kills', 'total_deaths', 'total_assists', 'total_headshots', 'total_damage', 'match_count']
+
+METRIC_LABELS = {
+    'kd_ratio': 'K/D',
+    'adr': 'ADR',
+    'kpr': 'KPR',
+    'hs_percentage': 'HS%',
+    'assists_per_match': 'APM',
+}
+
+# In-process cache: (scope, metric) -> ((pk, version), sorted values)
+_cache = {}
+
+
+def scopes_for(is_professional, rank):
+    """Scopes a player is ranked in"""
+    return ['all', 'pro' if is_professional else 'community', f'rank:{rank}']
+
+
+def metric_values(totals):
+    """{metric: float32 array} from arrays (or scalars) of career totals - same formulas as comparison.derived_stats"""
+    kills = np.asarray(totals['total_kills'], dtype=np.float64)
+    matches = np.maximum(np.asarray(totals['match_count'], dtype=np.float64), 1)
+    values = {
+        'kd_ratio': kills / np.maximum(totals['total_deaths'], 1),
+        'adr': np.asarray(totals['total_damage'], dtype=np.float64) / matches,
+        'kpr': kills / matches,
+        'hs_percentage': np.asarray(totals['total_headshots'], dtype=np.float64) / np.maximum(kills, 1) * 100,
+        'assists_per_match': np.asarray(totals['total_assists'], dtype=np.float64) / matches,
+    }
+    return {metric: np.asarray(values[metric], dtype=np.float32) for metric in METRICS}
+
+
+def player_totals(player_ids=None):
+    """(ids, scopes per player, {metric: values}) for players with enough matches, from one grouped query"""
+    queryset = PlayerMatchStats.objects.all()
+    if player_ids is not None:
+        queryset = queryset.filter(player_id__in=player_ids)
+    rows = list(queryset.values('player_id').annotate(
+        is_professional=F('player__is_professional'),
+        rank=F('player__rank'),
+        total_kills=Sum('kills'),
+        total_deaths=Sum('deaths'),
+        total_assists=Sum('assists'),
+        total_headshots=Sum('headshots'),
+        total_damage=Sum('damage_dealt'),
+        match_count=Count('match'),
+    ).filter(match_count__gte=getattr(settings, 'PERCENTILES_MIN_MATCHES', 1)).order_by())
+
+    ids = np.fromiter((row['player_id'] for row in rows), dtype=np.int32, count=len(rows))
+    scopes = [scopes_for(row['is_professional'], row['rank']) for row in rows]
+    totals = {key: np.fromiter((row[key] or 0 for row in rows), dtype=np.int64, count=len(rows)) for key in TOTALS}
+    return ids, scopes, metric_values(totals)
+
+
+def _decode(table):
+    return (np.frombuffer(bytes(table.player_ids), dtype=np.int32),
+            np.frombuffer(bytes(table.values), dtype=np.float32))
+
+
+def _encode(table, ids, values):
+    table.player_ids = ids.astype(np.int32).tobytes()
+    table.values = values.astype(np.float32).tobytes()
+    table.size = len(values)
+    table.version += 1
+    table.built_at = timezone.now()
+
+
+def _members(scopes):
+    """{scope: indexes of the players in it}"""
+    members = {}
+    for index, player_scopes in enumerate(scopes):
+        for scope in player_scopes:
+            members.setdefault(scope, []).append(index)
+    return {scope: np.array(indexes, dtype=np.intp) for scope, indexes in members.items()}
+
+
+@transaction.atomic
+def build_tables():
+    """Rebuild every table from scratch; returns the number of players ranked"""
+    ids, scopes, values = player_totals()
+    existing = {(table.scope, table.metric): table for table in PercentileTable.objects.select_for_update()}
+    members = _members(scopes)
+
+    changed = []
+    for scope, indexes in members.items():
+        for metric in METRICS:
+            scoped = values[metric][indexes]
+            order = np.argsort(scoped, kind='stable')
+            table = existing.pop((scope, metric), None) or PercentileTable(scope=scope, metric=metric)
+            _encode(table, ids[indexes][order], scoped[order])
+            changed.append(table)
+
+    # Scopes nobody is in any more (e.g. a rank with no players left)
+    PercentileTable.objects.filter(pk__in=[table.pk for table in existing.values()]).delete()
+    _save(changed)
+    return len(ids)
+
+
+@transaction.atomic
+def refresh_players(player_ids):
+    """Re-rank only `player_ids` in every table, e.g. after they finished a match"""
+    existing = {(table.scope, table.metric): table for table in PercentileTable.objects.select_for_update()}
+    if not existing:
+        build_tables()
+        return
+
+    ids, scopes, values = player_totals(player_ids)
+    members = _members(scopes)
+    stale = np.asarray(player_ids, dtype=np.int32)
+
+    changed = []
+    for scope in set(members) | {scope for scope, _ in existing}:
+        indexes = members.get(scope, np.array([], dtype=np.intp))
+        for metric in METRICS:
+            table = existing.get((scope, metric)) or PercentileTable(scope=scope, metric=metric)
+            table_ids, table_values = _decode(table) if table.pk else (np.array([], np.int32), np.array([], np.float32))
+
+            keep = ~np.isin(table_ids, stale)
+            if keep.all() and not len(indexes):
+                continue
+            table_ids, table_values = table_ids[keep], table_values[keep]
+
+            new_values = values[metric][indexes]
+            order = np.argsort(new_values, kind='stable')
+            new_values, new_ids = new_values[order], ids[indexes][order]
+            positions = np.searchsorted(table_values, new_values)
+            _encode(table, np.insert(table_ids, positions, new_ids), np.insert(table_values, positions, new_values))
+            changed.append(table)
+    _save(changed)
+
+
+def _save(tables):
+    new = [table for table in tables if not table.pk]
+    updated = [table for table in tables if table.pk]
+    PercentileTable.objects.bulk_create(new)
+    PercentileTable.objects.bulk_update(updated, ['values', 'player_ids', 'size', 'version', 'built_at'])
+    if tables:
+        tracking.bump(PercentileTable)  # Bulk writes skip the signals that move the comparison ETag
+
+
+def load_tables(scopes):
+    """{(scope, metric): sorted values} for `scopes`, re-reading only tables that changed since the last call"""
+    versions = {
+        (scope, metric): (pk, version) for pk, scope, metric, version in
+        PercentileTable.objects.filter(scope__in=scopes).values_list('pk', 'scope', 'metric', 'version')
+    }
+    stale = [versions[key][0] for key in versions if _cache.get(key, (None,))[0] != versions[key]]
+    if stale:
+        for table in PercentileTable.objects.filter(pk__in=stale).only('scope', 'metric', 'version', 'values'):
+            _cache[(table.scope, table.metric)] = (
+                (table.pk, table.version), np.frombuffer(bytes(table.values), dtype=np.float32)
+            )
+    return {key: _cache[key][1] for key in versions}
+
+
+def percentile(values, value):
+    """Share of `values` below `value`, ties counted half, as a 0-100 percentile"""
+    if not len(values):
+        return None
+    below = np.searchsorted(values, value, side='left')
+    at_or_below = np.searchsorted(values, value, side='right')
+    return round(float(below + at_or_below) / 2 / len(values) * 100, 1)
+
+
+def percentiles(tables, totals, scopes):
+    """{scope: {metric: percentile}} for one player's career totals (see comparison.career_totals)"""
+    if not totals.get('match_count'):
+        return {}
+    values = metric_values(totals)
+    return {
+        scope: {
+            metric: percentile(tables[(scope, metric)], values[metric])
+            for metric in METRICS if (scope, metric) in tables
+        }
+        for scope in scopes
+    }
+
+
+def player_percentiles(player, totals):
+    """{scope: {metric: percentile}} for one player"""
+    scopes = scopes_for(player.is_professional, player.rank)
+    return percentiles(load_tables(scopes), totals, scopes)
+
+
+def add_to_comparison(comparison):
+    """Set 'percentiles' on every entry of a comparison (see comparison.compare_players), one table load for all"""
+    scopes = {
+        entry['player'].id: scopes_for(entry['player'].is_professional, entry['player'].rank)
+        for entry in comparison['players']
+    }
+    tables = load_tables(sorted({scope for player_scopes in scopes.values() for scope in player_scopes}))
+    for entry in comparison['players']:
+        entry['percentiles'] = percentiles(tables, entry['stats'], scopes[entry['player'].id])
+    return comparison
@@ -0,0 +1,324 @@
+"""Date-range stats from day and month buckets.
+
+StatsBucket holds each player's, team's and map's totals per day and
+per month, over finished matches, plus running totals up to each
+bucket. A range is never aggregated from PlayerMatchStats:
+
+- `range_totals` (leaderboards, every subject at once) sums whole
+  months from month buckets and only the ragged ends from day buckets -
+  at most ~60 day rows and one row per month for each subject, in one
+  grouped query. The open range (all time) instead reads the running
+  totals of each subject's latest month bucket, one row per subject.
+- `subject_totals` (one player's page) subtracts two running totals:
+  the last day bucket on or before the end minus the last one before
+  the start, for any number of ranges in two queries.
+
+Buckets are re-totalled from the source rows whenever a match in them
+finishes or gets new player lines (tasks.refresh_rollups), so a refresh
+is safe to repeat; changed totals shift the running totals of every
+later bucket of the subject. `backfill` rebuilds everything, computing
+the buckets in worker processes (buckets.py). A match moved to another
+day or deleted leaves its old day as it was until that day is refreshed
+again or the next backfill.
+"""
+import calendar
+from datetime import date, datetime, time, timedelta
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, DateField, F, Max, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+from matches.models import Match, PlayerMatchStats
+from .comparison import derived_stats
+from .models import StatsBucket
+from . import buckets
+
+METRICS = ['matches', 'wins', 'kills', 'deaths', 'assists', 'headshots', 'damage']
+RUNNING = [f'running_{metric}' for metric in METRICS]
+SCOPES = [code for code, _ in StatsBucket.SCOPE_CHOICES]
+EPOCH = date(1970, 1, 1)
+
+RANGES = {
+    '7d': ('Last 7 days', 7),
+    '30d': ('Last 30 days', 30),
+    '90d': ('Last 90 days', 90),
+    'season': ('This season', None),
+    'all': ('All time', None),
+}
+
+STAT_SUMS = {
+    'kills': Sum('kills'),
+    'deaths': Sum('deaths'),
+    'assists': Sum('assists'),
+    'headshots': Sum('headshots'),
+    'damage': Sum('damage_dealt'),
+}
+
+
+def season_start(today):
+    """Seasons follow the calendar year"""
+    return date(today.year, 1, 1)
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def requested_range(params, today=None):
+    """(start, end, key) from ?range=7d|30d|90d|season|all or ?from=&to= ISO dates; None is open-ended.
+
+    Raises ValueError for dates that don't parse.
+    """
+    today = today or timezone.localdate()
+    if params.get('from') or params.get('to'):
+        start = date.fromisoformat(params['from']) if params.get('from') else None
+        end = date.fromisoformat(params['to']) if params.get('to') else None
+        return start, end, 'custom'
+    key = params.get('range') if params.get('range') in RANGES else 'all'
+    if key == 'all':
+        return None, None, key
+    if key == 'season':
+        return season_start(today), today, key
+    return today - timedelta(days=RANGES[key][1] - 1), today, key
+
+
+def _day_bounds(first, last):
+    """Aware datetimes [start of `first`, start of the day after `last`) in the current time zone"""
+    tz = timezone.get_current_timezone()
+    return (timezone.make_aware(datetime.combine(first, time.min), tz),
+            timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min), tz))
+
+
+def _totals(scope, period='day', first=None, last=None, subjects=None):
+    """{(subject, bucket start): [METRICS]} over finished matches, per day or per month"""
+    def matches_between(prefix=''):
+        window = Q(**{f'{prefix}is_finished': True})
+        if first is not None:
+            since, until = _day_bounds(first, last)
+            window &= Q(**{f'{prefix}match_date__gte': since, f'{prefix}match_date__lt': until})
+        return window
+
+    def bucket(field):
+        return TruncDate(field) if period == 'day' else TruncMonth(field, output_field=DateField())
+
+    totals = {}
+
+    def add(rows, subject_field, metrics):
+        for row in rows:
+            key = (str(row[subject_field]), row['bucket'])
+            values = totals.setdefault(key, [0] * len(METRICS))
+            for metric in metrics:
+                values[METRICS.index(metric)] += row[metric] or 0
+
+    stats = PlayerMatchStats.objects.filter(matches_between('match__')).annotate(bucket=bucket('match__match_date'))
+    if scope == 'player':
+        won = (Q(team=F('match__team1'), match__team1_score__gt=F('match__team2_score')) |
+               Q(team=F('match__team2'), match__team2_score__gt=F('match__team1_score')))
+        if subjects is not None:
+            stats = stats.filter(player_id__in=subjects)
+        add(stats.values('player_id', 'bucket').annotate(
+            matches=Count('id'), wins=Count('id', filter=won), **STAT_SUMS
+        ).order_by(), 'player_id', METRICS)
+        return totals
+
+    games = Match.objects.filter(matches_between()).annotate(bucket=bucket('match_date'))
+    if scope == 'team':
+        for side, other in (('team1', 'team2'), ('team2', 'team1')):
+            side_games = games.filter(**{f'{side}_id__in': subjects}) if subjects is not None else games
+            add(side_games.values(f'{side}_id', 'bucket').annotate(
+                matches=Count('id'), wins=Count('id', filter=Q(**{f'{side}_score__gt': F(f'{other}_score')})),
+            ).order_by(), f'{side}_id', ['matches', 'wins'])
+        subject_field = 'team_id'
+    else:
+        if subjects is not None:
+            games = games.filter(map_name__in=subjects)
+        add(games.values('map_name', 'bucket').annotate(matches=Count('id')).order_by(), 'map_name', ['matches'])
+        subject_field = 'match__map_name'
+
+    if subjects is not None:
+        stats = stats.filter(**{f'{subject_field}__in': subjects})
+    add(stats.values(subject_field, 'bucket').annotate(**STAT_SUMS).order_by(), subject_field, list(STAT_SUMS))
+    return totals
+
+
+def _apply(scope, period, start, own_totals):
+    """Store new own totals for `start`'s bucket of each subject and shift the later running totals"""
+    with transaction.atomic():
+        existing = {row.subject: row for row in StatsBucket.objects.select_for_update().filter(
+            scope=scope, period=period, start=start, subject__in=list(own_totals)
+        )}
+        for subject, own in own_totals.items():
+            row = existing.get(subject)
+            old = [getattr(row, metric) for metric in METRICS] if row else [0] * len(METRICS)
+            delta = [new - previous for new, previous in zip(own, old)]
+            if not any(delta):
+                continue
+            same_subject = StatsBucket.objects.filter(scope=scope, period=period, subject=subject)
+            if row is None:
+                before = same_subject.filter(start__lt=start).order_by('-start').values(*RUNNING).first()
+                base = [before[name] for name in RUNNING] if before else [0] * len(METRICS)
+                is_latest = not same_subject.filter(start__gt=start).exists()
+                if is_latest:
+                    same_subject.filter(is_latest=True).update(is_latest=False)
+                StatsBucket.objects.create(
+                    scope=scope, period=period, subject=subject, start=start, is_latest=is_latest,
+                    **dict(zip(METRICS, own)), **dict(zip(RUNNING, [total + added for total, added in zip(base, own)])),
+                )
+                later = same_subject.filter(start__gt=start)
+            else:
+                StatsBucket.objects.filter(pk=row.pk).update(**dict(zip(METRICS, own)))
+                later = same_subject.filter(start__gte=start)
+            later.update(**{name: F(name) + change for name, change in zip(RUNNING, delta) if change})
+
+
+def refresh_match(match):
+    """Re-total the day and month buckets of everything a finished match counts towards"""
+    day = timezone.localdate(match.match_date)
+    subjects = {
+        'player': [str(player_id) for player_id in match.player_stats.values_list('player_id', flat=True)],
+        'team': [str(match.team1_id), str(match.team2_id)],
+        'map': [match.map_name],
+    }
+    for period, first, last in (('day', day, day), ('month', day.replace(day=1), month_end(day))):
+        for scope, ids in subjects.items():
+            if not ids:
+                continue
+            totals = _totals(scope, period, first, last, ids)
+            _apply(scope, period, first, {
+                subject: totals.get((subject, first), [0] * len(METRICS)) for subject in ids
+            })
+
+
+def backfill(workers=0, batch_size=5000):
+    """Rebuild every bucket from scratch; returns the number of rows written"""
+    written = 0
+    with transaction.atomic():
+        StatsBucket.objects.all().delete()
+        for scope in SCOPES:
+            daily = _totals(scope)
+            if not daily:
+                continue
+            subjects = sorted({subject for subject, _ in daily})
+            code = {subject: index for index, subject in enumerate(subjects)}
+            codes = [code[subject] for subject, _ in daily]
+            days = [(day - EPOCH).days for _, day in daily]
+            for share in buckets.rollup_all(codes, days, list(daily.values()), workers):
+                for period, (bucket_codes, starts, own, running) in share.items():
+                    # Rows come sorted by subject then start, and a share never splits a subject
+                    last = np.append(bucket_codes[1:] != bucket_codes[:-1], True)
+                    rows = [
+                        StatsBucket(
+                            scope=scope, subject=subjects[bucket_code], period=period,
+                            start=EPOCH + timedelta(days=int(start)), is_latest=bool(is_latest),
+                            **dict(zip(METRICS, own_row.tolist())), **dict(zip(RUNNING, running_row.tolist())),
+                        )
+                        for bucket_code, start, own_row, running_row, is_latest
+                        in zip(bucket_codes, starts, own, running, last)
+                    ]
+                    StatsBucket.objects.bulk_create(rows, batch_size=batch_size)
+                    written += len(rows)
+    return written
+
+
+def _pieces(start, end):
+    """(period, first bucket, last bucket) pieces covering [start, end]; None is open-ended"""
+    if start and end and start > end:
+        return []
+    pieces = []
+    months_from, months_to = start, end
+    if start and start.day != 1:
+        if end and end <= month_end(start):
+            return [('day', start, end)]
+        pieces.append(('day', start, month_end(start)))
+        months_from = month_end(start) + timedelta(days=1)
+    if end and end != month_end(end):
+        pieces.append(('day', end.replace(day=1), end))
+        months_to = end.replace(day=1) - timedelta(days=1)
+    if months_from is None or months_to is None or months_from <= months_to:
+        pieces.append(('month', months_from, months_to and months_to.replace(day=1)))
+    return pieces
+
+
+def latest_totals(scope, subjects=None):
+    """{subject: {metric: total}} of all time - one query reading each subject's latest month bucket"""
+    rows = StatsBucket.objects.filter(scope=scope, period='month', is_latest=True)
+    if subjects is not None:
+        rows = rows.filter(subject__in=[str(subject) for subject in subjects])
+    return {
+        row['subject']: {metric: row[name] for metric, name in zip(METRICS, RUNNING)}
+        for row in rows.values('subject', *RUNNING)
+    }
+
+
+def range_totals(scope, start=None, end=None, subjects=None):
+    """{subject: {metric: total}} over the days [start, end] - one grouped query over a handful of buckets each"""
+    if start is None and end is None:
+        return latest_totals(scope, subjects)
+    condition = Q()
+    pieces = _pieces(start, end)
+    if not pieces:
+        return {}
+    for period, first, last in pieces:
+        piece = Q(period=period)
+        if first:
+            piece &= Q(start__gte=first)
+        if last:
+            piece &= Q(start__lte=last)
+        condition |= piece
+    rows = StatsBucket.objects.filter(condition, scope=scope)
+    if subjects is not None:
+        rows = rows.filter(subject__in=[str(subject) for subject in subjects])
+    rows = rows.values('subject').annotate(**{metric: Sum(metric) for metric in METRICS}).order_by()
+    return {row.pop('subject'): row for row in rows}
+
+
+def subject_totals(scope, subject, ranges):
+    """[{metric: total}] for one subject over each (start, end) - two queries however many ranges:
+    the last day bucket at each bound, then those buckets' running totals"""
+    bounds = list(dict.fromkeys(
+        day for start, end in ranges for day in ((end, start - timedelta(days=1)) if start else (end,))
+    ))
+    rows = StatsBucket.objects.filter(scope=scope, period='day', subject=str(subject))
+    latest = rows.aggregate(**{
+        f'bound_{index}': Max('start', filter=Q(start__lte=day) if day else Q()) for index, day in enumerate(bounds)
+    })
+    latest = {day: latest[f'bound_{index}'] for index, day in enumerate(bounds)}
+    running = {
+        row.pop('start'): np.array([row[name] for name in RUNNING])
+        for row in rows.filter(start__in=[start for start in latest.values() if start]).values('start', *RUNNING)
+    }
+
+    def through(day):
+        return running.get(latest[day], np.zeros(len(METRICS), dtype=np.int64))
+
+    results = []
+    for start, end in ranges:
+        totals = through(end) - (through(start - timedelta(days=1)) if start else 0)
+        results.append(dict(zip(METRICS, totals.tolist())))
+    return results
+
+
+def with_derived(totals):
+    """Totals plus K/D, ADR, KPR, HS% and win rate, as comparison.derived_stats computes them"""
+    derived = derived_stats({
+        'match_count': totals['matches'],
+        'total_kills': totals['kills'],
+        'total_deaths': totals['deaths'],
+        'total_assists': totals['assists'],
+        'total_headshots': totals['headshots'],
+        'total_damage': totals['damage'],
+    })
+    derived['win_rate'] = round(totals['wins'] / totals['matches'] * 100, 1) if totals['matches'] else 0
+    return {**totals, **derived}
+
+
+def player_form(player_id, today=None):
+    """The player page's last 30 days / this season / all time rows"""
+    today = today or timezone.localdate()
+    ranges = [
+        ('Last 30 days', today - timedelta(days=29), today),
+        ('This season', season_start(today), today),
+        ('All time', None, None),
+    ]
+    totals = subject_totals('player', player_id, [(start, end) for _, start, end in ranges])
+    return [{'label': label, **with_derived(row)} for (label, _, _), row in zip(ranges, totals)]
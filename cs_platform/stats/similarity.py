@@ -0,0 +1,302 @@
+"""Similar-player search: "players who play like X".
+
+Every ranked player gets a raw feature vector (FEATURES), stored in
+PlayerFeatures: K/D, ADR and HS%, the share of their kills per weapon,
+the share of their matches per map, and their current team role. The
+vectors are rebuilt for a match's players when it finishes, or for
+everyone with `manage.py build_player_features`.
+
+Searches run against an in-process index. It standardizes every
+feature and weights each group (performance, weapons, maps, role)
+equally, whatever its number of features. Up to
+SIMILARITY_BRUTE_FORCE_LIMIT players it compares the query with every
+vector. Above that it partitions the vectors with k-means and scans
+only the SIMILARITY_PROBES partitions nearest the query. Each search
+first pulls in the vectors that changed since the last one, so the
+index stays current without a full reload; a row count that no longer
+matches the index means vectors were deleted, and those players are
+dropped. Standardization and partitions are recomputed in memory once
+enough vectors have changed.
+"""
+import threading
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from changes import tracking
+from matches.models import PlayerMatchStats
+from teams.models import TeamMembership
+from .models import MapStats, PlayerFeatures, WeaponStats
+
+User = get_user_model()
+
+WEAPONS = [code for code, _ in WeaponStats.WEAPON_CHOICES]
+MAPS = [code for code, _ in MapStats.MAP_CHOICES]
+ROLES = [code for code, _ in TeamMembership.ROLE_CHOICES]
+
+# Feature groups - each weighs the same in the distance
+GROUPS = [
+    ('performance', ['kd_ratio', 'adr', 'hs_percentage']),
+    ('weapons', [f'weapon:{weapon}' for weapon in WEAPONS]),
+    ('maps', [f'map:{map_name}' for map_name in MAPS]),
+    ('role', [f'role:{role}' for role in ROLES]),
+]
+FEATURES = [name for _, names in GROUPS for name in names]
+WEIGHTS = np.array([1 / np.sqrt(len(names)) for _, names in GROUPS for _ in names], dtype=np.float32)
+
+# Vectors written this long before the last sync are fetched again, in case their transaction committed late
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def build_vectors(player_ids=None):
+    """(player ids, raw feature matrix) for players with at least one match - four queries for any number of players"""
+    def scoped(queryset):
+        return queryset if player_ids is None else queryset.filter(player_id__in=player_ids)
+
+    totals = list(scoped(PlayerMatchStats.objects.all()).values('player_id').annotate(
+        kills=Sum('kills'), deaths=Sum('deaths'), headshots=Sum('headshots'),
+        damage=Sum('damage_dealt'), matches=Count('match'),
+    ).order_by('player_id'))
+    ids = np.array([row['player_id'] for row in totals], dtype=np.int64)
+    position = {player_id: index for index, player_id in enumerate(ids.tolist())}
+    matrix = np.zeros((len(ids), len(FEATURES)), dtype=np.float32)
+
+    column = {name: index for index, name in enumerate(FEATURES)}
+    for index, row in enumerate(totals):
+        kills = row['kills'] or 0
+        matrix[index, column['kd_ratio']] = kills / max(row['deaths'] or 0, 1)
+        matrix[index, column['adr']] = (row['damage'] or 0) / max(row['matches'], 1)
+        matrix[index, column['hs_percentage']] = (row['headshots'] or 0) / max(kills, 1) * 100
+
+    def shares(rows, prefix, codes):
+        # Raw counts first, then each player's block is divided by its total
+        first = column[f'{prefix}:{codes[0]}']
+        for player_id, code, count in rows:
+            if player_id in position and f'{prefix}:{code}' in column:
+                matrix[position[player_id], column[f'{prefix}:{code}']] += count
+        block = matrix[:, first:first + len(codes)]
+        block /= np.maximum(block.sum(axis=1, keepdims=True), 1)
+
+    shares(scoped(WeaponStats.objects.all()).values_list('player_id', 'weapon', 'total_kills'), 'weapon', WEAPONS)
+    shares(scoped(MapStats.objects.all()).values_list('player_id', 'map_name', 'matches_played'), 'map', MAPS)
+
+    # Current role: the most recently joined active team, matchmaking lobbies aside
+    roles = scoped(TeamMembership.objects.filter(is_active=True, team__is_temporary=False)).order_by(
+        'joined_date'
+    ).values_list('player_id', 'role')
+    role_columns = [column[f'role:{role}'] for role in ROLES]
+    for player_id, role in roles:
+        if player_id in position and f'role:{role}' in column:
+            matrix[position[player_id], role_columns] = 0
+            matrix[position[player_id], column[f'role:{role}']] = 1
+    return ids, matrix
+
+
+@transaction.atomic
+def save_vectors(player_ids=None):
+    """Rebuild and store the vectors of `player_ids` (everyone when None); returns how many were written"""
+    ids, matrix = build_vectors(player_ids)
+    now = timezone.now()
+    PlayerFeatures.objects.bulk_create([
+        PlayerFeatures(player_id=player_id, vector=vector.tobytes(), updated_at=now)
+        for player_id, vector in zip(ids.tolist(), matrix)
+    ], batch_size=1000, update_conflicts=True, unique_fields=['player'], update_fields=['vector', 'updated_at'])
+
+    # Players who no longer have any matches drop out
+    stale = PlayerFeatures.objects.exclude(player_id__in=ids.tolist()) if player_ids is None else \
+        PlayerFeatures.objects.filter(player_id__in=set(player_ids) - set(ids.tolist()))
+    stale.delete()
+    tracking.bump(PlayerFeatures)  # The bulk upsert skips the signals that move the API's ETag
+    return len(ids)
+
+
+def brute_force_limit():
+    return getattr(settings, 'SIMILARITY_BRUTE_FORCE_LIMIT', 50000)
+
+
+def rebuild_fraction():
+    return getattr(settings, 'SIMILARITY_REBUILD_FRACTION', 0.1)
+
+
+class SimilarityIndex:
+    """Scaled vectors of every player, optionally partitioned, kept in sync with PlayerFeatures"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = np.empty(0, dtype=np.int64)
+        self.raw = np.empty((0, len(FEATURES)), dtype=np.float32)
+        self.positions = {}
+        self.synced_at = None
+        self.changed = 0
+        self.build()
+
+    def build(self):
+        """Standardize, weight and (for large sets) partition the raw vectors"""
+        count = len(self.ids)
+        self.mean = self.raw.mean(axis=0) if count else np.zeros(len(FEATURES), dtype=np.float32)
+        std = self.raw.std(axis=0) if count else np.ones(len(FEATURES), dtype=np.float32)
+        self.scale = WEIGHTS / np.where(std > 1e-6, std, 1)
+        self.vectors = self.transform(self.raw)
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.changed = 0
+
+        self.centroids = self.assignment = None
+        if count > brute_force_limit():
+            self.centroids = kmeans(self.vectors, int(np.sqrt(count)))
+            self.assignment = nearest_centroid(self.vectors, self.centroids)
+
+    def transform(self, raw):
+        return ((raw - self.mean) * self.scale).astype(np.float32)
+
+    def load(self, ids, raw):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.raw = np.array(raw, dtype=np.float32).reshape(len(self.ids), len(FEATURES))  # Writable copy
+        self.positions = {player_id: index for index, player_id in enumerate(self.ids.tolist())}
+        self.build()
+
+    def update(self, ids, raw):
+        """Insert or replace vectors in place, re-partitioning once enough of the index has changed"""
+        raw = np.asarray(raw, dtype=np.float32).reshape(len(ids), len(FEATURES))
+        added_ids, added = [], []
+        for player_id, vector in zip(ids, raw):
+            index = self.positions.get(player_id)
+            if index is None:
+                added_ids.append(player_id)
+                added.append(vector)
+            else:
+                self.raw[index] = vector
+        if added_ids:
+            self.positions.update({player_id: len(self.ids) + offset for offset, player_id in enumerate(added_ids)})
+            self.ids = np.concatenate([self.ids, np.array(added_ids, dtype=np.int64)])
+            self.raw = np.concatenate([self.raw, np.array(added, dtype=np.float32)])
+
+        self.changed += len(ids)
+        partitioned = len(self.ids) > brute_force_limit()
+        if self.changed > rebuild_fraction() * len(self.ids) or partitioned != (self.centroids is not None):
+            self.build()
+            return
+
+        # Scaled with the current standardization; the next rebuild re-fits it
+        indexes = np.array([self.positions[player_id] for player_id in ids], dtype=np.intp)
+        vectors = self.transform(self.raw[indexes])
+        if added_ids:
+            self.vectors = np.concatenate([self.vectors, np.empty((len(added_ids), len(FEATURES)), dtype=np.float32)])
+            self.norms = np.concatenate([self.norms, np.empty(len(added_ids), dtype=np.float32)])
+            if self.assignment is not None:
+                self.assignment = np.concatenate([self.assignment, np.empty(len(added_ids), dtype=self.assignment.dtype)])
+        self.vectors[indexes] = vectors
+        self.norms[indexes] = np.einsum('ij,ij->i', vectors, vectors)
+        if self.assignment is not None:
+            self.assignment[indexes] = nearest_centroid(vectors, self.centroids)
+
+    def remove(self, ids):
+        """Drop players whose vectors were deleted"""
+        keep = ~np.isin(self.ids, np.fromiter(ids, dtype=np.int64))
+        self.ids, self.raw = self.ids[keep], self.raw[keep]
+        self.positions = {player_id: index for index, player_id in enumerate(self.ids.tolist())}
+        self.build()
+
+    def sync(self):
+        """Pull in vectors written since the last sync - all of them the first time - and drop deleted ones"""
+        with self.lock:
+            started = timezone.now()
+            rows = PlayerFeatures.objects.all()
+            if self.synced_at is not None:
+                rows = rows.filter(updated_at__gte=self.synced_at - SYNC_OVERLAP)
+            rows = list(rows.values_list('player_id', 'vector'))
+            ids = [player_id for player_id, _ in rows]
+            raw = np.frombuffer(b''.join(bytes(vector) for _, vector in rows), dtype=np.float32)
+            if self.synced_at is None:
+                self.load(ids, raw)
+            else:
+                if rows:
+                    self.update(ids, raw)
+                # Only a deletion leaves the index larger than the table
+                if PlayerFeatures.objects.count() != len(self.ids):
+                    stored = set(PlayerFeatures.objects.values_list('player_id', flat=True))
+                    self.remove(set(self.positions) - stored)
+            self.synced_at = started
+
+    def search(self, player_id, limit=10):
+        """[(player id, distance)] of the `limit` players closest to `player_id`, nearest first"""
+        with self.lock:
+            return self._search(player_id, limit)
+
+    def _search(self, player_id, limit):
+        index = self.positions.get(player_id)
+        if index is None:
+            return []
+        query = self.vectors[index]
+        if self.centroids is None:
+            candidates = np.arange(len(self.ids))
+        else:
+            probes = getattr(settings, 'SIMILARITY_PROBES', 8)
+            centroid_distances = ((self.centroids - query) ** 2).sum(axis=1)
+            nearest = np.argpartition(centroid_distances, min(probes, len(self.centroids)) - 1)[:probes]
+            probed = np.zeros(len(self.centroids), dtype=bool)
+            probed[nearest] = True
+            candidates = np.flatnonzero(probed[self.assignment])
+
+        # |a - b|^2 = |a|^2 - 2ab + |b|^2, without materializing the differences
+        distances = self.norms[candidates] - 2 * (self.vectors[candidates] @ query) + self.norms[index]
+        distances[candidates == index] = np.inf
+        limit = min(limit, len(candidates) - 1)
+        if limit <= 0:
+            return []
+        best = np.argpartition(distances, limit - 1)[:limit]
+        best = best[np.argsort(distances[best], kind='stable')]
+        return [(int(self.ids[candidates[i]]), float(np.sqrt(max(distances[i], 0)))) for i in best]
+
+
+def kmeans(vectors, clusters, iterations=8, sample=40, seed=0):
+    """Centroids fitted on a sample of at most `sample` rows per cluster"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > clusters * sample:
+        vectors = vectors[rng.choice(len(vectors), clusters * sample, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = nearest_centroid(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def nearest_centroid(vectors, centroids, chunk=8192):
+    """Index of the closest centroid for every row, a chunk of rows at a time to bound memory"""
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        block = vectors[start:start + chunk]
+        assignment[start:start + chunk] = np.argmin(centroid_norms - 2 * (block @ centroids.T), axis=1)
+    return assignment
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex()
+    return _index
+
+
+def similar_players(player_id, limit=10):
+    """[{'player', 'distance', 'similarity'}] for the players who play most like `player_id`"""
+    index = get_index()
+    index.sync()
+    found = index.search(player_id, limit)
+    players = User.objects.in_bulk([other_id for other_id, _ in found])
+    return [{
+        'player': players[other_id],
+        'distance': round(distance, 3),
+        'similarity': round(100 / (1 + distance), 1),
+    } for other_id, distance in found if other_id in players]
@@ -0,0 +1,70 @@
+from django.db.models import Count, F, Q, Sum
+from tasks.queue import task
+from matches.models import Match, PlayerMatchStats
+from .models import MapStats
+from . import percentiles, rollups, similarity
+
+
+@task
+def recompute_player_stats(player_id):
+    """Rebuild a player's MapStats from their finished matches, dropping maps they no longer have any on"""
+    won_map = (
+        Q(team=F('match__team1'), match__team1_score__gt=F('match__team2_score')) |
+        Q(team=F('match__team2'), match__team2_score__gt=F('match__team1_score'))
+    )
+    per_map = PlayerMatchStats.objects.filter(
+        player_id=player_id, match__is_finished=True
+    ).values('match__map_name').annotate(
+        played=Count('id'),
+        won=Count('id', filter=won_map),
+        kills=Sum('kills'),
+        deaths=Sum('deaths'),
+    )
+
+    maps = []
+    for row in per_map:
+        maps.append(row['match__map_name'])
+        MapStats.objects.update_or_create(
+            player_id=player_id,
+            map_name=row['match__map_name'],
+            defaults={
+                'matches_played': row['played'],
+                'matches_won': row['won'],
+                'total_kills': row['kills'] or 0,
+                'total_deaths': row['deaths'] or 0,
+            }
+        )
+    MapStats.objects.filter(player_id=player_id).exclude(map_name__in=maps).delete()
+
+
+@task
+def recompute_match_stats(match_id):
+    """Fan out per-player recomputes for everyone who played a match"""
+    player_ids = list(PlayerMatchStats.objects.filter(match_id=match_id).values_list('player_id', flat=True))
+    refresh_rollups.enqueue(match_id, unique_key=f'rollups:{match_id}')
+    for player_id in player_ids:
+        recompute_player_stats.enqueue(player_id, unique_key=f'player-stats:{player_id}')
+    if player_ids:
+        refresh_percentiles.enqueue(player_ids, unique_key=f'percentiles:{match_id}')
+        # Queued after the MapStats recomputes above, which the map mix is read from
+        refresh_player_features.enqueue(player_ids, unique_key=f'features:{match_id}')
+
+
+@task
+def refresh_percentiles(player_ids):
+    """Re-rank a finished match's players in the percentile tables"""
+    percentiles.refresh_players(player_ids)
+
+
+@task
+def refresh_player_features(player_ids):
+    """Rebuild the similar-player search vectors of a finished match's players"""
+    similarity.save_vectors(player_ids)
+
+
+@task
+def refresh_rollups(match_id):
+    """Re-total the day and month buckets a finished match falls in"""
+    match = Match.objects.filter(pk=match_id, is_finished=True).first()
+    if match is not None:
+        rollups.refresh_match(match)
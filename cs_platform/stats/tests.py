@@ -1,3 +1,441 @@
 from django.test import TestCase
 
 # Create your tests here.
+
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F, Sum
+from django.test import override_settings
+from django.urls import reverse
+from io import StringIO
+from datetime import date, timedelta
+from django.utils import timezone
+from matches.models import Match, PlayerMatchStats
+from stats import buckets, percentiles, rollups, similarity
+from stats.models import MapStats, PercentileTable, PlayerFeatures, StatsBucket, WeaponStats
+from stats.comparison import MAX_PLAYERS, ComparisonError, career_totals, compare_players, parse_player_ids
+from stats.tasks import recompute_player_stats
+
+User = get_user_model()
+
+
+class GenerateLeagueTest(TestCase):
+    def generate(self, **options):
+        call_command('generate_league', players=20, teams=4, tournaments=2, matches=30,
+                     chunk_size=7, stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return list(PlayerMatchStats.objects.order_by('match_id', 'player__username').values_list(
+            'match_id', 'player__username', 'kills', 'deaths', 'headshots'))
+
+    def test_generates_full_stat_rows(self):
+        """Test that every match gets ten stat rows and the totals agree with them"""
+        self.generate()
+        self.assertEqual(Match.objects.filter(is_finished=True).count(), 30)
+        self.assertEqual(PlayerMatchStats.objects.count(), 300)
+
+        total_kills = PlayerMatchStats.objects.aggregate(total=Sum('kills'))['total']
+        self.assertEqual(MapStats.objects.aggregate(total=Sum('total_kills'))['total'], total_kills)
+        self.assertEqual(WeaponStats.objects.aggregate(total=Sum('total_kills'))['total'], total_kills)
+
+        # Same totals as the background recompute would produce
+        map_stats = MapStats.objects.first()
+        before = (map_stats.matches_played, map_stats.matches_won, map_stats.total_kills)
+        recompute_player_stats(map_stats.player_id)
+        map_stats.refresh_from_db()
+        self.assertEqual((map_stats.matches_played, map_stats.matches_won, map_stats.total_kills), before)
+
+    def test_same_seed_is_reproducible(self):
+        """Test that a cleared and regenerated league is identical"""
+        self.generate()
+        first = [row[1:] for row in self.snapshot()]
+        self.generate(clear=True)
+        self.assertEqual([row[1:] for row in self.snapshot()], first)
+        self.assertEqual(PlayerMatchStats.objects.count(), 300)
+
+
+@override_settings(QUERY_LOG_ENABLED=False)
+class PlayerComparisonTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_league', players=30, teams=4, tournaments=1, matches=20, stdout=StringIO())
+        cls.player_ids = list(
+            PlayerMatchStats.objects.values_list('player_id', flat=True).distinct().order_by('player_id')
+        )
+
+    def test_totals_match_per_player_aggregates(self):
+        """Test that the grouped totals equal a per-player aggregate"""
+        comparison = compare_players(self.player_ids[:3])
+        for entry in comparison['players']:
+            expected = PlayerMatchStats.objects.filter(player=entry['player']).aggregate(
+                kills=Sum('kills'), deaths=Sum('deaths'), damage=Sum('damage_dealt')
+            )
+            stats = entry['stats']
+            self.assertEqual((stats['total_kills'], stats['total_deaths'], stats['total_damage']),
+                             (expected['kills'], expected['deaths'], expected['damage']))
+            self.assertEqual(stats['kd_ratio'], round(expected['kills'] / max(expected['deaths'], 1), 2))
+            self.assertEqual(sum(weapon['kills'] for weapon in entry['weapons']), stats['total_kills'])
+            self.assertEqual(sum(row['matches'] for row in entry['maps']), stats['match_count'])
+
+    def test_query_count_does_not_grow_with_players(self):
+        """Test that comparing twenty players takes as many queries as comparing two"""
+        with self.assertNumQueries(5):
+            compare_players(self.player_ids[:2])
+        with self.assertNumQueries(5):
+            comparison = compare_players(self.player_ids[:20])
+        self.assertEqual([entry['player'].id for entry in comparison['players']], self.player_ids[:20])
+        self.assertIn(comparison['leaders']['kd_ratio'], self.player_ids[:20])
+
+    def test_parse_player_ids(self):
+        """Test that ids are de-duplicated in order and the player limit is enforced"""
+        self.assertEqual(parse_player_ids(['3,1', '3', '2']), [3, 1, 2])
+        with self.assertRaises(ComparisonError):
+            parse_player_ids([','.join(str(i) for i in range(MAX_PLAYERS + 1))])
+        with self.assertRaises(ComparisonError):
+            parse_player_ids(['1,x'])
+        with self.assertRaises(ComparisonError):
+            parse_player_ids(['1'])
+
+    def test_view_renders_every_player(self):
+        """Test that the comparison page shows all selected players, old parameters included"""
+        players = User.objects.filter(id__in=self.player_ids[:5])
+        ids = ','.join(str(player.id) for player in players)
+        response = self.client.get(reverse('player_comparison'), {'players': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['comparison_data']['players']), 5)
+        for player in players:
+            self.assertContains(response, player.username)
+
+        response = self.client.get(reverse('player_comparison'), {
+            'player1': self.player_ids[0], 'player2': self.player_ids[1]
+        })
+        self.assertEqual(len(response.context['comparison_data']['players']), 2)
+
+    def test_api_comparison(self):
+        """Test the comparison API, its player limit and unknown ids"""
+        url = reverse('api_player_comparison')
+        response = self.client.get(url, {'players': ','.join(map(str, self.player_ids[:4]))})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([entry['player']['id'] for entry in data['players']], self.player_ids[:4])
+        self.assertIn('kd_ratio', data['players'][0]['stats'])
+
+        too_many = ','.join(str(i) for i in range(1, MAX_PLAYERS + 2))
+        self.assertEqual(self.client.get(url, {'players': too_many}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'players': f'{self.player_ids[0]},999999'}).status_code, 404)
+
+
+@override_settings(QUERY_LOG_ENABLED=False)
+class PercentileTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_league', players=40, teams=4, tournaments=1, matches=30, stdout=StringIO())
+
+    def all_kd_ratios(self):
+        totals = career_totals(list(User.objects.values_list('id', flat=True)))
+        return {player_id: stats for player_id, stats in totals.items() if stats['match_count']}
+
+    def test_lookup_matches_a_full_sort(self):
+        """Test that table lookups give the same percentile as ranking every player on the fly"""
+        totals = self.all_kd_ratios()
+        values = sorted(percentiles.metric_values(stats)['kd_ratio'] for stats in totals.values())
+        tables = percentiles.load_tables(['all'])
+        self.assertEqual(len(tables[('all', 'kd_ratio')]), len(values))
+
+        for player_id, stats in list(totals.items())[:10]:
+            value = percentiles.metric_values(stats)['kd_ratio']
+            below = sum(1 for other in values if other < value)
+            equal = sum(1 for other in values if other == value)
+            expected = round((below + equal / 2) / len(values) * 100, 1)
+            self.assertEqual(percentiles.percentiles(tables, stats, ['all'])['all']['kd_ratio'], expected)
+
+    def test_scopes(self):
+        """Test that pro, community and rank tables partition the players"""
+        tables = percentiles.load_tables(['all', 'pro', 'community'])
+        size = len(tables[('all', 'adr')])
+        self.assertEqual(len(tables.get(('pro', 'adr'), [])) + len(tables.get(('community', 'adr'), [])), size)
+        rank_sizes = PercentileTable.objects.filter(scope__startswith='rank:', metric='adr').aggregate(total=Sum('size'))
+        self.assertEqual(rank_sizes['total'], size)
+
+    def test_incremental_refresh_matches_rebuild(self):
+        """Test that re-ranking one match's players gives the same tables as a full rebuild"""
+        match = Match.objects.filter(is_finished=True).first()
+        player_ids = list(match.player_stats.values_list('player_id', flat=True))
+        PlayerMatchStats.objects.filter(match=match).update(kills=40, deaths=2)
+        # A promotion moves the player between scopes
+        User.objects.filter(id=player_ids[0]).update(is_professional=True, rank='global_elite')
+
+        # Lock the tables, aggregate the match's players, one bulk update, the version bump - plus the savepoint pair
+        with self.assertNumQueries(6):
+            percentiles.refresh_players(player_ids)
+        refreshed = {(t.scope, t.metric): bytes(t.values) for t in PercentileTable.objects.all() if t.size}
+        percentiles.build_tables()
+        rebuilt = {(t.scope, t.metric): bytes(t.values) for t in PercentileTable.objects.all() if t.size}
+        self.assertEqual(refreshed, rebuilt)
+
+    def test_finished_match_queues_refresh(self):
+        """Test that finishing a match re-ranks its players in the background"""
+        from tasks.queue import run_pending
+        match = Match.objects.filter(is_finished=True).first()
+        player = match.player_stats.first().player
+
+        def kpr_percentile():
+            return percentiles.player_percentiles(player, career_totals([player.id])[player.id])['all']['kpr']
+
+        PlayerMatchStats.objects.filter(match=match, player=player).update(kills=200)
+        self.assertEqual(kpr_percentile(), 100)  # Above every value in the stale table, its own old one included
+        with self.captureOnCommitCallbacks(execute=True):
+            match.save()
+        run_pending()
+        # Now ranked against everyone else: the top of n players is at 100 - 50 / n
+        self.assertEqual(kpr_percentile(), 100 - 50 / PercentileTable.objects.get(scope='all', metric='kpr').size)
+
+    def test_profile_and_comparison_show_percentiles(self):
+        """Test that the player page and the comparison show percentiles"""
+        player_ids = list(self.all_kd_ratios())[:2]
+        response = self.client.get(reverse('player_detail', kwargs={'pk': player_ids[0]}))
+        self.assertEqual(len(response.context['percentile_rows']), len(percentiles.METRIC_LABELS))
+
+        response = self.client.get(reverse('api_player_comparison'), {'players': ','.join(map(str, player_ids))})
+        self.assertIn('kd_ratio', response.json()['players'][0]['percentiles']['all'])
+
+    def test_rebuild_changes_comparison_etag(self):
+        """Test that a table rebuild invalidates cached comparisons"""
+        url = reverse('api_player_comparison') + '?players=' + ','.join(map(str, list(self.all_kd_ratios())[:2]))
+        etag = self.client.get(url)['ETag']
+        PlayerMatchStats.objects.update(kills=F('kills') + 5)  # No signals: only the rebuild can move the ETag
+        percentiles.build_tables()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(QUERY_LOG_ENABLED=False)
+class SimilarityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_league', players=60, teams=6, tournaments=1, matches=40, stdout=StringIO())
+
+    def setUp(self):
+        similarity._index = None  # Each test's database starts from its own snapshot
+
+    def test_vectors(self):
+        """Test that weapon and map mixes are shares and every ranked player has one role"""
+        ids, matrix = similarity.build_vectors()
+        self.assertEqual(len(ids), PlayerFeatures.objects.count())
+        columns = {name: index for index, name in enumerate(similarity.FEATURES)}
+        for prefix in ('weapon:', 'map:', 'role:'):
+            block = matrix[:, [index for name, index in columns.items() if name.startswith(prefix)]]
+            self.assertTrue(np.allclose(block.sum(axis=1), 1, atol=1e-5), prefix)
+
+    def test_partitioned_index_matches_brute_force(self):
+        """Test that the partitioned index finds the same neighbours when every partition is probed"""
+        rng = np.random.default_rng(1)
+        ids = np.arange(1, 2001)
+        raw = rng.normal(size=(2000, len(similarity.FEATURES))).astype(np.float32)
+        exact = similarity.SimilarityIndex()
+        exact.load(ids, raw)
+        with override_settings(SIMILARITY_BRUTE_FORCE_LIMIT=100, SIMILARITY_PROBES=1000):
+            partitioned = similarity.SimilarityIndex()
+            partitioned.load(ids, raw)
+            self.assertIsNotNone(partitioned.centroids)
+            for player_id in (1, 500, 2000):
+                self.assertEqual([i for i, _ in partitioned.search(player_id, 10)],
+                                 [i for i, _ in exact.search(player_id, 10)])
+
+    def test_incremental_update_matches_rebuild(self):
+        """Test that an in-place update finds the same neighbours as an index built from scratch"""
+        rng = np.random.default_rng(2)
+        raw = rng.normal(size=(1000, len(similarity.FEATURES))).astype(np.float32)
+        index = similarity.SimilarityIndex()
+        index.load(np.arange(1000), raw)
+
+        changed = rng.normal(size=(5, len(similarity.FEATURES))).astype(np.float32)
+        index.update([3, 4, 1000, 1001, 1002], changed)  # Two replaced, three new
+        self.assertEqual(index.changed, 5)  # Updated in place, no rebuild
+
+        expected = np.concatenate([raw, changed[2:]])
+        expected[[3, 4]] = changed[:2]
+        fresh = similarity.SimilarityIndex()
+        fresh.load(np.arange(1003), expected)
+        fresh.mean, fresh.scale = index.mean, index.scale  # Same standardization as the live index
+        fresh.vectors = fresh.transform(fresh.raw)
+        fresh.norms = np.einsum('ij,ij->i', fresh.vectors, fresh.vectors)
+        for player_id in (3, 1001, 10):
+            self.assertEqual([i for i, _ in index.search(player_id, 10)], [i for i, _ in fresh.search(player_id, 10)])
+
+    def test_finished_match_refreshes_vectors(self):
+        """Test that finishing a match rewrites its players' vectors and the next search sees them"""
+        from tasks.queue import run_pending
+        match = Match.objects.filter(is_finished=True).first()
+        player_id = match.player_stats.first().player_id
+        self.assertEqual(len(similarity.similar_players(player_id, limit=5)), 5)
+        before = bytes(PlayerFeatures.objects.get(player_id=player_id).vector)
+
+        PlayerMatchStats.objects.filter(match=match, player_id=player_id).update(kills=90, headshots=80)
+        with self.captureOnCommitCallbacks(execute=True):
+            match.save()
+        run_pending()
+        after = PlayerFeatures.objects.get(player_id=player_id)
+        self.assertNotEqual(bytes(after.vector), before)
+
+        index = similarity.get_index()
+        index.sync()
+        position = index.positions[player_id]
+        self.assertEqual(index.raw[position].tobytes(), bytes(after.vector))
+
+    def test_player_page_and_api(self):
+        """Test that the player page and the API list similar players"""
+        player_id = PlayerFeatures.objects.values_list('player_id', flat=True).first()
+        response = self.client.get(reverse('player_detail', kwargs={'pk': player_id}))
+        self.assertEqual(len(response.context['similar_players']), 5)
+
+        response = self.client.get(reverse('api_similar_players', kwargs={'pk': player_id}), {'limit': 3})
+        data = response.json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertNotIn(player_id, [result['player']['id'] for result in data['results']])
+        distances = [result['distance'] for result in data['results']]
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual(self.client.get(reverse('api_similar_players', kwargs={'pk': 999999})).status_code, 404)
+
+    def test_dropped_player_leaves_index_and_etag_moves(self):
+        """Test that a player whose vector is deleted drops out of searches and cached responses"""
+        player_id, other_id = PlayerFeatures.objects.values_list('player_id', flat=True)[:2]
+        url = reverse('api_similar_players', kwargs={'pk': other_id}) + '?limit=50'
+        response = self.client.get(url)
+        self.assertIn(player_id, [result['player']['id'] for result in response.json()['results']])
+
+        PlayerMatchStats.objects.filter(player_id=player_id).delete()
+        similarity.save_vectors()
+        self.assertFalse(PlayerFeatures.objects.filter(player_id=player_id).exists())
+
+        refreshed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertNotIn(player_id, [result['player']['id'] for result in refreshed.json()['results']])
+        self.assertNotIn(player_id, similarity.get_index().positions)
+
+
+class RollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_league', players=40, teams=4, tournaments=1, matches=120, stdout=StringIO())
+
+    def scanned(self, start, end, field='player_id'):
+        """{subject: kills} straight from PlayerMatchStats, the full scan the buckets replace"""
+        kills = {}
+        for row in PlayerMatchStats.objects.filter(match__is_finished=True).values(
+            field, 'match__match_date', 'kills'
+        ):
+            day = timezone.localdate(row['match__match_date'])
+            if (start is None or day >= start) and (end is None or day <= end):
+                kills[str(row[field])] = kills.get(str(row[field]), 0) + row['kills']
+        return kills
+
+    def snapshot(self):
+        return sorted(StatsBucket.objects.values_list('scope', 'subject', 'period', 'start', 'kills', 'running_kills',
+                                                      'matches', 'wins', 'is_latest'))
+
+    def test_ranges_match_a_full_scan(self):
+        """Test that month-plus-day bucket sums and running-total differences give the scanned totals"""
+        today = timezone.localdate()
+        ranges = [(None, None), (today - timedelta(days=29), today), (today - timedelta(days=400), today - timedelta(days=45)),
+                  (date(today.year, 1, 1), None), (today - timedelta(days=90), today - timedelta(days=88))]
+        for start, end in ranges:
+            expected = self.scanned(start, end)
+            with self.assertNumQueries(1):
+                totals = rollups.range_totals('player', start, end)
+            self.assertEqual({subject: row['kills'] for subject, row in totals.items() if row['kills']},
+                             {subject: kills for subject, kills in expected.items() if kills}, (start, end))
+
+        player_id = next(iter(self.scanned(None, None)))
+        with self.assertNumQueries(2):
+            by_running_totals = rollups.subject_totals('player', player_id, ranges)
+        for (start, end), row in zip(ranges, by_running_totals):
+            self.assertEqual(row['kills'], self.scanned(start, end).get(player_id, 0), (start, end))
+
+        maps = rollups.range_totals('map', *ranges[2])
+        self.assertEqual({name: row['kills'] for name, row in maps.items() if row['kills']},
+                         {name: kills for name, kills in self.scanned(*ranges[2], 'match__map_name').items() if kills})
+        teams = rollups.range_totals('team')
+        self.assertEqual(sum(row['matches'] for row in teams.values()), 2 * Match.objects.filter(is_finished=True).count())
+
+    def test_all_time_reads_one_bucket_per_subject(self):
+        """Test that all-time totals come from exactly one month bucket per subject"""
+        for scope in rollups.SCOPES:
+            latest = StatsBucket.objects.filter(scope=scope, period='month', is_latest=True)
+            subjects = StatsBucket.objects.filter(scope=scope, period='month').values('subject').distinct()
+            self.assertEqual(latest.count(), subjects.count())
+            self.assertEqual(latest.values('subject').distinct().count(), latest.count())
+
+    def test_pieces(self):
+        """Test that whole months come from month buckets and only the ragged ends from days"""
+        self.assertEqual(rollups._pieces(date(2025, 1, 15), date(2025, 4, 10)), [
+            ('day', date(2025, 1, 15), date(2025, 1, 31)),
+            ('day', date(2025, 4, 1), date(2025, 4, 10)),
+            ('month', date(2025, 2, 1), date(2025, 3, 1)),
+        ])
+        self.assertEqual(rollups._pieces(date(2025, 2, 1), date(2025, 2, 28)), [('month', date(2025, 2, 1), date(2025, 2, 1))])
+        self.assertEqual(rollups._pieces(date(2025, 2, 3), date(2025, 2, 5)), [('day', date(2025, 2, 3), date(2025, 2, 5))])
+        self.assertEqual(rollups._pieces(None, None), [('month', None, None)])
+        self.assertEqual(rollups._pieces(date(2025, 3, 1), date(2025, 2, 1)), [])
+
+    def test_parallel_backfill_matches_inline(self):
+        """Test that buckets built in worker processes match the inline build"""
+        rng = np.random.default_rng(3)
+        codes, days = rng.integers(0, 50, 2000), rng.integers(19000, 19800, 2000)
+        totals = rng.integers(0, 30, (2000, len(rollups.METRICS)))
+        inline = buckets.rollup_all(codes, days, totals)
+        parallel = buckets.rollup_all(codes, days, totals, workers=2, chunks=4)
+        for period in ('day', 'month'):
+            for part in range(4):
+                self.assertTrue(np.array_equal(np.concatenate([share[period][part] for share in parallel]),
+                                               inline[0][period][part]))
+
+    def test_incremental_refresh_matches_rebuild(self):
+        """Test that finishing a match and adding a late stat line keep the buckets equal to a rebuild"""
+        from tasks.queue import run_pending
+        played = Match.objects.filter(is_finished=True).order_by('match_date')[10]
+        team1, team2 = played.team1, played.team2
+        match = Match.objects.create(team1=team1, team2=team2, map_name='mirage', match_date=played.match_date)
+        player = played.player_stats.filter(team=team1).first().player
+        PlayerMatchStats.objects.create(match=match, player=player, team=team1, kills=31, deaths=12)
+        with self.captureOnCommitCallbacks(execute=True):
+            match.team1_score, match.team2_score, match.is_finished = 13, 4, True
+            match.save()
+        run_pending()
+
+        other = played.player_stats.filter(team=team2).first().player
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayerMatchStats.objects.create(match=match, player=other, team=team2, kills=9, deaths=20)
+        run_pending()
+
+        # A match months after everything else moves the players' latest buckets
+        later = Match.objects.create(team1=team1, team2=team2, map_name='nuke',
+                                     match_date=Match.objects.latest('match_date').match_date + timedelta(days=70))
+        PlayerMatchStats.objects.create(match=later, player=player, team=team1, kills=20, deaths=15)
+        with self.captureOnCommitCallbacks(execute=True):
+            later.team1_score, later.team2_score, later.is_finished = 13, 9, True
+            later.save()
+        run_pending()
+
+        refreshed = self.snapshot()
+        rollups.backfill()
+        self.assertEqual(refreshed, self.snapshot())
+
+    def test_leaderboard_ranges(self):
+        """Test that the leaderboard takes preset and custom ranges and falls back on bad dates"""
+        response = self.client.get(reverse('leaderboard'), {'range': '30d'})
+        self.assertEqual(response.context['range_key'], '30d')
+        expected = self.scanned(timezone.localdate() - timedelta(days=29), timezone.localdate())
+        top = max(expected.items(), key=lambda item: (item[1], -int(item[0])))
+        self.assertEqual((str(response.context['top_killers'][0].id), response.context['top_killers'][0].total_kills), top)
+
+        response = self.client.get(reverse('leaderboard'), {'from': 'yesterday'})
+        self.assertEqual(response.context['range_key'], 'all')
+        self.assertContains(response, 'showing all time')
+
+        player = User.objects.get(id=int(top[0]))
+        response = self.client.get(reverse('player_detail', kwargs={'pk': player.id}))
+        self.assertEqual(response.context['form_rows'][0]['kills'], top[1])
@@ -1,174 +1,60 @@
 from django.shortcuts import render, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView
-from django.db.models import Sum, Avg, Count, F, Q
+from django.db.models import Sum, Count, F, Q
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta, datetime
 import random
 import hashlib
 from .models import WeaponStats, MapStats
+from . import percentiles, rollups
+from .comparison import MAX_PLAYERS, ComparisonError, compare_players, parse_player_ids
 from matches.models import PlayerMatchStats, Match
 from teams.models import Team
 
 User = get_user_model()
 
+MAP_NAMES = dict(MapStats.MAP_CHOICES)
+
 def set_mock_seed():
     """Set consistent seed for reproducible mock data"""
     random.seed(42)
 
 # Enhanced Player Comparison Tool
 def player_comparison(request):
-    print("=== DEBUG INFO ===")
-    print(f"GET params: {request.GET}")
-    print(f"Player1 ID: '{request.GET.get('player1')}'")
-    print(f"Player2 ID: '{request.GET.get('player2')}'")
-
-    player1_id = request.GET.get('player1')
-    player2_id = request.GET.get('player2')
+    """Compare up to MAX_PLAYERS players: ?players=1,2,3 (or the older ?player1=&player2=)"""
+    values = request.GET.getlist('players') + [
+        request.GET[name] for name in ('player1', 'player2') if request.GET.get(name)
+    ]
 
-    player1 = None
-    player2 = None
     comparison_data = None
-
-    if player1_id and player2_id:
-        print(f"Both players selected! Looking for ID {player1_id} and {player2_id}")
+    error = None
+    selected_ids = []
+    if values:
         try:
-            player1 = get_object_or_404(User, id=player1_id)
-            player2 = get_object_or_404(User, id=player2_id)
-            print(f"Found players: {player1.username} and {player2.username}")
-
-            # Generate comparison data
-            comparison_data = generate_player_comparison(player1, player2)
-            print(f"Generated comparison data: {bool(comparison_data)}")
-
-        except Exception as e:
-            print(f"ERROR finding players: {e}")
-            player1 = player2 = None
-    else:
-        print("Not both players selected!")
+            selected_ids = parse_player_ids(values)
+            comparison_data = percentiles.add_to_comparison(compare_players(selected_ids))
+        except ComparisonError as e:
+            error = str(e)
 
     # Get all players for selection
     all_players = User.objects.filter(
         Q(match_stats__isnull=False) | Q(is_professional=True)
-    ).distinct().order_by('username')[:35]
+    ).distinct().order_by('username')[:100]
 
     context = {
-        'player1': player1,
-        'player2': player2,
         'comparison_data': comparison_data,
+        'error': error,
+        'selected_ids': selected_ids,
+        'max_players': MAX_PLAYERS,
         'all_players': all_players,
     }
 
     return render(request, 'stats/player_comparison.html', context)
 
 
-def generate_player_comparison(player1, player2):
-    """Generate comprehensive comparison data between two players"""
-
-    # Basic stats with mock data enhancement
-    def get_enhanced_player_stats(player):
-        # Real stats from database
-        real_stats = player.match_stats.aggregate(
-            total_kills=Sum('kills'),
-            total_deaths=Sum('deaths'),
-            total_assists=Sum('assists'),
-            total_headshots=Sum('headshots'),
-            total_damage=Sum('damage_dealt'),
-            match_count=Count('match')
-        )
-
-        # Fix None values to 0
-        for key, value in real_stats.items():
-            if value is None:
-                real_stats[key] = 0
-
-        # Enhanced with realistic mock data if low/no real data
-        if real_stats['match_count'] < 5:
-            # Generate realistic stats for demo
-            base_matches = max(real_stats['match_count'], 15)
-            mock_stats = {
-                'total_kills': real_stats['total_kills'] + (base_matches * 18),  # ~18 kills per match
-                'total_deaths': real_stats['total_deaths'] + (base_matches * 14),  # ~14 deaths per match
-                'total_assists': real_stats['total_assists'] + (base_matches * 6),  # ~6 assists per match
-                'total_headshots': real_stats['total_headshots'] + (base_matches * 8),  # ~44% HS rate
-                'total_damage': real_stats['total_damage'] + (base_matches * 2300),  # ~2300 ADR
-                'match_count': base_matches
-            }
-            return mock_stats
-
-        return real_stats
-
-    # Get enhanced stats for both players
-    p1_stats = get_enhanced_player_stats(player1)
-    p2_stats = get_enhanced_player_stats(player2)
-
-    # Calculate derived stats
-    def calculate_derived_stats(stats):
-        derived = {}
-        derived['kd_ratio'] = round(stats['total_kills'] / max(stats['total_deaths'], 1), 2)
-        derived['adr'] = round(stats['total_damage'] / max(stats['match_count'], 1), 1)
-        derived['kpr'] = round(stats['total_kills'] / max(stats['match_count'], 1), 1)
-        derived['hs_percentage'] = round((stats['total_headshots'] / max(stats['total_kills'], 1)) * 100, 1)
-        derived['assists_per_match'] = round(stats['total_assists'] / max(stats['match_count'], 1), 1)
-        return derived
-
-    p1_derived = calculate_derived_stats(p1_stats)
-    p2_derived = calculate_derived_stats(p2_stats)
-
-    # Mock weapon preferences
-    weapon_preferences = {
-        player1.id: [
-            {'weapon': 'AK-47', 'kills': p1_stats['total_kills'] // 3, 'percentage': 33.2},
-            {'weapon': 'M4A4', 'kills': p1_stats['total_kills'] // 4, 'percentage': 25.1},
-            {'weapon': 'AWP', 'kills': p1_stats['total_kills'] // 8, 'percentage': 12.8},
-        ],
-        player2.id: [
-            {'weapon': 'AK-47', 'kills': p2_stats['total_kills'] // 3, 'percentage': 31.8},
-            {'weapon': 'AWP', 'kills': p2_stats['total_kills'] // 5, 'percentage': 19.2},
-            {'weapon': 'M4A1-S', 'kills': p2_stats['total_kills'] // 4, 'percentage': 24.3},
-        ]
-    }
-
-    # Mock map performance
-    map_performance = {
-        player1.id: [
-            {'map': 'Dust 2', 'matches': 25, 'wins': 16, 'win_rate': 64.0, 'avg_kills': 19.2, 'kd': 1.34},
-            {'map': 'Mirage', 'matches': 22, 'wins': 12, 'win_rate': 54.5, 'avg_kills': 17.8, 'kd': 1.18},
-            {'map': 'Inferno', 'matches': 18, 'wins': 11, 'win_rate': 61.1, 'avg_kills': 18.5, 'kd': 1.28},
-            ],
-        player2.id: [
-            {'map': 'Mirage', 'matches': 28, 'wins': 18, 'win_rate': 64.3, 'avg_kills': 20.1, 'kd': 1.42},
-            {'map': 'Dust 2', 'matches': 24, 'wins': 13, 'win_rate': 54.2, 'avg_kills': 18.7, 'kd': 1.21},
-            {'map': 'Inferno', 'matches': 20, 'wins': 14, 'win_rate': 70.0, 'avg_kills': 19.8, 'kd': 1.51},
-        ]
-    }
-
-    # Team history
-    team_history = {
-        player1.id: [
-            {'team': 'Team Vitality', 'period': '2024-2025', 'matches': 45, 'wins': 28},
-            {'team': 'MOUZ', 'period': '2023-2024', 'matches': 67, 'wins': 38},
-            {'team': 'BIG', 'period': '2022-2023', 'matches': 52, 'wins': 24},
-        ],
-        player2.id: [
-            {'team': 'NAVI', 'period': '2024-2025', 'matches': 42, 'wins': 31},
-            {'team': 'G2 Esports', 'period': '2023-2024', 'matches': 58, 'wins': 34},
-            {'team': 'FaZe Clan', 'period': '2022-2023', 'matches': 61, 'wins': 35},
-        ]
-    }
-
-    return {
-        'basic_stats': {
-            player1.id: {**p1_stats, **p1_derived},
-            player2.id: {**p2_stats, **p2_derived}
-        },
-        'weapon_preferences': weapon_preferences,
-        'map_performance': map_performance,
-        'team_history': team_history,
-    }
-
-
 # Enhanced Match History for Teams
 def team_match_history(request, team_id):
     """Show enhanced match history for a team with last 5 matches"""
@@ -502,34 +388,39 @@ class MapStatsView(ListView):
 
 
 def leaderboard(request):
-
-    # Top players by total kills
-    top_killers = User.objects.annotate(
-        total_kills=Sum('match_stats__kills'),
-        total_deaths=Sum('match_stats__deaths'),
-        total_matches=Count('match_stats'),
-        avg_kills=Avg('match_stats__kills')
-    ).filter(
-        total_kills__gt=0
-    ).order_by('-total_kills')[:10]
-
-    # Calculate K/D ratios for real players
-    for player in top_killers:
-        if player.total_deaths and player.total_deaths > 0:
+    try:
+        start, end, range_key = rollups.requested_range(request.GET)
+    except ValueError:
+        messages.warning(request, 'Dates must look like 2025-01-31 - showing all time instead.')
+        start, end, range_key = None, None, 'all'
+
+    # Range totals come from the day and month buckets, not a scan of every stat line;
+    # all time reads one running-total row per player
+    totals = rollups.range_totals('player', start, end)
+    by_kills = sorted((subject for subject in totals if totals[subject]['kills']),
+                      key=lambda subject: (-totals[subject]['kills'], int(subject)))[:10]
+    by_matches = sorted((subject for subject in totals if totals[subject]['matches']),
+                        key=lambda subject: (-totals[subject]['matches'], int(subject)))[:10]
+    players = User.objects.in_bulk([int(subject) for subject in set(by_kills + by_matches)])
+    for player_id, player in players.items():
+        player_totals = totals[str(player_id)]
+        player.total_kills = player_totals['kills']
+        player.total_deaths = player_totals['deaths']
+        player.total_matches = player.match_count = player_totals['matches']
+        if player.total_deaths > 0:
             player.kd_ratio = round(player.total_kills / player.total_deaths, 2)
         else:
             player.kd_ratio = player.total_kills
 
-    if len(top_killers) < 5:
-        top_killers = generate_mock_top_fraggers()
+    top_killers = [players[int(subject)] for subject in by_kills if int(subject) in players]
+    most_active = [players[int(subject)] for subject in by_matches if int(subject) in players]
 
-    # Most active players
-    most_active = User.objects.annotate(
-        match_count=Count('match_stats')
-    ).filter(match_count__gt=0).order_by('-match_count')[:10]
+    # Mock players only stand in for an empty all-time board, never for a chosen range
+    if len(top_killers) < 5 and range_key == 'all':
+        top_killers = generate_mock_top_fraggers()
 
     # If not enough active players, generate mock ones
-    if len(most_active) < 5:
+    if len(most_active) < 5 and range_key == 'all':
         most_active = generate_mock_active_players()
 
     weapon_popularity = [
@@ -540,27 +431,34 @@ def leaderboard(request):
         {'weapon': 'deagle', 'total_kills': 3876, 'user_count': 134},
     ]
 
-    # Mock map popularity
-    map_popularity = [
-        {'map_name': 'dust2', 'total_matches': 3420, 'user_count': 287},
-        {'map_name': 'mirage', 'total_matches': 3180, 'user_count': 265},
-        {'map_name': 'inferno', 'total_matches': 2950, 'user_count': 251},
-        {'map_name': 'cache', 'total_matches': 2780, 'user_count': 234},
-        {'map_name': 'overpass', 'total_matches': 2340, 'user_count': 198},
-        {'map_name': 'train', 'total_matches': 2120, 'user_count': 187},
-        {'map_name': 'cobblestone', 'total_matches': 1890, 'user_count': 156}
-    ]
+    map_totals = rollups.range_totals('map', start, end)
+    map_popularity = sorted([
+        {'map_name': map_name, 'map_display': MAP_NAMES.get(map_name, map_name),
+         'total_matches': map_total['matches'], 'total_kills': map_total['kills']}
+        for map_name, map_total in map_totals.items() if map_total['matches']
+    ], key=lambda row: -row['total_matches'])
 
     # Top teams by activity
     top_teams = Team.objects.filter(is_active=True).annotate(
         member_count=Count('memberships', filter=Q(memberships__is_active=True))
     ).order_by('-founded_date')[:10]
 
+    team_totals = rollups.range_totals('team', start, end)
+    busiest = sorted((subject for subject in team_totals if team_totals[subject]['matches']),
+                     key=lambda subject: (-team_totals[subject]['matches'], int(subject)))[:10]
+    teams = Team.objects.annotate(
+        member_count=Count('memberships', filter=Q(memberships__is_active=True))
+    ).in_bulk([int(subject) for subject in busiest])
+    most_active_teams = []
+    for subject in busiest:
+        if int(subject) in teams:
+            team = teams[int(subject)]
+            team.match_count = team_totals[subject]['matches']
+            most_active_teams.append(team)
+
     # Generate mock team activity if needed
-    if len(top_teams) < 5:
+    if len(most_active_teams) < 5 and range_key == 'all':
         most_active_teams = generate_mock_active_teams()
-    else:
-        most_active_teams = top_teams
 
     context = {
         'top_killers': top_killers,
@@ -569,6 +467,10 @@ def leaderboard(request):
         'most_active_teams': most_active_teams,
         'weapon_popularity': weapon_popularity,
         'map_popularity': map_popularity,
+        'range_key': range_key,
+        'range_start': start,
+        'range_end': end,
+        'range_choices': [(key, label) for key, (label, _) in rollups.RANGES.items()],
         'total_players': User.objects.count(),
         'total_teams': Team.objects.filter(is_active=True).count(),
         'total_matches': max(PlayerMatchStats.objects.values('match').distinct().count(), 1247),
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import QueuedTask
+
+@admin.register(QueuedTask)
+class QueuedTaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'unique_key', 'last_error']
+    ordering = ['-created_at']
@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from tasks import queue, worker
+
+
+class Command(BaseCommand):
+    help = 'Run background tasks from the database queue in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'TASKS_WORKERS', None) or os.cpu_count(),
+                            help='Worker processes (0 runs tasks inline in this process)')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        if settings.TASKS_BACKEND != 'database':
+            self.stderr.write(f"TASKS_BACKEND is '{settings.TASKS_BACKEND}' - run that backend's own worker instead")
+            return
+
+        workers = options['workers']
+        self.stdout.write(f'Task worker started ({workers or "inline"} workers, {len(queue.registry)} registered tasks)')
+
+        if workers == 0:
+            self.run_inline(options)
+        else:
+            self.run_pool(workers, options)
+
+    def run_inline(self, options):
+        while True:
+            processed = queue.run_pending()
+            if processed:
+                self.stdout.write(f'Processed {processed} tasks')
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['poll_interval'])
+
+    def start_pool(self, workers):
+        # Spawned (not forked) children so no SQLite handle is shared across processes
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=worker.init_worker_process,
+        )
+
+    def run_pool(self, workers, options):
+        pool = self.start_pool(workers)
+        try:
+            while True:
+                batch = queue.claim(limit=workers)
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                futures = {
+                    pool.submit(worker.execute_in_worker, queued_task.name, queued_task.args, queued_task.kwargs): queued_task
+                    for queued_task in batch
+                }
+                broken = False
+                for future in as_completed(futures):
+                    queued_task = futures[future]
+                    try:
+                        future.result()
+                    except BrokenProcessPool:
+                        # A worker died (killed, out of memory) and the pool fails everything still in flight
+                        broken = True
+                        queue.release(queued_task, 'Worker process died')
+                        self.stderr.write(f'Task {queued_task.name} #{queued_task.id} lost its worker, released')
+                    except Exception:
+                        queue.fail(queued_task, ''.join(traceback.format_exception(future.exception())))
+                        self.stderr.write(f'Task {queued_task.name} #{queued_task.id} failed (attempt {queued_task.attempts})')
+                    else:
+                        queue.complete(queued_task)
+                        self.stdout.write(f'Task {queued_task.name} #{queued_task.id} done')
+
+                if broken:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self.start_pool(workers)
+                    self.stderr.write('Worker pool broke - started a new one')
+        finally:
+            pool.shutdown()
@@ -0,0 +1,203 @@
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import QueuedTask
+
+# Task name -> function, filled by the @task decorator when apps import their tasks.py
+registry = {}
+
+_backend = None
+
+
+def task(func=None, *, name=None, max_attempts=3):
+    """Register a function as a background task.
+
+    The function keeps working as a plain call and gains an ``enqueue``
+    helper that queues it on the configured backend:
+
+        @task
+        def rebuild_rollups(player_id):
+            ...
+
+        rebuild_rollups.enqueue(player.id, unique_key=f'rollups:{player.id}')
+    """
+    def decorator(fn):
+        task_name = name or f"{fn.__module__}.{fn.__name__}"
+        registry[task_name] = fn
+
+        def enqueue_task(*args, unique_key='', delay=0, **kwargs):
+            return enqueue(task_name, args, kwargs, unique_key=unique_key,
+                           max_attempts=max_attempts, delay=delay)
+
+        fn.task_name = task_name
+        fn.enqueue = enqueue_task
+        get_backend().register(task_name, fn, max_attempts)
+        return fn
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(name, args=(), kwargs=None, unique_key='', max_attempts=3, delay=0):
+    """Queue a registered task by name"""
+    if name not in registry:
+        raise KeyError(f"Unknown task: {name}")
+    return get_backend().enqueue(name, list(args), kwargs or {}, unique_key, max_attempts, delay)
+
+
+class DatabaseBackend:
+    """Queue stored in the QueuedTask table, consumed by `manage.py run_tasks`"""
+
+    def register(self, name, func, max_attempts):
+        pass
+
+    def enqueue(self, name, args, kwargs, unique_key, max_attempts, delay):
+        # Skip duplicates that haven't been picked up yet - one recompute covers them all
+        if unique_key and QueuedTask.objects.filter(unique_key=unique_key, status='queued').exists():
+            return None
+
+        return QueuedTask.objects.create(
+            name=name,
+            args=args,
+            kwargs=kwargs,
+            unique_key=unique_key,
+            max_attempts=max_attempts,
+            run_after=timezone.now() + timedelta(seconds=delay),
+        )
+
+
+class CeleryBackend:
+    """Optional backend that hands tasks to Celery (see cs_platform/celery.py)"""
+
+    def __init__(self):
+        try:
+            from celery import shared_task
+        except ImportError:
+            raise ImproperlyConfigured("TASKS_BACKEND = 'celery' requires the celery package")
+        self.shared_task = shared_task
+        self.celery_tasks = {}
+
+    def register(self, name, func, max_attempts):
+        self.celery_tasks[name] = self.shared_task(
+            name=name,
+            autoretry_for=(Exception,),
+            max_retries=max(max_attempts - 1, 0),
+            retry_backoff=settings.TASKS_RETRY_DELAY,
+        )(func)
+
+    def enqueue(self, name, args, kwargs, unique_key, max_attempts, delay):
+        return self.celery_tasks[name].apply_async(args=args, kwargs=kwargs, countdown=delay or None)
+
+
+BACKENDS = {
+    'database': DatabaseBackend,
+    'celery': CeleryBackend,
+}
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        backend_name = getattr(settings, 'TASKS_BACKEND', 'database')
+        if backend_name not in BACKENDS:
+            raise ImproperlyConfigured(f"Unknown TASKS_BACKEND: {backend_name}")
+        _backend = BACKENDS[backend_name]()
+    return _backend
+
+
+def claim(limit=1, visibility_timeout=None):
+    """Lease up to `limit` due tasks.
+
+    A claimed task stays invisible to other workers until its lease expires.
+    Each claim is a conditional UPDATE, so two workers racing for the same row
+    can't both win it.
+    """
+    now = timezone.now()
+    timeout = visibility_timeout or settings.TASKS_VISIBILITY_TIMEOUT
+
+    # Workers that died mid-task on their last attempt leave leases behind
+    QueuedTask.objects.filter(
+        status='running', locked_until__lt=now, attempts__gte=F('max_attempts')
+    ).update(status='failed', last_error='Visibility timeout expired', finished_at=now)
+
+    available = (
+        Q(status='queued', run_after__lte=now) |
+        Q(status='running', locked_until__lt=now, attempts__lt=F('max_attempts'))
+    )
+    candidate_ids = list(
+        QueuedTask.objects.filter(available).order_by('run_after', 'id').values_list('id', flat=True)[:limit * 2]
+    )
+
+    claimed_ids = []
+    for task_id in candidate_ids:
+        updated = QueuedTask.objects.filter(available, id=task_id).update(
+            status='running',
+            locked_until=now + timedelta(seconds=timeout),
+            attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed_ids.append(task_id)
+        if len(claimed_ids) == limit:
+            break
+
+    return list(QueuedTask.objects.filter(id__in=claimed_ids))
+
+
+def complete(queued_task):
+    """Mark a leased task as done (no-op if the lease was lost to another worker)"""
+    QueuedTask.objects.filter(id=queued_task.id, status='running', attempts=queued_task.attempts).update(
+        status='done', locked_until=None, last_error='', finished_at=timezone.now()
+    )
+
+
+def fail(queued_task, error):
+    """Schedule a retry with exponential backoff, or give up after max_attempts"""
+    now = timezone.now()
+    lease = QueuedTask.objects.filter(id=queued_task.id, status='running', attempts=queued_task.attempts)
+
+    if queued_task.attempts < queued_task.max_attempts:
+        backoff = settings.TASKS_RETRY_DELAY * (2 ** (queued_task.attempts - 1))
+        lease.update(status='queued', locked_until=None, last_error=error,
+                     run_after=now + timedelta(seconds=backoff))
+    else:
+        lease.update(status='failed', locked_until=None, last_error=error, finished_at=now)
+
+
+def release(queued_task, error):
+    """Hand a lease back for an immediate retry, e.g. when its worker process died.
+
+    The attempt still counts, so a task that keeps killing its worker gives up after max_attempts.
+    """
+    now = timezone.now()
+    lease = QueuedTask.objects.filter(id=queued_task.id, status='running', attempts=queued_task.attempts)
+    if queued_task.attempts < queued_task.max_attempts:
+        lease.update(status='queued', locked_until=None, last_error=error, run_after=now)
+    else:
+        lease.update(status='failed', locked_until=None, last_error=error, finished_at=now)
+
+
+def execute(name, args, kwargs):
+    """Run a registered task in the current process"""
+    return registry[name](*args, **kwargs)
+
+
+def run_pending(limit=None):
+    """Run due tasks inline until the queue is drained. Returns how many ran."""
+    processed = 0
+    while limit is None or processed < limit:
+        batch = claim(limit=1)
+        if not batch:
+            break
+        queued_task = batch[0]
+        try:
+            execute(queued_task.name, queued_task.args, queued_task.kwargs)
+        except Exception:
+            fail(queued_task, traceback.format_exc())
+        else:
+            complete(queued_task)
+        processed += 1
+    return processed
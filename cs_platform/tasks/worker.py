@@ -0,0 +1,21 @@
+"""Entry points for task worker processes.
+
+Kept free of model imports at module level: spawned children unpickle these
+functions before Django is set up.
+"""
+from django.db import connections
+
+
+def init_worker_process():
+    """ProcessPoolExecutor initializer - each worker gets its own Django setup and DB connections"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def execute_in_worker(name, args, kwargs):
+    from .queue import execute
+    try:
+        execute(name, args, kwargs)
+    finally:
+        connections.close_all()
@@ -302,6 +302,7 @@ class Command(BaseCommand):
                 membership, mem_created = TeamMembership.objects.get_or_create(
                     team=team,
                     player=user,
+                    left_date=None,
                     defaults={
                         'role': player_data['role'],
                         'is_active': True,
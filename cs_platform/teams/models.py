@@ -4,7 +4,7 @@ from django.core.validators import MinValueValidator
 from django.utils import timezone
 import random
 import hashlib
-from datetime import datetime, date
+from datetime import date
 
 User = get_user_model()
 
@@ -23,6 +23,8 @@ class Team(models.Model):
     country = models.CharField(max_length=50, blank=True)
     is_active = models.BooleanField(default=True)
     captain = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='captained_teams')
+    is_temporary = models.BooleanField(default=False)  # Matchmaking lobby sides, created inactive
+    updated_at = models.DateTimeField(auto_now=True)
 
     def get_realistic_founded_date(self):
         team_seed = int(hashlib.md5(str(self.id).encode()).hexdigest()[:8], 16)
@@ -154,28 +156,31 @@ class TeamMembership(models.Model):
     player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='team_memberships')
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='rifler')
     joined_date = models.DateTimeField(default=timezone.now)
+    left_date = models.DateTimeField(null=True, blank=True)  # Open while the player is on the team
     is_active = models.BooleanField(default=True)
 
-    def get_realistic_joined_date(self):
-        # Use combination of player ID and team ID for consistent randomness
-        seed = int(hashlib.md5(f"{self.player.id}_{self.team.id}".encode()).hexdigest()[:8], 16)
-        random.seed(seed)
+    def save(self, *args, **kwargs):
+        # Deactivating a membership closes its stint
+        if not self.is_active and self.left_date is None:
+            self.left_date = timezone.now()
+        super().save(*args, **kwargs)
 
-        # Random year between 2015-2025
-        year = random.randint(2015, 2025)
-        month = random.randint(1, 12)
-
-        # If it's 2025, limit to months that have passed
-        if year == 2025:
-            month = random.randint(1, 8)  # Up to August 2025
-
-        day = random.randint(1, 28)  # Safe day range
-
-        return datetime(year, month, day)
+    def leave(self, when=None):
+        """End the stint; rejoining later starts a new membership row"""
+        self.left_date = when or timezone.now()
+        self.is_active = False
+        self.save(update_fields=['left_date', 'is_active'])
 
     class Meta:
-        unique_together = ['team', 'player']
         ordering = ['joined_date']
+        constraints = [
+            models.UniqueConstraint(fields=['team', 'player'], condition=models.Q(left_date__isnull=True),
+                                    name='unique_open_membership'),
+        ]
+        indexes = [
+            models.Index(fields=['team', 'left_date', 'joined_date']),  # Roster as of a date (rosters.py)
+            models.Index(fields=['player', 'joined_date']),
+        ]
 
     def __str__(self):
         return f"{self.player.username} - {self.team.name} ({self.role})"
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""Rosters over time.
+
+Each TeamMembership row is one stint: [joined_date, left_date), with
+left_date empty while the player is still on the team. A player who
+leaves and rejoins gets a second row, so match stats can be attributed
+to the stint they were played in, not just to the team.
+"""
+from django.db.models import Count, F, Q, Sum
+from stats.comparison import derived_stats
+from .models import TeamMembership
+
+
+def covering(when):
+    """Q for stints open at `when`"""
+    return Q(joined_date__lte=when) & (Q(left_date__isnull=True) | Q(left_date__gt=when))
+
+
+def roster_as_of(team, when):
+    """The team's memberships at `when` - one lookup on the (team, left_date, joined_date) index"""
+    return TeamMembership.objects.filter(covering(when), team=team).select_related('player')
+
+
+def career_stints(player):
+    """The player's stints, newest first, each with the totals of the matches they played for the team
+    during it - one grouped query over PlayerMatchStats joined against the intervals"""
+    played = 'player__match_stats__'
+    in_stint = Q(**{f'{played}team': F('team')}) & Q(**{f'{played}match__match_date__gte': F('joined_date')}) & (
+        Q(left_date__isnull=True) | Q(**{f'{played}match__match_date__lt': F('left_date')})
+    )
+    stints = TeamMembership.objects.filter(player=player, team__is_temporary=False).select_related('team').annotate(
+        match_count=Count(f'{played}id', filter=in_stint),
+        total_kills=Sum(f'{played}kills', filter=in_stint),
+        total_deaths=Sum(f'{played}deaths', filter=in_stint),
+        total_assists=Sum(f'{played}assists', filter=in_stint),
+        total_headshots=Sum(f'{played}headshots', filter=in_stint),
+        total_damage=Sum(f'{played}damage_dealt', filter=in_stint),
+    ).order_by('-joined_date', '-id')
+
+    rows = []
+    for stint in stints:
+        totals = {
+            key: getattr(stint, key) or 0
+            for key in ('match_count', 'total_kills', 'total_deaths', 'total_assists', 'total_headshots',
+                        'total_damage')
+        }
+        rows.append({'membership': stint, 'team': stint.team, **totals, **derived_stats(totals)})
+    return rows
@@ -1,7 +1,11 @@
+from datetime import timedelta
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
+from matches.models import Match, PlayerMatchStats
 from teams.models import Team, TeamMembership
+from teams import rosters
 
 User = get_user_model()
 
@@ -79,4 +83,70 @@ class TeamMembershipTestCase(TestCase):
         initial_count = TeamMembership.objects.filter(team=self.team).count()
         response = self.client.post(reverse('join_team', kwargs={'pk': self.team.pk}))
         final_count = TeamMembership.objects.filter(team=self.team).count()
-        self.assertEqual(initial_count, final_count)
\ No newline at end of file
+        self.assertEqual(initial_count, final_count)
+
+
+class RosterHistoryTestCase(TestCase):
+    """Test membership intervals, rosters as of a date and per-stint career totals"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.player = User.objects.create_user('traveller', 'tr@test.com', 'pass123')
+        self.other = User.objects.create_user('stayer', 'st@test.com', 'pass123')
+        self.first = Team.objects.create(name='First Club', tag='FC1')
+        self.second = Team.objects.create(name='Second Club', tag='SC2')
+        self.opponent = Team.objects.create(name='Opponents', tag='OPP')
+
+        # traveller: First Club for days 100-50 ago, Second Club since, then back at First Club from day 10
+        early = TeamMembership.objects.create(team=self.first, player=self.player,
+                                              joined_date=self.now - timedelta(days=100))
+        early.leave(self.now - timedelta(days=50))
+        TeamMembership.objects.create(team=self.second, player=self.player, joined_date=self.now - timedelta(days=50))
+        TeamMembership.objects.create(team=self.first, player=self.player, joined_date=self.now - timedelta(days=10))
+        TeamMembership.objects.create(team=self.first, player=self.other, joined_date=self.now - timedelta(days=200))
+
+    def play(self, team, days_ago, kills, deaths):
+        match = Match.objects.create(team1=team, team2=self.opponent, map_name='mirage',
+                                     match_date=self.now - timedelta(days=days_ago))
+        PlayerMatchStats.objects.create(match=match, player=self.player, team=team, kills=kills, deaths=deaths,
+                                        damage_dealt=kills * 100)
+
+    def test_roster_as_of_date(self):
+        """Test that the roster at a date only holds stints open at that date"""
+        def names(days_ago):
+            when = self.now - timedelta(days=days_ago)
+            return sorted(member.player.username for member in rosters.roster_as_of(self.first, when))
+
+        self.assertEqual(names(150), ['stayer'])
+        self.assertEqual(names(70), ['stayer', 'traveller'])
+        self.assertEqual(names(30), ['stayer'])
+        self.assertEqual(names(0), ['stayer', 'traveller'])
+
+        with self.assertNumQueries(1):
+            list(rosters.roster_as_of(self.first, self.now))
+
+    def test_deactivating_closes_the_stint(self):
+        """Test that an inactive membership gets a left date and a rejoin is allowed alongside it"""
+        membership = TeamMembership.objects.get(team=self.second, player=self.player)
+        membership.is_active = False
+        membership.save()
+        self.assertIsNotNone(membership.left_date)
+        TeamMembership.objects.create(team=self.second, player=self.player)
+        self.assertEqual(TeamMembership.objects.filter(team=self.second, player=self.player).count(), 2)
+
+    def test_career_stints_in_one_query(self):
+        """Test that stats are attributed to the stint they were played in"""
+        self.play(self.first, 80, 20, 10)
+        self.play(self.first, 60, 10, 10)
+        self.play(self.second, 40, 30, 15)
+        self.play(self.first, 5, 8, 16)
+
+        with self.assertNumQueries(1):
+            stints = rosters.career_stints(self.player)
+        summary = [(stint['team'].tag, stint['match_count'], stint['total_kills']) for stint in stints]
+        self.assertEqual(summary, [('FC1', 1, 8), ('SC2', 1, 30), ('FC1', 2, 30)])
+        self.assertEqual(stints[1]['kd_ratio'], 2.0)
+
+        response = self.client.get(reverse('player_detail', args=[self.player.pk]))
+        self.assertContains(response, 'Team History')
+        self.assertContains(response, 'Second Club')
@@ -5,9 +5,7 @@ from django.views.generic import ListView, DetailView
 from django.contrib import messages
 from django.db.models import Q, Count
 from django.utils import timezone
-from datetime import timedelta
-import random
-import hashlib
+from matches import history
 from .models import Team, TeamMembership
 from django.contrib.auth import get_user_model
 
@@ -150,109 +148,6 @@ def team_roster_preview(request, team_id):
 
     return render(request, 'teams/roster_preview.html', context)
 
-def generate_team_match_history(team):
-    # Use team ID for consistent results
-    team_seed = int(hashlib.md5(str(team.id).encode()).hexdigest()[:8], 16)
-    random.seed(team_seed)
-
-    # Realistic opponent teams based on team level
-    if team.is_professional:
-        opponent_pools = [
-            'Team Vitality', 'NAVI', 'G2 Esports', 'FaZe Clan', 'MOUZ',
-            'BIG', 'Team Spirit', 'Cloud9', 'FURIA', 'Heroic',
-            'ENCE', 'OG', 'Ninjas in Pyjamas', 'Complexity', 'Eternal Fire'
-        ]
-    else:
-        opponent_pools = [
-            'Team Alpha', 'Beta Squad', 'Gamma Force', 'Delta Warriors',
-            'Epsilon Gaming', 'Zeta Esports', 'Theta Team', 'Sigma Squad',
-            'Phoenix Rising', 'Storm Riders', 'Shadow Hawks', 'Lightning Bolts'
-        ]
-
-    maps = ['Mirage', 'Dust 2', 'Inferno', 'Cache', 'Overpass', 'Train', 'Nuke']
-
-    match_history = []
-
-    for i in range(5):  # Last 5 matches
-        days_ago = (i + 1) * random.randint(2, 5)  # 2-25 days ago
-        match_date = timezone.now() - timedelta(days=days_ago)
-
-        opponent_name = random.choice(opponent_pools)
-
-        # Generate realistic series (BO1, BO3, or BO5)
-        series_types = ['bo1', 'bo3', 'bo3', 'bo5'] if team.is_professional else ['bo1', 'bo1', 'bo3']
-        series_type = random.choice(series_types)
-
-        if series_type == 'bo1':
-            num_maps = 1
-            maps_to_win = 1
-        elif series_type == 'bo3':
-            num_maps = random.choice([2, 3])  # Can end 2-0 or go to 3rd map
-            maps_to_win = 2
-        else:  # bo5
-            num_maps = random.choice([3, 4, 5])
-            maps_to_win = 3
-
-        # Generate map results
-        selected_maps = random.sample(maps, num_maps)
-        map_results = []
-        team_maps_won = 0
-        opponent_maps_won = 0
-
-        for j, map_name in enumerate(selected_maps):
-            # Generate realistic scores
-            if team.is_professional:
-                # Pro teams have closer matches
-                team_score = random.randint(13, 19)
-                opponent_score = random.randint(13, 19)
-            else:
-                # Community matches can be more varied
-                team_score = random.randint(10, 16)
-                opponent_score = random.randint(8, 16)
-
-            # Ensure one team wins
-            if team_score == opponent_score:
-                if random.choice([True, False]):
-                    team_score += random.randint(1, 3)
-                else:
-                    opponent_score += random.randint(1, 3)
-
-            # Track series score
-            if team_score > opponent_score:
-                team_maps_won += 1
-                map_winner = 'team'
-            else:
-                opponent_maps_won += 1
-                map_winner = 'opponent'
-
-            map_results.append({
-                'map': map_name,
-                'team_score': team_score,
-                'opponent_score': opponent_score,
-                'winner': map_winner
-            })
-
-            # Check if series is over
-            if team_maps_won == maps_to_win or opponent_maps_won == maps_to_win:
-                break
-
-        # Determine series winner
-        series_winner = 'team' if team_maps_won > opponent_maps_won else 'opponent'
-
-        match_history.append({
-            'opponent': opponent_name,
-            'opponent_tag': f'[{opponent_name[:3].upper()}]',
-            'date': match_date,
-            'series_score': f"{team_maps_won}-{opponent_maps_won}",
-            'series_winner': series_winner,
-            'series_type': series_type.upper(),
-            'map_results': map_results,
-            'total_maps': len(map_results)
-        })
-
-    return match_history
-
-
 class TeamListView(ListView):
     model = Team
     template_name = 'teams/team_list.html'
@@ -315,11 +210,7 @@ class TeamDetailView(DetailView):
             context['user_is_member'] = False
             context['user_is_captain'] = False
 
-        # Generate match history only for older teams (created more than 1 day ago)
-        if (timezone.now().date() - team.founded_date).days > 0:
-            context['match_history'] = generate_team_match_history(team)
-        else:
-            context['match_history'] = []  # New team, no matches yet
+        context['match_history'] = history.team_history(team)
 
         # Calculate team performance stats
         match_history = context['match_history']
@@ -1,10 +1,21 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth import get_user_model
 from teams.models import Team, TeamMembership
-from matches.models import Match
+from matches.models import Match, PlayerMatchStats
+from tournaments.models import Tournament, TournamentParticipation
+from stats.models import WeaponStats
+from api import serializers
+from api.fast import FastSerializer
+from api.renderers import FastJSONRenderer
 import json
 
 User = get_user_model()
@@ -96,4 +107,211 @@ class APITest(TestCase):
 
         # Check that only professional teams are returned
         for team in response.data['results']:
-            self.assertTrue(team['is_professional'])
\ No newline at end of file
+            self.assertTrue(team['is_professional'])
+
+
+# The query log's periodic flush would land in the counted queries
+@override_settings(QUERY_LOG_ENABLED=False)
+class FastSerializerTest(TestCase):
+    def setUp(self):
+        self.captain = User.objects.create_user(
+            username='captain', password='testpass123', country='Denmark',
+            hltv_rating=Decimal('6.5'), prize_money=Decimal('1234.5')
+        )
+        self.player = User.objects.create_user(username='nocountry', password='testpass123')
+        self.team1 = Team.objects.create(name='Alpha', tag='ALP', country='Denmark', captain=self.captain)
+        self.team2 = Team.objects.create(name='Bravo', tag='BRV', country='Atlantis')  # No captain
+        TeamMembership.objects.create(team=self.team1, player=self.captain)
+        TeamMembership.objects.create(team=self.team1, player=self.player)
+
+        finished = Match.objects.create(team1=self.team1, team2=self.team2, map_name='mirage',
+                                        team1_score=16, team2_score=9, is_finished=True, duration_minutes=40)
+        Match.objects.create(team1=self.team2, team2=self.team1, map_name='inferno',
+                             match_date=timezone.now() + timedelta(days=1))
+        PlayerMatchStats.objects.create(match=finished, player=self.captain, team=self.team1,
+                                        kills=20, deaths=0, headshots=9)
+        WeaponStats.objects.create(player=self.captain, weapon='ak47', total_kills=30, total_shots=200,
+                                   headshot_kills=11)
+        WeaponStats.objects.create(player=self.player, weapon='awp')
+        tournament = Tournament.objects.create(
+            name='Cup', prize_pool=Decimal('5000'), start_date=timezone.now(), end_date=timezone.now(),
+            registration_deadline=timezone.now(), organizer=self.captain
+        )
+        TournamentParticipation.objects.create(tournament=tournament, team=self.team1)
+
+    def assertSameAsSerializer(self, serializer_class, queryset):
+        fast = FastSerializer(serializer_class)
+        expected = json.loads(json.dumps(serializer_class(queryset, many=True).data))
+        actual = json.loads(json.dumps(fast.build_many(fast.values(queryset))))
+        self.assertEqual(actual, expected)
+
+    def test_fast_serializers_match_model_serializers(self):
+        """Test that the values() path produces the same JSON as every list serializer"""
+
+        self.assertSameAsSerializer(serializers.UserSerializer, User.objects.order_by('id'))
+        self.assertSameAsSerializer(serializers.TeamSerializer, Team.objects.all())
+        self.assertSameAsSerializer(serializers.MatchSerializer, Match.objects.all())
+        self.assertSameAsSerializer(serializers.PlayerMatchStatsSerializer, PlayerMatchStats.objects.all())
+        self.assertSameAsSerializer(serializers.TournamentSerializer, Tournament.objects.all())
+        self.assertSameAsSerializer(serializers.WeaponStatsSerializer, WeaponStats.objects.all())
+
+    def test_match_list_is_one_query_per_page(self):
+        """Test that the match list runs the count and one page query regardless of size"""
+        with self.assertNumQueries(3):  # Plus the ETag version lookup
+            response = self.client.get('/api/matches/?format=json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_page_size_parameter(self):
+        """Test that clients can request larger pages up to the cap"""
+        response = self.client.get('/api/players/?page_size=1&format=json')
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNotNone(response.json()['next'])
+
+    def test_fast_renderer_matches_json_renderer(self):
+        """Test that orjson output decodes to the same data as the standard renderer"""
+        data = {'name': 'Ω \u2028', 'prize': Decimal('1.50'), 'items': [1, None, True]}
+        fast = FastJSONRenderer().render(data)
+        self.assertNotIn('\u2028'.encode(), fast)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+
+    def test_fast_detail_matches_detail_serializer(self):
+        """Test that team detail, members included, matches TeamDetailSerializer"""
+        expected = json.loads(json.dumps(serializers.TeamDetailSerializer(Team.objects.get(pk=self.team1.pk)).data))
+        response = self.client.get(f'/api/teams/{self.team1.pk}/?format=json')
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(self.client.get('/api/teams/999999/?format=json').status_code, 404)
+
+
+@override_settings(QUERY_LOG_ENABLED=False)
+class SparseFieldsTest(TestCase):
+    def setUp(self):
+        self.team1 = Team.objects.create(name='Alpha', tag='ALP', description='x' * 500)
+        self.team2 = Team.objects.create(name='Bravo', tag='BRV')
+        self.match = Match.objects.create(team1=self.team1, team2=self.team2, map_name='dust2',
+                                          team1_score=16, team2_score=14, is_finished=True)
+
+    def get_with_sql(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        # Leave out the ETag version lookup, which names every table the endpoint reads
+        return response.json(), ' '.join(query['sql'] for query in queries if 'changes_tableversion' not in query['sql'])
+
+    def test_fields_limits_payload_and_query(self):
+        """Test that ?fields= returns only the requested keys and skips unrequested columns"""
+        data, sql = self.get_with_sql('/api/matches/?format=json&fields=id,team1.name,team2.name,team1_score,team2_score')
+        self.assertEqual(data['results'], [{
+            'id': self.match.pk, 'team1': {'name': 'Alpha'}, 'team2': {'name': 'Bravo'},
+            'team1_score': 16, 'team2_score': 14,
+        }])
+        self.assertNotIn('description', sql)
+        self.assertNotIn('teams_teammembership', sql)
+
+    def test_unexpanded_relations_render_as_ids_without_joins(self):
+        """Test that relations left out of ?expand= come back as ids from the foreign key column"""
+        data, sql = self.get_with_sql('/api/matches/?format=json&expand=&fields=id,team1,team2')
+        self.assertEqual(data['results'], [{'id': self.match.pk, 'team1': self.team1.pk, 'team2': self.team2.pk}])
+        self.assertNotIn('JOIN', sql)
+
+        data, _ = self.get_with_sql('/api/matches/?format=json&expand=team2&fields=team1,team2.tag')
+        self.assertEqual(data['results'], [{'team1': self.team1.pk, 'team2': {'tag': 'BRV'}}])
+
+    def test_fields_on_detail_and_to_many(self):
+        """Test that detail endpoints and nested member lists honour fields and expand"""
+        player = User.objects.create_user(username='member', password='testpass123')
+        TeamMembership.objects.create(team=self.team1, player=player, role='awper')
+
+        data, _ = self.get_with_sql(f'/api/teams/{self.team1.pk}/?format=json&fields=name,members.role,members.player.username')
+        self.assertEqual(data, {'name': 'Alpha', 'members': [{'role': 'awper', 'player': {'username': 'member'}}]})
+
+        data, _ = self.get_with_sql(f'/api/teams/{self.team1.pk}/?format=json&fields=name,members&expand=')
+        self.assertEqual(data, {'name': 'Alpha', 'members': [player.team_memberships.get().pk]})
+
+    def test_unknown_fields_are_rejected(self):
+        """Test that a misspelled field name is a 400 rather than silently ignored"""
+        response = self.client.get('/api/matches/?format=json&fields=id,team1.nme')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+
+
+@override_settings(QUERY_LOG_ENABLED=False, API_BATCH_WORKERS=1)
+class BatchTest(TestCase):
+    def setUp(self):
+        self.team1 = Team.objects.create(name='Alpha', tag='ALP')
+        self.team2 = Team.objects.create(name='Bravo', tag='BRV')
+        Match.objects.create(team1=self.team1, team2=self.team2, map_name='mirage',
+                             team1_score=16, team2_score=10, is_finished=True)
+
+    def post(self, requests):
+        return self.client.post('/api/batch/?format=json', {'requests': requests}, content_type='application/json')
+
+    def test_batch_returns_every_sub_response_in_order(self):
+        """Test that sub-requests come back in order with the same bodies as separate calls"""
+        team_url = f'/api/teams/{self.team1.pk}/'
+        h2h_url = f'/api/matches/?team={self.team1.pk}&opponent={self.team2.pk}'
+        response = self.post([
+            {'id': 'team', 'url': team_url},
+            {'id': 'h2h', 'url': h2h_url},
+            {'id': 'missing', 'url': '/api/teams/999999/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['responses']
+        self.assertEqual([result['id'] for result in results], ['team', 'h2h', 'missing'])
+        self.assertEqual(results[0]['body'], self.client.get(team_url + '?format=json').json())
+        self.assertEqual(results[1]['body']['count'], 1)
+        self.assertEqual(results[2]['status'], 404)
+
+    def test_overlapping_lookups_hit_the_database_once(self):
+        """Test that repeated queries inside one batch are served from the batch cache"""
+        url = '/api/matches/?fields=id,team1.name'
+        with CaptureQueriesContext(connection) as single:
+            self.post([{'url': url}])
+        with CaptureQueriesContext(connection) as repeated:
+            self.post([{'url': url}, {'url': url}, {'url': url}])
+        # Only the per-request ETag version lookup repeats
+        self.assertEqual(len(repeated) - len(single), 2)
+
+    def test_sub_request_conditional_headers(self):
+        """Test that a sub-request can send If-None-Match and get a 304"""
+        url = f'/api/teams/{self.team1.pk}/'
+        etag = self.post([{'url': url}]).json()['responses'][0]['headers']['ETag']
+        result = self.post([{'url': url, 'headers': {'If-None-Match': etag}}]).json()['responses'][0]
+        self.assertEqual((result['status'], result['body']), (304, None))
+
+    def test_failing_sub_request_is_contained(self):
+        """Test that a bad filter is a 400 and a crashing view a 500 entry, without failing the batch"""
+        from unittest import mock
+        from api.views import TeamDetailView
+        with self.assertLogs('api.batch', 'ERROR'), \
+                mock.patch.object(TeamDetailView, 'retrieve', side_effect=RuntimeError('boom')):
+            response = self.post([
+                {'url': '/api/tournaments/?team=abc'},
+                {'url': f'/api/matches/?team={self.team1.pk}&opponent=abc'},
+                {'url': f'/api/teams/{self.team1.pk}/'},
+                {'url': '/api/teams/', 'headers': {'Accept': 'text/html'}},
+            ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['responses']
+        self.assertEqual([result['status'] for result in results], [400, 400, 500, 200])
+        self.assertIn('team', results[0]['body'])
+        self.assertIsInstance(results[3]['body'], dict)  # Accept isn't forwarded - still JSON
+
+    def test_invalid_batches_are_rejected(self):
+        """Test that non-GET, non-API and oversized batches are a 400"""
+        self.assertEqual(self.post([{'url': '/admin/'}]).status_code, 400)
+        self.assertEqual(self.post([{'url': '/api/teams/', 'method': 'POST'}]).status_code, 400)
+        self.assertEqual(self.post([{'url': '/api/batch/'}]).status_code, 400)
+        self.assertEqual(self.post([{'url': '/api/teams/'}] * 21).status_code, 400)
+
+
+@override_settings(QUERY_LOG_ENABLED=False, API_BATCH_WORKERS=4)
+class ConcurrentBatchTest(TransactionTestCase):
+    def test_sub_requests_on_worker_threads(self):
+        """Test that a batch run on the thread pool returns the same results as sequential calls"""
+        team = Team.objects.create(name='Alpha', tag='ALP')
+        urls = [f'/api/teams/{team.pk}/', '/api/teams/', '/api/matches/', '/api/players/']
+        response = self.client.post('/api/batch/?format=json', {'requests': [{'url': url} for url in urls]},
+                                    content_type='application/json')
+        bodies = [result['body'] for result in response.json()['responses']]
+        self.assertEqual(bodies, [self.client.get(url, {'format': 'json'}).json() for url in urls])
@@ -0,0 +1,74 @@
+import gzip
+import shutil
+import tempfile
+from pathlib import Path
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+class CompressionTest(TestCase):
+    def test_leaderboard_html_is_gzipped(self):
+        """Test that large HTML pages are compressed for clients that accept gzip"""
+        response = self.client.get(reverse('leaderboard'), HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'Leaderboard', gzip.decompress(response.content))
+
+    def test_uncompressed_without_accept_encoding(self):
+        """Test that clients without gzip support get the plain body"""
+        response = self.client.get(reverse('leaderboard'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class StaticFilesTest(TestCase):
+    """The production serving profile: collected, hashed and precompressed files behind the configured middleware"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        production = override_settings(
+            STATIC_ROOT=cls.static_root,
+            STATICFILES_DIRS=[],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+            },
+            WHITENOISE_MAX_AGE=3600,
+            WHITENOISE_AUTOREFRESH=False,
+        )
+        production.enable()
+        cls.addClassCleanup(production.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_hashed_file_is_served_precompressed_and_immutable(self):
+        """Test that a manifest name is served from its .gz variant with a year-long immutable cache"""
+        url = staticfiles_storage.url('admin/css/base.css')
+        self.assertRegex(url, r'^/static/admin/css/base\.[0-9a-f]{12}\.css$')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=315360000', response['Cache-Control'])
+        original = (Path(self.static_root) / url.removeprefix('/static/')).read_bytes()
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), original)
+
+    def test_unhashed_file_gets_the_short_cache(self):
+        """Test that the original name is still served, cached only for WHITENOISE_MAX_AGE"""
+        response = self.client.get('/static/admin/css/base.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_views_are_gzipped_by_the_same_stack(self):
+        """Test that a page rendered under the production storage is still compressed per request"""
+        response = self.client.get(reverse('leaderboard'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertNotIn('immutable', response.get('Cache-Control', ''))
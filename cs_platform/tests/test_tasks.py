@@ -0,0 +1,137 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from tasks import queue
+from tasks.models import QueuedTask
+from teams.models import Team
+from matches.models import Match, PlayerMatchStats
+from stats.models import MapStats
+from stats.tasks import recompute_player_stats
+
+User = get_user_model()
+
+calls = []
+
+
+@queue.task(max_attempts=2)
+def record_call(value):
+    calls.append(value)
+
+
+@queue.task(max_attempts=2)
+def always_fails():
+    raise RuntimeError('boom')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        """Test that queued tasks run and are marked done"""
+        record_call.enqueue(5)
+        self.assertEqual(queue.run_pending(), 1)
+        self.assertEqual(calls, [5])
+        self.assertEqual(QueuedTask.objects.get().status, 'done')
+
+    def test_unique_key_dedupes_queued_tasks(self):
+        """Test that a second enqueue with the same key is skipped"""
+        record_call.enqueue(1, unique_key='same')
+        record_call.enqueue(2, unique_key='same')
+        self.assertEqual(QueuedTask.objects.count(), 1)
+
+    def test_failed_task_retries_then_fails(self):
+        """Test retry with backoff and final failure after max_attempts"""
+        always_fails.enqueue()
+        queue.run_pending()
+        queued_task = QueuedTask.objects.get()
+        self.assertEqual(queued_task.status, 'queued')
+        self.assertIn('boom', queued_task.last_error)
+
+        QueuedTask.objects.update(run_after=timezone.now())
+        queue.run_pending()
+        self.assertEqual(QueuedTask.objects.get().status, 'failed')
+
+    def test_claimed_task_is_invisible_until_lease_expires(self):
+        """Test the visibility timeout"""
+        record_call.enqueue(1)
+        self.assertEqual(len(queue.claim()), 1)
+        self.assertEqual(queue.claim(), [])
+
+        QueuedTask.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(queue.claim()), 1)
+
+    @override_settings(TASKS_BACKEND='database')
+    def test_broken_pool_is_replaced_and_leases_released(self):
+        """Test that a dead worker process releases its in-flight tasks and run_tasks carries on with a new pool"""
+        pools = []
+
+        class FakePool:
+            """The first pool breaks like one whose worker was killed; the next one runs tasks inline"""
+            def __init__(self, **kwargs):
+                self.broken = not pools
+                self.shut_down = False
+                pools.append(self)
+
+            def submit(self, fn, name, args, kwargs):
+                future = Future()
+                if self.broken:
+                    future.set_exception(BrokenProcessPool('A child process terminated abruptly'))
+                else:
+                    future.set_result(queue.execute(name, args, kwargs))
+                return future
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                self.shut_down = True
+
+        record_call.enqueue(1)
+        record_call.enqueue(2)
+        with mock.patch('tasks.management.commands.run_tasks.ProcessPoolExecutor', FakePool):
+            call_command('run_tasks', workers=2, once=True, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(len(pools), 2)
+        self.assertTrue(all(pool.shut_down for pool in pools))
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertEqual(set(QueuedTask.objects.values_list('status', 'attempts')), {('done', 2)})
+
+
+class RecomputeSignalTest(TestCase):
+    def setUp(self):
+        self.player = User.objects.create_user('fragger', 'f@test.com', 'pass123')
+        self.team1 = Team.objects.create(name='Alpha', tag='ALP', captain=self.player)
+        self.team2 = Team.objects.create(name='Bravo', tag='BRV')
+        self.match = Match.objects.create(team1=self.team1, team2=self.team2, map_name='mirage')
+
+    def test_finished_match_queues_map_stats_recompute(self):
+        """Test that saves enqueue the recompute instead of running it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayerMatchStats.objects.create(match=self.match, player=self.player, team=self.team1,
+                                            kills=25, deaths=10)
+            self.match.team1_score = 13
+            self.match.team2_score = 7
+            self.match.is_finished = True
+            self.match.save()
+
+        self.assertFalse(MapStats.objects.exists())
+        queue.run_pending()
+
+        map_stats = MapStats.objects.get(player=self.player, map_name='mirage')
+        self.assertEqual(map_stats.matches_played, 1)
+        self.assertEqual(map_stats.matches_won, 1)
+        self.assertEqual(map_stats.total_kills, 25)
+
+    def test_recompute_drops_maps_without_matches(self):
+        """Test that a map the player no longer has finished matches on loses its MapStats row"""
+        MapStats.objects.create(player=self.player, map_name='nuke', matches_played=3, total_kills=40)
+        PlayerMatchStats.objects.create(match=self.match, player=self.player, team=self.team1, kills=25, deaths=10)
+        Match.objects.filter(pk=self.match.pk).update(is_finished=True, team1_score=13, team2_score=7)
+
+        recompute_player_stats(self.player.id)
+        self.assertEqual(list(MapStats.objects.filter(player=self.player).values_list('map_name', flat=True)),
+                         ['mirage'])
@@ -1,3 +1,14 @@
 from django.contrib import admin
+from .models import Stage, BracketSlot
 
-# Register your models here.
+@admin.register(Stage)
+class StageAdmin(admin.ModelAdmin):
+    list_display = ['tournament', 'name', 'format', 'order', 'current_round', 'rounds', 'status']
+    list_filter = ['format', 'status']
+    search_fields = ['tournament__name', 'name']
+
+@admin.register(BracketSlot)
+class BracketSlotAdmin(admin.ModelAdmin):
+    list_display = ['stage', 'bracket', 'group', 'round_number', 'position', 'team1', 'team2', 'winner']
+    list_filter = ['bracket', 'stage__format']
+    search_fields = ['stage__tournament__name', 'team1__name', 'team2__name']
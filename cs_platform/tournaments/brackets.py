@@ -0,0 +1,447 @@
+"""Bracket generation and automatic advancement for tournament stages.
+
+Elimination brackets are built as a graph of BracketSlots: every slot knows
+where its winner (and, in double elimination, its loser) goes next. Results
+flow through that graph, so byes and drop-downs need no special cases -
+an empty side just auto-advances the other team.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from changes import tracking
+from matches.models import Match
+from teams.models import Team
+from .models import Stage, BracketSlot, TournamentParticipation
+from . import standings
+
+MAP_POOL = [code for code, _ in Match.MAP_CHOICES]
+
+
+def team_rating(team):
+    """Deterministic team strength used for seeding (higher is stronger)"""
+    rating = 1000.0
+    if team.is_professional:
+        rating += 500
+        if team.world_ranking:
+            rating += max(0, 100 - team.world_ranking) * 5
+        rating += min(float(team.prize_money or 0) / 10000, 200)
+    return rating
+
+
+def seed_teams(teams):
+    """Order teams by rating, strongest first - O(n log n)"""
+    return sorted(teams, key=lambda team: (-team_rating(team), team.name))
+
+
+def bracket_order(size):
+    """Seed numbers in bracket position order, so 1 and 2 can only meet in the final.
+
+    bracket_order(8) == [1, 8, 4, 5, 2, 7, 3, 6]
+    """
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+def round_robin_schedule(team_ids):
+    """Circle-method schedule: a list of rounds, each a list of pairs (byes dropped)"""
+    teams = list(team_ids)
+    if len(teams) % 2:
+        teams.append(None)
+
+    rounds = []
+    for _ in range(len(teams) - 1):
+        half = len(teams) // 2
+        pairs = [(teams[i], teams[-1 - i]) for i in range(half)]
+        rounds.append([pair for pair in pairs if None not in pair])
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return rounds
+
+
+class BracketState:
+    """In-memory view of one stage's slots.
+
+    Loads every slot once, applies results, and writes back only what
+    changed - new matches for a round are created with a single bulk_create.
+    """
+
+    def __init__(self, stage, slots=None):
+        self.stage = stage
+        self.slots = {slot.id: slot for slot in (slots if slots is not None else stage.slots.all())}
+        self.dirty = set()
+        self.needs_match = []
+        self.placements = {}
+        self.results = []
+
+    def place(self, slot, side, team_id):
+        setattr(slot, f'team{side}_id', team_id)
+        setattr(slot, f'team{side}_decided', True)
+        self.dirty.add(slot.id)
+        if slot.team1_decided and slot.team2_decided:
+            self.ready(slot)
+
+    def ready(self, slot):
+        if slot.team1_id and slot.team2_id:
+            self.needs_match.append(slot)
+        else:
+            # Bye - the present team (if any) advances without playing
+            self.finish(slot, slot.team1_id or slot.team2_id, None)
+
+    def finish(self, slot, winner_id, loser_id, rounds=(0, 0)):
+        slot.winner_id = winner_id
+        slot.is_resolved = True
+        self.dirty.add(slot.id)
+
+        if winner_id and not self.stage.is_elimination:
+            self.results.append((winner_id, loser_id, *rounds))
+
+        if slot.winner_to_id:
+            self.place(self.slots[slot.winner_to_id], slot.winner_to_side, winner_id)
+        elif winner_id and self.stage.is_elimination:
+            self.placements[winner_id] = 1
+
+        if slot.loser_to_id:
+            self.place(self.slots[slot.loser_to_id], slot.loser_to_side, loser_id)
+        elif loser_id and slot.loser_placement:
+            self.placements[loser_id] = slot.loser_placement
+
+    def save(self):
+        if self.needs_match:
+            matches = [
+                Match(
+                    team1_id=slot.team1_id,
+                    team2_id=slot.team2_id,
+                    map_name=MAP_POOL[(slot.round_number - 1) % len(MAP_POOL)],
+                    match_type='tournament',
+                    match_date=round_date(self.stage, slot.round_number),
+                )
+                for slot in self.needs_match
+            ]
+            Match.objects.bulk_create(matches)
+            tracking.bump(Match)
+            for slot, match in zip(self.needs_match, matches):
+                slot.match_id = match.id
+                self.dirty.add(slot.id)
+            self.needs_match = []
+
+        if self.dirty:
+            BracketSlot.objects.bulk_update(
+                [self.slots[slot_id] for slot_id in self.dirty],
+                ['team1', 'team2', 'team1_decided', 'team2_decided', 'match', 'winner', 'is_resolved'],
+            )
+            self.dirty = set()
+
+        standings.record_results(self.stage, self.results)
+        self.results = []
+
+        save_placements(self.stage.tournament_id, self.placements)
+        self.placements = {}
+
+
+def round_date(stage, round_number):
+    start = max(stage.tournament.start_date, timezone.now())
+    return start + timedelta(days=round_number - 1)
+
+
+def save_placements(tournament_id, placements):
+    by_placement = defaultdict(list)
+    for team_id, placement in placements.items():
+        by_placement[placement].append(team_id)
+    for placement, team_ids in by_placement.items():
+        TournamentParticipation.objects.filter(
+            tournament_id=tournament_id, team_id__in=team_ids
+        ).update(placement=placement)
+    if by_placement:
+        tracking.bump(TournamentParticipation)
+
+
+def _next_power_of_two(count):
+    return 1 << max(count - 1, 1).bit_length()
+
+
+def _link(source, target, side, kind='winner'):
+    source.links.append((kind, target, side))
+
+
+def _persist(layout):
+    """bulk_create a list of new slots, then wire up their winner/loser links"""
+    BracketSlot.objects.bulk_create(layout)
+    linked = [slot for slot in layout if slot.links]
+    for slot in linked:
+        for kind, target, side in slot.links:
+            setattr(slot, f'{kind}_to_id', target.id)
+            setattr(slot, f'{kind}_to_side', side)
+    if linked:
+        BracketSlot.objects.bulk_update(linked, ['winner_to', 'winner_to_side', 'loser_to', 'loser_to_side'])
+    return layout
+
+
+def _new_slot(stage, bracket, round_number, position, **kwargs):
+    slot = BracketSlot(stage=stage, bracket=bracket, round_number=round_number, position=position, **kwargs)
+    slot.links = []
+    return slot
+
+
+def _seed_first_round(first_round, seeded_ids, size):
+    order = bracket_order(size)
+    for position, slot in enumerate(first_round):
+        for side, seed in enumerate(order[position * 2:position * 2 + 2], start=1):
+            team_id = seeded_ids[seed - 1] if seed <= len(seeded_ids) else None
+            setattr(slot, f'team{side}_id', team_id)
+            setattr(slot, f'team{side}_decided', True)
+
+
+def _build_upper_bracket(stage, seeded_ids, eliminating=True):
+    size = _next_power_of_two(len(seeded_ids))
+    total_rounds = size.bit_length() - 1
+    rounds = [
+        [
+            _new_slot(stage, 'upper', round_number, position,
+                      loser_placement=size // 2 ** round_number + 1 if eliminating else None)
+            for position in range(size // 2 ** round_number)
+        ]
+        for round_number in range(1, total_rounds + 1)
+    ]
+    for round_slots, next_round in zip(rounds, rounds[1:]):
+        for position, slot in enumerate(round_slots):
+            _link(slot, next_round[position // 2], position % 2 + 1)
+
+    _seed_first_round(rounds[0], seeded_ids, size)
+    return size, rounds
+
+
+def build_single_elimination(stage, seeded_ids):
+    _, rounds = _build_upper_bracket(stage, seeded_ids)
+    return [slot for round_slots in rounds for slot in round_slots]
+
+
+def build_double_elimination(stage, seeded_ids):
+    """Upper bracket losers drop into a lower bracket; its winner meets the upper winner in a grand final"""
+    if len(seeded_ids) < 4:
+        return build_single_elimination(stage, seeded_ids)
+
+    size, upper = _build_upper_bracket(stage, seeded_ids, eliminating=False)
+    total_rounds = len(upper)
+
+    lower = []
+    for lower_round in range(1, 2 * (total_rounds - 1) + 1):
+        slot_count = size // 2 ** ((lower_round + 1) // 2 + 1)
+        # Teams still alive once this round is played: lower survivors + unbeaten upper teams
+        upper_round = (lower_round + 1) // 2 if lower_round % 2 else lower_round // 2 + 1
+        placement = slot_count + size // 2 ** upper_round + 1
+        lower.append([
+            _new_slot(stage, 'lower', lower_round, position, loser_placement=placement)
+            for position in range(slot_count)
+        ])
+
+    grand_final = _new_slot(stage, 'grand_final', total_rounds + 1, 0, loser_placement=2)
+
+    # Upper round 1 losers pair up in lower round 1
+    for position, slot in enumerate(upper[0]):
+        _link(slot, lower[0][position // 2], position % 2 + 1, kind='loser')
+
+    # Later upper losers drop in against lower survivors, in reverse order to delay rematches
+    for upper_round in range(2, total_rounds + 1):
+        drop_round = lower[2 * (upper_round - 1) - 1]
+        for position, slot in enumerate(upper[upper_round - 1]):
+            _link(slot, drop_round[len(drop_round) - 1 - position], 2, kind='loser')
+
+    for index, round_slots in enumerate(lower[:-1]):
+        next_round = lower[index + 1]
+        for position, slot in enumerate(round_slots):
+            if (index + 1) % 2:
+                # Odd rounds feed a drop-in round of the same size
+                _link(slot, next_round[position], 1)
+            else:
+                _link(slot, next_round[position // 2], position % 2 + 1)
+
+    _link(upper[-1][0], grand_final, 1)
+    _link(lower[-1][0], grand_final, 2)
+
+    return (
+        [slot for round_slots in upper for slot in round_slots] +
+        [slot for round_slots in lower for slot in round_slots] +
+        [grand_final]
+    )
+
+
+def build_round_robin(stage, seeded_ids):
+    """Snake-seeded groups, each playing a full circle-method schedule"""
+    groups = [[] for _ in range(min(stage.group_count, max(len(seeded_ids) // 2, 1)))]
+    for index, team_id in enumerate(seeded_ids):
+        lap, offset = divmod(index, len(groups))
+        groups[offset if lap % 2 == 0 else len(groups) - 1 - offset].append(team_id)
+
+    layout = []
+    for group_number, group_ids in enumerate(groups):
+        for round_number, pairs in enumerate(round_robin_schedule(group_ids), start=1):
+            for position, (team1_id, team2_id) in enumerate(pairs):
+                layout.append(_new_slot(
+                    stage, 'group', round_number, position, group=group_number,
+                    team1_id=team1_id, team2_id=team2_id, team1_decided=True, team2_decided=True,
+                ))
+    return layout
+
+
+def build_swiss_round(stage, round_number, pairs):
+    return [
+        _new_slot(stage, 'swiss', round_number, position,
+                  team1_id=team1_id, team2_id=team2_id, team1_decided=True, team2_decided=True)
+        for position, (team1_id, team2_id) in enumerate(pairs)
+    ]
+
+
+BUILDERS = {
+    'single_elimination': build_single_elimination,
+    'double_elimination': build_double_elimination,
+    'round_robin': build_round_robin,
+}
+
+
+@transaction.atomic
+def generate_stage(stage, team_ids=None):
+    """Seed a pending stage and create its first matches.
+
+    `team_ids` defaults to every team registered for the tournament.
+    """
+    stage = Stage.objects.select_for_update().select_related('tournament').get(pk=stage.pk)
+    if stage.status != 'pending':
+        return stage
+
+    if team_ids is None:
+        team_ids = TournamentParticipation.objects.filter(
+            tournament=stage.tournament
+        ).values_list('team_id', flat=True)
+    seeded_ids = [team.id for team in seed_teams(Team.objects.filter(id__in=list(team_ids)))]
+
+    if len(seeded_ids) < 2:
+        raise ValueError('A stage needs at least two teams')
+
+    if stage.format == 'swiss':
+        if not stage.rounds:
+            stage.rounds = math.ceil(math.log2(len(seeded_ids)))
+        # Round 1: top half of the seeding meets the bottom half
+        half = len(seeded_ids) // 2
+        pairs = list(zip(seeded_ids[:half], seeded_ids[half:half * 2]))
+        if len(seeded_ids) % 2:
+            pairs.append((seeded_ids[-1], None))
+        layout = build_swiss_round(stage, 1, pairs)
+    else:
+        layout = BUILDERS[stage.format](stage, seeded_ids)
+        if stage.format == 'round_robin':
+            stage.rounds = max(slot.round_number for slot in layout)
+
+    _persist(layout)
+    if not stage.is_elimination:
+        groups = {slot.team1_id: slot.group for slot in layout}
+        groups.update({slot.team2_id: slot.group for slot in layout})
+        standings.create_standings(stage, seeded_ids, groups)
+
+    stage.status = 'ongoing'
+    stage.current_round = 1
+    stage.save(update_fields=['rounds', 'status', 'current_round'])
+    if stage.tournament.status == 'upcoming':
+        stage.tournament.status = 'ongoing'
+        stage.tournament.save(update_fields=['status'])
+
+    state = BracketState(stage)
+    for slot in layout:
+        if slot.team1_decided and slot.team2_decided:
+            state.ready(state.slots[slot.id])
+    state.save()
+    _check_progress(stage, state)
+    return stage
+
+
+@transaction.atomic
+def record_result(match):
+    """Advance the bracket after a match finishes; returns the tournament's id if a slot was resolved.
+
+    A drawn map decides nothing - its slot stays open until the match is
+    saved with a winner.
+    """
+    if not match.is_finished or match.team1_score == match.team2_score:
+        return
+    stage_id = BracketSlot.objects.filter(match=match, is_resolved=False).values_list('stage_id', flat=True).first()
+    if stage_id is None:
+        return
+
+    # One result at a time per stage, so concurrent finishes can't overwrite each other's slots or standings
+    stage = Stage.objects.select_for_update().select_related('tournament').get(pk=stage_id)
+    state = BracketState(stage, stage.slots.select_for_update())
+    slot = next((slot for slot in state.slots.values() if slot.match_id == match.id and not slot.is_resolved), None)
+    if slot is None:
+        return  # Resolved by a concurrent save while we waited for the lock
+    if match.team1_score > match.team2_score:
+        result = (match.team1_id, match.team2_id, (match.team1_score, match.team2_score))
+    else:
+        result = (match.team2_id, match.team1_id, (match.team2_score, match.team1_score))
+    state.finish(slot, *result)
+    state.save()
+    _check_progress(stage, state)
+    return stage.tournament_id
+
+
+def _check_progress(stage, state):
+    slots = state.slots.values()
+    if stage.format == 'swiss':
+        open_slots = [slot for slot in slots if slot.round_number == stage.current_round and not slot.is_resolved]
+        if open_slots:
+            return
+        if stage.current_round < stage.rounds:
+            _next_swiss_round(stage, state)
+            return
+    elif not all(slot.is_resolved for slot in slots):
+        return
+
+    _complete_stage(stage, state)
+
+
+def _next_swiss_round(stage, state):
+    rows = standings.ranked_standings(stage)
+    played = {frozenset((row.team_id, opponent_id)) for row in rows for opponent_id in row.opponents}
+    had_bye = {row.team_id for row in rows if row.had_bye}
+    pairs = standings.pair_swiss([row.team_id for row in rows], played, had_bye)
+
+    stage.current_round += 1
+    stage.save(update_fields=['current_round'])
+    layout = _persist(build_swiss_round(stage, stage.current_round, pairs))
+
+    state.slots.update({slot.id: slot for slot in layout})
+    for slot in layout:
+        state.ready(slot)
+    state.save()
+    _check_progress(stage, state)
+
+
+def _complete_stage(stage, state):
+    stage.status = 'completed'
+    stage.save(update_fields=['status'])
+
+    next_stage = stage.tournament.stages.filter(order__gt=stage.order, status='pending').order_by('order').first()
+
+    if not stage.is_elimination:
+        ranking = standings.stage_ranking(stage)
+        advancing = ranking[:stage.advance_count] if next_stage else []
+        if len(advancing) < 2:
+            advancing = []  # Nothing to play a next stage with - the tournament ends here
+        save_placements(stage.tournament_id, {
+            team_id: place for place, team_id in enumerate(ranking, start=1) if team_id not in advancing
+        })
+        if advancing:
+            from .tasks import generate_stage_bracket
+            transaction.on_commit(lambda: generate_stage_bracket.enqueue(next_stage.id, advancing))
+            return
+
+    # An elimination stage always ends the tournament (StageCreateForm doesn't allow stages after one)
+    stage.tournament.status = 'completed'
+    stage.tournament.save(update_fields=['status'])
+
+
+def next_stage_order(tournament):
+    return (tournament.stages.aggregate(highest=Max('order'))['highest'] or 0) + 1
@@ -0,0 +1,288 @@
+"""Tournament forecasts: how likely each team is to reach each stage and finish in each place.
+
+`build_plan` turns the tournament's current state into a plan for
+montecarlo.play_out: played slots keep their results, open slots are
+played against matches.odds' map win probabilities, and stages that
+haven't been generated yet are laid out with the same builders
+generate_stage uses, seeded from whoever the previous stage sends on.
+
+Forecasts are cached per tournament, keyed by a hash of the bracket
+state. `cached` serves the stored forecast and queues a background
+recompute (tasks.simulate_tournament) when the state has moved on;
+finishing a tournament match queues one too (see signals.py).
+"""
+import hashlib
+import math
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from matches.odds import MAP_POOL, map_win_matrix
+from teams.models import Team
+from .brackets import BUILDERS, seed_teams
+from .models import BracketSlot, TournamentForecast, TournamentParticipation
+from . import montecarlo, standings
+
+ROUND_NAMES = {1: 'Final', 2: 'Semifinals', 4: 'Quarterfinals'}
+
+
+def simulation_runs():
+    return getattr(settings, 'TOURNAMENT_SIMULATION_RUNS', 100000)
+
+
+def simulation_workers():
+    return getattr(settings, 'TOURNAMENT_SIMULATION_WORKERS', 0)
+
+
+def _map_index(round_number):
+    return (round_number - 1) % len(MAP_POOL)
+
+
+def state_key(tournament):
+    """Hash of the bracket state a forecast is computed from, or None for a tournament without stages"""
+    stages = list(tournament.stages.order_by('order').values_list(
+        'id', 'format', 'status', 'current_round', 'rounds', 'group_count', 'advance_count'
+    ))
+    if not stages:
+        return None
+    participants = sorted(TournamentParticipation.objects.filter(
+        tournament=tournament
+    ).values_list('team_id', flat=True))
+    slots = list(BracketSlot.objects.filter(stage__tournament=tournament).order_by('id').values_list(
+        'id', 'team1_id', 'team2_id', 'winner_id', 'is_resolved'
+    ))
+    state = repr((simulation_runs(), participants, stages, slots))
+    return hashlib.sha1(state.encode()).hexdigest()
+
+
+def _round_name(slot_count, double_elimination):
+    name = ROUND_NAMES.get(slot_count, f'Round of {slot_count * 2}')
+    return f'Upper {name}' if double_elimination else name
+
+
+def _elimination_stage(stage, entrant_count, team_source, milestones):
+    if entrant_count is None:
+        slots = list(stage.slots.all())
+        by_id = {slot.id: index for index, slot in enumerate(slots)}
+
+        def side_source(slot, side):
+            if not getattr(slot, f'team{side}_decided'):
+                return ('open',)  # Filled in when the feeding slot is played
+            return team_source(getattr(slot, f'team{side}_id'))
+
+        def link(slot, kind):
+            target = getattr(slot, f'{kind}_to_id')
+            return target and (by_id[target], getattr(slot, f'{kind}_to_side') - 1)
+    else:
+        # Not generated yet - lay it out over seed numbers, as generate_stage would over teams
+        slots = BUILDERS[stage.format](stage, list(range(1, entrant_count + 1)))
+        by_object = {id(slot): index for index, slot in enumerate(slots)}
+
+        def side_source(slot, side):
+            if not getattr(slot, f'team{side}_decided'):
+                return ('open',)
+            seed = getattr(slot, f'team{side}_id')
+            return ('seed', seed) if seed else ('team', -1)
+
+        def link(slot, kind):
+            targets = [(target, side) for link_kind, target, side in slot.links if link_kind == kind]
+            return targets and (by_object[id(targets[0][0])], targets[0][1] - 1)
+
+    # Everyone plays the first round, so round milestones start at the second
+    upper_rounds = defaultdict(int)
+    for slot in slots:
+        if slot.bracket == 'upper':
+            upper_rounds[slot.round_number] += 1
+    round_milestones = {}
+    for round_number, slot_count in sorted(upper_rounds.items())[1:]:
+        round_milestones[('upper', round_number)] = len(milestones)
+        milestones.append((stage.name, _round_name(slot_count, stage.format == 'double_elimination')))
+    for slot in slots:
+        if slot.bracket == 'grand_final':
+            round_milestones[('grand_final', slot.round_number)] = len(milestones)
+            milestones.append((stage.name, 'Grand Final'))
+
+    nodes = [{
+        'map': _map_index(slot.round_number),
+        'sides': [side_source(slot, 1), side_source(slot, 2)],
+        'resolved': slot.is_resolved,
+        'winner': team_source(slot.winner_id)[1] if slot.is_resolved else None,
+        'winner_to': link(slot, 'winner') or None,
+        'loser_to': link(slot, 'loser') or None,
+        'loser_placement': slot.loser_placement,
+        'milestone': round_milestones.get((slot.bracket, slot.round_number)),
+    } for slot in slots]
+    return {'kind': 'elimination', 'nodes': nodes, 'order': montecarlo.elimination_order(nodes), 'advance': 0}
+
+
+def _table_stage(stage, entrant_count, team_source, has_next):
+    fixtures = defaultdict(lambda: ([], [], []))
+    spec = {'kind': 'table', 'ranking': None, 'dynamic_rounds': []}
+
+    if entrant_count is None:
+        rows = sorted(stage.standings.all(), key=lambda row: row.seed)
+        member = {row.team_id: index for index, row in enumerate(rows)}
+        spec['members'] = [team_source(row.team_id) for row in rows]
+        spec['groups'] = [row.group for row in rows]
+        spec['wins'] = [row.wins for row in rows]
+        if stage.status == 'completed':
+            spec['ranking'] = [member[team_id] for team_id in standings.stage_ranking(stage)]
+        else:
+            for slot in stage.slots.all():
+                if not slot.is_resolved and slot.team1_id and slot.team2_id:
+                    fixtures[slot.round_number][0].append(member[slot.team1_id])
+                    fixtures[slot.round_number][1].append(member[slot.team2_id])
+            if stage.format == 'swiss':
+                spec['dynamic_rounds'] = [_map_index(number) for number in range(stage.current_round + 1,
+                                                                                  stage.rounds + 1)]
+    else:
+        spec['members'] = [('seed', seed) for seed in range(1, entrant_count + 1)]
+        spec['wins'] = [0] * entrant_count
+        spec['groups'] = [0] * entrant_count
+        if stage.format == 'swiss':
+            # Round 1: top half of the seeding meets the bottom half, as in generate_stage
+            half = entrant_count // 2
+            fixtures[1][0].extend(range(half))
+            fixtures[1][1].extend(range(half, half * 2))
+            if entrant_count % 2:
+                fixtures[1][2].append(entrant_count - 1)
+            rounds = stage.rounds or math.ceil(math.log2(entrant_count))
+            spec['dynamic_rounds'] = [_map_index(number) for number in range(2, rounds + 1)]
+        else:
+            for slot in BUILDERS[stage.format](stage, list(range(1, entrant_count + 1))):
+                fixtures[slot.round_number][0].append(slot.team1_id - 1)
+                fixtures[slot.round_number][1].append(slot.team2_id - 1)
+                spec['groups'][slot.team1_id - 1] = spec['groups'][slot.team2_id - 1] = slot.group
+
+    spec['rounds'] = [(_map_index(number), *fixtures[number]) for number in sorted(fixtures)]
+    spec['advance'] = min(stage.advance_count, len(spec['members'])) if has_next else 0
+    return spec
+
+
+def build_plan(tournament, stages=None):
+    """(plan for montecarlo.play_out, teams in plan order), or None without stages.
+
+    `stages` defaults to the tournament's own; unsaved Stage objects
+    forecast a format that hasn't been set up yet.
+    """
+    if stages is None:
+        stages = tournament.stages.order_by('order').prefetch_related(
+            Prefetch('slots', queryset=BracketSlot.objects.order_by('id')), 'standings'
+        )
+    stages = list(stages)
+    if not stages:
+        return None
+
+    # Team indexes follow the seeding, so seeding a later stage is a sort
+    teams = seed_teams(Team.objects.filter(tournament_participations__tournament=tournament))
+    known = {team.id for team in teams}
+    playing = {
+        team_id for stage in stages if stage.pk
+        for slot in stage.slots.all() for team_id in (slot.team1_id, slot.team2_id)
+    } | {row.team_id for stage in stages if stage.pk for row in stage.standings.all()}
+    if playing - known - {None}:
+        teams += seed_teams(Team.objects.filter(id__in=playing - known - {None}))
+    index = {team.id: position for position, team in enumerate(teams)}
+
+    def team_source(team_id):
+        return ('team', index[team_id] if team_id else -1)
+
+    specs, milestones = [], []
+    entrant_count = len(teams)
+    for position, stage in enumerate(stages):
+        generated = stage.pk and stage.status != 'pending'
+        if not generated and not entrant_count:
+            break  # Nobody is sent on to this stage
+        if stage.is_elimination:
+            spec = _elimination_stage(stage, None if generated else entrant_count, team_source, milestones)
+        else:
+            spec = _table_stage(stage, None if generated else entrant_count, team_source,
+                                position < len(stages) - 1)
+            spec['advance_milestone'] = None
+            if spec['advance']:
+                spec['advance_milestone'] = len(milestones)
+                milestones.append((stage.name, 'Advances'))
+
+        spec.update({
+            'source': 'fixed' if generated else ('all' if not position else 'previous'),
+            'entrant_count': entrant_count,
+        })
+        specs.append(spec)
+        entrant_count = spec['advance']
+
+    matrix = np.full((len(MAP_POOL), len(teams) + 1, len(teams) + 1), 0.5)
+    matrix[:, :-1, :-1] = map_win_matrix(teams)
+    plan = {'team_count': len(teams), 'win_matrix': matrix, 'stages': specs, 'milestones': milestones}
+    return plan, teams
+
+
+def simulate(tournament, runs=None, workers=None, seed=0, stages=None):
+    """Forecast results (see `summarize`) from `runs` play-outs, or None without stages"""
+    planned = build_plan(tournament, stages)
+    if planned is None:
+        return None
+    plan, teams = planned
+    runs = runs or simulation_runs()
+    placements, reach = montecarlo.play_out(
+        plan, runs, seed, simulation_workers() if workers is None else workers
+    )
+    return summarize(teams, plan['milestones'], placements, reach, runs)
+
+
+def summarize(teams, milestones, placements, reach, runs):
+    """JSON-ready probabilities per team, most likely winner first"""
+    rows = []
+    for index, team in enumerate(teams):
+        counts = placements[index]
+        places = np.flatnonzero(counts[1:]) + 1
+        placed = counts[places].sum()
+        rows.append({
+            'team_id': team.id,
+            'team': team.name,
+            'win': round(float(counts[1]) / runs, 4),
+            'reach': [round(float(count) / runs, 4) for count in reach[:, index]],
+            'placements': [[int(place), round(float(counts[place]) / runs, 4)] for place in places],
+            'expected_placement': round(float((places * counts[places]).sum() / placed), 2) if placed else None,
+        })
+    rows.sort(key=lambda row: (-row['win'], row['expected_placement'] or math.inf, row['team']))
+    return {
+        'runs': runs,
+        'milestones': [{'stage': stage, 'label': label} for stage, label in milestones],
+        'teams': rows,
+    }
+
+
+def refresh(tournament):
+    """Recompute and store the forecast unless the stored one matches the current state"""
+    key = state_key(tournament)
+    if key is None:
+        TournamentForecast.objects.filter(tournament=tournament).delete()
+        return None
+    forecast = TournamentForecast.objects.filter(tournament=tournament).first()
+    if forecast and forecast.state_key == key:
+        return forecast
+    results = simulate(tournament)
+    forecast, _ = TournamentForecast.objects.update_or_create(
+        tournament=tournament, defaults={'state_key': key, 'runs': results['runs'], 'results': results}
+    )
+    return forecast
+
+
+def queue_refresh(tournament_id):
+    from .tasks import simulate_tournament
+    transaction.on_commit(
+        lambda: simulate_tournament.enqueue(tournament_id, unique_key=f'forecast:{tournament_id}')
+    )
+
+
+def cached(tournament):
+    """(stored forecast or None, whether it is stale); a stale or missing forecast queues a recompute"""
+    key = state_key(tournament)
+    if key is None:
+        return None, False
+    forecast = TournamentForecast.objects.filter(tournament=tournament).first()
+    stale = forecast is None or forecast.state_key != key
+    if stale:
+        queue_refresh(tournament.id)
+    return forecast, stale
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Tournament, TournamentParticipation
+from .models import Tournament, TournamentParticipation, Stage
 
 
 class TournamentCreateForm(forms.ModelForm):
@@ -31,5 +31,46 @@ class TournamentRegistrationForm(forms.Form):
         from teams.models import Team
         self.fields['team'].queryset = Team.objects.filter(
             memberships__player=user,
-            memberships__is_active=True
-        ).distinct()
\ No newline at end of file
+            memberships__is_active=True,
+            is_temporary=False,
+        ).distinct()
+
+
+class StageCreateForm(forms.ModelForm):
+    class Meta:
+        model = Stage
+        fields = ['name', 'format', 'rounds', 'group_count', 'advance_count']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. Swiss Stage, Playoffs'}),
+            'format': forms.Select(attrs={'class': 'form-control'}),
+            'rounds': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
+            'group_count': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
+            'advance_count': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
+        }
+        help_texts = {
+            'rounds': 'Swiss only - 0 picks log2(teams) rounds',
+            'group_count': 'Round robin only',
+            'advance_count': 'Teams that move on if another stage follows (Swiss and round robin, at least 2)',
+        }
+
+    def __init__(self, *args, tournament=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tournament = tournament
+
+    def clean(self):
+        cleaned_data = super().clean()
+        stage_format = cleaned_data.get('format')
+        # Any Swiss or round robin stage may get a stage after it, which needs teams to seed
+        if stage_format in ('swiss', 'round_robin') and (cleaned_data.get('advance_count') or 0) < 2:
+            self.add_error('advance_count', 'Swiss and round robin stages must send at least 2 teams on.')
+
+        if self.tournament is not None:
+            if self.tournament.status in ('completed', 'cancelled'):
+                raise forms.ValidationError("This tournament is over - no more stages can be added.")
+            previous = self.tournament.stages.order_by('-order').first()
+            if previous is not None and previous.is_elimination:
+                raise forms.ValidationError("An elimination stage ends the tournament - no stage can follow it.")
+            if previous is not None and previous.advance_count < 2:
+                raise forms.ValidationError(f'"{previous.name}" sends no teams on, so no stage can follow it.')
+
+        return cleaned_data
@@ -25,6 +25,7 @@ class Tournament(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='upcoming')
     organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='organized_tournaments')
     banner = models.ImageField(upload_to='tournament_banners/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-start_date']
@@ -45,4 +46,126 @@ class TournamentParticipation(models.Model):
         ordering = ['placement']
 
     def __str__(self):
-        return f"{self.team.name} in {self.tournament.name}"
\ No newline at end of file
+        return f"{self.team.name} in {self.tournament.name}"
+
+
+class Stage(models.Model):
+    FORMAT_CHOICES = [
+        ('single_elimination', 'Single Elimination'),
+        ('double_elimination', 'Double Elimination'),
+        ('swiss', 'Swiss'),
+        ('round_robin', 'Round Robin Groups'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ongoing', 'Ongoing'),
+        ('completed', 'Completed'),
+    ]
+
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='stages')
+    name = models.CharField(max_length=100)
+    format = models.CharField(max_length=20, choices=FORMAT_CHOICES, default='single_elimination')
+    order = models.IntegerField(default=1)
+    rounds = models.IntegerField(default=0, validators=[MinValueValidator(0)])  # Swiss rounds, 0 = log2(teams)
+    group_count = models.IntegerField(default=1, validators=[MinValueValidator(1)])  # Round robin groups
+    advance_count = models.IntegerField(default=0, validators=[MinValueValidator(0)])  # Teams sent to the next stage
+    current_round = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    class Meta:
+        ordering = ['tournament', 'order']
+        unique_together = ['tournament', 'order']
+
+    def __str__(self):
+        return f"{self.tournament.name} - {self.name}"
+
+    @property
+    def is_elimination(self):
+        return self.format in ('single_elimination', 'double_elimination')
+
+
+class BracketSlot(models.Model):
+    BRACKET_CHOICES = [
+        ('upper', 'Upper Bracket'),
+        ('lower', 'Lower Bracket'),
+        ('grand_final', 'Grand Final'),
+        ('swiss', 'Swiss'),
+        ('group', 'Group'),
+    ]
+
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name='slots')
+    bracket = models.CharField(max_length=20, choices=BRACKET_CHOICES, default='upper')
+    group = models.IntegerField(default=0)
+    round_number = models.IntegerField(validators=[MinValueValidator(1)])
+    position = models.IntegerField(default=0)
+    team1 = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    team2 = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # A side is decided once its feeder slot has finished - an empty decided side is a bye
+    team1_decided = models.BooleanField(default=False)
+    team2_decided = models.BooleanField(default=False)
+    match = models.OneToOneField('matches.Match', on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='bracket_slot')
+    winner = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    is_resolved = models.BooleanField(default=False)
+    winner_to = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    winner_to_side = models.SmallIntegerField(default=1)
+    loser_to = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    loser_to_side = models.SmallIntegerField(default=1)
+    loser_placement = models.IntegerField(null=True, blank=True)  # Placement for a team eliminated here
+
+    class Meta:
+        ordering = ['stage', 'bracket', 'group', 'round_number', 'position']
+        indexes = [
+            models.Index(fields=['stage', 'round_number']),
+        ]
+
+    def __str__(self):
+        return f"{self.stage} - {self.get_bracket_display()} R{self.round_number} #{self.position + 1}"
+
+
+class StageStanding(models.Model):
+    """Per-team standings row for Swiss and round robin stages, kept up to date as results arrive"""
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name='standings')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='stage_standings')
+    group = models.IntegerField(default=0)
+    seed = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    rounds_for = models.IntegerField(default=0)
+    rounds_against = models.IntegerField(default=0)
+    buchholz = models.IntegerField(default=0)  # Sum of opponents' wins
+    sonneborn_berger = models.IntegerField(default=0)  # Sum of beaten opponents' wins
+    opponent_games = models.IntegerField(default=0)  # Sum of opponents' games, for opponent win rate
+    opponents = models.JSONField(default=list)  # Team ids played so far
+    beaten = models.JSONField(default=list)  # Team ids beaten so far
+    had_bye = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['stage', 'team']
+        ordering = ['stage', 'group', '-wins', '-buchholz', '-sonneborn_berger', 'seed']
+
+    def __str__(self):
+        return f"{self.team.name} {self.wins}-{self.losses} in {self.stage}"
+
+    @property
+    def round_differential(self):
+        return self.rounds_for - self.rounds_against
+
+    @property
+    def opponent_win_rate(self):
+        if self.opponent_games == 0:
+            return 0
+        return round((self.buchholz / self.opponent_games) * 100, 1)
+
+
+class TournamentForecast(models.Model):
+    """Cached Monte Carlo forecast (see forecast.py), valid while the bracket state hashes to `state_key`"""
+    tournament = models.OneToOneField(Tournament, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    state_key = models.CharField(max_length=40)
+    runs = models.IntegerField(default=0)
+    results = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Forecast for {self.tournament.name} ({self.runs} runs)"
@@ -0,0 +1,215 @@
+"""Vectorized Monte Carlo play-out of a tournament's remaining matches.
+
+A shard is a pure function of the plan and its seed and never touches
+the ORM, so play_out can hand it to a spawned worker as-is. A plan (see
+forecast.build_plan) describes every stage; each match is played for
+all runs of a shard at once - one random draw against the map win
+matrix per match, not per run. Every shard is seeded from (seed, shard
+index), which keeps the totals identical whatever the worker count.
+
+Team indexes are positions in the plan's seeding order, so "sort by
+seed" is a plain sort. -1 is an empty side: the win matrix and the
+placement array carry one padding row/column, so -1 indexes it and a
+bye needs no special case until the winner is picked.
+
+Swiss and round robin tiebreakers (Buchholz, Sonneborn-Berger, round
+difference) aren't simulated - teams on equal wins are ordered at
+random - and later Swiss rounds pair neighbours in the standings
+without checking for rematches.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+SHARD_RUNS = 25000
+
+_plan = None
+
+
+def init_worker(plan):
+    """Pool initializer - the plan (and its win matrix) is sent once per worker instead of once per shard"""
+    global _plan
+    _plan = plan
+
+
+def elimination_order(nodes):
+    """Node indexes ordered so every slot comes after the slots feeding it"""
+    feeders = [0] * len(nodes)
+    for node in nodes:
+        for link in (node['winner_to'], node['loser_to']):
+            if link:
+                feeders[link[0]] += 1
+
+    ready = [index for index, count in enumerate(feeders) if not count]
+    order = []
+    while ready:
+        index = ready.pop()
+        order.append(index)
+        for link in (nodes[index]['winner_to'], nodes[index]['loser_to']):
+            if link:
+                feeders[link[0]] -= 1
+                if not feeders[link[0]]:
+                    ready.append(link[0])
+    return order
+
+
+def _source(source, runs, entrants):
+    kind = source[0]
+    if kind == 'team':
+        return np.full(runs, source[1], dtype=np.intp)
+    if kind == 'seed':
+        return entrants[:, source[1] - 1]
+    return np.full(runs, -1, dtype=np.intp)  # Filled in by the feeding slot
+
+
+def _play(rng, matrix, map_index, first, second):
+    """(winners, losers) of one match per run; a side of -1 gives the other team a bye"""
+    won = rng.random(first.shape) < matrix[map_index, first, second]
+    winners = np.where(won, first, second)
+    losers = np.where(won, second, first)
+    bye = (first < 0) | (second < 0)
+    return np.where(bye, np.maximum(first, second), winners), np.where(bye, -1, losers)
+
+
+def _count(reach, teams):
+    teams = teams[teams >= 0]
+    reach += np.bincount(teams, minlength=len(reach))[:len(reach)]
+
+
+def _play_elimination(rng, matrix, stage, entrants, placements, reach):
+    runs = len(placements)
+    rows = np.arange(runs)
+    nodes = stage['nodes']
+    sides = [[_source(source, runs, entrants) for source in node['sides']] for node in nodes]
+
+    for index in stage['order']:
+        node = nodes[index]
+        first, second = sides[index]
+        if node['milestone'] is not None:
+            _count(reach[node['milestone']], np.concatenate([first, second]))
+
+        if node['resolved']:
+            winners = np.full(runs, node['winner'], dtype=np.intp)
+            losers = np.where(first == winners, second, first)
+            losers[(first < 0) | (second < 0)] = -1
+        else:
+            winners, losers = _play(rng, matrix, node['map'], first, second)
+
+        if node['winner_to']:
+            target, side = node['winner_to']
+            sides[target][side] = winners
+        else:
+            placements[rows, winners] = 1
+        if node['loser_to']:
+            target, side = node['loser_to']
+            sides[target][side] = losers
+        elif node['loser_placement']:
+            placements[rows, losers] = node['loser_placement']
+    return None
+
+
+def _rank(rng, wins, groups):
+    """Member positions best-first per run; groups are interleaved like standings.stage_ranking"""
+    key = wins + rng.random(wins.shape)  # Random tiebreak between teams on equal wins
+    groups = np.asarray(groups)
+    group_numbers = np.unique(groups)
+    place = np.empty(wins.shape, dtype=np.intp)
+    for number in group_numbers:
+        columns = np.flatnonzero(groups == number)
+        order = np.argsort(-key[:, columns], axis=1)
+        np.put_along_axis(place, columns[order], np.broadcast_to(np.arange(len(columns)), order.shape), axis=1)
+    return np.argsort(place * len(group_numbers) + np.searchsorted(group_numbers, groups), axis=1)
+
+
+def _play_table(rng, matrix, stage, entrants, placements, reach):
+    runs = len(placements)
+    rows = np.arange(runs)[:, None]
+    teams = np.stack([_source(source, runs, entrants) for source in stage['members']], axis=1)
+
+    if stage['ranking'] is not None:
+        ranked = teams[:, stage['ranking']]
+    else:
+        wins = np.tile(np.asarray(stage['wins'], dtype=np.float64), (runs, 1))
+        for map_index, first, second, byes in stage['rounds']:
+            if first:
+                won = rng.random((runs, len(first))) < matrix[map_index, teams[:, first], teams[:, second]]
+                wins[:, first] += won
+                wins[:, second] += ~won
+            if byes:
+                wins[:, byes] += 1
+
+        for map_index in stage['dynamic_rounds']:
+            # Swiss: pair neighbours in this run's standings; the last team gets a bye on odd counts
+            order = np.argsort(-(wins + rng.random(wins.shape)), axis=1)
+            if order.shape[1] % 2:
+                wins[rows[:, 0], order[:, -1]] += 1
+                order = order[:, :-1]
+            first, second = order[:, 0::2], order[:, 1::2]
+            won = rng.random(first.shape) < matrix[map_index, teams[rows, first], teams[rows, second]]
+            wins[rows, first] += won
+            wins[rows, second] += ~won
+        ranked = np.take_along_axis(teams, _rank(rng, wins, stage['groups']), axis=1)
+
+    advance = stage['advance']
+    placements[rows, ranked[:, advance:]] = np.arange(advance + 1, ranked.shape[1] + 1)
+    if not advance:
+        return None
+    advancing = ranked[:, :advance]
+    if stage['advance_milestone'] is not None:
+        _count(reach[stage['advance_milestone']], advancing.ravel())
+    return np.sort(advancing, axis=1)  # Seeded for the next stage
+
+
+PLAYERS = {
+    'elimination': _play_elimination,
+    'table': _play_table,
+}
+
+
+def play_shard(plan, seed, shard_index, runs):
+    """(placement counts [teams, places + 1], milestone counts [milestones, teams]) for one shard"""
+    rng = np.random.default_rng([seed, shard_index])
+    matrix, team_count = plan['win_matrix'], plan['team_count']
+    placements = np.zeros((runs, team_count + 1), dtype=np.int16)
+    reach = np.zeros((len(plan['milestones']), team_count), dtype=np.int64)
+
+    advancing = None
+    for stage in plan['stages']:
+        if stage['source'] == 'all':
+            entrants = np.broadcast_to(np.arange(stage['entrant_count']), (runs, stage['entrant_count']))
+        elif stage['source'] == 'previous':
+            if advancing is None:
+                break  # The previous stage sends nobody on, so this one never starts
+            entrants = advancing
+        else:
+            entrants = None
+        advancing = PLAYERS[stage['kind']](rng, matrix, stage, entrants, placements, reach)
+
+    flat = placements[:, :team_count] + np.arange(team_count) * (team_count + 1)
+    counts = np.bincount(flat.ravel(), minlength=team_count * (team_count + 1))
+    return counts.reshape(team_count, team_count + 1), reach
+
+
+def _play_worker_shard(shard):
+    return play_shard(_plan, *shard)
+
+
+def play_out(plan, runs, seed=0, workers=0):
+    """Summed shard counts for `runs` play-outs; workers > 1 plays shards in a process pool"""
+    shards = [
+        (seed, index, min(SHARD_RUNS, runs - start))
+        for index, start in enumerate(range(0, runs, SHARD_RUNS))
+    ]
+    if workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(shards)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker, initargs=(plan,),
+        ) as pool:
+            results = list(pool.map(_play_worker_shard, shards))
+    else:
+        results = [play_shard(plan, *shard) for shard in shards]
+
+    placements = sum(result[0] for result in results)
+    reach = sum(result[1] for result in results)
+    return placements, reach
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from matches.models import Match
+from . import brackets, forecast
+
+
+@receiver(post_save, sender=Match)
+def advance_bracket(sender, instance, **kwargs):
+    """Move the winner (and loser, in double elimination) on when a bracket match finishes"""
+    if instance.is_finished and instance.match_type == 'tournament':
+        tournament_id = brackets.record_result(instance)
+        if tournament_id:
+            # Re-run the forecast in the background against the new bracket state
+            forecast.queue_refresh(tournament_id)
@@ -0,0 +1,175 @@
+"""Incrementally maintained standings for Swiss and round robin stages.
+
+Each result only touches the two teams involved and their previous
+opponents, so recording a result is O(rounds) instead of a rescan of
+every match in the stage:
+
+- Buchholz: when a team gains a win, each of its opponents gains +1.
+- Sonneborn-Berger: when a team gains a win, each team that beat it gains +1.
+- Opponent win rate: Buchholz over the opponents' total games, where each
+  game played adds +1 to the opponents' opponent_games.
+"""
+from collections import defaultdict
+from django.db.models import F
+from .models import StageStanding
+
+STANDING_FIELDS = [
+    'wins', 'losses', 'rounds_for', 'rounds_against', 'buchholz', 'sonneborn_berger',
+    'opponent_games', 'opponents', 'beaten', 'had_bye',
+]
+
+
+def ranking_order():
+    return [
+        '-wins', '-buchholz', '-sonneborn_berger',
+        (F('rounds_for') - F('rounds_against')).desc(), 'seed',
+    ]
+
+
+def create_standings(stage, seeded_ids, groups=None):
+    """One row per team; `groups` maps team id -> round robin group"""
+    groups = groups or {}
+    StageStanding.objects.bulk_create([
+        StageStanding(stage=stage, team_id=team_id, seed=seed, group=groups.get(team_id, 0))
+        for seed, team_id in enumerate(seeded_ids, start=1)
+    ])
+
+
+def record_results(stage, results):
+    """Apply (winner_id, loser_id or None, winner_rounds, loser_rounds) results in order"""
+    if not results:
+        return
+
+    involved = {team_id for result in results for team_id in result[:2] if team_id}
+    rows = {row.team_id: row for row in StageStanding.objects.select_for_update().filter(
+        stage=stage, team_id__in=involved
+    )}
+    # Previous opponents are touched by the propagation rules above
+    opponent_ids = {team_id for row in rows.values() for team_id in row.opponents} - set(rows)
+    rows.update({row.team_id: row for row in StageStanding.objects.select_for_update().filter(
+        stage=stage, team_id__in=opponent_ids
+    )})
+
+    for winner_id, loser_id, winner_rounds, loser_rounds in results:
+        winner = rows[winner_id]
+        if loser_id is None:
+            winner.had_bye = True
+            _add_win(winner, rows)
+            continue
+
+        loser = rows[loser_id]
+        winner.rounds_for += winner_rounds
+        winner.rounds_against += loser_rounds
+        loser.rounds_for += loser_rounds
+        loser.rounds_against += winner_rounds
+
+        # Meet first, using each side's record before this game...
+        winner.opponents.append(loser_id)
+        loser.opponents.append(winner_id)
+        winner.beaten.append(loser_id)
+        winner.buchholz += loser.wins
+        loser.buchholz += winner.wins
+        winner.sonneborn_berger += loser.wins
+        winner.opponent_games += loser.wins + loser.losses
+        loser.opponent_games += winner.wins + winner.losses
+
+        # ...then let the new game and win ripple out to everyone they've played
+        _add_win(winner, rows)
+        loser.losses += 1
+        _add_game(loser, rows)
+
+    StageStanding.objects.bulk_update(list(rows.values()), STANDING_FIELDS)
+
+
+def _add_win(row, rows):
+    row.wins += 1
+    for opponent_id in row.opponents:
+        opponent = rows[opponent_id]
+        opponent.buchholz += 1
+        if row.team_id in opponent.beaten:
+            opponent.sonneborn_berger += 1
+    _add_game(row, rows)
+
+
+def _add_game(row, rows):
+    for opponent_id in row.opponents:
+        rows[opponent_id].opponent_games += 1
+
+
+def ranked_standings(stage):
+    """Standings best-first within each group"""
+    return list(StageStanding.objects.filter(stage=stage).select_related('team').order_by('group', *ranking_order()))
+
+
+def stage_ranking(stage):
+    """Team ids best-first. Groups are interleaved: every group winner, then every runner-up..."""
+    by_group = defaultdict(list)
+    for row in StageStanding.objects.filter(stage=stage).order_by('group', *ranking_order()):
+        by_group[row.group].append(row.team_id)
+
+    ranked_groups = [team_ids for _, team_ids in sorted(by_group.items())]
+    ranking = []
+    for place in range(max((len(group) for group in ranked_groups), default=0)):
+        ranking.extend(group[place] for group in ranked_groups if place < len(group))
+    return ranking
+
+
+def pair_swiss(ranked_team_ids, played_pairs, had_bye=()):
+    """Pair a Swiss round as a perfect matching on the not-yet-played graph.
+
+    Teams are taken in standings order and each is matched to the
+    closest-ranked team it hasn't played, so score groups float down on
+    their own. When the tail of the list can't be completed the search
+    backs up to the latest choice that still has alternatives - in practice
+    only the last few pairs - keeping a 1024-team round at a few ms.
+    Rematches are only allowed if no rematch-free pairing exists.
+    """
+    teams = list(ranked_team_ids)
+    pairs = []
+
+    if len(teams) % 2:
+        # Lowest-ranked team that hasn't had a bye yet sits out
+        bye_index = next((i for i in range(len(teams) - 1, -1, -1) if teams[i] not in had_bye), len(teams) - 1)
+        pairs.append((teams.pop(bye_index), None))
+
+    matching = _match_in_order(teams, played_pairs)
+    if matching is None:
+        matching = _match_in_order(teams, frozenset())
+
+    pairs.extend(matching)
+    pairs.reverse()
+    return pairs
+
+
+def _match_in_order(teams, played_pairs, budget=100000):
+    paired = [False] * len(teams)
+    stack = []  # (team index, opponent index) for each pair chosen so far
+    start_from = 0
+    steps = 0
+
+    while len(stack) * 2 < len(teams):
+        team_index = paired.index(False)
+        paired[team_index] = True
+        opponent_index = next(
+            (j for j in range(max(start_from, team_index + 1), len(teams))
+             if not paired[j] and frozenset((teams[team_index], teams[j])) not in played_pairs),
+            None,
+        )
+
+        if opponent_index is not None:
+            paired[opponent_index] = True
+            stack.append((team_index, opponent_index))
+            start_from = 0
+            continue
+
+        # Dead end - undo the latest pair and try its next candidate
+        paired[team_index] = False
+        steps += 1
+        if not stack or steps > budget:
+            return None
+        previous_team, previous_opponent = stack.pop()
+        paired[previous_team] = False
+        paired[previous_opponent] = False
+        start_from = previous_opponent + 1
+
+    return [(teams[i], teams[j]) for i, j in stack]
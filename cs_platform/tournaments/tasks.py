@@ -0,0 +1,18 @@
+from tasks.queue import task
+from .models import Stage, Tournament
+from . import brackets, forecast
+
+
+@task
+def generate_stage_bracket(stage_id, team_ids=None):
+    """Seed a stage and create its opening matches"""
+    stage = Stage.objects.select_related('tournament').get(pk=stage_id)
+    brackets.generate_stage(stage, team_ids)
+
+
+@task
+def simulate_tournament(tournament_id):
+    """Recompute a tournament's forecast if its bracket has moved on"""
+    tournament = Tournament.objects.filter(pk=tournament_id).first()
+    if tournament is not None:
+        forecast.refresh(tournament)
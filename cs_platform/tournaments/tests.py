@@ -1,3 +1,348 @@
-from django.test import TestCase
+import time
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from teams.models import Team
+from matches.forms import MatchResultForm
+from matches.models import Match
+from tournaments.models import Tournament, TournamentParticipation, Stage, BracketSlot, TournamentForecast
+from tournaments import brackets, forecast, montecarlo, standings
+from tasks.queue import run_pending
 
-# Create your tests here.
+User = get_user_model()
+
+
+class BracketTestMixin:
+    def create_tournament(self, team_count):
+        self.organizer = User.objects.create_user('organizer', 'org@test.com', 'pass123')
+        self.tournament = Tournament.objects.create(
+            name='Test Cup',
+            organizer=self.organizer,
+            start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=7),
+            registration_deadline=timezone.now(),
+            max_teams=team_count,
+        )
+        self.teams = [
+            Team.objects.create(name=f'Team {i}', tag=f'T{i}', is_professional=True, world_ranking=i + 1)
+            for i in range(team_count)
+        ]
+        for team in self.teams:
+            TournamentParticipation.objects.create(tournament=self.tournament, team=team)
+
+    def create_stage(self, format, **kwargs):
+        stage = Stage.objects.create(tournament=self.tournament, name=format, format=format, **kwargs)
+        return brackets.generate_stage(stage)
+
+    def play_open_matches(self, stage, winner_is_better_seed=True):
+        """Finish every scheduled match - the better world ranking wins"""
+        played = 0
+        for slot in stage.slots.filter(match__isnull=False, is_resolved=False).select_related('match'):
+            match = slot.match
+            team1_wins = match.team1.world_ranking < match.team2.world_ranking
+            if not winner_is_better_seed:
+                team1_wins = not team1_wins
+            match.team1_score, match.team2_score = (13, 8) if team1_wins else (8, 13)
+            match.is_finished = True
+            match.save()
+            played += 1
+        return played
+
+    def placement(self, team):
+        return TournamentParticipation.objects.get(tournament=self.tournament, team=team).placement
+
+
+class BracketOrderTest(TestCase):
+    def test_bracket_order(self):
+        """Test that top seeds are kept apart until the final"""
+        self.assertEqual(brackets.bracket_order(8), [1, 8, 4, 5, 2, 7, 3, 6])
+
+    def test_round_robin_schedule_plays_everyone_once(self):
+        """Test the circle method schedule"""
+        rounds = brackets.round_robin_schedule([1, 2, 3, 4, 5])
+        pairs = [frozenset(pair) for round_pairs in rounds for pair in round_pairs]
+        self.assertEqual(len(pairs), 10)
+        self.assertEqual(len(set(pairs)), 10)
+
+    def test_swiss_pairing_1024_teams_is_fast(self):
+        """Test that a 1024-team Swiss round pairs well under a second"""
+        team_ids = list(range(1024))
+        played = {frozenset((i, i + 512)) for i in range(512)}
+        start = time.perf_counter()
+        pairs = standings.pair_swiss(team_ids, played)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(len(pairs), 512)
+        self.assertFalse(any(frozenset(pair) in played for pair in pairs))
+
+
+class SingleEliminationTest(BracketTestMixin, TestCase):
+    def setUp(self):
+        self.create_tournament(6)
+
+    def test_byes_advance_and_final_sets_placements(self):
+        """Test a 6-team bracket: 2 byes, winners advance until the final"""
+        stage = self.create_stage('single_elimination')
+        self.assertEqual(stage.slots.count(), 7)
+        self.assertEqual(Match.objects.count(), 2)  # Seeds 1 and 2 have byes
+
+        while self.play_open_matches(stage):
+            pass
+
+        stage.refresh_from_db()
+        self.assertEqual(stage.status, 'completed')
+        self.assertEqual(self.placement(self.teams[0]), 1)
+        self.assertEqual(self.placement(self.teams[1]), 2)
+        self.assertEqual(self.placement(self.teams[2]), 3)
+        self.tournament.refresh_from_db()
+        self.assertEqual(self.tournament.status, 'completed')
+
+    def test_drawn_map_leaves_the_slot_open(self):
+        """Test that a draw resolves nothing and a draw can't be entered as a tournament result"""
+        stage = self.create_stage('single_elimination')
+        match = Match.objects.first()
+        match.team1_score = match.team2_score = 12
+        match.is_finished = True
+        match.save()
+        self.assertFalse(stage.slots.get(match=match).is_resolved)
+
+        form = MatchResultForm({'team1_score': 12, 'team2_score': 12, 'duration_minutes': 40, 'is_finished': True},
+                               instance=match)
+        self.assertFalse(form.is_valid())
+
+
+class DoubleEliminationTest(BracketTestMixin, TestCase):
+    def setUp(self):
+        self.create_tournament(8)
+
+    def test_upper_losers_drop_to_lower_bracket(self):
+        """Test that an upset in the upper bracket still lets the favourite win via the lower bracket"""
+        stage = self.create_stage('double_elimination')
+        self.assertEqual(stage.slots.filter(bracket='lower').count(), 6)
+
+        # Underdogs win round 1, favourites win everything after
+        self.play_open_matches(stage, winner_is_better_seed=False)
+        while self.play_open_matches(stage):
+            pass
+
+        self.assertEqual(BracketSlot.objects.filter(stage=stage, is_resolved=False).count(), 0)
+        grand_final = stage.slots.get(bracket='grand_final')
+        self.assertIsNotNone(grand_final.winner)
+        self.assertEqual(self.placement(grand_final.winner), 1)
+        self.assertEqual(
+            TournamentParticipation.objects.filter(tournament=self.tournament, placement__isnull=False).count(), 8
+        )
+
+
+class SwissAndRoundRobinTest(BracketTestMixin, TestCase):
+    def setUp(self):
+        self.create_tournament(8)
+
+    def test_swiss_rounds_generate_without_rematches(self):
+        """Test that each finished Swiss round pairs the next one"""
+        stage = self.create_stage('swiss')
+        self.assertEqual(stage.rounds, 3)
+
+        while self.play_open_matches(stage):
+            pass
+
+        stage.refresh_from_db()
+        self.assertEqual(stage.status, 'completed')
+        pairs = [frozenset((slot.team1_id, slot.team2_id)) for slot in stage.slots.all()]
+        self.assertEqual(len(pairs), 12)
+        self.assertEqual(len(set(pairs)), 12)
+        self.assertEqual(self.placement(self.teams[0]), 1)
+
+    def test_swiss_top_teams_advance_to_playoffs(self):
+        """Test that the next stage is seeded from the Swiss standings"""
+        swiss = self.create_stage('swiss', advance_count=4)
+        playoffs = Stage.objects.create(tournament=self.tournament, name='Playoffs',
+                                        format='single_elimination', order=2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            while self.play_open_matches(swiss):
+                pass
+        run_pending()
+
+        playoffs.refresh_from_db()
+        self.assertEqual(playoffs.status, 'ongoing')
+        seeded = {team_id for slot in playoffs.slots.filter(round_number=1)
+                  for team_id in (slot.team1_id, slot.team2_id)}
+        self.assertEqual(seeded, set(standings.stage_ranking(swiss)[:4]))
+
+    def test_stage_without_advancing_teams_completes_the_tournament(self):
+        """Test that a Swiss stage sending no teams on still ends the tournament"""
+        swiss = self.create_stage('swiss')
+        Stage.objects.create(tournament=self.tournament, name='Playoffs', format='single_elimination', order=2)
+        while self.play_open_matches(swiss):
+            pass
+        self.tournament.refresh_from_db()
+        self.assertEqual(self.tournament.status, 'completed')
+        self.assertEqual(
+            TournamentParticipation.objects.filter(tournament=self.tournament, placement__isnull=False).count(), 8
+        )
+
+    def test_round_robin_groups(self):
+        """Test that two groups of four play six matches each"""
+        stage = self.create_stage('round_robin', group_count=2)
+        self.assertEqual(Match.objects.count(), 12)
+        self.assertEqual(stage.rounds, 3)
+
+
+class StageViewTest(BracketTestMixin, TestCase):
+    def setUp(self):
+        self.create_tournament(4)
+        self.client.login(username='organizer', password='pass123')
+
+    def test_organizer_creates_stage_and_bracket_renders(self):
+        """Test that the first stage is generated in the background and shown on the detail page"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('create_stage', kwargs={'tournament_id': self.tournament.pk}), {
+                'name': 'Playoffs', 'format': 'single_elimination',
+                'rounds': 0, 'group_count': 1, 'advance_count': 0,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(run_pending(), 1)
+
+        response = self.client.get(reverse('tournament_detail', kwargs={'pk': self.tournament.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Playoffs')
+        self.assertContains(response, '[T0] Team 0')
+
+    def test_stage_layouts_that_could_never_finish_are_rejected(self):
+        """Test that Swiss stages must send teams on and nothing may follow an elimination stage"""
+        url = reverse('create_stage', kwargs={'tournament_id': self.tournament.pk})
+        settings = {'rounds': 0, 'group_count': 1, 'advance_count': 0}
+        self.client.post(url, {'name': 'Swiss', 'format': 'swiss', **settings})
+        self.assertFalse(Stage.objects.exists())
+
+        self.client.post(url, {'name': 'Playoffs', 'format': 'single_elimination', **settings})
+        self.client.post(url, {'name': 'Showmatch', 'format': 'single_elimination', **settings})
+        self.assertEqual(list(Stage.objects.values_list('name', flat=True)), ['Playoffs'])
+
+
+class SwissStandingsTest(BracketTestMixin, TestCase):
+    def setUp(self):
+        self.create_tournament(9)
+
+    def test_incremental_tiebreaks_match_full_recompute(self):
+        """Test Buchholz, Sonneborn-Berger and opponent games against a from-scratch recompute"""
+        stage = self.create_stage('swiss', rounds=4)
+        # Alternate which side wins so records spread out
+        flip = False
+        while True:
+            open_slots = stage.slots.filter(match__isnull=False, is_resolved=False).select_related('match')
+            if not open_slots:
+                break
+            for slot in open_slots:
+                flip = not flip
+                slot.match.team1_score, slot.match.team2_score = (13, 11) if flip else (9, 13)
+                slot.match.is_finished = True
+                slot.match.save()
+
+        rows = {row.team_id: row for row in stage.standings.all()}
+        self.assertEqual(sum(row.wins for row in rows.values()), stage.slots.count())
+        for row in rows.values():
+            opponents = [rows[team_id] for team_id in row.opponents]
+            self.assertEqual(row.buchholz, sum(o.wins for o in opponents))
+            self.assertEqual(row.sonneborn_berger, sum(rows[team_id].wins for team_id in row.beaten))
+            self.assertEqual(row.opponent_games, sum(o.wins + o.losses for o in opponents))
+            self.assertEqual(len(row.opponents), len(set(row.opponents)))  # No rematches
+        self.assertEqual(sum(row.had_bye for row in rows.values()), 4)  # A different team each round
+
+    def test_pairing_backtracks_instead_of_forcing_a_rematch(self):
+        """Test that the last pair isn't forced into a rematch"""
+        played = {frozenset((3, 4))}
+        pairs = standings.pair_swiss([1, 2, 3, 4], played)
+        self.assertNotIn(frozenset((3, 4)), [frozenset(pair) for pair in pairs])
+
+
+@override_settings(TOURNAMENT_SIMULATION_RUNS=20000)
+class ForecastTest(BracketTestMixin, TestCase):
+    def setUp(self):
+        self.create_tournament(8)
+
+    def win_chances(self, results):
+        return {row['team_id']: row['win'] for row in results['teams']}
+
+    def test_probabilities_add_up(self):
+        """Test that every team finishes somewhere and exactly four reach the semifinals"""
+        self.create_stage('single_elimination')
+        results = forecast.simulate(self.tournament)
+
+        self.assertEqual([milestone['label'] for milestone in results['milestones']], ['Semifinals', 'Final'])
+        self.assertAlmostEqual(sum(row['win'] for row in results['teams']), 1, places=3)
+        self.assertAlmostEqual(sum(row['reach'][0] for row in results['teams']), 4, places=3)
+        for row in results['teams']:
+            self.assertAlmostEqual(sum(chance for _, chance in row['placements']), 1, places=3)
+        self.assertEqual(results['teams'][0]['team_id'], self.teams[0].id)  # Best ranked is the favourite
+
+    def test_played_matches_are_respected(self):
+        """Test that first-round losers can't win and finish fifth"""
+        stage = self.create_stage('single_elimination')
+        self.play_open_matches(stage, winner_is_better_seed=False)
+        losers = [slot.team1_id if slot.winner_id == slot.team2_id else slot.team2_id
+                  for slot in stage.slots.filter(round_number=1)]
+
+        results = forecast.simulate(self.tournament)
+        rows = {row['team_id']: row for row in results['teams']}
+        for team_id in losers:
+            self.assertEqual(rows[team_id]['win'], 0)
+            self.assertEqual(rows[team_id]['placements'], [[5, 1.0]])
+
+    def test_pending_stages_are_forecast(self):
+        """Test that Swiss qualifiers send exactly four teams on to playoffs that don't exist yet"""
+        self.create_stage('swiss', advance_count=4)
+        Stage.objects.create(tournament=self.tournament, name='Playoffs', format='single_elimination', order=2)
+        results = forecast.simulate(self.tournament)
+
+        labels = [(milestone['stage'], milestone['label']) for milestone in results['milestones']]
+        self.assertEqual(labels, [('swiss', 'Advances'), ('Playoffs', 'Final')])
+        self.assertAlmostEqual(sum(row['reach'][0] for row in results['teams']), 4, places=3)
+        self.assertAlmostEqual(sum(row['win'] for row in results['teams']), 1, places=3)
+
+    def test_shards_give_the_same_totals_in_a_process_pool(self):
+        """Test that sharded runs don't depend on the worker count"""
+        self.create_stage('double_elimination')
+        plan, _ = forecast.build_plan(self.tournament)
+        runs = montecarlo.SHARD_RUNS + 500
+
+        inline = montecarlo.play_out(plan, runs, seed=7)
+        pooled = montecarlo.play_out(plan, runs, seed=7, workers=2)
+        np.testing.assert_array_equal(inline[0], pooled[0])
+        np.testing.assert_array_equal(inline[1], pooled[1])
+        self.assertEqual(inline[0].sum(), runs * len(self.teams))
+
+    def test_finished_match_queues_a_recompute(self):
+        """Test that the cached forecast is only recomputed once the bracket changes"""
+        stage = self.create_stage('single_elimination')
+        first = forecast.refresh(self.tournament)
+        self.assertEqual(forecast.cached(self.tournament), (first, False))
+
+        slot = stage.slots.filter(match__isnull=False).select_related('match').first()
+        slot.match.team1_score, slot.match.team2_score = 8, 13
+        slot.match.is_finished = True
+        with self.captureOnCommitCallbacks(execute=True):
+            slot.match.save()
+        self.assertTrue(forecast.cached(self.tournament)[1])
+        run_pending()
+
+        updated = TournamentForecast.objects.get(tournament=self.tournament)
+        self.assertEqual(updated.state_key, forecast.state_key(self.tournament))
+        self.assertEqual(self.win_chances(updated.results)[slot.match.team1_id], 0)
+
+    def test_detail_page_and_api_show_forecast(self):
+        """Test that the forecast table renders once computed, and the API serves it"""
+        self.create_stage('single_elimination')
+        forecast.refresh(self.tournament)
+
+        response = self.client.get(reverse('tournament_detail', args=[self.tournament.pk]))
+        self.assertContains(response, 'Forecast')
+        self.assertContains(response, 'Semifinals')
+
+        response = self.client.get(reverse('api_tournament_forecast', args=[self.tournament.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['is_stale'])
+        self.assertEqual(len(response.json()['teams']), 8)
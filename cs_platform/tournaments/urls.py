@@ -8,6 +8,7 @@ urlpatterns = [
     path('<int:pk>/register/', views.tournament_register, name='tournament_register'),
     path('<int:tournament_id>/admin/add-team/', views.admin_add_team, name='admin_add_team'),
     path('<int:tournament_id>/admin/remove-team/', views.admin_remove_team, name='admin_remove_team'),
+    path('<int:tournament_id>/stages/create/', views.create_stage, name='create_stage'),
     path('api/team/<int:team_pk>/', views.get_team_info, name='get_team_info'),
     path('<int:tournament_id>/delete/', views.delete_tournament, name='delete_tournament'),
     path('<int:tournament_id>/ajax-delete/', views.ajax_delete_tournament, name='ajax_delete_tournament'),
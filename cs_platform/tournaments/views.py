@@ -7,8 +7,11 @@ from django.utils import timezone
 from django.db import transaction
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from .models import Tournament, TournamentParticipation
-from .forms import TournamentCreateForm, TournamentRegistrationForm
+from django.db.models import Prefetch
+from .models import Tournament, TournamentParticipation, BracketSlot, StageStanding
+from .forms import TournamentCreateForm, TournamentRegistrationForm, StageCreateForm
+from .tasks import generate_stage_bracket
+from . import brackets, forecast, standings
 from teams.models import Team
 
 
@@ -27,7 +30,8 @@ class TournamentListView(ListView):
         if status_filter and status_filter != 'all':
             queryset = queryset.filter(status=status_filter)
 
-        return queryset.select_related('organizer')
+        # participants.count in the template reads the prefetched rows
+        return queryset.select_related('organizer').prefetch_related('participants')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -73,6 +77,19 @@ class TournamentDetailView(DetailView):
             context['professional_teams'] = available_teams.filter(is_professional=True)
             context['community_teams'] = available_teams.filter(is_professional=False)
 
+        # Bracket stages with every slot and standings row in three queries
+        context['stages'] = tournament.stages.prefetch_related(
+            Prefetch('slots', queryset=BracketSlot.objects.select_related('team1', 'team2', 'winner', 'match')),
+            Prefetch('standings', queryset=StageStanding.objects.select_related('team').order_by(
+                'group', *standings.ranking_order()
+            )),
+        )
+        if context['is_organizer']:
+            context['stage_form'] = StageCreateForm(tournament=tournament)
+
+        # Cached Monte Carlo forecast; a stale one is shown while it's recomputed in the background
+        context['forecast'], context['forecast_is_stale'] = forecast.cached(tournament)
+
         # Check if user has teams that can register (normal registration)
         if self.request.user.is_authenticated and not context['is_organizer']:
             user_teams = Team.objects.filter(
@@ -394,3 +411,38 @@ def delete_tournament(request, tournament_id):
         return redirect('tournament_list')
 
     return redirect('tournament_detail', pk=tournament_id)
+
+
+@login_required
+@require_POST
+def create_stage(request, tournament_id):
+    """Organizer adds a bracket stage - the first one is seeded right away in the background"""
+    tournament = get_object_or_404(Tournament, id=tournament_id)
+
+    if tournament.organizer != request.user:
+        messages.error(request, 'Only the tournament organizer can create stages!')
+        return redirect('tournament_detail', pk=tournament_id)
+
+    form = StageCreateForm(request.POST, tournament=tournament)
+    if not form.is_valid():
+        errors = [error for field_errors in form.errors.values() for error in field_errors]
+        messages.error(request, f'Invalid stage settings! {" ".join(errors)}')
+        return redirect('tournament_detail', pk=tournament_id)
+
+    if tournament.participants.count() < 2:
+        messages.error(request, 'At least two teams are needed to build a bracket!')
+        return redirect('tournament_detail', pk=tournament_id)
+
+    stage = form.save(commit=False)
+    stage.tournament = tournament
+    stage.order = brackets.next_stage_order(tournament)
+    stage.save()
+
+    # Later stages are seeded automatically from the previous stage's standings
+    if stage.order == 1:
+        transaction.on_commit(lambda: generate_stage_bracket.enqueue(stage.id, unique_key=f'stage:{stage.id}'))
+        messages.success(request, f'🏆 Stage "{stage.name}" created - the bracket is being generated!')
+    else:
+        messages.success(request, f'🏆 Stage "{stage.name}" will be seeded when the previous stage finishes!')
+
+    return redirect('tournament_detail', pk=tournament_id)